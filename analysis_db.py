@@ -2,11 +2,16 @@
 # -*- coding: utf-8 -*-
 
 import sqlite3
+import db_pool
 import json
-import re
 from typing import Dict, List, Any, Optional, Tuple
 import logging
 import datetime
+import search_index
+import report_stats
+import prescorer
+import near_duplicate
+from analysis_parser import parse_analysis, extract_suggestions
 
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -22,7 +27,7 @@ class AnalysisDatabase:
     
     def _init_db(self):
         """初始化数据库表结构"""
-        conn = sqlite3.connect(self.db_path)
+        conn = db_pool.connect(self.db_path)
         cursor = conn.cursor()
         
         # 检查表是否存在
@@ -110,7 +115,7 @@ class AnalysisDatabase:
         int
             新插入的分析记录ID
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = db_pool.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
@@ -180,6 +185,12 @@ class AnalysisDatabase:
             WHERE id = ?
             ''', (completeness_score, analyzer_type, report_id))
             
+            # 6. 一句话总结参与全文检索，同步刷新索引
+            search_index.index_report(conn, report_id)
+            
+            # 7. 增量更新统计聚合数据
+            report_stats.refresh_report(conn, report_id)
+            
             conn.commit()
             return analysis_id
             
@@ -199,13 +210,9 @@ class AnalysisDatabase:
             # 尝试从文本中提取改进建议
             suggestions = self._extract_suggestions_from_text(suggestions_text)
             
-            # 如果无法提取，尝试从完整分析文本中提取
+            # 如果无法提取，使用完整分析文本的解析结果（分析器解析过的文本直接复用）
             if not suggestions and 'full_analysis' in analysis_result:
-                full_text = analysis_result['full_analysis']
-                suggestions_section = re.search(r'## 可操作补强思路(.*?)##', full_text, re.DOTALL)
-                if suggestions_section:
-                    suggestions_text = suggestions_section.group(1).strip()
-                    suggestions = self._extract_suggestions_from_text(suggestions_text)
+                suggestions = parse_analysis(analysis_result['full_analysis']).suggestions
             
             # 保存提取到的建议
             for point, suggestion in suggestions:
@@ -215,46 +222,8 @@ class AnalysisDatabase:
                 ''', (analysis_id, point, suggestion))
     
     def _extract_suggestions_from_text(self, text: str) -> List[Tuple[str, str]]:
-        """从文本中提取改进建议"""
-        suggestions = []
-        
-        # 尝试解析表格格式
-        table_rows = re.findall(r'\|(.*?)\|(.*?)\|', text)
-        if table_rows:
-            for row in table_rows:
-                if len(row) >= 2 and not ('待完善点' in row[0] and '建议' in row[1]):
-                    point = row[0].strip()
-                    suggestion = row[1].strip()
-                    
-                    # 处理<br>标签，确保它们正确显示
-                    suggestion = suggestion.replace('<br>', '<br />')
-                    
-                    # 验证提取的建议是否有效
-                    if (point and suggestion and 
-                        point != '-------' and suggestion != '----' and
-                        len(point) > 1 and len(suggestion) > 1):
-                        suggestions.append((point, suggestion))
-        
-        # 如果没有找到表格格式，尝试解析其他格式
-        if not suggestions:
-            # 尝试解析列表格式
-            list_items = re.findall(r'- (.*?)[:：](.*?)(?:\n|$)', text)
-            if list_items:
-                for item in list_items:
-                    if len(item) >= 2:
-                        point = item[0].strip()
-                        suggestion = item[1].strip()
-                        
-                        # 处理<br>标签，确保它们正确显示
-                        suggestion = suggestion.replace('<br>', '<br />')
-                        
-                        # 验证提取的建议是否有效
-                        if (point and suggestion and 
-                            point != '-------' and suggestion != '----' and
-                            len(point) > 1 and len(suggestion) > 1):
-                            suggestions.append((point, suggestion))
-        
-        return suggestions
+        """从文本中提取改进建议，支持表格和"- 待完善点：建议"列表两种格式"""
+        return extract_suggestions(text)
     
     def get_analysis_by_report_id(self, report_id: int, analyzer_type: str = None) -> Optional[Dict[str, Any]]:
         """
@@ -270,9 +239,26 @@ class AnalysisDatabase:
         Returns:
         --------
         Dict[str, Any] or None
-            分析结果字典，如果没有找到则返回None
+            分析结果字典，如果没有找到则返回None；
+            近似重复的研报没有LLM分析时返回原研报的分析结果，并带duplicate_of字段（原研报ID）；
+            规则预评分结果不作为分析结果返回
         """
-        conn = sqlite3.connect(self.db_path)
+        analysis = self._get_analysis(report_id, analyzer_type)
+        if analysis is None:
+            conn = db_pool.connect(self.db_path)
+            try:
+                original_id = near_duplicate.original_of(conn, report_id)
+            finally:
+                conn.close()
+            shared = self._get_analysis(original_id, analyzer_type) if original_id else None
+            if shared is not None:
+                shared['duplicate_of'] = original_id
+                return shared
+        return analysis
+
+    def _get_analysis(self, report_id: int, analyzer_type: str = None) -> Optional[Dict[str, Any]]:
+        """获取研报自身的分析结果（不含规则预评分），不考虑近似重复关系"""
+        conn = db_pool.connect(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -280,9 +266,9 @@ class AnalysisDatabase:
             # 构建查询
             query = '''
             SELECT * FROM report_analysis 
-            WHERE report_id = ?
+            WHERE report_id = ? AND analyzer_type != ?
             '''
-            params = [report_id]
+            params = [report_id, prescorer.ANALYZER_TYPE]
             
             if analyzer_type:
                 query += ' AND analyzer_type = ?'
@@ -299,9 +285,9 @@ class AnalysisDatabase:
                 if analyzer_type:
                     cursor.execute('''
                     SELECT * FROM report_analysis 
-                    WHERE report_id = ?
+                    WHERE report_id = ? AND analyzer_type != ?
                     ORDER BY created_at DESC LIMIT 1
-                    ''', [report_id])
+                    ''', [report_id, prescorer.ANALYZER_TYPE])
                     any_analysis = cursor.fetchone()
                     
                     if any_analysis:
@@ -316,58 +302,183 @@ class AnalysisDatabase:
             # 将行转换为字典
             analysis = dict(analysis_row)
             analysis_id = analysis['id']
-            
+
             # 获取步骤分析
             cursor.execute('''
             SELECT * FROM step_analysis
             WHERE analysis_id = ?
             ''', (analysis_id,))
-            
+
             steps = {}
             for step_row in cursor.fetchall():
-                step_dict = dict(step_row)
-                step_name = step_dict['step_name']
-                steps[step_name] = {
-                    'found': bool(step_dict['found']),
-                    'description': step_dict['description'],
-                    'step_score': step_dict['step_score'],
-                    'framework_summary': step_dict['framework_summary']
-                }
-            
+                steps[step_row['step_name']] = self._step_row_to_dict(step_row)
+
             # 获取改进建议
             cursor.execute('''
             SELECT point, suggestion FROM improvement_suggestions
             WHERE analysis_id = ?
             ''', (analysis_id,))
-            
+
             suggestions = []
             for suggestion_row in cursor.fetchall():
                 suggestions.append({
                     'point': suggestion_row['point'],
                     'suggestion': suggestion_row['suggestion']
                 })
-            
+
             # 构建完整的结果字典
-            result = {
-                'id': analysis['id'],
-                'report_id': analysis['report_id'],
-                'analyzer_type': analysis['analyzer_type'],
-                'completeness_score': analysis['completeness_score'],
-                'evaluation': analysis['evaluation'],
-                'one_line_summary': analysis['one_line_summary'],
-                'full_analysis': analysis['full_analysis'],
-                'created_at': analysis['created_at'],
-                'steps': steps,
-                'improvement_suggestions': suggestions
-            }
-            
-            return result
-            
+            return self._build_analysis_dict(analysis, steps, suggestions)
+
         except Exception as e:
             logger.error(f"获取分析结果时出错: {str(e)}")
             return None
         finally:
             conn.close()
+
+    def get_analyses_by_report_ids(self, report_ids: List[int], analyzer_type: str = None) -> Dict[int, Dict[str, Any]]:
+        """
+        批量获取多份研报的分析结果
+
+        与逐条调用get_analysis_by_report_id相比，只需固定次数的查询
+        （report_analysis、step_analysis、improvement_suggestions各一次，
+        id数量超过单次查询上限时按批次拆分）。
+
+        Parameters:
+        -----------
+        report_ids : List[int]
+            研报ID列表
+        analyzer_type : str, optional
+            优先使用的分析器类型，若某研报没有该类型的分析则使用其最新的其他类型分析
+
+        Returns:
+        --------
+        Dict[int, Dict[str, Any]]
+            以研报ID为键的分析结果字典，结构与get_analysis_by_report_id的返回值相同
+            （包括近似重复研报使用原研报分析结果的规则）；没有分析结果的研报不出现在字典中
+        """
+        report_ids = list(dict.fromkeys(report_ids))
+        if not report_ids:
+            return {}
+
+        conn = db_pool.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        try:
+            # 1. 每份研报选出一条分析记录（优先指定类型，其次最新）
+            chosen = self._choose_analyses(cursor, report_ids, analyzer_type)
+
+            # 近似重复且没有LLM分析的研报改用原研报的分析记录
+            originals = near_duplicate.originals_of(conn, [
+                report_id for report_id in report_ids if report_id not in chosen
+            ])
+            shared = self._choose_analyses(cursor, list(set(originals.values())), analyzer_type)
+            duplicate_of = {}
+            for report_id, original_id in originals.items():
+                if original_id in shared:
+                    chosen[report_id] = shared[original_id]
+                    duplicate_of[report_id] = original_id
+
+            if not chosen:
+                return {}
+
+            analysis_ids = [analysis['id'] for analysis in chosen.values()]
+            steps_by_analysis = {analysis_id: {} for analysis_id in analysis_ids}
+            suggestions_by_analysis = {analysis_id: [] for analysis_id in analysis_ids}
+
+            # 2. 批量获取步骤分析和改进建议
+            for chunk in self._chunked(analysis_ids):
+                placeholders = ','.join('?' * len(chunk))
+
+                cursor.execute(f'''
+                SELECT * FROM step_analysis
+                WHERE analysis_id IN ({placeholders})
+                ''', chunk)
+                for step_row in cursor.fetchall():
+                    steps_by_analysis[step_row['analysis_id']][step_row['step_name']] = self._step_row_to_dict(step_row)
+
+                cursor.execute(f'''
+                SELECT analysis_id, point, suggestion FROM improvement_suggestions
+                WHERE analysis_id IN ({placeholders})
+                ORDER BY id
+                ''', chunk)
+                for suggestion_row in cursor.fetchall():
+                    suggestions_by_analysis[suggestion_row['analysis_id']].append({
+                        'point': suggestion_row['point'],
+                        'suggestion': suggestion_row['suggestion']
+                    })
+
+            # 3. 组装与单条查询相同的结构
+            results = {
+                report_id: self._build_analysis_dict(
+                    analysis,
+                    steps_by_analysis[analysis['id']],
+                    suggestions_by_analysis[analysis['id']]
+                )
+                for report_id, analysis in chosen.items()
+            }
+            for report_id, original_id in duplicate_of.items():
+                results[report_id]['duplicate_of'] = original_id
+            return results
+
+        except Exception as e:
+            logger.error(f"批量获取分析结果时出错: {str(e)}")
+            return {}
+        finally:
+            conn.close()
+
+    def _choose_analyses(self, cursor, report_ids: List[int], analyzer_type: str = None) -> Dict[int, Dict[str, Any]]:
+        """每份研报选出一条report_analysis记录（优先指定类型，其次最新，不含规则预评分）"""
+        chosen = {}
+        for chunk in self._chunked(report_ids):
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'''
+            SELECT * FROM report_analysis
+            WHERE report_id IN ({placeholders}) AND analyzer_type != ?
+            ORDER BY report_id, created_at DESC
+            ''', chunk + [prescorer.ANALYZER_TYPE])
+
+            for row in cursor.fetchall():
+                report_id = row['report_id']
+                current = chosen.get(report_id)
+                if current is None:
+                    chosen[report_id] = dict(row)
+                elif (analyzer_type and current['analyzer_type'] != analyzer_type
+                      and row['analyzer_type'] == analyzer_type):
+                    chosen[report_id] = dict(row)
+        return chosen
+
+    @staticmethod
+    def _chunked(ids: List[int], size: int = 500):
+        """按SQLite参数数量上限将id列表分批"""
+        for start in range(0, len(ids), size):
+            yield ids[start:start + size]
+
+    @staticmethod
+    def _step_row_to_dict(step_row) -> Dict[str, Any]:
+        """将step_analysis行转换为步骤字典"""
+        return {
+            'found': bool(step_row['found']),
+            'description': step_row['description'],
+            'step_score': step_row['step_score'],
+            'framework_summary': step_row['framework_summary']
+        }
+
+    @staticmethod
+    def _build_analysis_dict(analysis: Dict[str, Any], steps: Dict[str, Any], suggestions: List[Dict[str, str]]) -> Dict[str, Any]:
+        """构建分析结果字典"""
+        return {
+            'id': analysis['id'],
+            'report_id': analysis['report_id'],
+            'analyzer_type': analysis['analyzer_type'],
+            'completeness_score': analysis['completeness_score'],
+            'evaluation': analysis['evaluation'],
+            'one_line_summary': analysis['one_line_summary'],
+            'full_analysis': analysis.get('full_analysis'),
+            'created_at': analysis['created_at'],
+            'steps': steps,
+            'improvement_suggestions': suggestions
+        }
     
     def delete_analysis(self, analysis_id: int) -> bool:
         """
@@ -383,10 +494,12 @@ class AnalysisDatabase:
         bool
             删除是否成功
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = db_pool.connect(self.db_path)
         try:
             cursor = conn.cursor()
             
+            row = cursor.execute('SELECT report_id FROM report_analysis WHERE id = ?', (analysis_id,)).fetchone()
+            
             # 删除步骤分析
             cursor.execute('DELETE FROM step_analysis WHERE analysis_id = ?', (analysis_id,))
             
@@ -396,6 +509,11 @@ class AnalysisDatabase:
             # 删除主分析记录
             cursor.execute('DELETE FROM report_analysis WHERE id = ?', (analysis_id,))
             
+            # 一句话总结和统计数据可能随之变化，刷新全文索引和统计聚合
+            if row:
+                search_index.index_report(conn, row[0])
+                report_stats.refresh_report(conn, row[0])
+            
             conn.commit()
             logger.info(f"已删除分析ID {analysis_id}")
             return True
@@ -420,7 +538,7 @@ class AnalysisDatabase:
         List[Dict[str, Any]]
             分析结果列表
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = db_pool.connect(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -468,19 +586,33 @@ class AnalysisDatabase:
         Returns:
         --------
         int
-            新插入的研报ID
+            研报ID，链接已存在时（增量爬取发现详情内容变化）更新原研报并返回原ID
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = db_pool.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
-            # 插入研报信息
+            # 插入研报信息，链接已存在时更新内容并保留原ID和历史分析结果
             cursor.execute('''
             INSERT INTO reports (title, link, industry, rating, org, date, full_content, created_at, updated_at)
             VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
+            ON CONFLICT(link) DO UPDATE SET
+                title = excluded.title,
+                industry = excluded.industry,
+                rating = excluded.rating,
+                org = excluded.org,
+                date = excluded.date,
+                full_content = excluded.full_content,
+                updated_at = datetime('now')
             ''', (title, link, industry, rating, org, date, content))
             
-            report_id = cursor.lastrowid
+            report_id = cursor.execute('SELECT id FROM reports WHERE link = ?', (link,)).fetchone()[0]
+            search_index.index_report(conn, report_id)
+            report_stats.refresh_report(conn, report_id)
+            # 入库时即计算规则预评分，供分析排序和阈值过滤使用
+            prescorer.prescore_report(conn, report_id, content)
+            # 与已入库研报近似重复时记录指向原研报的关系
+            near_duplicate.index_report(conn, report_id, content)
             conn.commit()
             logger.info(f"插入新研报，ID: {report_id}, 标题: {title}")
             return report_id
@@ -502,8 +634,8 @@ class AnalysisDatabase:
             研报ID
         analyzer_type : str
             分析器类型
-        analysis_json : str
-            JSON格式的分析结果
+        analysis_json : str or Dict[str, Any]
+            JSON格式的分析结果，也可以直接传入分析结果字典，省去序列化和解析
             
         Returns:
         --------
@@ -512,7 +644,7 @@ class AnalysisDatabase:
         """
         try:
             # 解析JSON
-            analysis_data = json.loads(analysis_json)
+            analysis_data = json.loads(analysis_json) if isinstance(analysis_json, str) else analysis_json
             
             # 调用现有的save_analysis_result方法
             analysis_id = self.save_analysis_result(report_id, analysis_data, analyzer_type)
@@ -543,7 +675,7 @@ class AnalysisDatabase:
         int
             新插入或更新的记录ID
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = db_pool.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
@@ -597,7 +729,7 @@ class AnalysisDatabase:
         str
             视频文案文本，如果不存在则返回空字符串
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = db_pool.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
@@ -627,7 +759,7 @@ class AnalysisDatabase:
         List[Dict[str, Any]]
             包含视频脚本信息的字典列表，每个字典包含id、report_id、script_text、created_at等字段
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = db_pool.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
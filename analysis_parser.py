@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+五步法分析文本解析
+模型返回的分析文本由若干"## "小节和markdown表格组成，这里逐行扫描一遍，
+同时完成小节切分和表格行解析，得到ParsedAnalysis对象；
+同一个解析器既可以一次解析完整文本，也可以在流式输出时增量解析，
+分析器、保存分析结果和保存研报时都使用这里的结果，不再各自用正则重复解析
+"""
+
+import re
+import json
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+STEPS = ('信息', '逻辑', '超预期', '催化剂', '结论')
+
+SECTION_CHECKLIST = '体检清单'
+SECTION_FRAMEWORK = '五步框架梳理'
+SECTION_SUGGESTIONS = '可操作补强思路'
+SECTION_SUMMARY = '一句话总结'
+SECTION_SCORES = '五步法定量评分'
+SECTIONS = (SECTION_CHECKLIST, SECTION_FRAMEWORK, SECTION_SUGGESTIONS, SECTION_SUMMARY, SECTION_SCORES)
+
+# 产出row事件的表格小节
+STEP_TABLE_SECTIONS = frozenset([SECTION_CHECKLIST, SECTION_FRAMEWORK, SECTION_SCORES])
+
+# 五步框架梳理表中的英文步骤名
+FRAMEWORK_STEPS = {
+    'Information': '信息',
+    'Logic': '逻辑',
+    'Beyond-Consensus': '超预期',
+    'Catalyst': '催化剂',
+    'Conclusion': '结论'
+}
+
+TOTAL_ROW = '总分'
+
+# 体检清单"是否覆盖"列中表示已覆盖（含部分覆盖）的标记，提示词要求填写是/否
+COVERED_MARKS = ('✅', '⚠️', '是')
+
+# 没有可操作补强思路时使用的默认建议
+DEFAULT_SUGGESTIONS = "| 整体完善 | 建议根据五步法框架进一步完善研报结构 |"
+
+NO_SUMMARY = "无法提取一句话总结"
+
+_NUMBER = re.compile(r'\d+')
+_BOLD = re.compile(r'\*\*|__')
+
+
+@dataclass
+class StepResult:
+    """单个步骤在各表格中的解析结果"""
+    name: str
+    covered: str = ''
+    comment: str = ''
+    framework_summary: str = ''
+    score: Optional[int] = None
+    score_comment: str = ''
+
+    @property
+    def found(self) -> bool:
+        return any(mark in self.covered for mark in COVERED_MARKS) and '否' not in self.covered
+
+
+@dataclass
+class ParsedAnalysis:
+    """
+    一份五步法分析文本的解析结果
+
+    parse_analysis()对相同文本返回同一个对象，调用方不应修改。
+    """
+    text: str = ''
+    sections: Dict[str, str] = field(default_factory=dict)
+    steps: Dict[str, StepResult] = field(default_factory=lambda: {step: StepResult(step) for step in STEPS})
+    suggestions: List[Tuple[str, str]] = field(default_factory=list)
+    total_score: Optional[int] = None
+    total_comment: str = ''
+
+    @property
+    def one_line_summary(self) -> Optional[str]:
+        return self.sections.get(SECTION_SUMMARY) or None
+
+    @property
+    def improvement_text(self) -> str:
+        """可操作补强思路小节原文"""
+        return self.sections.get(SECTION_SUGGESTIONS, '')
+
+    @property
+    def completeness_score(self) -> int:
+        """总分行的分数，没有总分时取各步骤平均分"""
+        if self.total_score:
+            return self.total_score
+        return sum(step.score or 0 for step in self.steps.values()) // len(STEPS)
+
+    @property
+    def steps_found(self) -> int:
+        """评分不低于60的步骤数"""
+        return sum(1 for step in self.steps.values() if (step.score or 0) >= 60)
+
+    @property
+    def complete(self) -> bool:
+        """体检清单和评分表中五个步骤都有结果，且有一句话总结"""
+        return bool(self.one_line_summary) and all(
+            step.covered and step.score is not None for step in self.steps.values()
+        )
+
+    def to_result(self, evaluate=None, xhtml_breaks=False, default_suggestions=None):
+        """
+        转换为分析器返回的结构化结果
+
+        参数:
+        evaluate (callable): 没有总分评价时根据分数生成评价文本的函数
+        xhtml_breaks (bool): 是否把文本中的<br>替换为<br />
+        default_suggestions (str): 没有有效的可操作补强思路时使用的默认内容，None表示不填
+
+        返回:
+        dict: 包含analysis（各步骤和summary）和full_analysis的字典
+        """
+        def clean(value):
+            return value.replace('<br>', '<br />') if xhtml_breaks and value else value
+
+        analysis = {}
+        for name, step in self.steps.items():
+            # 体检清单的快评优先，其次使用评分表中的评价
+            description = step.comment if step.found and step.comment else step.score_comment
+            analysis[name] = {
+                "found": step.found,
+                "keywords": [],
+                "evidence": [],
+                "description": clean(description),
+                "step_score": step.score or 0,
+                "framework_summary": clean(step.framework_summary)
+            }
+
+        score = self.completeness_score
+        evaluation = clean(self.total_comment)
+        if not evaluation and evaluate is not None:
+            evaluation = evaluate(score)
+        analysis["summary"] = {
+            "completeness_score": score,
+            "steps_found": self.steps_found,
+            "evaluation": evaluation,
+            "one_line_summary": clean(self.one_line_summary) or NO_SUMMARY
+        }
+
+        improvement = self.improvement_text
+        if improvement and not improvement.startswith('-------'):
+            analysis["improvement_suggestions"] = improvement
+        elif default_suggestions is not None:
+            analysis["improvement_suggestions"] = default_suggestions
+
+        return {"analysis": analysis, "full_analysis": self.text}
+
+
+# 分析文本的词法单元：小节标题、表格行（取前三列）和列表项，由预编译正则在C层面切分
+_HEADING = re.compile(r'^[ \t]*##[ \t]+([^\n]*?)[ \t]*$', re.M)
+_ROW = re.compile(r'^[ \t]*\|[ \t]*([^|\n]*?)[ \t]*\|[ \t]*([^|\n]*?)[ \t]*\|(?:[ \t]*([^|\n]*?)[ \t]*\|)?', re.M)
+_ITEM = re.compile(r'^[ \t]*[-*][ \t]*([^:：\n]+?)[ \t]*[:：][ \t]*([^\n]*?)[ \t]*$', re.M)
+
+
+@lru_cache(maxsize=256)
+def _step_name(cell):
+    """表格第一列对应的步骤名，表头和分隔行返回None"""
+    cell = _BOLD.sub('', cell).strip()
+    if cell in FRAMEWORK_STEPS:
+        return FRAMEWORK_STEPS[cell]
+    if cell in STEPS or cell == TOTAL_ROW:
+        return cell
+    for step in STEPS:
+        if cell.startswith(step):
+            return step
+    return None
+
+
+@lru_cache(maxsize=64)
+def _section_name(heading):
+    for name in SECTIONS:
+        if name in heading:
+            return name
+    return heading
+
+
+def _valid_suggestion(point, suggestion):
+    return (len(point) > 1 and len(suggestion) > 1 and
+            not point.startswith('---') and not suggestion.startswith('---'))
+
+
+class AnalysisParser:
+    """
+    五步法分析文本的单遍解析器
+
+    预编译的正则在C层面切出小节标题、表格行和列表项，Python代码只处理步骤行，每行只处理一次。
+    feed()接收任意长度的文本片段，只扫描新到达的完整行：体检清单、五步框架梳理和五步法定量评分中的
+    步骤行立即写入parsed并产出row事件，遇到下一个"## "标题时上一节结束并产出section事件。
+    close()之后parsed即为完整的解析结果。
+
+    Parameters:
+    -----------
+    emit_events : bool
+        是否产出事件，一次解析完整文本时不需要
+    """
+
+    def __init__(self, emit_events=True):
+        self.parsed = ParsedAnalysis()
+        self._emit = emit_events
+        self._text = ''
+        self._scanned = 0
+        self._section = None
+        self._section_start = 0
+        self._table_suggestions = []
+        self._list_suggestions = []
+
+    def feed(self, delta):
+        """追加文本片段，返回新产生的事件列表"""
+        self._text += delta
+        newline = delta.rfind('\n')
+        if newline < 0:
+            return []
+        return self._scan(len(self._text) - len(delta) + newline + 1)
+
+    def close(self):
+        """文本结束，返回剩余的事件"""
+        events = self._scan(len(self._text))
+        events.extend(self._finish_section(len(self._text)))
+        self._section = None
+        self.parsed.text = self._text
+        return events
+
+    def _scan(self, end):
+        events = []
+        position = self._scanned
+        for match in _HEADING.finditer(self._text, position, end):
+            events.extend(self._scan_section(position, match.start()))
+            events.extend(self._finish_section(match.start()))
+            self._section = _section_name(match.group(1))
+            self._section_start = position = match.end()
+        events.extend(self._scan_section(position, end))
+        self._scanned = end
+        return events
+
+    def _scan_section(self, start, end):
+        """处理当前小节中[start, end)范围内的表格行和列表项"""
+        if self._section == SECTION_SUGGESTIONS:
+            for point, suggestion, _ in _ROW.findall(self._text, start, end):
+                if not ('待完善点' in point and '建议' in suggestion) and _valid_suggestion(point, suggestion):
+                    self._table_suggestions.append((point, suggestion.replace('<br>', '<br />')))
+            for point, suggestion in _ITEM.findall(self._text, start, end):
+                if _valid_suggestion(point, suggestion):
+                    self._list_suggestions.append((point, suggestion.replace('<br>', '<br />')))
+            return []
+        if self._section not in STEP_TABLE_SECTIONS:
+            return []
+
+        events = []
+        for first, second, third in _ROW.findall(self._text, start, end):
+            step = _step_name(first)
+            # 表头行和分隔行的第一列不是步骤名
+            if step is None:
+                continue
+            event = self._handle_row(step, second, third)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def _handle_row(self, step, second, third):
+        if self._section == SECTION_SCORES:
+            match = _NUMBER.search(second)
+            score = int(match.group(0)) if match else None
+            if step == TOTAL_ROW:
+                self.parsed.total_score = score
+                self.parsed.total_comment = third
+            else:
+                self.parsed.steps[step].score = score
+                self.parsed.steps[step].score_comment = third
+            fields = ('score', score, 'comment', third)
+        elif step == TOTAL_ROW:
+            return None
+        elif self._section == SECTION_CHECKLIST:
+            self.parsed.steps[step].covered = second
+            self.parsed.steps[step].comment = third
+            fields = ('covered', second, 'comment', third)
+        else:
+            self.parsed.steps[step].framework_summary = second
+            fields = ('summary', second)
+        if not self._emit:
+            return None
+        event = {'event': 'row', 'section': self._section, 'step': step}
+        event.update(zip(fields[::2], fields[1::2]))
+        return event
+
+    def _finish_section(self, end):
+        if self._section is None:
+            return []
+        text = self._text[self._section_start:end].strip()
+        self.parsed.sections[self._section] = text
+        if self._section == SECTION_SUGGESTIONS:
+            # 表格格式优先，没有表格时使用列表格式
+            self.parsed.suggestions = self._table_suggestions or self._list_suggestions
+            self._table_suggestions, self._list_suggestions = [], []
+        if not self._emit:
+            return []
+        return [{'event': 'section', 'section': self._section, 'text': text}]
+
+
+@lru_cache(maxsize=128)
+def parse_analysis(text):
+    """
+    一次解析完整的分析文本
+
+    结果按文本缓存，分析器解析后保存分析结果时再次调用不会重复解析。
+
+    参数:
+    text (str): 模型返回的五步法分析文本
+
+    返回:
+    ParsedAnalysis: 解析结果
+    """
+    parser = AnalysisParser(emit_events=False)
+    parser.feed(text or '')
+    parser.close()
+    return parser.parsed
+
+
+def extract_suggestions(text):
+    """
+    从可操作补强思路小节的原文中提取(待完善点, 建议)
+
+    参数:
+    text (str): 小节原文（不含标题），表格或"- 待完善点：建议"列表
+
+    返回:
+    list: (待完善点, 建议)列表
+    """
+    return parse_analysis(f"## {SECTION_SUGGESTIONS}\n{text or ''}").suggestions
+
+
+def _cell(value):
+    """JSON字段值转换为表格单元格文本，单元格内不能有竖线和换行"""
+    return str(value if value is not None else '').replace('|', '｜').replace('\r', '').replace('\n', '<br>').strip()
+
+
+def _json_score(value, where):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 100:
+        raise ValueError(f"{where}应为0-100的数字")
+    return int(value)
+
+
+def _json_text(value, where):
+    if not isinstance(value, str):
+        raise ValueError(f"{where}应为字符串")
+    return _cell(value)
+
+
+@lru_cache(maxsize=128)
+def parse_analysis_json(text):
+    """
+    解析JSON格式的五步法分析结果
+
+    只做字段和类型检查，不经过正则解析；text字段为按markdown格式生成的分析文本，
+    与模型直接返回markdown时的格式相同，页面展示和保存研报时无需区分两种格式。
+
+    参数:
+    text (str): 模型返回的JSON文本，格式见deepseek_analyzer.ANALYSIS_JSON_FORMAT
+
+    返回:
+    ParsedAnalysis: 解析结果，parse_analysis(结果.text)得到相同的结果
+
+    异常:
+    ValueError: 不是合法的JSON或不符合格式要求
+    """
+    data = json.loads(text)
+    if not isinstance(data, dict) or not isinstance(data.get('steps'), dict):
+        raise ValueError("缺少steps对象")
+
+    parsed = ParsedAnalysis()
+    for name in STEPS:
+        step = data['steps'].get(name)
+        if not isinstance(step, dict):
+            raise ValueError(f"缺少步骤: {name}")
+        if not isinstance(step.get('found'), bool):
+            raise ValueError(f"{name}.found应为布尔值")
+        result = parsed.steps[name]
+        result.covered = '是' if step['found'] else '否'
+        result.comment = _json_text(step.get('comment', ''), f"{name}.comment")
+        result.framework_summary = _json_text(step.get('framework', ''), f"{name}.framework")
+        result.score = _json_score(step.get('score'), f"{name}.score")
+
+    suggestions = data.get('suggestions', [])
+    if not isinstance(suggestions, list):
+        raise ValueError("suggestions应为数组")
+    for item in suggestions:
+        if not isinstance(item, dict):
+            raise ValueError("suggestions的元素应为对象")
+        point = _json_text(item.get('point', ''), "suggestions.point")
+        advice = _json_text(item.get('advice', ''), "suggestions.advice")
+        if not ('待完善点' in point and '建议' in advice) and _valid_suggestion(point, advice):
+            parsed.suggestions.append((point, advice.replace('<br>', '<br />')))
+
+    summary = _json_text(data.get('summary'), "summary")
+    if not summary:
+        raise ValueError("缺少一句话总结")
+    parsed.total_score = _json_score(data.get('total_score'), "total_score")
+    parsed.total_comment = _json_text(data.get('evaluation', ''), "evaluation")
+
+    # 按提示词要求的markdown格式生成分析文本
+    framework_names = {step: english for english, step in FRAMEWORK_STEPS.items()}
+    steps = parsed.steps.values()
+    parsed.sections = {
+        SECTION_CHECKLIST: "| 五步要素 | 是否覆盖 | 快评 |\n| ------- | ------- | ---- |\n" + "\n".join(
+            f"| {step.name} | {step.covered} | {step.comment} |" for step in steps),
+        SECTION_FRAMEWORK: "| 步骤 | 核心内容提炼 |\n| ---- | ------------ |\n" + "\n".join(
+            f"| {framework_names[step.name]} | {step.framework_summary} |" for step in steps),
+        SECTION_SUGGESTIONS: "| 待完善点 | 建议 |\n| ------- | ---- |" + "".join(
+            f"\n| {point} | {advice.replace('<br />', '<br>')} |" for point, advice in parsed.suggestions),
+        SECTION_SUMMARY: summary,
+        SECTION_SCORES: "| 步骤 | 分数(0-100) | 评价 |\n| ---- | ----------- | ---- |\n" + "\n".join(
+            f"| {step.name} | {step.score} |  |" for step in steps) +
+            f"\n| {TOTAL_ROW} | {parsed.total_score} | {parsed.total_comment} |",
+    }
+    parsed.text = "\n\n".join(f"## {name}\n{body}" for name, body in parsed.sections.items()) + "\n"
+    return parsed
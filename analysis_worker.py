@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务队列工作进程
+从job_queue领取任务并执行：研报五步法分析、视频文案生成和研报爬取。
+与Web应用分开运行，可启动多个进程并行处理，任务执行期间定期续约，进程退出后未完成的任务由其他进程接手
+
+用法: python analysis_worker.py [run|enqueue-backlog|stats] [--workers 进程数] [--types analyze,video_script]
+      [--db 数据库] [--threshold 最低预评分] [--limit 条数]
+"""
+
+import os
+import json
+import time
+import socket
+import signal
+import sqlite3
+import db_pool
+import argparse
+import threading
+import multiprocessing
+import logging
+
+from job_queue import JobQueue, PermanentJobError, DEFAULT_DB_PATH, DEFAULT_LEASE_SECONDS
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 任务类型
+JOB_ANALYZE = 'analyze'
+JOB_VIDEO_SCRIPT = 'video_script'
+JOB_SCRAPE = 'scrape'
+
+# 没有可执行任务时的轮询间隔（秒）
+POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', 2))
+
+# 流式分析时写入任务进度的最短间隔（秒），表格行和小节完成时立即写入
+PROGRESS_INTERVAL = 1.0
+
+# 当前线程正在执行的任务，处理函数通过report_progress上报进度
+_current = threading.local()
+
+
+def _load_report(db_path, report_id):
+    conn = db_pool.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        report = conn.execute('SELECT * FROM reports WHERE id = ?', (report_id,)).fetchone()
+    finally:
+        conn.close()
+    if not report:
+        raise PermanentJobError(f"未找到研报ID {report_id}")
+    return dict(report)
+
+
+def report_progress(progress):
+    """上报当前任务的执行进度；不在工作进程中执行（如直接调用处理函数）时不做任何操作"""
+    job = getattr(_current, 'job', None)
+    if job is not None:
+        queue, job_id, worker_id = job
+        queue.report_progress(job_id, worker_id, progress)
+
+
+def _stream_analysis(analyzer, report, force_refresh):
+    # 边接收模型输出边上报已生成的文本、表格行和小节，详情页据此逐行显示分析结果
+    progress = {'text': '', 'rows': [], 'sections': []}
+    reported_at = 0
+    for event in analyzer.stream_five_steps(report['title'], report['full_content'], report['industry'],
+                                            force_refresh=force_refresh):
+        name = event.pop('event')
+        if name == 'done':
+            report_progress(progress)
+            return event['result']
+        if name == 'error':
+            # 流式请求失败时由任务队列按退避时间重试
+            raise RuntimeError(event['message'])
+        if name == 'delta':
+            progress['text'] += event['text']
+        elif name == 'row':
+            progress['rows'].append(event)
+        elif name == 'section':
+            progress['sections'].append(event['section'])
+        if name != 'delta' or time.time() - reported_at >= PROGRESS_INTERVAL:
+            report_progress(progress)
+            reported_at = time.time()
+    raise RuntimeError("流式分析意外结束")
+
+
+def _can_stream(analyzer):
+    # JSON格式分析需要完整回复后校验，只有markdown格式的分析器流式执行
+    from deepseek_analyzer import OUTPUT_JSON
+    return hasattr(analyzer, 'stream_five_steps') and getattr(analyzer, 'output_format', None) != OUTPUT_JSON
+
+
+def handle_analyze(payload, db_path):
+    """
+    使用payload中analyzer_type对应的分析器（默认DeepSeek）对研报进行五步法分析并保存结果
+
+    支持流式输出的分析器边生成边上报任务进度，详情页通过/jobs/<id>/events逐行显示
+    """
+    from analyzer_registry import get_analyzer
+    from analysis_db import AnalysisDatabase
+    import near_duplicate
+
+    report_id = payload['report_id']
+    report = _load_report(db_path, report_id)
+    if not payload.get('force_refresh', False):
+        # 近似重复的研报复用原研报的分析结果，不调用LLM
+        conn = db_pool.connect(db_path)
+        try:
+            original_id = (near_duplicate.original_of(conn, report_id)
+                           or near_duplicate.analyzed_original(conn, report['full_content'], exclude_id=report_id))
+        finally:
+            conn.close()
+        if original_id:
+            logger.info(f"研报 {report_id} 与研报 {original_id} 近似重复，跳过LLM分析")
+            return {"report_id": report_id, "duplicate_of": original_id}
+    try:
+        analyzer = get_analyzer(payload.get('analyzer_type'))
+    except KeyError as e:
+        raise PermanentJobError(str(e))
+    force_refresh = payload.get('force_refresh', False)
+    if _can_stream(analyzer):
+        analysis_result = _stream_analysis(analyzer, report, force_refresh)
+    else:
+        analysis_result = analyzer.analyze_with_five_steps(report['title'], report['full_content'],
+                                                           report['industry'], force_refresh=force_refresh)
+    # 对冲分析器的结果按实际胜出的服务商保存
+    analyzer_type = analysis_result.get('analyzer_type', analyzer.analyzer_type)
+    AnalysisDatabase(db_path).save_analysis_result(report_id, analysis_result, analyzer_type=analyzer_type)
+
+    summary = analysis_result.get('analysis', {}).get('summary', {})
+    return {
+        "report_id": report_id,
+        "analyzer_type": analyzer_type,
+        "completeness_score": summary.get('completeness_score', 0),
+        "evaluation": summary.get('evaluation', '')
+    }
+
+
+def handle_video_script(payload, db_path):
+    """调用DeepSeek生成研报的视频文案并保存"""
+    report_id = payload['report_id']
+
+    from deepseek_analyzer import DeepSeekAnalyzer
+    from analysis_db import AnalysisDatabase
+
+    report = _load_report(db_path, report_id)
+    analysis_db = AnalysisDatabase(db_path)
+    analysis_result = analysis_db.get_analysis_by_report_id(report_id, analyzer_type='deepseek')
+    if not analysis_result:
+        raise PermanentJobError("请先进行研报分析")
+
+    analyzer = DeepSeekAnalyzer()
+    video_script = analyzer.generate_video_script(report, analysis_result,
+                                                  force_refresh=payload.get('force_refresh', False))
+    if video_script == "无法生成视频文案: API密钥未配置":
+        raise PermanentJobError(video_script)
+    if not video_script:
+        raise RuntimeError("生成内容为空")
+
+    script_id = analysis_db.save_video_script(report_id, video_script)
+    if not script_id:
+        raise RuntimeError("保存视频文案到数据库失败")
+    return {"report_id": report_id, "script_id": script_id}
+
+
+def handle_scrape(payload, db_path):
+    """增量爬取东方财富行业研报列表，获取详情、分析并入库"""
+    from main import list_reports_incrementally, get_report_detail, analyze_with_five_steps
+    from crawl_pipeline import CrawlPipeline
+    from crawl_state import CrawlState
+    import database as db
+    import near_duplicate
+
+    url = payload.get('url', "https://data.eastmoney.com/report/hyyb.html")
+    logger.info(f"开始爬取研报列表，URL: {url}")
+
+    # 增量获取研报列表：只返回水位线之后的新研报和需要检查更新的已入库研报
+    state = CrawlState(db_path)
+    reports_data = list_reports_incrementally(url, state)
+
+    if not reports_data:
+        if state.listing_complete:
+            return {"message": "没有新的研报需要分析", "count": 0}
+        raise RuntimeError("未爬取到研报数据，请检查网站结构是否已更新")
+
+    logger.info(f"获取到 {len(reports_data)} 条新研报或待检查更新的研报")
+
+    def fetch_detail(report):
+        # 获取研报详情，已入库研报使用条件请求，详情未变化时返回None跳过分析
+        content = get_report_detail(report['link'], state=state)
+        if content is None:
+            return None
+        return report, content
+
+    def analyze(item):
+        report, content = item
+        industry = report.get('industry', '未知行业')
+
+        # 与已分析研报近似重复时不调用LLM，入库时记录重复关系，页面展示原研报的分析结果
+        conn = db_pool.connect(db_path)
+        try:
+            original_id = near_duplicate.analyzed_original(conn, content)
+        finally:
+            conn.close()
+        if original_id:
+            logger.info(f"研报 {report.get('title', 'N/A')} 与研报 {original_id} 近似重复，跳过LLM分析")
+            analysis, analysis_method = {}, "近似重复"
+        else:
+            # 使用五步法分析
+            analysis = analyze_with_five_steps(report.get("abstract", ""), content, industry=industry)
+            analysis_method = "Claude增强"
+
+        return {
+            "title": report.get("title", "N/A"),
+            "link": report.get("link", "N/A"),
+            "abstract": report.get("abstract", "N/A"),
+            "content_preview": content if content else "未获取到内容",
+            "full_content": content,  # 存储完整内容
+            "industry": industry,
+            "rating": report.get("rating", "N/A"),
+            "org": report.get("org", "N/A"),
+            "date": report.get("date", "N/A"),
+            "analysis": analysis,
+            "analysis_method": analysis_method
+        }
+
+    def write(analyzed_report):
+        # 单线程写入数据库
+        return analyzed_report, db.save_report_to_db(analyzed_report)
+
+    # 详情获取、分析和数据库写入并行流水线执行，出错的研报会被跳过
+    pipeline = CrawlPipeline(fetch_detail, analyze, write)
+    results = pipeline.run(reports_data)
+    analyzed_reports = [analyzed_report for analyzed_report, _ in results]
+    db_saved_count = sum(1 for _, report_id in results if report_id > 0)
+
+    # 所有较早的研报都已入库时推进水位线
+    state.advance_watermark(reports_data)
+
+    unchanged_count = pipeline.stats['detail']['skipped']
+    if not analyzed_reports and unchanged_count == len(reports_data):
+        return {"message": f"{unchanged_count} 条已入库研报内容未变化，无需重新分析", "count": 0}
+
+    if not analyzed_reports:
+        raise RuntimeError("未能成功分析任何研报，请检查分析逻辑")
+
+    # 同时保存到JSON文件（为了兼容性）
+    with open('research_reports.json', 'w', encoding='utf-8') as f:
+        json.dump(analyzed_reports, f, ensure_ascii=False, indent=4)
+
+    logger.info(f"成功分析了 {len(analyzed_reports)} 条研报，已保存 {db_saved_count} 条到数据库")
+    return {
+        "message": f"成功爬取并分析了 {len(analyzed_reports)} 条研报数据，其中 {db_saved_count} 条保存到数据库",
+        "count": len(analyzed_reports)
+    }
+
+
+# 任务类型 -> 处理函数(payload, db_path)，返回可JSON序列化的结果；
+# 抛出PermanentJobError时任务直接失败，其他异常按退避时间重试
+HANDLERS = {
+    JOB_ANALYZE: handle_analyze,
+    JOB_VIDEO_SCRIPT: handle_video_script,
+    JOB_SCRAPE: handle_scrape,
+}
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _keep_lease(queue, job_id, worker_id, lease_seconds, done):
+    # 任务执行期间每隔三分之一租约时长续约一次
+    while not done.wait(lease_seconds / 3):
+        if not queue.heartbeat(job_id, worker_id, lease_seconds):
+            logger.warning(f"任务 {job_id} 的租约已丢失")
+            return
+
+
+def process_next(queue, worker_id, job_types=None, lease_seconds=DEFAULT_LEASE_SECONDS, handlers=None):
+    """
+    领取并执行一个任务
+
+    参数:
+    queue (JobQueue): 任务队列
+    worker_id (str): 工作进程标识
+    job_types (list): 只处理这些类型的任务
+    lease_seconds (float): 租约时长
+    handlers (dict): 任务类型到处理函数的映射，默认HANDLERS
+
+    返回:
+    dict: 执行后的任务，没有可执行任务时返回None
+    """
+    handlers = HANDLERS if handlers is None else handlers
+    job = queue.claim(worker_id, job_types or list(handlers), lease_seconds)
+    if not job:
+        return None
+
+    handler = handlers.get(job['job_type'])
+    if handler is None:
+        queue.fail(job['id'], worker_id, f"未知的任务类型: {job['job_type']}", retry=False)
+        return queue.get(job['id'])
+
+    logger.info(f"[{worker_id}] 开始执行任务 {job['id']} ({job['job_type']}，第 {job['attempts']} 次)")
+    done = threading.Event()
+    keeper = threading.Thread(target=_keep_lease, args=(queue, job['id'], worker_id, lease_seconds, done),
+                              daemon=True)
+    keeper.start()
+    started = time.time()
+    _current.job = (queue, job['id'], worker_id)
+    try:
+        result = handler(job['payload'], queue.db_path)
+    except PermanentJobError as e:
+        queue.fail(job['id'], worker_id, str(e), retry=False)
+    except Exception as e:
+        logger.exception(f"任务 {job['id']} 执行出错: {str(e)}")
+        queue.fail(job['id'], worker_id, str(e))
+    else:
+        queue.complete(job['id'], worker_id, result)
+        logger.info(f"[{worker_id}] 任务 {job['id']} 完成，耗时 {time.time() - started:.1f} 秒")
+    finally:
+        _current.job = None
+        done.set()
+        keeper.join()
+    return queue.get(job['id'])
+
+
+def run_worker(db_path=DEFAULT_DB_PATH, job_types=None, stop_event=None, poll_interval=POLL_INTERVAL,
+               lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    工作进程主循环，直到stop_event被设置；当前任务执行完才会退出
+
+    参数:
+    db_path (str): 数据库路径
+    job_types (list): 只处理这些类型的任务
+    stop_event (multiprocessing.Event): 停止信号
+    poll_interval (float): 没有任务时的轮询间隔
+    lease_seconds (float): 租约时长
+    """
+    # Ctrl+C由主进程统一处理，子进程收到后不中断正在执行的任务
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stop_event = stop_event or multiprocessing.Event()
+    queue = JobQueue(db_path)
+    worker_id = default_worker_id()
+    logger.info(f"工作进程 {worker_id} 已启动，任务类型: {job_types or list(HANDLERS)}")
+
+    while not stop_event.is_set():
+        try:
+            job = process_next(queue, worker_id, job_types, lease_seconds)
+        except sqlite3.Error as e:
+            logger.error(f"领取任务时数据库出错: {str(e)}")
+            job = None
+        if job is None:
+            stop_event.wait(poll_interval)
+
+    logger.info(f"工作进程 {worker_id} 已退出")
+
+
+def run_workers(db_path=DEFAULT_DB_PATH, workers=1, job_types=None):
+    """启动多个工作进程，收到SIGINT或SIGTERM后等待各进程完成当前任务再退出"""
+    stop_event = multiprocessing.Event()
+    processes = [multiprocessing.Process(target=run_worker, args=(db_path, job_types, stop_event),
+                                         name=f"analysis-worker-{index}")
+                 for index in range(workers)]
+    for process in processes:
+        process.start()
+
+    def _stop(signum, frame):
+        logger.info("收到退出信号，等待工作进程完成当前任务...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+    for process in processes:
+        process.join()
+
+
+def enqueue_backlog(db_path=DEFAULT_DB_PATH, threshold=None, limit=None):
+    """
+    把尚未经过LLM分析的研报加入分析队列，以预评分作为优先级
+
+    返回:
+    dict: 新入队和已在队列中的任务数
+    """
+    import prescorer
+    import near_duplicate
+    from analyzer_registry import DEFAULT_ANALYZER_TYPE
+
+    conn = db_pool.connect(db_path)
+    try:
+        ranked = prescorer.rank_unanalyzed(conn, threshold, limit)
+        # 近似重复的研报复用原研报的分析结果，不必入队
+        duplicates = near_duplicate.originals_of(conn, [report_id for report_id, _ in ranked])
+        ranked = [(report_id, score) for report_id, score in ranked if report_id not in duplicates]
+    finally:
+        conn.close()
+
+    queue = JobQueue(db_path)
+    created = 0
+    for report_id, score in ranked:
+        # 参数与页面提交的分析任务一致，相同研报不会重复入队
+        payload = {'report_id': report_id, 'force_refresh': False, 'analyzer_type': DEFAULT_ANALYZER_TYPE}
+        _, is_new = queue.enqueue(JOB_ANALYZE, payload, priority=score)
+        created += is_new
+    return {'enqueued': created, 'already_queued': len(ranked) - created}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="任务队列工作进程")
+    parser.add_argument('command', nargs='?', default='run', choices=['run', 'enqueue-backlog', 'stats'],
+                        help='run: 启动工作进程; enqueue-backlog: 按预评分把待分析研报加入队列; stats: 查看任务统计')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='数据库文件路径')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WORKER_PROCESSES', 2)),
+                        help='工作进程数')
+    parser.add_argument('--types', default=None, help='只处理的任务类型，逗号分隔')
+    parser.add_argument('--threshold', type=int, default=None, help='enqueue-backlog的最低预评分')
+    parser.add_argument('--limit', type=int, default=None, help='enqueue-backlog最多入队的条数')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        job_types = args.types.split(',') if args.types else None
+        run_workers(args.db, args.workers, job_types)
+        return
+    if args.command == 'enqueue-backlog':
+        result = enqueue_backlog(args.db, args.threshold, args.limit)
+    else:
+        result = JobQueue(args.db).stats()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,8 @@ from main import scrape_research_reports, get_report_detail
 from deepseek_analyzer import DeepSeekAnalyzer
 from analysis_db import AnalysisDatabase
 import json
+import search_index
+import report_stats
 
 def main():
     """爬取并分析5篇研报，结果存入数据库"""
@@ -84,8 +86,8 @@ def main():
             )
             
             # 保存研报到数据库
-            import sqlite3
-            conn = sqlite3.connect('research_reports.db')
+            import db_pool
+            conn = db_pool.connect('research_reports.db')
             cursor = conn.cursor()
             
             # 检查研报是否已存在
@@ -111,8 +113,11 @@ def main():
                     report.get('org', ''),
                     report.get('date', '')
                 ))
-                conn.commit()
                 report_id = cursor.lastrowid
+                # 与AnalysisDatabase.insert_report一样，同步刷新全文索引和统计聚合
+                search_index.index_report(conn, report_id)
+                report_stats.refresh_report(conn, report_id)
+                conn.commit()
                 print(f"研报已保存到数据库，新ID: {report_id}")
             
             conn.close()
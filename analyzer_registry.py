@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析器注册表
+按report_analysis.analyzer_type注册分析器，每个服务商（或同一服务商的备用地址）一份接口配置。
+对冲分析器先向首选服务商发送请求，超过其延迟直方图的p90仍未返回时再向下一个服务商发送同样的请求，
+先返回有效分析结果的一方胜出，用少量额外请求压低长尾延迟
+
+服务商配置:
+- deepseek: DEEPSEEK_API_URL、DEEPSEEK_API_KEY、DEEPSEEK_MODEL环境变量
+- 其他兼容chat completions接口的服务商或备用地址: ANALYZER_PROVIDERS环境变量，JSON列表，例如
+  [{"analyzer_type": "deepseek-backup", "api_url": "https://...", "api_key_env": "BACKUP_API_KEY", "model": "deepseek-chat"}]
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+import logging
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from analysis_parser import parse_analysis
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = "https://api.deepseek.com/v1/chat/completions"
+
+# 未指定时使用的分析器
+DEFAULT_ANALYZER_TYPE = os.environ.get('ANALYZER_TYPE', 'deepseek')
+
+# 对冲分析器
+HEDGED_ANALYZER_TYPE = 'hedged'
+
+# 对冲分析器依次尝试的服务商，逗号分隔，默认为全部已配置的服务商
+HEDGE_PROVIDERS = os.environ.get('HEDGE_PROVIDERS', '')
+
+# 对冲阈值取延迟分位数
+HEDGE_QUANTILE = 0.9
+
+# 样本数不足时的对冲等待秒数
+HEDGE_DEFAULT_DELAY = float(os.environ.get('HEDGE_DEFAULT_DELAY', 20))
+
+# 直方图至少有这么多样本时才按分位数计算对冲阈值
+HEDGE_MIN_SAMPLES = 20
+
+# 延迟直方图桶的上界（秒），按1.25倍递增，覆盖0.1秒到约10分钟
+LATENCY_BUCKETS = tuple(round(0.1 * 1.25 ** i, 3) for i in range(40))
+
+# 样本数超过此值时各桶计数减半，直方图逐步反映最近的延迟
+LATENCY_DECAY_SAMPLES = 1000
+
+# 服务商接口配置，timeout为单次请求的超时秒数
+ProviderConfig = namedtuple('ProviderConfig', ['analyzer_type', 'api_url', 'api_key', 'model', 'timeout'],
+                            defaults=('deepseek-chat', 60))
+
+
+class LatencyHistogram:
+    """
+    单个服务商的请求延迟直方图（线程安全）
+
+    Parameters:
+    -----------
+    buckets : tuple
+        各桶的上界（秒），升序
+    decay_samples : int
+        样本数超过此值时各桶计数减半
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, decay_samples=LATENCY_DECAY_SAMPLES):
+        self.buckets = buckets
+        self.decay_samples = decay_samples
+        # 最后一个桶收集超过最大上界的样本
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """记录一次请求耗时"""
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += 1
+            if self.total > self.decay_samples:
+                self.counts = [count // 2 for count in self.counts]
+                self.total = sum(self.counts)
+
+    def quantile(self, q):
+        """
+        估算延迟分位数
+
+        参数:
+        q (float): 分位数，0-1
+
+        返回:
+        float: 分位数所在桶的上界（秒），没有样本时返回None
+        """
+        with self._lock:
+            if not self.total:
+                return None
+            rank = q * self.total
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank and count:
+                    return self.buckets[min(index, len(self.buckets) - 1)]
+        return self.buckets[-1]
+
+    def hedge_delay(self, q=HEDGE_QUANTILE, min_samples=HEDGE_MIN_SAMPLES, default=HEDGE_DEFAULT_DELAY):
+        """发出对冲请求前的等待秒数，样本不足时返回default"""
+        if self.total < min_samples:
+            return default
+        return self.quantile(q)
+
+    def snapshot(self):
+        """返回样本数和常用分位数，用于统计展示"""
+        return {
+            'samples': self.total,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99)
+        }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def get_latency_histogram(analyzer_type):
+    """获取（必要时创建）服务商的延迟直方图，同一进程内共享"""
+    with _histograms_lock:
+        histogram = _histograms.get(analyzer_type)
+        if histogram is None:
+            histogram = _histograms[analyzer_type] = LatencyHistogram()
+        return histogram
+
+
+def latency_stats():
+    """各服务商的延迟统计"""
+    with _histograms_lock:
+        histograms = dict(_histograms)
+    return {analyzer_type: histogram.snapshot() for analyzer_type, histogram in histograms.items()}
+
+
+def default_provider():
+    """由DEEPSEEK_*环境变量构成的DeepSeek接口配置"""
+    return ProviderConfig(
+        analyzer_type='deepseek',
+        api_url=os.environ.get("DEEPSEEK_API_URL", DEFAULT_API_URL),
+        api_key=os.environ.get("DEEPSEEK_API_KEY"),
+        model=os.environ.get("DEEPSEEK_MODEL", "deepseek-chat")
+    )
+
+
+def load_providers():
+    """
+    读取全部服务商配置
+
+    返回:
+    dict: analyzer_type -> ProviderConfig，按配置顺序排列，deepseek在最前
+    """
+    providers = {'deepseek': default_provider()}
+    raw = os.environ.get('ANALYZER_PROVIDERS')
+    if not raw:
+        return providers
+    try:
+        entries = json.loads(raw)
+    except ValueError as e:
+        logger.error(f"ANALYZER_PROVIDERS不是有效的JSON: {str(e)}")
+        return providers
+
+    for entry in entries:
+        try:
+            providers[entry['analyzer_type']] = ProviderConfig(
+                analyzer_type=entry['analyzer_type'],
+                api_url=entry['api_url'],
+                api_key=os.environ.get(entry['api_key_env']) if entry.get('api_key_env') else entry.get('api_key'),
+                model=entry.get('model', 'deepseek-chat'),
+                timeout=entry.get('timeout', 60)
+            )
+        except (KeyError, TypeError) as e:
+            logger.error(f"忽略无效的服务商配置 {entry}: 缺少字段 {str(e)}")
+    return providers
+
+
+class ReportAnalyzer(ABC):
+    """
+    分析器接口
+
+    analyze_with_five_steps返回的结果字典包含analysis和full_analysis，
+    可以带analyzer_type字段指明实际产生结果的分析器，保存时以它为准；
+    未实现该方法的分析器在构造时即抛出TypeError
+    """
+
+    analyzer_type = None
+
+    @abstractmethod
+    def analyze_with_five_steps(self, report_title, report_content, industry=None, force_refresh=False):
+        """对研报进行五步法分析"""
+
+
+def is_valid_result(result):
+    """分析结果是否为完整的五步法分析（而不是出错时的后备结果）"""
+    try:
+        return bool(result) and parse_analysis(result.get('full_analysis') or '').complete
+    except Exception:
+        return False
+
+
+# 对冲请求共用的线程池，落败的请求在后台执行完毕，不阻塞调用方
+_hedge_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('HEDGE_MAX_WORKERS', 8)),
+                                     thread_name_prefix='hedge')
+
+
+class HedgedAnalyzer(ReportAnalyzer):
+    """
+    对冲分析器
+
+    Parameters:
+    -----------
+    analyzers : list
+        按优先顺序排列的分析器（DeepSeekAnalyzer），每个分析器的latency直方图决定何时发出下一个请求
+    """
+
+    analyzer_type = HEDGED_ANALYZER_TYPE
+
+    def __init__(self, analyzers):
+        if not analyzers:
+            raise ValueError("对冲分析器至少需要一个分析器")
+        self.analyzers = list(analyzers)
+
+    def _run(self, analyzer, report_title, report_content, industry, force_refresh):
+        result = analyzer.analyze_with_five_steps(report_title, report_content, industry, force_refresh=force_refresh)
+        if result is not None:
+            result['analyzer_type'] = analyzer.analyzer_type
+        return result
+
+    def analyze_with_five_steps(self, report_title, report_content, industry=None, force_refresh=False):
+        """
+        依次向各服务商发起分析，返回最先到达的有效结果
+
+        首选服务商的请求超过其p90延迟仍未返回、或返回了无效结果时，向下一个服务商发出同样的请求；
+        全部无效时返回首选服务商的结果
+        """
+        started = time.time()
+        remaining = list(self.analyzers)
+        futures = {}
+        results = {}
+        deadline = None
+
+        while True:
+            if remaining and (deadline is None or time.time() >= deadline or not futures):
+                analyzer = remaining.pop(0)
+                if futures:
+                    logger.info(f"对冲请求: {analyzer.analyzer_type}（已等待 {time.time() - started:.1f} 秒）")
+                future = _hedge_executor.submit(self._run, analyzer, report_title, report_content, industry,
+                                                force_refresh)
+                futures[future] = analyzer
+                deadline = time.time() + analyzer.latency.hedge_delay()
+
+            if not futures:
+                break
+
+            timeout = max(0.0, deadline - time.time()) if remaining else None
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                analyzer = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"{analyzer.analyzer_type} 分析出错: {str(e)}")
+                    result = None
+                if is_valid_result(result):
+                    logger.info(f"{analyzer.analyzer_type} 的分析结果胜出，耗时 {time.time() - started:.1f} 秒")
+                    return result
+                if result is not None:
+                    results[analyzer.analyzer_type] = result
+                # 出错或结果无效时不必等到阈值，立即尝试下一个服务商
+                deadline = time.time()
+
+        logger.warning("所有服务商均未返回有效分析结果")
+        primary = self.analyzers[0]
+        if results:
+            return results.get(primary.analyzer_type) or next(iter(results.values()))
+        result = primary._generate_fallback_analysis()
+        result['analyzer_type'] = primary.analyzer_type
+        return result
+
+
+def _provider_analyzer(provider):
+    from deepseek_analyzer import DeepSeekAnalyzer
+    return DeepSeekAnalyzer(provider=provider)
+
+
+def _legacy_analyzer():
+    from claude_analyzer import LegacyDeepSeekAnalyzer
+    return LegacyDeepSeekAnalyzer()
+
+
+def _hedged_analyzer():
+    providers = load_providers()
+    names = [name.strip() for name in HEDGE_PROVIDERS.split(',') if name.strip()] or list(providers)
+    unknown = [name for name in names if name not in providers]
+    if unknown:
+        logger.warning(f"HEDGE_PROVIDERS中的服务商未配置，已忽略: {', '.join(unknown)}")
+    return HedgedAnalyzer([_provider_analyzer(providers[name]) for name in names if name in providers])
+
+
+# 除服务商之外另行注册的分析器：analyzer_type -> 无参工厂函数
+_factories = {
+    HEDGED_ANALYZER_TYPE: _hedged_analyzer,
+    'legacy': _legacy_analyzer,
+}
+
+
+def register(analyzer_type, factory):
+    """注册分析器工厂函数，同名时覆盖"""
+    _factories[analyzer_type] = factory
+
+
+def analyzer_types():
+    """全部可用的analyzer_type"""
+    providers = list(load_providers())
+    return providers + [name for name in _factories if name not in providers]
+
+
+def get_analyzer(analyzer_type=None):
+    """
+    按analyzer_type创建分析器
+
+    参数:
+    analyzer_type (str): 分析器类型，默认DEFAULT_ANALYZER_TYPE
+
+    返回:
+    分析器实例
+
+    异常:
+    KeyError: 未注册的analyzer_type
+    """
+    analyzer_type = analyzer_type or DEFAULT_ANALYZER_TYPE
+    if analyzer_type in _factories:
+        return _factories[analyzer_type]()
+    providers = load_providers()
+    if analyzer_type in providers:
+        return _provider_analyzer(providers[analyzer_type])
+    raise KeyError(f"未知的分析器类型: {analyzer_type}")
@@ -4,16 +4,25 @@ import json
 import os
 import sys
 import socket
-from main import scrape_research_reports, analyze_with_five_steps, get_report_detail, get_evaluation_text
+from main import analyze_with_five_steps, get_report_detail, get_evaluation_text
 import database as db  # 导入数据库模块
 import datetime
 import sqlite3
+import db_pool
 import requests
 import logging
 from database import get_db_connection, get_reports_from_db
-import threading
+import time
 import importlib.util # 用于动态导入模块
 from analysis_db import AnalysisDatabase
+import search_index
+from llm_cache import get_default_cache
+from detail_extractors import get_default_extractor
+import http_fetch
+import report_stats
+import near_duplicate
+from job_queue import JobQueue, PRIORITY_INTERACTIVE, FINISHED_STATUSES, job_status
+import analyzer_registry
 from recommendation_engine import RecommendationEngine
 from user_manager import UserManager, login_required, admin_required
 
@@ -49,8 +58,8 @@ VERSION = "0.7.2"
 # 数据库路径
 DATABASE_PATH = 'research_reports.db'
 
-# 全局变量，存储爬取状态
-scraping_status = {"is_scraping": False, "message": ""}
+# 任务队列，LLM分析、视频文案生成和爬取由analysis_worker.py工作进程执行
+jobs = JobQueue(DATABASE_PATH)
 
 # 用户认证相关路由
 @app.route('/login', methods=['GET', 'POST'])
@@ -181,7 +190,7 @@ def edit_profile():
         return redirect(url_for('index'))
         
     # 获取所有可用行业
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = db_pool.connect(DATABASE_PATH)
     cursor = conn.cursor()
     cursor.execute('SELECT DISTINCT industry FROM reports WHERE industry IS NOT NULL AND industry != ""')
     all_industries = [row[0] for row in cursor.fetchall()]
@@ -270,23 +279,23 @@ def index():
     for report in recommendations:
         report['is_read'] = recommendation_engine.check_is_read(report['id'], user_id=user_id)
     
-    # 获取所有研报
-    reports = load_reports_from_db()
+    # 分页获取研报
+    page_data = load_reports_page()
     
     # 获取顶部推荐（用于弹窗）
     top_recommendation = recommendations[0] if recommendations else None
     
     return render_template('index.html', 
-                          reports=reports, 
                           recommendations=recommendations,
-                          top_recommendation=top_recommendation)
+                          top_recommendation=top_recommendation,
+                          **page_data)
 
 # 研报详情页面
 @app.route('/report/<int:report_id>')
 def report_detail(report_id):
     """显示研报详情页面"""
     # 从数据库获取研报
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = db_pool.connect(DATABASE_PATH)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
@@ -391,270 +400,76 @@ def api_report(report_id):
 # 实时爬取新研报
 @app.route('/scrape', methods=['GET'])
 def scrape():
+    """提交爬取任务，爬取、分析和入库由工作进程执行，进度通过/scrape-status查询"""
     try:
-        # 使用selenium爬取
-        # 东方财富网行业研报页面 URL
-        url = "https://data.eastmoney.com/report/hyyb.html"
-        print(f"开始爬取研报列表，URL: {url}")
-        
-        from main import scrape_research_reports, get_report_detail, analyze_with_five_steps
-        
-        # 爬取研报列表
-        reports_data = scrape_research_reports(url)
-        
-        if not reports_data:
-            return jsonify({
-                "success": False,
-                "message": "未爬取到研报数据，请检查网站结构是否已更新"
-            }), 500
-            
-        print(f"爬取到 {len(reports_data)} 条研报数据")
-        
-        # 对每份报告进行五步分析
-        analyzed_reports = []
-        
-        # 处理所有爬取到的研报数据
-        print(f"将处理全部 {len(reports_data)} 条研报数据")
-        
-        for i, report in enumerate(reports_data):
-            try:
-                print(f"\n处理第 {i+1}/{len(reports_data)} 条研报: {report.get('title', 'N/A')}")
-                
-                # 获取研报详情
-                content = get_report_detail(report['link'])
-                industry = report.get('industry', '未知行业')
-                
-                # 使用五步法分析
-                analysis = analyze_with_five_steps(
-                    report.get("abstract", ""),
-                    content,
-                    industry=industry
-                )
-                
-                analyzed_reports.append({
-                    "title": report.get("title", "N/A"),
-                    "link": report.get("link", "N/A"),
-                    "abstract": report.get("abstract", "N/A"),
-                    "content_preview": content if content else "未获取到内容",
-                    "full_content": content,  # 存储完整内容
-                    "industry": industry,
-                    "rating": report.get("rating", "N/A"),
-                    "org": report.get("org", "N/A"),
-                    "date": report.get("date", "N/A"),
-                    "analysis": analysis,
-                    "analysis_method": "Claude增强"
-                })
-                
-                print(f"完成第 {i+1}/{len(reports_data)} 条研报的分析")
-            except Exception as e:
-                print(f"处理研报 {report.get('title', 'N/A')} 时出错: {str(e)}")
-                # 继续处理下一条研报
-        
-        if not analyzed_reports:
-            return jsonify({
-                "success": False,
-                "message": "未能成功分析任何研报，请检查分析逻辑"
-            }), 500
-        
-        # 将分析结果保存到数据库
-        db_saved_count = db.save_reports_to_db(analyzed_reports)
-        
-        # 同时保存到JSON文件（为了兼容性）
-        with open('research_reports.json', 'w', encoding='utf-8') as f:
-            json.dump(analyzed_reports, f, ensure_ascii=False, indent=4)
-        
-        print(f"成功分析了 {len(analyzed_reports)} 条研报，已保存 {db_saved_count} 条到数据库")
-        
-        return jsonify({
-            "success": True,
-            "message": f"成功爬取并分析了 {len(analyzed_reports)} 条研报数据，其中 {db_saved_count} 条保存到数据库",
-            "count": len(analyzed_reports)
-        })
-    except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"爬取过程中发生错误: {str(e)}\n{error_details}")
-        
-        return jsonify({
-            "success": False,
-            "message": f"爬取过程中发生错误: {str(e)}"
-        }), 500
+        job_id, created = jobs.enqueue('scrape', {}, priority=PRIORITY_INTERACTIVE, max_attempts=2)
+    except sqlite3.Error as e:
+        logger.error(f"提交爬取任务失败: {str(e)}")
+        return jsonify({"success": False, "message": f"提交爬取任务失败: {str(e)}"}), 500
+    
+    return jsonify({
+        "success": True,
+        "message": "爬取任务已启动" if created else "已经有一个爬取任务在进行中",
+        "job_id": job_id
+    })
 
 # 统计页面 - 分析五步法应用情况
 @app.route('/stats')
 def stats_page():
     """统计分析页面"""
-    reports = load_reports_from_db()
-    
-    if not reports:
-        return render_template('stats.html', 
-                              reports=[], 
-                              industry_names=[],
-                              industry_counts_list=[],
-                              industry_counts={},
-                              org_counts={},
-                              industries=[],
-                              organizations=[],
-                              avg_score=0,
-                              step_avg_scores=[0, 0, 0, 0, 0],
-                              industry_avg_scores={},
-                              org_avg_scores={},
-                              rating_labels=[],
-                              rating_counts=[])
-    
-    # 计算行业统计
-    industry_counts = {}
-    industry_avg_scores = {}
-    for report in reports:
-        industry = report.get("industry", "未知行业")
-        if industry not in industry_counts:
-            industry_counts[industry] = 0
-            industry_avg_scores[industry] = []
-        
-        industry_counts[industry] += 1
-        industry_avg_scores[industry].append(report["analysis"]["summary"]["completeness_score"])
-    
-    # 计算行业平均分
-    for industry in industry_avg_scores:
-        scores = industry_avg_scores[industry]
-        industry_avg_scores[industry] = sum(scores) / len(scores) if scores else 0
-    
-    # 计算机构统计
-    org_counts = {}
-    org_avg_scores = {}
-    for report in reports:
-        org = report.get("org", "未知机构")
-        if org not in org_counts:
-            org_counts[org] = 0
-            org_avg_scores[org] = []
-        
-        org_counts[org] += 1
-        org_avg_scores[org].append(report["analysis"]["summary"]["completeness_score"])
+    # 统计数据由report_stats在分析结果写入时增量维护，这里只读取聚合行
+    stats = report_stats.get_stats(DATABASE_PATH)
     
-    # 计算机构平均分
-    for org in org_avg_scores:
-        scores = org_avg_scores[org]
-        org_avg_scores[org] = sum(scores) / len(scores) if scores else 0
-    
-    # 计算评级分布
-    rating_counts_dict = {}
-    for report in reports:
-        rating = report.get("rating", "未知评级")
-        # 标准化评级
-        if rating in ["买入", "强烈推荐"]:
-            rating = "买入/强烈推荐"
-        elif rating in ["增持", "推荐"]:
-            rating = "增持/推荐"
-        elif rating in ["中性", "持有"]:
-            rating = "中性/持有"
-        elif rating in ["减持", "卖出"]:
-            rating = "减持/卖出"
-        else:
-            rating = "其他"
-            
-        if rating not in rating_counts_dict:
-            rating_counts_dict[rating] = 0
-        
-        rating_counts_dict[rating] += 1
-    
-    # 转换为列表
-    rating_labels = list(rating_counts_dict.keys())
-    rating_counts = list(rating_counts_dict.values())
-    
-    # 计算各步骤平均分
-    step_scores = {"信息": [], "逻辑": [], "超预期": [], "催化剂": [], "结论": []}
-    for report in reports:
-        # 检查steps是列表还是字典，适配不同数据结构
-        if "steps" in report["analysis"]:
-            steps = report["analysis"]["steps"]
-            # 如果是列表形式（旧版本）
-            if isinstance(steps, list):
-                for step in steps:
-                    step_name = step.get("step_name", "")
-                    step_score = step.get("step_score", 0)
-                    
-                    if "信息" in step_name:
-                        step_scores["信息"].append(step_score)
-                    elif "逻辑" in step_name:
-                        step_scores["逻辑"].append(step_score)
-                    elif "超预期" in step_name:
-                        step_scores["超预期"].append(step_score)
-                    elif "催化剂" in step_name:
-                        step_scores["催化剂"].append(step_score)
-                    elif "结论" in step_name:
-                        step_scores["结论"].append(step_score)
-            else:
-                # 如果是字典形式（新版本）
-                for step_key, step_data in steps.items():
-                    step_score = step_data.get("step_score", 0)
-                    if step_score == 0 and isinstance(step_data, dict):
-                        step_score = float(step_data.get("step_score", 0))
-                        
-                    if "信息" in step_key:
-                        step_scores["信息"].append(step_score)
-                    elif "逻辑" in step_key:
-                        step_scores["逻辑"].append(step_score)
-                    elif "超预期" in step_key:
-                        step_scores["超预期"].append(step_score)
-                    elif "催化剂" in step_key:
-                        step_scores["催化剂"].append(step_score)
-                    elif "结论" in step_key:
-                        step_scores["结论"].append(step_score)
-    
-    # 计算平均分
-    step_avg_scores = []
-    for step in ["信息", "逻辑", "超预期", "催化剂", "结论"]:
-        scores = step_scores[step]
-        avg = sum(scores) / len(scores) if scores else 0
-        step_avg_scores.append(avg)
-    
-    # 计算总平均分
-    all_scores = [report["analysis"]["summary"]["completeness_score"] for report in reports]
-    avg_score = sum(all_scores) / len(all_scores) if all_scores else 0
+    industry_counts = stats['industry_counts']
+    org_counts = stats['org_counts']
     
     # 按研报数量降序排列
-    industry_names = sorted(industry_counts.keys(), key=lambda x: industry_counts[x], reverse=True)
+    industry_names = list(industry_counts.keys())
     industry_counts_list = [industry_counts[industry] for industry in industry_names]
     
     return render_template(
         'stats.html',
-        reports=reports,
+        total_reports=stats['total'],
+        score_bands=stats['score_bands'],
         industries=list(industry_counts.keys()),
         organizations=list(org_counts.keys()),
         industry_names=industry_names,
         industry_counts_list=industry_counts_list,
         industry_counts=industry_counts,
         org_counts=org_counts,
-        avg_score=avg_score,
-        step_avg_scores=step_avg_scores,
-        industry_avg_scores=industry_avg_scores,
-        org_avg_scores=org_avg_scores,
-        rating_labels=rating_labels,
-        rating_counts=rating_counts
+        avg_score=stats['avg_score'],
+        step_avg_scores=stats['step_avg_scores'],
+        industry_avg_scores=stats['industry_avg_scores'],
+        org_avg_scores=stats['org_avg_scores'],
+        rating_labels=stats['rating_labels'],
+        rating_counts=stats['rating_counts']
     )
 
 # 搜索研报
 @app.route('/search')
 def search_reports():
-    """搜索研报"""
+    """搜索研报（全文索引，按相关度排序）"""
     query = request.args.get('q', '').strip()
-    reports = load_reports_from_db()
     
     if not query:
         return redirect('/')
     
-    # 简单关键词匹配
-    filtered_reports = []
-    for report in reports:
-        if (query.lower() in report.get("title", "").lower() or 
-            query.lower() in report.get("content", "").lower() or
-            query.lower() in report.get("industry", "").lower() or
-            query.lower() in report.get("org", "").lower()):
-            filtered_reports.append(report)
+    page_size = request.args.get('page_size', db.DEFAULT_PAGE_SIZE, type=int)
+    page_size = max(1, min(page_size, db.MAX_PAGE_SIZE))
+    page = max(1, request.args.get('page', 1, type=int))
+    
+    # 命中总数和评分分布与当前页在同一条全文检索查询中统计
+    reports, summary = search_index.search(DATABASE_PATH, query, page=page, page_size=page_size)
+    has_next = page * page_size < summary['total']
     
     return render_template(
         'filtered_reports.html',
-        reports=filtered_reports,
+        reports=attach_analysis_to_reports(reports),
+        summary=summary,
+        page=page,
+        page_size=page_size,
+        first_page_url=url_for('search_reports', q=query, page_size=page_size) if page > 1 else None,
+        next_page_url=url_for('search_reports', q=query, page=page + 1, page_size=page_size) if has_next else None,
         filter_type="搜索",
         filter_value=query
     )
@@ -663,69 +478,82 @@ def search_reports():
 @app.route('/industry/<industry>')
 def industry_reports(industry):
     """按行业过滤研报"""
-    reports = load_reports_from_db()
-    filtered_reports = [report for report in reports if report.get("industry") == industry]
+    page_data = load_reports_page({'industry': industry})
     
     return render_template(
         'filtered_reports.html',
-        reports=filtered_reports,
         filter_type="行业",
-        filter_value=industry
+        filter_value=industry,
+        **page_data
     )
 
 @app.route('/organization/<org>')
 def organization_reports(org):
     """按发布机构过滤研报"""
-    reports = load_reports_from_db()
-    filtered_reports = [report for report in reports if report.get("org") == org]
+    page_data = load_reports_page({'org': org})
     
     return render_template(
         'filtered_reports.html',
-        reports=filtered_reports,
         filter_type="机构",
-        filter_value=org
+        filter_value=org,
+        **page_data
     )
 
-def background_scrape():
-    """后台爬取研报的函数"""
-    global scraping_status
-    scraping_status["is_scraping"] = True
-    scraping_status["message"] = "正在爬取研报数据..."
-    
-    try:
-        # 调用爬虫主函数
-        scrape_research_reports()
-        scraping_status["message"] = f"爬取完成，时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-    except Exception as e:
-        scraping_status["message"] = f"爬取失败: {str(e)}"
-    finally:
-        scraping_status["is_scraping"] = False
-
-@app.route('/scrape')
-def scrape_endpoint():
-    """触发爬虫的接口"""
-    global scraping_status
-    
-    # 检查是否已经在爬取
-    if scraping_status["is_scraping"]:
-        return jsonify({"success": False, "message": "已经有一个爬取任务在进行中"})
-    
-    # 启动后台线程进行爬取
-    threading.Thread(target=background_scrape).start()
-    
-    return jsonify({"success": True, "message": "爬取任务已启动"})
-
 @app.route('/scrape-status')
 def scrape_status():
-    """获取爬取状态的接口"""
-    global scraping_status
-    return jsonify(scraping_status)
+    """获取最近一次爬取任务的状态"""
+    job = jobs.latest('scrape')
+    if not job:
+        return jsonify({"is_scraping": False, "message": ""})
+    
+    status = job['status']
+    if status == 'done':
+        finished = datetime.datetime.fromtimestamp(job['finished_at']).strftime('%Y-%m-%d %H:%M:%S')
+        message = f"爬取完成，{job['result']['message']}，时间: {finished}"
+    elif status == 'failed':
+        message = f"爬取失败: {job['error']}"
+    elif status == 'running':
+        message = "正在爬取研报数据..."
+    elif job['error']:
+        message = f"爬取失败，等待重试: {job['error']}"
+    else:
+        message = "爬取任务排队中，等待工作进程执行..."
+    
+    return jsonify({
+        "is_scraping": status not in FINISHED_STATUSES,
+        "message": message,
+        "job_id": job['id']
+    })
 
 @app.route('/about')
 def about():
     """关于页面"""
     return render_template('about.html', version=VERSION)
 
+@app.route('/api/llm_cache/stats')
+@admin_required
+def api_llm_cache_stats():
+    """获取LLM响应缓存命中统计的API"""
+    return jsonify(get_default_cache().stats())
+
+@app.route('/api/detail_extractor/stats')
+@admin_required
+def api_detail_extractor_stats():
+    """获取详情页正文提取策略命中率和耗时统计的API"""
+    return jsonify(get_default_extractor().stats())
+
+@app.route('/api/http_fetch/metrics')
+@admin_required
+def api_http_fetch_metrics():
+    """获取按主机统计的页面请求次数、耗时和字节数的API"""
+    return jsonify(http_fetch.get_metrics())
+
+@app.route('/api/db_pool/metrics')
+@admin_required
+def api_db_pool_metrics():
+    """获取按数据库统计的连接复用、占用和等待耗时的API"""
+    return jsonify(db_pool.get_metrics())
+
 @app.route('/api/version')
 def api_version():
     """获取应用版本信息的API"""
@@ -779,54 +607,92 @@ def load_reports_from_db():
         
         reports = [dict(row) for row in cursor.fetchall()]
         conn.close()
-        
-        # 初始化分析数据库
-        analysis_db = AnalysisDatabase()
-        
-        # 对每个研报添加分析结果
-        for report in reports:
-            report_id = report["id"]
-            
-            # 获取分析结果
-            analysis = analysis_db.get_analysis_by_report_id(report_id)
-            
-            if analysis:
-                # 构建分析结构
-                report["analysis"] = {
-                    "steps": analysis.get("steps", {}),
-                    "summary": {
-                        "completeness_score": analysis.get("completeness_score", 0),
-                        "completeness_description": get_completeness_description(analysis.get("completeness_score", 0)),
-                        "improvement_suggestions": "建议请参考详细分析页面",
-                        "one_line_summary": analysis.get("one_line_summary", "")
-                    }
-                }
-            else:
-                # 创建默认分析结构
-                report["analysis"] = {
-                    "steps": {
-                        "信息": {"found": False, "step_score": 0},
-                        "逻辑": {"found": False, "step_score": 0},
-                        "超预期": {"found": False, "step_score": 0},
-                        "催化剂": {"found": False, "step_score": 0},
-                        "结论": {"found": False, "step_score": 0}
-                    },
-                    "summary": {
-                        "completeness_score": 0,
-                        "completeness_description": "尚未分析",
-                        "improvement_suggestions": "尚未分析",
-                        "one_line_summary": "尚未分析"
-                    }
-                }
-            
-            # 确保报告有内容字段
-            report["content"] = report.get("full_content", report.get("content_preview", ""))
-            
-        return reports
+
+        return attach_analysis_to_reports(reports)
     except Exception as e:
         logger.error(f"从数据库加载研报数据出错: {e}")
         return []
 
+def load_reports_page(filters=None):
+    """
+    按当前请求的分页参数加载一页研报，筛选条件在SQL中完成
+
+    请求参数:
+    cursor: 上一页最后一条研报的id
+    page_size: 每页数量
+    page: 当前页码，仅用于显示序号
+
+    返回:
+    dict: 包含reports、summary、page、page_size及分页链接
+    """
+    cursor = request.args.get('cursor', type=int)
+    page_size = request.args.get('page_size', db.DEFAULT_PAGE_SIZE, type=int)
+    page_size = max(1, min(page_size, db.MAX_PAGE_SIZE))
+    page = max(1, request.args.get('page', 1, type=int))
+
+    reports, next_cursor = db.get_reports_page(filters, cursor=cursor, page_size=page_size)
+
+    # 分页链接保留当前路由参数
+    view_args = dict(request.view_args or {})
+    first_page_url = url_for(request.endpoint, page_size=page_size, **view_args) if page > 1 else None
+    next_page_url = None
+    if next_cursor is not None:
+        next_page_url = url_for(request.endpoint, cursor=next_cursor, page=page + 1,
+                                page_size=page_size, **view_args)
+
+    return {
+        'reports': attach_analysis_to_reports(reports),
+        'summary': db.get_reports_summary(filters),
+        'page': page,
+        'page_size': page_size,
+        'first_page_url': first_page_url,
+        'next_page_url': next_page_url
+    }
+
+def attach_analysis_to_reports(reports):
+    """为研报列表批量附加分析结果，构建列表页使用的analysis结构"""
+    # 一次性批量获取所有研报的分析结果，避免逐条查询
+    analyses = analysis_db.get_analyses_by_report_ids([report["id"] for report in reports])
+
+    # 对每个研报添加分析结果
+    for report in reports:
+        # 获取分析结果
+        analysis = analyses.get(report["id"])
+
+        if analysis:
+            # 构建分析结构
+            report["analysis"] = {
+                "steps": analysis.get("steps", {}),
+                "summary": {
+                    "completeness_score": analysis.get("completeness_score", 0),
+                    "completeness_description": get_completeness_description(analysis.get("completeness_score", 0)),
+                    "improvement_suggestions": "建议请参考详细分析页面",
+                    "one_line_summary": analysis.get("one_line_summary", "")
+                }
+            }
+        else:
+            # 创建默认分析结构
+            report["analysis"] = {
+                "steps": {
+                    "信息": {"found": False, "step_score": 0},
+                    "逻辑": {"found": False, "step_score": 0},
+                    "超预期": {"found": False, "step_score": 0},
+                    "催化剂": {"found": False, "step_score": 0},
+                    "结论": {"found": False, "step_score": 0}
+                },
+                "summary": {
+                    "completeness_score": 0,
+                    "completeness_description": "尚未分析",
+                    "improvement_suggestions": "尚未分析",
+                    "one_line_summary": "尚未分析"
+                }
+            }
+        
+        # 确保报告有内容字段
+        report["content"] = report.get("full_content", report.get("content_preview", ""))
+        
+    return reports
+
 def get_completeness_description(score):
     """根据完整性分数提供评估描述"""
     if score is None:
@@ -846,49 +712,190 @@ def get_completeness_description(score):
     else:
         return "该研报对五步法的应用不足，多数分析要素缺失，分析浅显，投资建议依据不足。"
 
+def _wants_json():
+    """请求方是否期望JSON响应（?format=json或Accept: application/json）"""
+    return request.args.get('format') == 'json' or request.accept_mimetypes.best == 'application/json'
+
+def _job_accepted(job_id, created, message, report_id):
+    """
+    返回任务已提交的响应
+
+    Parameters:
+    -----------
+    job_id : int
+        任务ID
+    created : bool
+        是否新建任务，False表示已有相同任务在队列中
+    message : str
+        提示信息
+    report_id : int
+        研报ID，浏览器请求时重定向到研报详情页
+
+    Returns:
+    --------
+    Response
+        JSON请求返回202和任务状态地址，浏览器请求重定向到研报详情页
+    """
+    if _wants_json():
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "created": created,
+            "message": message,
+            "status_url": url_for('job_status_api', job_id=job_id),
+            "events_url": url_for('job_events', job_id=job_id)
+        }), 202
+    
+    # 详情页根据job参数订阅任务状态，完成后自动刷新
+    flash(f'{message}（任务 #{job_id}）', 'info')
+    return redirect(url_for('report_detail', report_id=report_id, job=job_id))
+
 @app.route('/analyze/<int:report_id>')
 def analyze_report(report_id):
-    """分析研报"""
-    # 从数据库获取研报
-    conn = sqlite3.connect(DATABASE_PATH)
+    """提交研报分析任务，由工作进程调用指定的分析器分析并保存结果"""
+    conn = db_pool.connect(DATABASE_PATH)
     cursor = conn.cursor()
-    
-    cursor.execute('''
-    SELECT title, full_content, industry FROM reports WHERE id = ?
-    ''', (report_id,))
-    
+    cursor.execute('SELECT id FROM reports WHERE id = ?', (report_id,))
     result = cursor.fetchone()
     conn.close()
     
     if not result:
+        if _wants_json():
+            return jsonify({"success": False, "message": "未找到研报"}), 404
         flash('未找到研报', 'error')
         return redirect(url_for('index'))
     
-    title, content, industry = result
+    # ?analyzer=hedged 等指定分析器，默认由ANALYZER_TYPE环境变量决定
+    analyzer_type = request.args.get('analyzer') or analyzer_registry.DEFAULT_ANALYZER_TYPE
+    if analyzer_type not in analyzer_registry.analyzer_types():
+        if _wants_json():
+            return jsonify({"success": False, "message": f"未知的分析器类型: {analyzer_type}"}), 400
+        flash(f'未知的分析器类型: {analyzer_type}', 'error')
+        return redirect(url_for('report_detail', report_id=report_id))
     
+    # ?force=1 跳过响应缓存，强制重新分析
+    force_refresh = request.args.get('force') == '1'
+    job_id, created = jobs.enqueue('analyze', {'report_id': report_id, 'force_refresh': force_refresh,
+                                               'analyzer_type': analyzer_type},
+                                   priority=PRIORITY_INTERACTIVE)
+    return _job_accepted(job_id, created, '分析任务已提交' if created else '该研报的分析任务已在队列中', report_id)
+
+@app.route('/jobs/<int:job_id>')
+def job_status_api(job_id):
+    """查询任务状态"""
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"success": False, "message": "任务不存在"}), 404
+    return jsonify(job_status(job))
+
+# 任务状态推送的轮询间隔（秒）和单个连接的最长时间（秒），超时后浏览器的EventSource会自动重连
+JOB_EVENTS_INTERVAL = float(os.environ.get('JOB_EVENTS_INTERVAL', 1.0))
+JOB_EVENTS_TIMEOUT = int(os.environ.get('JOB_EVENTS_TIMEOUT', 120))
+# 状态没有变化时发送心跳注释的间隔（秒），写入失败即可发现客户端已断开
+JOB_EVENTS_HEARTBEAT = 15
+
+def _sse_message(event, data):
+    """格式化一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _job_event_stream(job_id):
+    """以Server-Sent Events推送任务状态和执行进度的变化，任务完成或失败后结束"""
+    from flask import Response, stream_with_context
+    
+    def generate():
+        last = None
+        last_sent = time.time()
+        deadline = last_sent + JOB_EVENTS_TIMEOUT
+        try:
+            while time.time() < deadline:
+                job = jobs.get(job_id)
+                if job is None:
+                    return
+                status = job_status(job)
+                if status['status'] in FINISHED_STATUSES:
+                    yield _sse_message('done', status)
+                    return
+                if status != last:
+                    last = status
+                    last_sent = time.time()
+                    yield _sse_message('status', status)
+                elif time.time() - last_sent >= JOB_EVENTS_HEARTBEAT:
+                    last_sent = time.time()
+                    yield ': keep-alive\n\n'
+                time.sleep(JOB_EVENTS_INTERVAL)
+        except GeneratorExit:
+            # 客户端断开连接，停止轮询数据库
+            logger.info(f"任务 {job_id} 的状态推送连接已断开")
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # 关闭反向代理的缓冲，进度才能及时到达浏览器
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/jobs/<int:job_id>/events')
+def job_events(job_id):
+    """以Server-Sent Events推送任务状态变化，任务完成或失败后结束"""
+    if not jobs.get(job_id):
+        return jsonify({"success": False, "message": "任务不存在"}), 404
+    return _job_event_stream(job_id)
+
+def _analyzed_original(report_id, content):
+    """与analysis_worker.handle_analyze相同的近似重复检查，返回可复用分析结果的原研报ID"""
+    conn = db_pool.connect(DATABASE_PATH)
     try:
-        # 使用DeepSeek分析器
-        from deepseek_analyzer import DeepSeekAnalyzer
-        analyzer = DeepSeekAnalyzer()
-        analysis_result = analyzer.analyze_with_five_steps(title, content, industry)
-        
-        # 保存分析结果到数据库
-        analysis_db = AnalysisDatabase()
-        analysis_db.save_analysis_result(report_id, analysis_result, analyzer_type='deepseek')
-        
-        flash('使用DeepSeek分析完成', 'success')
-    except Exception as e:
-        flash(f'分析失败: {str(e)}', 'error')
+        return (near_duplicate.original_of(conn, report_id)
+                or near_duplicate.analyzed_original(conn, content, exclude_id=report_id))
+    finally:
+        conn.close()
+
+@app.route('/analyze/<int:report_id>/stream')
+def analyze_report_stream(report_id):
+    """
+    提交研报分析任务并以Server-Sent Events转发任务状态和流式分析进度
+
+    分析由工作进程执行（与/analyze相同的任务去重、重试和租约），
+    事件与/jobs/<id>/events相同：status携带progress（已生成的文本、表格行和小节），done为最终状态
+    """
+    from flask import Response
     
-    return redirect(url_for('report_detail', report_id=report_id))
+    conn = db_pool.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute('SELECT full_content FROM reports WHERE id = ?', (report_id,))
+    result = cursor.fetchone()
+    conn.close()
+    
+    if not result:
+        return jsonify({"success": False, "message": "未找到研报"}), 404
+    
+    # ?analyzer=hedged 等指定分析器，默认由ANALYZER_TYPE环境变量决定
+    analyzer_type = request.args.get('analyzer') or analyzer_registry.DEFAULT_ANALYZER_TYPE
+    if analyzer_type not in analyzer_registry.analyzer_types():
+        return jsonify({"success": False, "message": f"未知的分析器类型: {analyzer_type}"}), 400
+    force_refresh = request.args.get('force') == '1'
+    
+    if not force_refresh:
+        # 近似重复的研报复用原研报的分析结果，不必入队
+        original_id = _analyzed_original(report_id, result[0])
+        if original_id:
+            logger.info(f"研报 {report_id} 与研报 {original_id} 近似重复，跳过LLM分析")
+            return Response(_sse_message('done', {
+                "status": "done",
+                "result": {"report_id": report_id, "duplicate_of": original_id}
+            }), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+    
+    job_id, created = jobs.enqueue('analyze', {'report_id': report_id, 'force_refresh': force_refresh,
+                                               'analyzer_type': analyzer_type},
+                                   priority=PRIORITY_INTERACTIVE)
+    return _job_event_stream(job_id)
 
 @app.route('/generate_video_script/<int:report_id>')
 def generate_video_script(report_id):
-    """生成研报的视频文案"""
-    logger.info(f"开始为研报ID {report_id} 生成视频文案")
+    """提交视频文案生成任务，由工作进程调用DeepSeek生成并保存"""
+    logger.info(f"提交研报ID {report_id} 的视频文案生成任务")
     
     # 从数据库获取研报信息
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = db_pool.connect(DATABASE_PATH)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
@@ -904,10 +911,6 @@ def generate_video_script(report_id):
         flash('未找到研报', 'error')
         return redirect(url_for('index'))
     
-    # 转换为字典
-    report_info = dict(report)
-    logger.info(f"获取到研报信息: {report_info['title']}")
-    
     # 获取分析结果
     analysis_db = AnalysisDatabase()
     analysis_result = analysis_db.get_analysis_by_report_id(report_id, analyzer_type='deepseek')
@@ -917,31 +920,11 @@ def generate_video_script(report_id):
         flash('请先进行研报分析', 'warning')
         return redirect(url_for('report_detail', report_id=report_id))
     
-    try:
-        # 使用DeepSeek生成视频文案
-        from deepseek_analyzer import DeepSeekAnalyzer
-        analyzer = DeepSeekAnalyzer()
-        logger.info("调用DeepSeek生成视频文案")
-        video_script = analyzer.generate_video_script(report_info, analysis_result)
-        
-        if video_script and video_script != "无法生成视频文案: API密钥未配置":
-            # 保存视频文案到数据库
-            logger.info("成功生成视频文案，正在保存到数据库")
-            script_id = analysis_db.save_video_script(report_id, video_script)
-            if script_id:
-                logger.info(f"视频文案已保存，ID: {script_id}")
-                flash('视频文案生成完成', 'success')
-            else:
-                logger.error("保存视频文案到数据库失败")
-                flash('视频文案生成成功，但保存失败', 'warning')
-        else:
-            logger.error(f"视频文案生成失败: {video_script}")
-            flash('视频文案生成失败: API密钥未配置或生成内容为空', 'error')
-    except Exception as e:
-        logger.exception(f"生成视频文案时出错: {str(e)}")
-        flash(f'生成视频文案失败: {str(e)}', 'error')
-    
-    return redirect(url_for('report_detail', report_id=report_id))
+    job_id, created = jobs.enqueue('video_script',
+                                   {'report_id': report_id, 'force_refresh': request.args.get('force') == '1'},
+                                   priority=PRIORITY_INTERACTIVE)
+    return _job_accepted(job_id, created, '视频文案生成任务已提交' if created else '视频文案生成任务已在队列中',
+                         report_id)
 
 @app.route('/get_video_script/<int:report_id>')
 def get_video_script(report_id):
@@ -1528,27 +1511,25 @@ def run_migrations():
 @app.route('/rating/<rating>')
 def filter_by_rating(rating):
     """按评级筛选研报"""
-    reports = load_reports_from_db()
-    filtered_reports = [report for report in reports if report.get("rating") == rating]
+    page_data = load_reports_page({'rating': rating})
     
     return render_template(
         'filtered_reports.html',
-        reports=filtered_reports,
         filter_type="评级",
-        filter_value=rating
+        filter_value=rating,
+        **page_data
     )
 
 @app.route('/date/<date>')
 def filter_by_date(date):
     """按发布日期筛选研报"""
-    reports = load_reports_from_db()
-    filtered_reports = [report for report in reports if report.get("date") == date]
+    page_data = load_reports_page({'date': date})
     
     return render_template(
         'filtered_reports.html',
-        reports=filtered_reports,
         filter_type="日期",
-        filter_value=date
+        filter_value=date,
+        **page_data
     )
 
 if __name__ == '__main__':
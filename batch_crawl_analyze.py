@@ -3,14 +3,107 @@
 
 import sys
 import os
-import time
+import copy
 import dotenv
-import sqlite3
-from main import scrape_research_reports, get_report_detail
+import db_pool
+from main import list_reports_incrementally, get_report_detail
 from deepseek_analyzer import DeepSeekAnalyzer
 from analysis_db import AnalysisDatabase
+from crawl_pipeline import CrawlPipeline
+from crawl_state import CrawlState
+import prescorer
+import near_duplicate
 import json
 
+# 默认分析结果，在API分析失败时使用
+DEFAULT_ANALYSIS_RESULT = {
+    "analysis": {
+        "信息": {"found": True, "keywords": ["数据"], "evidence": ["由于分析错误，使用默认结果"], "step_score": 60, "description": "包含基本信息"},
+        "逻辑": {"found": True, "keywords": ["分析"], "evidence": ["由于分析错误，使用默认结果"], "step_score": 60, "description": "包含基本逻辑"},
+        "超预期": {"found": False, "keywords": [], "evidence": [], "step_score": 0, "description": "未找到明显超预期"},
+        "催化剂": {"found": False, "keywords": [], "evidence": [], "step_score": 0, "description": "未找到明显催化剂"},
+        "结论": {"found": True, "keywords": ["建议"], "evidence": ["由于分析错误，使用默认结果"], "step_score": 60, "description": "包含基本结论"},
+        "summary": {
+            "completeness_score": 60,
+            "steps_found": 3,
+            "evaluation": "研报部分应用了五步分析法，关键分析要素有所欠缺",
+            "one_line_summary": "由于分析错误，使用默认结果"
+        }
+    },
+    "full_analysis": "由于分析错误，使用默认结果"
+}
+
+def normalize_analysis_result(analysis_result):
+    """
+    校正DeepSeek分析结果的结构，确保包含analysis、summary和各步骤的step_score
+    """
+    # 检查分析结果是否有效
+    if not analysis_result or not isinstance(analysis_result, dict):
+        print("警告: DeepSeek分析返回了无效结果，使用默认分析")
+        return copy.deepcopy(DEFAULT_ANALYSIS_RESULT)
+    
+    # 确保结构正确
+    if "analysis" not in analysis_result:
+        print("警告: 分析结果结构不正确，重新组织结构")
+        # 保存原始分析结果
+        original_analysis = analysis_result
+        
+        # 创建新的结构化结果
+        analysis_result = {
+            "analysis": {},
+            "full_analysis": original_analysis.get("full_analysis", "无法获取完整分析")
+        }
+        
+        # 复制五步法分析结果
+        for step in ["信息", "逻辑", "超预期", "催化剂", "结论"]:
+            if step in original_analysis:
+                analysis_result["analysis"][step] = original_analysis[step]
+            else:
+                analysis_result["analysis"][step] = {
+                    "found": False, 
+                    "keywords": [], 
+                    "evidence": [], 
+                    "step_score": 0,
+                    "description": f"未找到{step}相关内容"
+                }
+    
+    # 确保analysis包含summary字段
+    if "summary" not in analysis_result["analysis"]:
+        print("警告: 分析结果中没有summary字段，添加默认summary")
+        # 计算找到的步骤数量
+        steps_found = sum(1 for step in ["信息", "逻辑", "超预期", "催化剂", "结论"] 
+                        if step in analysis_result["analysis"] and analysis_result["analysis"][step].get("found", False))
+        
+        # 计算完整度分数
+        completeness_score = int((steps_found / 5) * 100)
+        
+        # 生成评价文本
+        if completeness_score >= 90:
+            evaluation = "研报非常完整地应用了五步分析法，包含了全面的分析要素"
+        elif completeness_score >= 80:
+            evaluation = "研报较好地应用了五步分析法，大部分分析要素齐全"
+        elif completeness_score >= 60:
+            evaluation = "研报部分应用了五步分析法，关键分析要素有所欠缺"
+        elif completeness_score >= 40:
+            evaluation = "研报仅包含少量五步分析法要素，分析不够全面"
+        else:
+            evaluation = "研报几乎未应用五步分析法，分析要素严重不足"
+        
+        analysis_result["analysis"]["summary"] = {
+            "completeness_score": completeness_score,
+            "steps_found": steps_found,
+            "evaluation": evaluation,
+            "one_line_summary": "自动生成的分析总结"
+        }
+    
+    # 确保每个步骤都有step_score字段
+    for step in ["信息", "逻辑", "超预期", "催化剂", "结论"]:
+        if step in analysis_result["analysis"] and "step_score" not in analysis_result["analysis"][step]:
+            found = analysis_result["analysis"][step].get("found", False)
+            analysis_result["analysis"][step]["step_score"] = 60 if found else 0
+    
+    return analysis_result
+
 def main():
     """
     爬取10条研报，使用DeepSeek分析器分析，并将结果存入数据库
@@ -39,211 +132,151 @@ def main():
     # 东方财富网行业研报页面 URL
     report_url = "https://data.eastmoney.com/report/hyyb.html"
     
-    # 爬取研究报告列表
-    reports_data = scrape_research_reports(report_url)
-    print(f"爬取到 {len(reports_data)} 条研报数据")
-    
-    if not reports_data:
-        print("未爬取到任何研报，请检查网络连接或网站结构是否变化")
-        return
-    
-    # 初始化分析器和数据库
+    # 初始化分析器、数据库和增量爬取状态
     analyzer = DeepSeekAnalyzer()
     analysis_db = AnalysisDatabase()
+    state = CrawlState('research_reports.db')
     
-    # 连接数据库，用于检查研报是否已存在
-    conn = sqlite3.connect('research_reports.db')
-    cursor = conn.cursor()
-    
-    # 获取数据库中已存在的研报链接
-    cursor.execute('SELECT link FROM reports')
-    existing_links = {row[0] for row in cursor.fetchall()}
-    print(f"数据库中已有 {len(existing_links)} 条研报记录")
-    
-    # 过滤掉已经存在的研报
-    new_reports = [report for report in reports_data if report['link'] not in existing_links]
-    print(f"发现 {len(new_reports)} 条新研报")
-    
-    # 处理前10条新研报（或者所有新研报，如果不足10条）
-    num_reports = min(10, len(new_reports))
-    processed_reports = 0
+    # 增量获取研报列表：翻页到上次处理的水位线即停止，已入库的链接在数据库中按批查询
+    # 处理前10条（按发布时间从早到晚，使水位线逐步推进）
+    new_reports = list_reports_incrementally(report_url, state, limit=10)
+    num_reports = len(new_reports)
+    print(f"发现 {sum(1 for report in new_reports if not report['known'])} 条新研报，"
+          f"{sum(1 for report in new_reports if report['known'])} 条已入库研报待检查更新")
     
     if num_reports == 0:
         print("没有新的研报需要处理")
-        conn.close()
         return
     
-    for i, report in enumerate(new_reports[:num_reports]):
-        print(f"\n处理第 {i+1}/{len(new_reports[:num_reports])} 条新研报: {report.get('title', 'N/A')}")
+    def fetch_detail(item):
+        """详情阶段：获取研报详情"""
+        i, report = item
+        print(f"\n获取第 {i+1}/{num_reports} 条新研报详情: {report.get('title', 'N/A')}")
         print(f"行业: {report.get('industry', 'N/A')}")
         print(f"链接: {report.get('link', 'N/A')}")
         
+        # 已入库研报使用条件请求，详情未变化时返回None，流水线跳过该条
+        content = get_report_detail(report['link'], state=state)
+        if content is None:
+            print("研报详情未变化，跳过分析")
+            return None
+        
+        if not content or len(content.strip()) < 100:
+            print(f"警告: 获取到的研报内容过短或为空，可能无法进行有效分析")
+            content = f"[内容获取失败] {report.get('title', '')} - {report.get('abstract', '')}"
+        
+        print(f"成功获取研报内容，长度: {len(content)} 字符")
+        preview = content[:100].replace('\n', ' ') if len(content) > 100 else content.replace('\n', ' ')
+        print(f"内容预览: {preview}...")
+        return i, report, content
+    
+    # 短研报（包括用标题和摘要代替的正文）不在流水线中逐篇分析，稍后合并为批量请求
+    short_reports = []
+    
+    def analyze(item):
+        """分析阶段：使用DeepSeek进行五步法分析，失败时使用默认分析"""
+        i, report, content = item
+        # 与已分析研报近似重复（换链接重发、略改标题）时不调用LLM，入库后复用原研报的分析结果
+        conn = db_pool.connect('research_reports.db')
         try:
-            # 获取研报详情
-            content = get_report_detail(report['link'])
-            
-            if not content or len(content.strip()) < 100:
-                print(f"警告: 获取到的研报内容过短或为空，可能无法进行有效分析")
-                content = f"[内容获取失败] {report.get('title', '')} - {report.get('abstract', '')}"
-            
-            print(f"成功获取研报内容，长度: {len(content)} 字符")
-            preview = content[:100].replace('\n', ' ') if len(content) > 100 else content.replace('\n', ' ')
-            print(f"内容预览: {preview}...")
-            
-            # 使用DeepSeek进行五步法分析
-            print("\n开始调用DeepSeek API进行分析...")
-            try:
-                analysis_result = analyzer.analyze_with_five_steps(
-                    report['title'], 
-                    content,
-                    industry=report['industry']
-                )
-                
-                # 检查分析结果是否有效
-                if not analysis_result or not isinstance(analysis_result, dict):
-                    print("警告: DeepSeek分析返回了无效结果，使用默认分析")
-                    analysis_result = {
-                        "analysis": {
-                            "信息": {"found": True, "keywords": ["数据"], "evidence": ["由于分析错误，使用默认结果"], "step_score": 60, "description": "包含基本信息"},
-                            "逻辑": {"found": True, "keywords": ["分析"], "evidence": ["由于分析错误，使用默认结果"], "step_score": 60, "description": "包含基本逻辑"},
-                            "超预期": {"found": False, "keywords": [], "evidence": [], "step_score": 0, "description": "未找到明显超预期"},
-                            "催化剂": {"found": False, "keywords": [], "evidence": [], "step_score": 0, "description": "未找到明显催化剂"},
-                            "结论": {"found": True, "keywords": ["建议"], "evidence": ["由于分析错误，使用默认结果"], "step_score": 60, "description": "包含基本结论"},
-                            "summary": {
-                                "completeness_score": 60,
-                                "steps_found": 3,
-                                "evaluation": "研报部分应用了五步分析法，关键分析要素有所欠缺",
-                                "one_line_summary": "由于分析错误，使用默认结果"
-                            }
-                        },
-                        "full_analysis": "由于分析错误，使用默认结果"
-                    }
-                
-                # 确保结构正确
-                if "analysis" not in analysis_result:
-                    print("警告: 分析结果结构不正确，重新组织结构")
-                    # 保存原始分析结果
-                    original_analysis = analysis_result
-                    
-                    # 创建新的结构化结果
-                    analysis_result = {
-                        "analysis": {},
-                        "full_analysis": original_analysis.get("full_analysis", "无法获取完整分析")
-                    }
-                    
-                    # 复制五步法分析结果
-                    for step in ["信息", "逻辑", "超预期", "催化剂", "结论"]:
-                        if step in original_analysis:
-                            analysis_result["analysis"][step] = original_analysis[step]
-                        else:
-                            analysis_result["analysis"][step] = {
-                                "found": False, 
-                                "keywords": [], 
-                                "evidence": [], 
-                                "step_score": 0,
-                                "description": f"未找到{step}相关内容"
-                            }
-                
-                # 确保analysis包含summary字段
-                if "summary" not in analysis_result["analysis"]:
-                    print("警告: 分析结果中没有summary字段，添加默认summary")
-                    # 计算找到的步骤数量
-                    steps_found = sum(1 for step in ["信息", "逻辑", "超预期", "催化剂", "结论"] 
-                                    if step in analysis_result["analysis"] and analysis_result["analysis"][step].get("found", False))
-                    
-                    # 计算完整度分数
-                    completeness_score = int((steps_found / 5) * 100)
-                    
-                    # 生成评价文本
-                    if completeness_score >= 90:
-                        evaluation = "研报非常完整地应用了五步分析法，包含了全面的分析要素"
-                    elif completeness_score >= 80:
-                        evaluation = "研报较好地应用了五步分析法，大部分分析要素齐全"
-                    elif completeness_score >= 60:
-                        evaluation = "研报部分应用了五步分析法，关键分析要素有所欠缺"
-                    elif completeness_score >= 40:
-                        evaluation = "研报仅包含少量五步分析法要素，分析不够全面"
-                    else:
-                        evaluation = "研报几乎未应用五步分析法，分析要素严重不足"
-                    
-                    analysis_result["analysis"]["summary"] = {
-                        "completeness_score": completeness_score,
-                        "steps_found": steps_found,
-                        "evaluation": evaluation,
-                        "one_line_summary": "自动生成的分析总结"
-                    }
-                
-                # 确保每个步骤都有step_score字段
-                for step in ["信息", "逻辑", "超预期", "催化剂", "结论"]:
-                    if step in analysis_result["analysis"] and "step_score" not in analysis_result["analysis"][step]:
-                        found = analysis_result["analysis"][step].get("found", False)
-                        analysis_result["analysis"][step]["step_score"] = 60 if found else 0
-            except Exception as e:
-                print(f"DeepSeek分析过程中出错: {str(e)}")
-                print("使用默认分析结果...")
-                analysis_result = {
-                    "analysis": {
-                        "信息": {"found": True, "keywords": ["数据"], "evidence": ["由于分析错误，使用默认结果"], "step_score": 60, "description": "包含基本信息"},
-                        "逻辑": {"found": True, "keywords": ["分析"], "evidence": ["由于分析错误，使用默认结果"], "step_score": 60, "description": "包含基本逻辑"},
-                        "超预期": {"found": False, "keywords": [], "evidence": [], "step_score": 0, "description": "未找到明显超预期"},
-                        "催化剂": {"found": False, "keywords": [], "evidence": [], "step_score": 0, "description": "未找到明显催化剂"},
-                        "结论": {"found": True, "keywords": ["建议"], "evidence": ["由于分析错误，使用默认结果"], "step_score": 60, "description": "包含基本结论"},
-                        "summary": {
-                            "completeness_score": 60,
-                            "steps_found": 3,
-                            "evaluation": "研报部分应用了五步分析法，关键分析要素有所欠缺",
-                            "one_line_summary": "由于分析错误，使用默认结果"
-                        }
-                    },
-                    "full_analysis": "由于分析错误，使用默认结果"
-                }
-            
-            print("\n分析完成，结果摘要:")
-            
-            # 保存研报到数据库
-            try:
-                # 将研报保存到数据库
-                report_id = analysis_db.insert_report(
-                    report['title'],
-                    report['link'],
-                    report.get('industry', '未知行业'),
-                    report.get('rating', ''),
-                    report.get('org', ''),
-                    report.get('date', ''),
-                    content
-                )
-                print(f"研报已保存到数据库，新ID: {report_id}")
-                
-                # 保存分析结果到数据库
-                try:
-                    analysis_id = analysis_db.insert_analysis(report_id, 'deepseek', json.dumps(analysis_result, ensure_ascii=False))
-                    print(f"分析结果已保存到数据库，分析ID: {analysis_id}")
-                except Exception as e:
-                    print(f"保存到数据库时出错: {str(e)}")
-                
-                # 保存分析结果到JSON文件
-                analysis_file = f"analysis_report_{i+1}.json"
-                with open(analysis_file, 'w', encoding='utf-8') as f:
-                    json.dump(analysis_result, f, ensure_ascii=False, indent=4)
-                print(f"分析结果已保存到 {analysis_file} 文件")
-                
-                # 更新成功处理的报告计数
-                processed_reports += 1
-            except Exception as db_error:
-                print(f"保存到数据库时出错: {str(db_error)}")
+            original_id = near_duplicate.analyzed_original(conn, content)
+        finally:
+            conn.close()
+        if original_id:
+            print(f"\n第 {i+1} 条研报与已分析的研报 {original_id} 近似重复，跳过LLM分析")
+            return i, report, content, {'duplicate_of': original_id}
+        # 规则预评分低于阈值的研报不调用LLM，直接保存预评分结果
+        pre = prescorer.prescore(content)
+        if not prescorer.should_analyze(pre.score):
+            print(f"\n第 {i+1} 条研报规则预评分 {pre.score} 低于阈值 {prescorer.PRESCORE_THRESHOLD}，跳过LLM分析")
+            return i, report, content, pre.to_result()
+        if analyzer.is_short_report(content):
+            short_reports.append(item)
+            return None
+        print(f"\n开始调用DeepSeek API分析第 {i+1} 条研报...")
+        try:
+            analysis_result = analyzer.analyze_with_five_steps(
+                report['title'], 
+                content,
+                industry=report['industry']
+            )
+        except Exception as e:
+            print(f"DeepSeek分析过程中出错: {str(e)}")
+            print("使用默认分析结果...")
+            analysis_result = None
+        return i, report, content, analysis_result
+    
+    def parse(item):
+        """整理阶段：校正分析结果结构"""
+        i, report, content, analysis_result = item
+        if analysis_result and 'duplicate_of' in analysis_result:
+            return item
+        return i, report, content, normalize_analysis_result(analysis_result)
+    
+    def write(item):
+        """写入阶段：保存研报和分析结果"""
+        i, report, content, analysis_result = item
+        print(f"\n第 {i+1} 条研报分析完成，保存结果...")
+        
+        # 将研报保存到数据库
+        report_id = analysis_db.insert_report(
+            report['title'],
+            report['link'],
+            report.get('industry', '未知行业'),
+            report.get('rating', ''),
+            report.get('org', ''),
+            report.get('date', ''),
+            content
+        )
+        print(f"研报已保存到数据库，新ID: {report_id}")
+        
+        # 近似重复的研报入库时已记录指向原研报的关系，不另存分析结果
+        if 'duplicate_of' in analysis_result:
+            print(f"研报为研报 {analysis_result['duplicate_of']} 的近似重复，复用其分析结果")
+            return report_id
+        
+        # 保存分析结果到数据库，跳过LLM分析的研报保存为预评分结果
+        analyzer_type = analysis_result.get('analyzer_type', 'deepseek')
+        try:
+            analysis_id = analysis_db.insert_analysis(report_id, analyzer_type, analysis_result)
+            print(f"分析结果已保存到数据库，分析ID: {analysis_id}")
         except Exception as e:
-            print(f"处理研报时出错: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            print("跳过此研报，继续处理下一个...")
+            print(f"保存到数据库时出错: {str(e)}")
         
-        # 添加间隔，避免API请求过于频繁
-        if i < len(new_reports[:num_reports]) - 1:
-            print("等待2秒后处理下一个研报...")
-            time.sleep(2)
+        # 保存分析结果到JSON文件
+        analysis_file = f"analysis_report_{i+1}.json"
+        with open(analysis_file, 'w', encoding='utf-8') as f:
+            json.dump(analysis_result, f, ensure_ascii=False, indent=4)
+        print(f"分析结果已保存到 {analysis_file} 文件")
+        return report_id
+    
+    # 详情获取、API分析和数据库写入并行流水线执行，API请求频率由流水线统一限速
+    pipeline = CrawlPipeline(fetch_detail, analyze, write, parse=parse)
+    saved_ids = pipeline.run(enumerate(new_reports))
+    
+    if short_reports:
+        # 多篇短研报合并到一次请求中分析，系统提示词和格式要求只发送一次
+        short_reports.sort(key=lambda item: item[0])
+        print(f"\n批量分析 {len(short_reports)} 条短研报...")
+        try:
+            batch_results = analyzer.analyze_batch([
+                {'title': report['title'], 'content': content, 'industry': report['industry']}
+                for _, report, content in short_reports
+            ])
+        except Exception as e:
+            print(f"DeepSeek批量分析过程中出错: {str(e)}")
+            print("使用默认分析结果...")
+            batch_results = [None] * len(short_reports)
+        for (i, report, content), analysis_result in zip(short_reports, batch_results):
+            try:
+                saved_ids.append(write(parse((i, report, content, analysis_result))))
+            except Exception as e:
+                print(f"保存第 {i+1} 条研报时出错: {str(e)}")
+    
+    processed_reports = len(saved_ids)
     
-    # 关闭数据库连接
-    conn.close()
+    # 所有较早的研报都已入库时推进水位线
+    state.advance_watermark(new_reports)
     
     print(f"\n总共成功处理了 {processed_reports}/{num_reports} 条新研报")
     
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+五步法分析文本解析基准测试
+语料为数据库report_analysis表中保存的full_analysis，数据库中没有分析结果时使用fixtures/analysis下的样例；
+输出单遍解析、转换为结构化结果以及两者合计的平均耗时，
+并与内容相同的JSON格式结果比较解析耗时和估算的输出token数
+
+用法: python bench_analysis_parser.py [数据库路径] [重复次数]
+"""
+
+import os
+import sys
+import glob
+import time
+import json
+import sqlite3
+import db_pool
+
+import analysis_parser
+from content_compactor import estimate_tokens
+
+
+def load_corpus(db_path):
+    """读取已保存的分析文本，没有时返回样例文本"""
+    texts = []
+    if os.path.exists(db_path):
+        conn = db_pool.connect(db_path)
+        try:
+            rows = conn.execute("SELECT full_analysis FROM report_analysis "
+                                "WHERE full_analysis IS NOT NULL AND full_analysis != ''").fetchall()
+            texts = [row[0] for row in rows]
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            conn.close()
+    if texts:
+        return texts, db_path
+
+    fixture_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "analysis")
+    for path in sorted(glob.glob(os.path.join(fixture_dir, "*.md"))):
+        with open(path, encoding="utf-8") as f:
+            texts.append(f.read())
+    return texts, fixture_dir
+
+
+def bench(func, texts, repeat):
+    """返回每篇文本的平均微秒数"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            func(text)
+    return (time.perf_counter() - started) * 1e6 / (repeat * len(texts))
+
+
+def parse_uncached(text):
+    parser = analysis_parser.AnalysisParser(emit_events=False)
+    parser.feed(text)
+    parser.close()
+    return parser.parsed
+
+
+def to_json(parsed):
+    """按JSON格式的字段要求生成与解析结果内容相同的JSON文本"""
+    return json.dumps({
+        "steps": {name: {"found": step.found, "comment": step.comment, "framework": step.framework_summary,
+                         "score": step.score or 0} for name, step in parsed.steps.items()},
+        "suggestions": [{"point": point, "advice": advice} for point, advice in parsed.suggestions],
+        "summary": parsed.one_line_summary or "",
+        "total_score": parsed.completeness_score,
+        "evaluation": parsed.total_comment
+    }, ensure_ascii=False)
+
+
+def main():
+    db_path = sys.argv[1] if len(sys.argv) > 1 else "research_reports.db"
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    texts, source = load_corpus(db_path)
+    if not texts:
+        print("没有可用的分析文本")
+        return
+    total_chars = sum(len(text) for text in texts)
+    print(f"语料: {source}，{len(texts)} 篇，平均 {total_chars // len(texts)} 字符")
+
+    parsed = [parse_uncached(text) for text in texts]
+    print(f"{'阶段':<24}{'耗时(微秒/篇)':>16}")
+    print(f"{'单遍解析':<24}{bench(parse_uncached, texts, repeat):>16.1f}")
+    elapsed = bench(lambda item: item.to_result(), parsed, repeat)
+    print(f"{'转换为结构化结果':<24}{elapsed:>16.1f}")
+    elapsed = bench(lambda text: parse_uncached(text).to_result(), texts, repeat)
+    print(f"{'解析+转换':<24}{elapsed:>16.1f}")
+    # 分析器解析之后，保存分析结果和保存研报时命中缓存
+    analysis_parser.parse_analysis.cache_clear()
+    for text in texts:
+        analysis_parser.parse_analysis(text)
+    print(f"{'缓存命中':<24}{bench(analysis_parser.parse_analysis, texts, repeat):>16.1f}")
+
+    json_texts = [to_json(item) for item in parsed]
+    parse_json = analysis_parser.parse_analysis_json.__wrapped__
+    elapsed = bench(lambda text: parse_json(text).to_result(), json_texts, repeat)
+    print(f"{'JSON解析+转换':<24}{elapsed:>16.1f}")
+    markdown_tokens = sum(estimate_tokens(text) for text in texts) // len(texts)
+    json_tokens = sum(estimate_tokens(text) for text in json_texts) // len(texts)
+    print(f"估算输出token: markdown {markdown_tokens}，JSON {json_tokens}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+研报列表页解析基准测试
+对仓库中保存的页面快照分别使用各树构建器解析，输出每次解析的平均耗时和解析出的研报数；
+安装了BeautifulSoup时同时给出旧解析器建树（html.parser）的耗时作为对比
+
+用法: python bench_list_parser.py [重复次数]
+"""
+
+import os
+import sys
+import time
+
+import list_parser
+
+FIXTURES = ["page_output.html", "new_page_output.html", "page_source_backup_industry.jshtml"]
+
+
+def bench(func, repeat):
+    """返回(平均毫秒数, 最后一次的返回值)"""
+    result = func()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - started) * 1000 / repeat, result
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError:
+        BeautifulSoup = None
+        print("未安装BeautifulSoup，跳过旧解析器对比")
+
+    print(f"{'页面':<40}{'解析器':<28}{'耗时(ms)':>10}{'研报数':>8}")
+    for name in FIXTURES:
+        with open(os.path.join(base_dir, name), encoding="utf-8") as f:
+            page_source = f.read()
+
+        if BeautifulSoup is not None:
+            # 旧解析器在逐行处理之前需要先用html.parser构建完整文档树
+            elapsed, rows = bench(lambda: BeautifulSoup(page_source, "html.parser").find_all("tr"), repeat)
+            print(f"{name:<40}{'bs4 html.parser(仅建树)':<28}{elapsed:>10.2f}{len(rows):>8}")
+
+        for builder in list_parser.BUILDERS:
+            elapsed, reports = bench(lambda: list_parser.parse_reports(page_source, builder=builder), repeat)
+            print(f"{name:<40}{builder:<28}{elapsed:>10.2f}{len(reports):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+无头浏览器池
+维护若干个长期存活的Chrome会话，按租用/归还方式复用，避免每个页面都重新启动浏览器；
+归还时检查会话健康状态，处理一定数量页面后自动回收重建，并提供按选择器等待页面加载的辅助函数
+"""
+
+import os
+import queue
+import atexit
+import threading
+import logging
+from contextlib import contextmanager
+
+try:
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    from selenium.common.exceptions import TimeoutException, WebDriverException
+    selenium_available = True
+except ImportError:
+    selenium_available = False
+    TimeoutException = WebDriverException = Exception
+
+try:
+    from chromedriver_py import binary_path
+except ImportError:
+    binary_path = None
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 池中浏览器数量
+DEFAULT_POOL_SIZE = int(os.environ.get('BROWSER_POOL_SIZE', 2))
+
+# 每个浏览器处理多少个页面后回收重建，防止内存持续增长
+DEFAULT_MAX_PAGES = int(os.environ.get('BROWSER_MAX_PAGES', 50))
+
+# 租用浏览器的最长等待时间（秒）
+DEFAULT_LEASE_TIMEOUT = float(os.environ.get('BROWSER_LEASE_TIMEOUT', 120))
+
+# 页面加载超时（秒）
+DEFAULT_PAGE_LOAD_TIMEOUT = 60
+
+# 研报列表页和详情页的就绪条件
+LIST_READY_SELECTORS = ["table tbody tr a[href*='zw_industry.jshtml']", "table tbody tr a[href*='zw_stock.jshtml']"]
+DETAIL_READY_SELECTORS = [".ctx-content p", ".zw-content .ctx-box p", ".report-content", ".newsContent", "#ContentBody"]
+
+USER_AGENT = ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36")
+
+
+def build_chrome_options():
+    """创建无头Chrome的启动参数"""
+    chrome_options = Options()
+    chrome_options.add_argument("--headless=new")  # 使用新的无头模式
+    chrome_options.add_argument("--window-size=1920,1080")  # 设置固定窗口大小
+    chrome_options.add_argument("--disable-extensions")  # 禁用扩展
+    chrome_options.add_argument("--disable-gpu")  # 禁用GPU加速
+    chrome_options.add_argument("--no-sandbox")  # 禁用沙箱模式
+    chrome_options.add_argument("--disable-dev-shm-usage")  # 禁用/dev/shm使用
+    chrome_options.add_argument("--disable-infobars")  # 禁用信息栏
+    chrome_options.add_argument("--disable-notifications")  # 禁用通知
+    chrome_options.add_argument(f"--user-agent={USER_AGENT}")  # 设置用户代理
+    # 页面DOM就绪即返回，其余资源由显式等待条件控制
+    chrome_options.page_load_strategy = 'eager'
+    return chrome_options
+
+
+def create_chrome_driver():
+    """启动一个新的无头Chrome会话"""
+    if not selenium_available or binary_path is None:
+        raise RuntimeError("Selenium或chromedriver_py未安装，无法启动浏览器")
+    service = Service(executable_path=binary_path)
+    driver = webdriver.Chrome(service=service, options=build_chrome_options())
+    driver.set_page_load_timeout(DEFAULT_PAGE_LOAD_TIMEOUT)
+    return driver
+
+
+def wait_for_any(driver, selectors, timeout=15):
+    """
+    等待任一CSS选择器匹配的元素出现
+
+    参数:
+    driver: WebDriver实例
+    selectors (list): CSS选择器列表
+    timeout (float): 最长等待秒数
+
+    返回:
+    bool: 超时前出现匹配元素返回True，否则返回False
+    """
+    conditions = [EC.presence_of_element_located((By.CSS_SELECTOR, selector)) for selector in selectors]
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.2).until(EC.any_of(*conditions))
+        return True
+    except TimeoutException:
+        logger.info(f"等待页面元素超时({timeout}秒): {', '.join(selectors)}")
+        return False
+
+
+class _PooledBrowser:
+    """池中的一个浏览器会话及其使用计数"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+
+
+class BrowserPool:
+    """
+    浏览器会话池
+
+    浏览器在首次租用时按需启动，最多同时存在size个。使用方式：
+
+        with pool.lease() as driver:
+            pool.load(driver, url)
+            wait_for_any(driver, DETAIL_READY_SELECTORS)
+
+    页面需通过load打开，才能计入浏览器处理的页面数。
+
+    Parameters:
+    -----------
+    size : int
+        池中浏览器数量上限
+    max_pages : int
+        单个浏览器处理的页面数上限，达到后回收重建
+    driver_factory : callable
+        创建WebDriver的函数，默认启动无头Chrome
+    lease_timeout : float
+        等待空闲浏览器的最长时间（秒）
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_pages=DEFAULT_MAX_PAGES,
+                 driver_factory=create_chrome_driver, lease_timeout=DEFAULT_LEASE_TIMEOUT):
+        self.size = max(1, int(size))
+        self.max_pages = max_pages
+        self.driver_factory = driver_factory
+        self.lease_timeout = lease_timeout
+
+        self._idle = queue.LifoQueue()
+        # 控制同时存在（空闲+租出）的浏览器数量
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._closed = False
+        # 租出中的浏览器，按driver对象查找以便计数页面
+        self._leased = {}
+
+        # 统计信息
+        self.created = 0
+        self.recycled = 0
+        self.leases = 0
+
+    def _is_healthy(self, browser):
+        """检查浏览器会话是否仍可用"""
+        try:
+            browser.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _destroy(self, browser):
+        try:
+            browser.driver.quit()
+        except Exception as e:
+            logger.warning(f"关闭浏览器时遇到错误: {e}")
+
+    def _acquire(self):
+        if self._closed:
+            raise RuntimeError("浏览器池已关闭")
+        if not self._slots.acquire(timeout=self.lease_timeout):
+            raise TimeoutError(f"等待空闲浏览器超过 {self.lease_timeout} 秒")
+
+        # 优先复用空闲浏览器，不健康的直接丢弃
+        while True:
+            try:
+                browser = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if self._is_healthy(browser):
+                return browser
+            logger.info("浏览器会话已失效，重新创建")
+            self._destroy(browser)
+
+        try:
+            browser = _PooledBrowser(self.driver_factory())
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.created += 1
+        return browser
+
+    def _release(self, browser, broken=False):
+        recycle = broken or self._closed or (self.max_pages and browser.pages >= self.max_pages)
+        if recycle:
+            if not broken and not self._closed:
+                with self._lock:
+                    self.recycled += 1
+            self._destroy(browser)
+        else:
+            self._idle.put(browser)
+        self._slots.release()
+
+    @contextmanager
+    def lease(self):
+        """
+        租用一个浏览器，退出with块时归还
+
+        块内抛出WebDriverException时认为会话已损坏，归还时直接关闭而不放回池中。
+        """
+        browser = self._acquire()
+        with self._lock:
+            self.leases += 1
+            self._leased[id(browser.driver)] = browser
+        broken = False
+        try:
+            yield browser.driver
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            with self._lock:
+                self._leased.pop(id(browser.driver), None)
+            self._release(browser, broken=broken)
+
+    def load(self, driver, url):
+        """
+        在租用的浏览器中打开页面，并计入该浏览器处理的页面数
+
+        参数:
+        driver: 通过lease租用的WebDriver实例
+        url (str): 页面地址
+        """
+        with self._lock:
+            browser = self._leased.get(id(driver))
+        if browser is not None:
+            browser.pages += 1
+        driver.get(url)
+
+    def close(self):
+        """关闭池中所有空闲浏览器，租出中的浏览器在归还时关闭"""
+        self._closed = True
+        while True:
+            try:
+                browser = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._destroy(browser)
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'idle': self._idle.qsize(),
+            'created': self.created,
+            'recycled': self.recycled,
+            'leases': self.leases
+        }
+
+
+# 进程内共享的默认浏览器池
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool():
+    """获取进程内共享的默认浏览器池，进程退出时自动关闭所有浏览器"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = BrowserPool()
+            atexit.register(_default_pool.close)
+        return _default_pool
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import sqlite3
+import db_pool
 import sys
 from datetime import datetime
 
@@ -15,7 +16,7 @@ def check_existing_reports(search_term=None, limit=20):
     """
     try:
         # 连接数据库
-        conn = sqlite3.connect('research_reports.db')
+        conn = db_pool.connect('research_reports.db')
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1,24 +1,29 @@
 """
-五步法分析器 - DeepSeek版
-使用DeepSeek API进行研报五步法分析
+五步法分析器 - DeepSeek旧版
+使用DeepSeek API进行研报五步法分析（不压缩正文、不缓存响应），在分析器注册表中的类型为legacy。
+新代码请使用deepseek_analyzer.DeepSeekAnalyzer或analyzer_registry.get_analyzer
 """
 
 import os
 import json
-import re
 import tempfile
 import subprocess
 import requests  # 添加 requests 库用于调用 DeepSeek API
 from contextlib import contextmanager
+from deepseek_client import get_http_session
+from analysis_parser import parse_analysis, DEFAULT_SUGGESTIONS
+from analyzer_registry import ReportAnalyzer
 
-class DeepSeekAnalyzer:
-    """使用DeepSeek API进行研报五步法分析的分析器"""
+class LegacyDeepSeekAnalyzer(ReportAnalyzer):
+    """使用DeepSeek API进行研报五步法分析的旧版分析器"""
+    
+    analyzer_type = 'legacy'
     
     def __init__(self):
         """初始化DeepSeek分析器"""
-        print("初始化DeepSeek五步法分析器")
+        print("初始化DeepSeek五步法分析器（旧版）")
     
-    def analyze_with_five_steps(self, report_title, report_content, industry=None):
+    def analyze_with_five_steps(self, report_title, report_content, industry=None, force_refresh=False):
         """
         使用DeepSeek对研报内容进行五步法分析
         
@@ -30,6 +35,8 @@ class DeepSeekAnalyzer:
             研报内容正文
         industry : str, optional
             行业分类，用于提供更具针对性的分析
+        force_refresh : bool, optional
+            旧版分析器不缓存响应，该参数只为与其他分析器接口一致
             
         Returns:
         --------
@@ -160,7 +167,8 @@ class DeepSeekAnalyzer:
             
             print(f"正在向 DeepSeek API 发送请求 (模型: {model_name})...")
             
-            response = requests.post(api_url, headers=headers, json=data, timeout=120)
+            # 复用连接池中的keep-alive连接
+            response = get_http_session().post(api_url, headers=headers, json=data, timeout=120)
             response.raise_for_status()  # 如果HTTP响应状态码不是200，引发异常
             
             result = response.json()
@@ -190,178 +198,10 @@ class DeepSeekAnalyzer:
         将DeepSeek生成的文本分析结果解析为结构化数据
         """
         try:
-            # 初始化结果结构
-            result = {
-                "analysis": {
-                    "信息": {"found": False, "keywords": [], "evidence": [], "description": "", "step_score": 0},
-                    "逻辑": {"found": False, "keywords": [], "evidence": [], "description": "", "step_score": 0},
-                    "超预期": {"found": False, "keywords": [], "evidence": [], "description": "", "step_score": 0},
-                    "催化剂": {"found": False, "keywords": [], "evidence": [], "description": "", "step_score": 0},
-                    "结论": {"found": False, "keywords": [], "evidence": [], "description": "", "step_score": 0},
-                    "summary": {"completeness_score": 0, "steps_found": 0, "evaluation": ""}
-                },
-                "full_analysis": analysis_text  # 保存完整的分析文本
-            }
-            
-            # 尝试解析体检清单部分
-            try:
-                checklist_section = analysis_text.split("## 体检清单")[1].split("##")[0]
-                steps = ["信息", "逻辑", "超预期", "催化剂", "结论"]
-                
-                for step in steps:
-                    for line in checklist_section.split("\n"):
-                        if step in line:
-                            # 检查是否包含"✅"标记
-                            if "✅" in line:
-                                result["analysis"][step]["found"] = True
-                                # 提取快评作为描述
-                                match = re.search(r'\|.*\|.*\|(.*)\|', line)
-                                if match:
-                                    description = match.group(1).strip()
-                                    # 处理<br>标签，确保它们正确显示
-                                    description = description.replace('<br>', '<br />')
-                                    result["analysis"][step]["description"] = description
-                            # 检查是否包含"⚠️"标记 (部分应用)
-                            elif "⚠️" in line:
-                                result["analysis"][step]["found"] = True
-                                match = re.search(r'\|.*\|.*\|(.*)\|', line)
-                                if match:
-                                    description = match.group(1).strip()
-                                    # 处理<br>标签，确保它们正确显示
-                                    description = description.replace('<br>', '<br />')
-                                    result["analysis"][step]["description"] = description
-            except Exception as e:
-                print(f"解析体检清单时出错: {e}")
-            
-            # 解析五步框架梳理部分
-            try:
-                framework_section_match = re.search(r'## 五步框架梳理(.*?)##', analysis_text, re.DOTALL)
-                if framework_section_match:
-                    framework_section = framework_section_match.group(1)
-                    steps_mapping = {
-                        'Information': '信息',
-                        'Logic': '逻辑',
-                        'Beyond-Consensus': '超预期',
-                        'Catalyst': '催化剂',
-                        'Conclusion': '结论'
-                    }
-                    
-                    for eng_name, cn_name in steps_mapping.items():
-                        pattern = r'\| ' + re.escape(eng_name) + r' \|(.*?)\|'
-                        match = re.search(pattern, framework_section, re.DOTALL)
-                        if match and cn_name in result["analysis"]:
-                            framework_summary = match.group(1).strip()
-                            # 处理<br>标签，确保它们正确显示
-                            framework_summary = framework_summary.replace('<br>', '<br />')
-                            result["analysis"][cn_name]["framework_summary"] = framework_summary
-            except Exception as e:
-                print(f"解析五步框架梳理时出错: {e}")
-            
-            # 解析可操作补强思路部分
-            try:
-                suggestions_match = re.search(r'## 可操作补强思路(.*?)##', analysis_text, re.DOTALL)
-                if suggestions_match:
-                    improvement_suggestions = suggestions_match.group(1).strip()
-                    # 检查是否为有效的改进建议内容
-                    if improvement_suggestions and not improvement_suggestions.startswith('-------'):
-                        result["analysis"]["improvement_suggestions"] = improvement_suggestions
-                    else:
-                        # 如果内容无效，使用默认的改进建议
-                        result["analysis"]["improvement_suggestions"] = "| 整体完善 | 建议根据五步法框架进一步完善研报结构 |"
-                else:
-                    # 如果没有找到改进建议部分，使用默认的改进建议
-                    result["analysis"]["improvement_suggestions"] = "| 整体完善 | 建议根据五步法框架进一步完善研报结构 |"
-            except Exception as e:
-                print(f"解析可操作补强思路时出错: {e}")
-                # 出错时使用默认的改进建议
-                result["analysis"]["improvement_suggestions"] = "| 整体完善 | 建议根据五步法框架进一步完善研报结构 |"
-            
-            # 解析五步法定量评分部分
-            try:
-                scores_section = analysis_text.split("## 五步法定量评分")[1]
-                steps = ["信息", "逻辑", "超预期", "催化剂", "结论"]
-                total_score = 0
-                steps_found = 0
-                
-                for step in steps:
-                    for line in scores_section.split("\n"):
-                        if line.strip().startswith(f"| {step}"):
-                            parts = line.split("|")
-                            if len(parts) >= 4:
-                                try:
-                                    score = int(parts[2].strip())
-                                    result["analysis"][step]["step_score"] = score
-                                    
-                                    # 如果分数大于等于60，认为是有效应用
-                                    if score >= 60:
-                                        steps_found += 1
-                                    
-                                    total_score += score
-                                    
-                                    # 提取评价
-                                    if len(parts) >= 5:
-                                        # 如果找到评价
-                                        if len(parts) >= 5:
-                                            evaluation = parts[3].strip()
-                                            # 处理<br>标签，确保它们正确显示
-                                            evaluation = evaluation.replace('<br>', '<br />')
-                                            result["analysis"][step]["description"] = evaluation
-                                            result["analysis"]["summary"]["evaluation"] = evaluation
-                                except Exception as e:
-                                    print(f"解析步骤'{step}'评分时出错: {e}")
-                
-                # 提取总分
-                for line in scores_section.split("\n"):
-                    if "总分" in line:
-                        parts = line.split("|")
-                        if len(parts) >= 4:
-                            try:
-                                overall_score = int(parts[2].strip())
-                                result["analysis"]["summary"]["completeness_score"] = overall_score
-                                
-                                # 如果找到评价
-                                if len(parts) >= 5:
-                                    evaluation = parts[3].strip()
-                                    # 处理<br>标签，确保它们正确显示
-                                    evaluation = evaluation.replace('<br>', '<br />')
-                                    result["analysis"]["summary"]["evaluation"] = evaluation
-                            except:
-                                # 如果无法提取总分，使用平均分
-                                if len(steps) > 0:
-                                    avg_score = total_score // len(steps)
-                                    result["analysis"]["summary"]["completeness_score"] = avg_score
-                            break
-                
-                # 如果没有找到总分行
-                if result["analysis"]["summary"]["completeness_score"] == 0 and len(steps) > 0:
-                    avg_score = total_score // len(steps)
-                    result["analysis"]["summary"]["completeness_score"] = avg_score
-                
-                result["analysis"]["summary"]["steps_found"] = steps_found
-            except Exception as e:
-                print(f"解析五步法定量评分时出错: {e}")
-            
-            # 如果没有评价，根据分数生成评价
-            if not result["analysis"]["summary"]["evaluation"]:
-                score = result["analysis"]["summary"]["completeness_score"]
-                result["analysis"]["summary"]["evaluation"] = self._get_evaluation_from_score(score)
-            
-            # 尝试提取一句话总结
-            try:
-                summary_section_match = re.search(r'## 一句话总结(.*?)##', analysis_text, re.DOTALL)
-                if summary_section_match:
-                    one_line_summary = summary_section_match.group(1).strip()
-                    # 处理<br>标签，确保它们正确显示
-                    one_line_summary = one_line_summary.replace('<br>', '<br />')
-                    result["analysis"]["summary"]["one_line_summary"] = one_line_summary
-                else:
-                    result["analysis"]["summary"]["one_line_summary"] = "无法提取一句话总结"
-            except Exception as e:
-                print(f"提取一句话总结时出错: {e}")
-                result["analysis"]["summary"]["one_line_summary"] = "无法提取一句话总结"
-            
-            return result
-            
+            # 评分表的评价和一句话总结中的<br>替换为<br />，确保它们正确显示
+            return parse_analysis(analysis_text).to_result(evaluate=self._get_evaluation_from_score,
+                                                           xhtml_breaks=True,
+                                                           default_suggestions=DEFAULT_SUGGESTIONS)
         except Exception as e:
             print(f"解析DeepSeek分析结果时出错: {str(e)}")
             return self._generate_fallback_analysis()
@@ -396,4 +236,7 @@ class DeepSeekAnalyzer:
         elif score >= 40:
             return "研报仅包含少量五步分析法要素，分析不够全面"
         else:
-            return "研报几乎未应用五步分析法，分析要素严重不足" 
\ No newline at end of file
+            return "研报几乎未应用五步分析法，分析要素严重不足" 
+
+# 兼容旧名称，避免与deepseek_analyzer.DeepSeekAnalyzer混淆，新代码请使用LegacyDeepSeekAnalyzer
+DeepSeekAnalyzer = LegacyDeepSeekAnalyzer
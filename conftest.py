@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试公共夹具
+"""
+
+import os
+import glob
+import json
+import time
+import sqlite3
+import threading
+import importlib.util
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from analysis_db import AnalysisDatabase
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STEPS = ("信息", "逻辑", "超预期", "催化剂", "结论")
+
+
+def _load_migration(file_path):
+    spec = importlib.util.spec_from_file_location(os.path.basename(file_path)[:-3], file_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def load_migration():
+    """按文件名加载migrations目录中的迁移模块"""
+    return lambda name: _load_migration(os.path.join(BASE_DIR, "migrations", name))
+
+
+@pytest.fixture
+def migrated_db(tmp_path):
+    """在临时目录中执行全部迁移并创建分析结果表，返回数据库路径"""
+    db_path = str(tmp_path / "reports.db")
+    for file_path in sorted(glob.glob(os.path.join(BASE_DIR, "migrations", "[0-9]*.py"))):
+        _load_migration(file_path).migrate(db_path)
+    # 分析结果表由AnalysisDatabase创建
+    AnalysisDatabase(db_path)
+    return db_path
+
+
+@pytest.fixture
+def analysis_db_path(migrated_db):
+    """在migrated_db的基础上补全保存和读取分析结果用到的列、默认值和表，返回数据库路径"""
+    conn = sqlite3.connect(migrated_db)
+    try:
+        # 迁移和AnalysisDatabase创建的report_analysis缺少full_analysis列和created_at默认值，也不创建步骤表和建议表
+        conn.execute("DROP TABLE report_analysis")
+        conn.execute("CREATE TABLE report_analysis (id INTEGER PRIMARY KEY AUTOINCREMENT, report_id INTEGER NOT NULL, "
+                     "analyzer_type TEXT NOT NULL, completeness_score INTEGER DEFAULT 0, evaluation TEXT, "
+                     "one_line_summary TEXT, full_analysis TEXT, created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+                     "UNIQUE(report_id, analyzer_type))")
+        conn.execute("CREATE TABLE IF NOT EXISTS step_analysis (id INTEGER PRIMARY KEY, analysis_id INTEGER, "
+                     "step_name TEXT, found INTEGER, description TEXT, step_score INTEGER, framework_summary TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS improvement_suggestions (id INTEGER PRIMARY KEY, analysis_id INTEGER, "
+                     "point TEXT, suggestion TEXT)")
+        conn.commit()
+    finally:
+        conn.close()
+    return migrated_db
+
+
+def _analysis_text(score):
+    checklist = "\n".join(f"| {step} | 是 | 有涉及 |" for step in STEPS)
+    scores = "\n".join(f"| {step} | {score} | 一般 |" for step in STEPS)
+    return (f"## 体检清单\n| 五步要素 | 是否覆盖 | 快评 |\n| ------- | ------- | ---- |\n{checklist}\n\n"
+            f"## 一句话总结\n分数为{score}的研报。\n\n"
+            f"## 五步法定量评分\n| 步骤 | 分数(0-100) | 评价 |\n| ---- | ----------- | ---- |\n{scores}\n"
+            f"| 总分 | {score} | 一般 |\n")
+
+
+@pytest.fixture
+def analysis_text():
+    """按总分生成一篇五个步骤齐全的markdown分析文本"""
+    return _analysis_text
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        time.sleep(self.server.delay)
+        status, content = self.server.next_reply(body)
+
+        if status != 200:
+            self._send_json(status, {"error": {"message": content}})
+        elif body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for start in range(0, len(content), 7):
+                chunk = {"choices": [{"delta": {"content": content[start:start + 7]}}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.write(b": keep-alive\n\ndata: [DONE]\n\n")
+        else:
+            self._send_json(200, {"choices": [{"message": {"content": content}}]})
+
+    def _send_json(self, status, data):
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubChatServer(ThreadingHTTPServer):
+    """
+    本地chat completions桩服务器，不访问真实API
+
+    script为回复脚本：列表时按请求依次取用，最后一项重复使用；也可以是以请求体为参数的函数。
+    每项回复为文本或(状态码, 文本)，stream请求按SSE格式分段返回。
+    requests记录收到的请求体，delay为每次回复前的等待秒数。
+    """
+
+    def __init__(self, script, delay=0):
+        super().__init__(("127.0.0.1", 0), _ChatHandler)
+        self.script = script
+        self.delay = delay
+        self.requests = []
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/chat/completions"
+
+    def next_reply(self, body):
+        with self._lock:
+            if callable(self.script):
+                reply = self.script(body)
+            elif len(self.script) > 1:
+                reply = self.script.pop(0)
+            else:
+                reply = self.script[0]
+        return reply if isinstance(reply, tuple) else (200, reply)
+
+
+@pytest.fixture
+def chat_server():
+    """启动桩服务器的工厂函数：chat_server(script, delay=0)，测试结束时关闭"""
+    servers = []
+
+    def start(script, delay=0):
+        server = StubChatServer(script, delay)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
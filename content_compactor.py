@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析前的研报正文压缩
+去除免责声明、联系方式等模板内容和重复段落，把正文切分为句群，
+用关键词和数字密度等词法特征为每个句群计算与五步（信息/逻辑/超预期/催化剂/结论）的相关度，
+先保证每一步至少有一段内容，再按单位token得分填满token预算，按原文顺序输出
+"""
+
+import os
+import re
+import math
+import logging
+from collections import namedtuple
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 发送给模型的正文token预算，默认不超过原先截取的前1000字（约450~600个token）
+DEFAULT_TOKEN_BUDGET = int(os.environ.get('ANALYSIS_TOKEN_BUDGET', 450))
+
+# 句群的最大字符数，较长的段落按句子切分后合并到不超过此长度
+MAX_UNIT_CHARS = 160
+
+# 短于此长度的片段（页码、表格残片等）直接丢弃
+MIN_UNIT_CHARS = 8
+
+STEPS = ('信息', '逻辑', '超预期', '催化剂', '结论')
+
+# 各步骤的关键词
+STEP_PATTERNS = {
+    '信息': re.compile(r'同比|环比|营收|收入|净利润|毛利率|销量|产能|份额|价格|出货|订单|亿元|万元|增速|占比|数据'),
+    '逻辑': re.compile(r'因为|由于|因此|所以|驱动|带动|导致|受益|主要原因|一方面|另一方面|从而|随着|意味着|逻辑'),
+    '超预期': re.compile(r'超预期|预期差|一致预期|市场认为|市场担心|好于预期|优于预期|高于预期|低于预期|'
+                      r'不及预期|低估|被忽视|分歧|我们认为'),
+    '催化剂': re.compile(r'催化|政策|落地|投产|发布|有望|将于|即将|会议|招标|审批|新品|大促|事件|补贴'),
+    '结论': re.compile(r'投资建议|维持|首次覆盖|给予|评级|买入|增持|推荐|目标价|盈利预测|EPS|PE|建议关注|风险提示'),
+}
+
+# 小节标题及其对应的步骤，标题之后的内容在对应步骤上加分，直到下一个标题
+SECTION_PATTERN = re.compile(r'^\s*(投资要点|核心观点|报告摘要|摘要|事件|点评|投资建议|盈利预测|估值|风险提示|催化剂)\s*[:：]?')
+SECTION_STEPS = {
+    '事件': '信息',
+    '点评': '逻辑',
+    '投资建议': '结论',
+    '盈利预测': '结论',
+    '估值': '结论',
+    '风险提示': '结论',
+    '催化剂': '催化剂',
+}
+# 这些小节是全文概要，所有步骤都加分
+SUMMARY_SECTIONS = frozenset(['投资要点', '核心观点', '报告摘要', '摘要'])
+SECTION_BONUS = 1.5
+
+# 出现后其后全部是模板内容的标题
+TAIL_BOILERPLATE = re.compile(r'^\s*(免责声明|分析师声明|特别声明|重要声明|法律声明|评级说明|投资评级说明|分析师承诺)')
+
+# 单句级别的模板内容
+BOILERPLATE = re.compile(r'本报告仅供|请务必阅读|执业证书编号|S\d{10}|联系人[:：]|电话[:：]|邮箱[:：]|E-?mail|'
+                         r'地址[:：]|www\.|https?://|版权所有|未经.{0,10}许可', re.I)
+
+_NUMBER = re.compile(r'\d+(?:\.\d+)?%?')
+_SENTENCE_END = re.compile(r'(?<=[。！？；!?;])')
+_NON_WORD = re.compile(r'[\W_]+')
+_CJK = re.compile(r'[一-鿿]')
+
+Compaction = namedtuple('Compaction', 'text tokens_before tokens_after kept dropped covered_steps')
+
+
+def estimate_tokens(text):
+    """估算token数：中文字符约0.6个token，其余字符约0.3个token"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return int(math.ceil(cjk * 0.6 + (len(text) - cjk) * 0.3))
+
+
+def _split_units(paragraph):
+    """把段落切分为不超过MAX_UNIT_CHARS的句群"""
+    if len(paragraph) <= MAX_UNIT_CHARS:
+        return [paragraph]
+    units = []
+    current = ''
+    for sentence in _SENTENCE_END.split(paragraph):
+        if not sentence:
+            continue
+        if current and len(current) + len(sentence) > MAX_UNIT_CHARS:
+            units.append(current)
+            current = ''
+        current += sentence
+    if current:
+        units.append(current)
+    return units
+
+
+def _score(text, section):
+    """计算句群在各步骤上的得分"""
+    scores = {}
+    for step in STEPS:
+        score = float(len(STEP_PATTERNS[step].findall(text)))
+        if section in SUMMARY_SECTIONS:
+            score += SECTION_BONUS / 2
+        elif SECTION_STEPS.get(section) == step:
+            score += SECTION_BONUS
+        scores[step] = score
+    # 数字密度体现信息量
+    scores['信息'] += min(len(_NUMBER.findall(text)), 6) * 0.5
+    return scores
+
+
+def _candidates(content):
+    """
+    去除模板内容和重复片段，返回候选句群列表
+
+    每项为(段落序号, 句群文本, token数, 各步骤得分)
+    """
+    candidates = []
+    seen = set()
+    section = None
+    for paragraph_index, paragraph in enumerate(p.strip() for p in content.splitlines()):
+        if not paragraph:
+            continue
+        if TAIL_BOILERPLATE.match(paragraph):
+            break
+        match = SECTION_PATTERN.match(paragraph)
+        if match:
+            section = match.group(1)
+        for unit in _split_units(paragraph):
+            unit = unit.strip()
+            if len(unit) < MIN_UNIT_CHARS or BOILERPLATE.search(unit):
+                continue
+            key = _NON_WORD.sub('', unit)
+            if key in seen:
+                continue
+            seen.add(key)
+            candidates.append((paragraph_index, unit, estimate_tokens(unit), _score(unit, section)))
+    return candidates
+
+
+def compact(content, token_budget=None):
+    """
+    在token预算内压缩研报正文
+
+    去除模板内容和重复段落后没有剩下任何句群时（正文很短或全是残片），退回原文，超出预算时截取开头。
+
+    参数:
+    content (str): 研报正文
+    token_budget (int): token预算，默认为DEFAULT_TOKEN_BUDGET
+
+    返回:
+    Compaction: text为压缩后的正文，另含压缩前后的token数、保留和丢弃的句群数以及覆盖到的步骤
+    """
+    token_budget = token_budget or DEFAULT_TOKEN_BUDGET
+    content = content or ''
+    tokens_before = estimate_tokens(content)
+    candidates = _candidates(content)
+
+    if not candidates:
+        text = content.strip()
+        if tokens_before > token_budget:
+            text = text[:max(1, int(len(text) * token_budget / tokens_before))]
+        return Compaction(text, tokens_before, estimate_tokens(text), 0, 0, [])
+
+    selected = set()
+    remaining = token_budget
+
+    # 第一轮：每个步骤选取得分最高且放得下的句群，保证覆盖面
+    for step in STEPS:
+        best = None
+        for index, (_, _, tokens, scores) in enumerate(candidates):
+            if index in selected or tokens > remaining or scores[step] <= 0:
+                continue
+            if best is None or scores[step] > candidates[best][3][step]:
+                best = index
+        if best is not None:
+            selected.add(best)
+            remaining -= candidates[best][2]
+
+    # 第二轮：按单位token得分填满剩余预算，总分以最相关步骤为主
+    def value(index):
+        _, _, tokens, scores = candidates[index]
+        top = max(scores.values())
+        return (top + 0.25 * (sum(scores.values()) - top)) / max(tokens, 1)
+
+    for index in sorted(set(range(len(candidates))) - selected, key=value, reverse=True):
+        tokens = candidates[index][2]
+        if tokens <= remaining:
+            selected.add(index)
+            remaining -= tokens
+
+    if not selected and candidates:
+        # 单个句群就超出预算时，截取其开头部分
+        _, unit, tokens, _ = candidates[0]
+        keep = max(1, int(len(unit) * token_budget / tokens))
+        candidates[0] = (candidates[0][0], unit[:keep], token_budget, candidates[0][3])
+        selected.add(0)
+
+    # 按原文顺序输出，同一段落的句群直接拼接
+    lines = []
+    last_paragraph = None
+    for index in sorted(selected):
+        paragraph_index, unit, _, _ = candidates[index]
+        if paragraph_index == last_paragraph:
+            lines[-1] += unit
+        else:
+            lines.append(unit)
+        last_paragraph = paragraph_index
+    text = '\n'.join(lines)
+
+    covered = [step for step in STEPS if any(candidates[index][3][step] > 0 for index in selected)]
+    return Compaction(text, tokens_before, estimate_tokens(text), len(selected),
+                      len(candidates) - len(selected), covered)
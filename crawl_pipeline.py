@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+研报爬取与分析流水线
+将列表获取、详情获取、LLM分析、结果整理和数据库写入拆分为独立阶段，
+各阶段使用各自的线程池并通过有界队列衔接，使整体吞吐受限于API速率而不是各环节耗时之和
+"""
+
+import os
+import time
+import queue
+import threading
+import logging
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 各阶段默认并发数，可通过环境变量调整
+DEFAULT_DETAIL_WORKERS = int(os.environ.get('CRAWL_DETAIL_WORKERS', 4))
+DEFAULT_ANALYSIS_WORKERS = int(os.environ.get('CRAWL_ANALYSIS_WORKERS', 2))
+DEFAULT_PARSE_WORKERS = int(os.environ.get('CRAWL_PARSE_WORKERS', 1))
+
+# LLM接口每分钟最多请求次数
+DEFAULT_REQUESTS_PER_MINUTE = float(os.environ.get('CRAWL_REQUESTS_PER_MINUTE', 30))
+
+# 阶段之间队列的容量，上游过快时会被阻塞，避免大量详情内容堆积在内存中
+DEFAULT_QUEUE_SIZE = int(os.environ.get('CRAWL_QUEUE_SIZE', 8))
+
+# 队列结束标记
+_STOP = object()
+
+
+class RateLimiter:
+    """线程安全的请求速率限制器，保证相邻两次请求的间隔不小于60/每分钟请求数秒"""
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute and requests_per_minute > 0 else 0
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """等待直到可以发出下一次请求"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            scheduled = max(now, self._next_time)
+            self._next_time = scheduled + self.interval
+        # 在锁外等待，其他线程可以同时预约后续时间片
+        delay = scheduled - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class _Stage:
+    """流水线中的一个阶段：从输入队列取数据，处理后放入输出队列"""
+
+    def __init__(self, name, func, workers, input_queue, output_queue=None, limiter=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.limiter = limiter
+        self.next_stage = None
+
+        self.processed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.busy_seconds = 0.0
+        self.results = []
+
+        self._running = self.workers
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-{i + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self):
+        while True:
+            item = self.input_queue.get()
+            if item is _STOP:
+                self._finish()
+                return
+
+            if self.limiter:
+                self.limiter.acquire()
+
+            started = time.monotonic()
+            try:
+                result = self.func(item)
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                    self.busy_seconds += time.monotonic() - started
+                logger.error(f"[{self.name}] 处理失败: {str(e)}")
+                continue
+
+            with self._lock:
+                self.busy_seconds += time.monotonic() - started
+                # 返回None表示该条数据被过滤，不再向下游传递
+                if result is None:
+                    self.skipped += 1
+                    continue
+                self.processed += 1
+                if self.output_queue is None:
+                    self.results.append(result)
+
+            if self.output_queue is not None:
+                self.output_queue.put(result)
+
+    def _finish(self):
+        # 本阶段最后一个退出的线程负责通知下游阶段结束
+        with self._lock:
+            self._running -= 1
+            last = self._running == 0
+        if last and self.next_stage is not None:
+            for _ in range(self.next_stage.workers):
+                self.output_queue.put(_STOP)
+
+    def summary(self):
+        return {
+            'workers': self.workers,
+            'processed': self.processed,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'busy_seconds': round(self.busy_seconds, 2)
+        }
+
+
+class CrawlPipeline:
+    """
+    研报爬取与分析流水线
+
+    各阶段的处理函数接收上一阶段的输出并返回本阶段的输出，返回None表示丢弃该条数据，
+    抛出异常时记录错误并跳过该条数据。写入阶段固定为单线程，避免SQLite写锁竞争。
+
+    Parameters:
+    -----------
+    fetch_detail : callable
+        详情获取阶段，通常为网络I/O
+    analyze : callable
+        LLM分析阶段，受requests_per_minute限速
+    write : callable
+        数据库写入阶段，单线程执行，返回值收集到run()结果中
+    parse : callable, optional
+        结果整理阶段，默认原样传递
+    detail_workers, analysis_workers, parse_workers : int
+        各阶段并发数
+    requests_per_minute : float
+        LLM接口每分钟最多请求次数，0表示不限速
+    queue_size : int
+        阶段之间队列的容量
+    """
+
+    def __init__(self, fetch_detail, analyze, write, parse=None,
+                 detail_workers=DEFAULT_DETAIL_WORKERS,
+                 analysis_workers=DEFAULT_ANALYSIS_WORKERS,
+                 parse_workers=DEFAULT_PARSE_WORKERS,
+                 requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        self.fetch_detail = fetch_detail
+        self.analyze = analyze
+        self.parse = parse or (lambda item: item)
+        self.write = write
+        self.detail_workers = detail_workers
+        self.analysis_workers = analysis_workers
+        self.parse_workers = parse_workers
+        self.requests_per_minute = requests_per_minute
+        self.queue_size = queue_size
+        self.stats = {}
+
+    def run(self, list_source):
+        """
+        运行流水线直到所有数据处理完毕
+
+        Parameters:
+        -----------
+        list_source : iterable or callable
+            研报列表，或返回研报列表的函数（在列表阶段的线程中调用）
+
+        Returns:
+        --------
+        list
+            写入阶段的返回值列表（顺序与完成顺序一致）
+        """
+        started = time.monotonic()
+
+        detail_queue = queue.Queue(maxsize=self.queue_size)
+        analysis_queue = queue.Queue(maxsize=self.queue_size)
+        parse_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+
+        detail_stage = _Stage('detail', self.fetch_detail, self.detail_workers, detail_queue, analysis_queue)
+        analysis_stage = _Stage('analysis', self.analyze, self.analysis_workers, analysis_queue, parse_queue,
+                                limiter=RateLimiter(self.requests_per_minute))
+        parse_stage = _Stage('parse', self.parse, self.parse_workers, parse_queue, write_queue)
+        write_stage = _Stage('write', self.write, 1, write_queue)
+
+        detail_stage.next_stage = analysis_stage
+        analysis_stage.next_stage = parse_stage
+        parse_stage.next_stage = write_stage
+        stages = [detail_stage, analysis_stage, parse_stage, write_stage]
+
+        for stage in stages:
+            stage.start()
+
+        # 列表阶段：逐条放入详情队列，队列满时阻塞
+        listed = 0
+        try:
+            items = list_source() if callable(list_source) else list_source
+            for item in items:
+                detail_queue.put(item)
+                listed += 1
+        except Exception as e:
+            logger.error(f"[list] 获取研报列表失败: {str(e)}")
+        finally:
+            for _ in range(detail_stage.workers):
+                detail_queue.put(_STOP)
+
+        for stage in stages:
+            stage.join()
+
+        self.stats = {'listed': listed, 'elapsed_seconds': round(time.monotonic() - started, 2)}
+        for stage in stages:
+            self.stats[stage.name] = stage.summary()
+        logger.info(f"流水线完成: 列表 {listed} 条，写入 {write_stage.processed} 条，"
+                    f"耗时 {self.stats['elapsed_seconds']} 秒")
+        return write_stage.results
@@ -2,7 +2,8 @@
 import os
 import json
 import time
-import requests
+import http_fetch
+from page_archive import archive_page, KIND_LIST, KIND_DETAIL
 from bs4 import BeautifulSoup
 from datetime import datetime
 import database as db
@@ -15,20 +16,10 @@ def scrape_research_reports():
     print("开始爬取东方财富网研报列表...")
     url = "https://data.eastmoney.com/report/industry.jshtml"
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-        'Referer': 'https://data.eastmoney.com/'
-    }
-    
     try:
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        # 设置正确的编码
-        if response.encoding == 'ISO-8859-1':
-            response.encoding = response.apparent_encoding
+        # 共享会话，字符集由响应头或<meta charset>确定
+        response = http_fetch.fetch(url)
+        archive_page(url, response.text, KIND_LIST)
         
         # 使用BeautifulSoup解析HTML
         soup = BeautifulSoup(response.text, 'html.parser')
@@ -93,20 +84,9 @@ def get_report_detail(url):
     """
     print(f"正在获取研报详情: {url}")
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-        'Referer': 'https://data.eastmoney.com/'
-    }
-    
     try:
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        # 设置正确的编码
-        if response.encoding == 'ISO-8859-1':
-            response.encoding = response.apparent_encoding
+        # 共享会话，字符集由响应头或<meta charset>确定
+        response = http_fetch.fetch(url)
         
         soup = BeautifulSoup(response.text, 'html.parser')
         
@@ -140,9 +120,8 @@ def get_report_detail(url):
                     if content_div:
                         content = content_div.get_text(strip=True)
         
-        # 保存完整的网页内容以便调试
-        with open("report_content_debug.html", "w", encoding="utf-8") as f:
-            f.write(str(soup))
+        # 归档原始页面，解析器修复后可离线重新解析
+        archive_page(url, response.text, KIND_DETAIL)
         
         print(f"获取到研报内容，长度: {len(content)} 字符")
         
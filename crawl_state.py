@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量爬取状态
+按数据源保存水位线（已处理到的最新发布日期和infocode），并按详情页地址保存ETag、Last-Modified和正文哈希。
+列表翻页到水位线即停止，已知研报的详情页使用条件请求，只有新增或内容变化的研报才进入分析流程
+"""
+
+import sqlite3
+import db_pool
+import hashlib
+import datetime
+import logging
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = 'research_reports.db'
+
+# 默认数据源：东方财富行业研报
+DEFAULT_SOURCE = 'eastmoney:industry'
+
+# SQLite单条语句的参数上限较小，批量查询时分块
+_QUERY_CHUNK_SIZE = 500
+
+
+def ensure_crawl_state_tables(conn):
+    """创建水位线表和详情页状态表（已存在时不做任何操作）"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS crawl_watermarks (
+        source TEXT PRIMARY KEY,
+        last_date TEXT,
+        last_info_code TEXT,
+        updated_at TEXT
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS crawl_details (
+        url TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        content_hash TEXT,
+        fetched_at TEXT,
+        checked_at TEXT
+    )
+    ''')
+
+
+def content_hash(content):
+    """计算详情正文的哈希，忽略空白差异"""
+    normalized = ' '.join((content or '').split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec='seconds')
+
+
+class CrawlState:
+    """
+    单个数据源的增量爬取状态
+
+    Parameters:
+    -----------
+    db_path : str
+        数据库路径，状态表与reports表位于同一数据库
+    source : str
+        数据源名称，不同列表（如行业研报、个股研报）各自维护水位线
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, source=DEFAULT_SOURCE):
+        self.db_path = db_path
+        self.source = source
+        # 最近一次select_reports是否完整列到了水位线，列表中断时较早的研报可能缺失，不能推进水位线
+        self.listing_complete = False
+
+        conn = self._connect()
+        try:
+            ensure_crawl_state_tables(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return db_pool.connect(self.db_path, timeout=30)
+
+    def get_watermark(self):
+        """
+        读取水位线
+
+        返回:
+        dict: 包含last_date和last_info_code，尚未爬取过时返回None
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT last_date, last_info_code FROM crawl_watermarks WHERE source = ?', (self.source,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        return {'last_date': row[0], 'last_info_code': row[1]}
+
+    def known_links(self, links):
+        """
+        查询哪些链接已存在于reports表中
+
+        参数:
+        links (iterable): 研报链接
+
+        返回:
+        set: 已存在的链接
+        """
+        links = list(dict.fromkeys(link for link in links if link))
+        known = set()
+        conn = self._connect()
+        try:
+            for start in range(0, len(links), _QUERY_CHUNK_SIZE):
+                chunk = links[start:start + _QUERY_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(f'SELECT link FROM reports WHERE link IN ({placeholders})', chunk).fetchall()
+                known.update(row[0] for row in rows)
+        except sqlite3.Error as e:
+            logger.error(f"查询已有研报链接出错: {str(e)}")
+        finally:
+            conn.close()
+        return known
+
+    def select_reports(self, reports, limit=None):
+        """
+        从按发布时间倒序的研报列表中选出需要处理的研报
+
+        遇到发布日期早于水位线或infocode等于水位线的研报即停止迭代，传入的是分页生成器时后续页不会再请求。
+        新研报标记known=False；水位线当天已入库的研报标记known=True，由详情阶段通过条件请求判断是否变化。
+
+        参数:
+        reports (iterable): 研报字典，按发布时间倒序
+        limit (int): 最多返回多少条，优先保留较早的研报，使水位线可以逐步推进
+
+        返回:
+        list: 按发布时间正序排列的待处理研报
+        """
+        watermark = self.get_watermark()
+        listed = []
+        self.listing_complete = False
+        try:
+            for report in reports:
+                if watermark and self._reached_watermark(report, watermark):
+                    break
+                listed.append(report)
+            self.listing_complete = True
+        except Exception as e:
+            logger.error(f"获取研报列表中断，本次不推进水位线: {str(e)}")
+
+        known = self.known_links(report['link'] for report in listed)
+        seen = set()
+        candidates = []
+        for report in listed:
+            if report['link'] in seen:
+                continue
+            seen.add(report['link'])
+            report['known'] = report['link'] in known
+            candidates.append(report)
+
+        # 新研报即使曾抓取过详情（例如上次写入失败），也要重新完整获取
+        self.forget_details(report['link'] for report in candidates if not report['known'])
+
+        candidates.reverse()
+        if limit is not None and len(candidates) > limit:
+            candidates = candidates[:limit]
+
+        new_count = sum(1 for report in candidates if not report['known'])
+        logger.info(f"[{self.source}] 列出 {len(listed)} 条研报，新研报 {new_count} 条，"
+                    f"待复查 {len(candidates) - new_count} 条")
+        return candidates
+
+    @staticmethod
+    def _reached_watermark(report, watermark):
+        info_code = report.get('info_code')
+        if info_code and info_code == watermark['last_info_code']:
+            return True
+        date = report.get('date')
+        return bool(date and watermark['last_date'] and date < watermark['last_date'])
+
+    def advance_watermark(self, candidates):
+        """
+        按发布时间正序推进水位线，遇到第一条未入库的研报即停止，保证水位线之前的研报都已处理
+
+        参数:
+        candidates (list): select_reports返回的研报列表
+
+        返回:
+        dict: 推进后的水位线，没有推进时返回None
+        """
+        if not candidates or not self.listing_complete:
+            return None
+        stored = self.known_links(report['link'] for report in candidates)
+        newest = None
+        for report in candidates:
+            if report['link'] not in stored:
+                break
+            newest = report
+        if newest is None or not newest.get('date'):
+            return None
+
+        conn = self._connect()
+        try:
+            conn.execute('''
+            INSERT OR REPLACE INTO crawl_watermarks (source, last_date, last_info_code, updated_at)
+            VALUES (?, ?, ?, ?)
+            ''', (self.source, newest['date'], newest.get('info_code'), _now()))
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"更新爬取水位线出错: {str(e)}")
+            return None
+        finally:
+            conn.close()
+        logger.info(f"[{self.source}] 水位线推进到 {newest['date']} {newest.get('info_code') or ''}")
+        return {'last_date': newest['date'], 'last_info_code': newest.get('info_code')}
+
+    def conditional_headers(self, url):
+        """
+        生成详情页条件请求头
+
+        返回:
+        dict: If-None-Match和/或If-Modified-Since，没有记录时为空字典
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT etag, last_modified FROM crawl_details WHERE url = ?', (url,)).fetchone()
+        finally:
+            conn.close()
+        headers = {}
+        if row and row[0]:
+            headers['If-None-Match'] = row[0]
+        if row and row[1]:
+            headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def record_detail(self, url, content, etag=None, last_modified=None):
+        """
+        记录详情页的校验信息和正文哈希
+
+        参数:
+        url (str): 详情页地址
+        content (str): 提取出的正文
+        etag, last_modified (str): 响应头中的校验信息
+
+        返回:
+        bool: 正文是新的或与上次不同时返回True
+        """
+        digest = content_hash(content)
+        now = _now()
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT content_hash FROM crawl_details WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                # 启用增量爬取前已入库的研报没有正文哈希，首次记录作为基准，不视为变化
+                stored = conn.execute('SELECT 1 FROM reports WHERE link = ?', (url,)).fetchone()
+                changed = stored is None
+            else:
+                changed = row[0] != digest
+            conn.execute('''
+            INSERT OR REPLACE INTO crawl_details (url, etag, last_modified, content_hash, fetched_at, checked_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', (url, etag, last_modified, digest, now, now))
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"记录详情页状态出错: {str(e)}")
+            return True
+        finally:
+            conn.close()
+        return changed
+
+    def touch_detail(self, url):
+        """详情页返回304时只更新检查时间"""
+        conn = self._connect()
+        try:
+            conn.execute('UPDATE crawl_details SET checked_at = ? WHERE url = ?', (_now(), url))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def forget_details(self, urls):
+        """删除详情页状态，下次获取时不带条件请求头"""
+        urls = [url for url in urls if url]
+        if not urls:
+            return
+        conn = self._connect()
+        try:
+            conn.executemany('DELETE FROM crawl_details WHERE url = ?', [(url,) for url in urls])
+            conn.commit()
+        finally:
+            conn.close()
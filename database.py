@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 import sqlite3
+import db_pool
 import json
 import os
 import time
 from datetime import datetime
-import re
+import search_index
+import report_stats
+import prescorer
+import near_duplicate
+from analysis_parser import parse_analysis
 
 # 数据库文件名
 DB_FILE = 'research_reports.db'
@@ -13,10 +18,112 @@ def get_db_connection():
     """
     获取数据库连接
     """
-    conn = sqlite3.connect(DB_FILE)
+    conn = db_pool.connect(DB_FILE)
     conn.row_factory = sqlite3.Row  # 使结果以字典形式返回
     return conn
 
+# 批量保存时每个事务包含的研报数
+BULK_CHUNK_SIZE = 500
+
+STEP_NAMES = ['信息', '逻辑', '超预期', '催化剂', '结论']
+
+# 首页（无筛选条件）统计结果的缓存有效期（秒）
+SUMMARY_CACHE_SECONDS = float(os.environ.get('REPORTS_SUMMARY_CACHE_SECONDS', 60))
+
+# 数据库路径 -> (过期时间, 数据版本, 统计结果)
+_summary_cache = {}
+
+def _report_rows(report_data, now):
+    """
+    把一条研报及其分析结果整理为各表待插入的行
+    
+    返回:
+    tuple: (reports表的行, report_full_analysis表的行或None, analysis_results表的行列表)，
+           后两者不含report_id，插入研报后再补上
+    """
+    analysis = report_data.get('analysis', {})
+    # 提取分析摘要
+    completeness_score = analysis.get('summary', {}).get('completeness_score', 0)
+    
+    report_row = (
+        report_data.get('title', 'N/A'),
+        report_data.get('link', 'N/A'),
+        report_data.get('abstract', ''),
+        report_data.get('content_preview', ''),
+        report_data.get('full_content', ''),
+        report_data.get('industry', '未知'),
+        report_data.get('rating', ''),
+        report_data.get('org', ''),
+        report_data.get('date', ''),
+        report_data.get('analysis_method', ''),
+        completeness_score,
+        now,
+        now
+    )
+    
+    # 完整分析文本和一句话总结
+    full_analysis = report_data.get('full_analysis', '')
+    one_line_summary = analysis.get('summary', {}).get('one_line_summary', '')
+    full_analysis_row = (full_analysis, one_line_summary) if full_analysis or one_line_summary else None
+    
+    # 从Claude结果中提取五步框架梳理和可操作补强思路
+    framework_summaries = {}  # 用于存储各步骤的框架摘要
+    improvement_suggestions = ""  # 用于存储改进建议
+    
+    # 尝试从full_analysis中提取框架摘要
+    if full_analysis:
+        try:
+            # 与分析器共用解析结果，相同文本不会重复解析
+            parsed = parse_analysis(full_analysis)
+            framework_summaries = {name: step.framework_summary for name, step in parsed.steps.items()}
+            improvement_suggestions = parsed.improvement_text
+        except Exception as e:
+            print(f"从full_analysis提取框架摘要和改进建议时出错: {e}")
+    
+    step_rows = []
+    for step in STEP_NAMES:
+        if step in analysis:
+            step_data = analysis[step]
+            step_rows.append((
+                step,
+                1 if step_data.get('found', False) else 0,
+                json.dumps(step_data.get('keywords', []), ensure_ascii=False),
+                json.dumps(step_data.get('evidence', []), ensure_ascii=False),
+                step_data.get('description', ''),
+                framework_summaries.get(step, ''),  # 添加框架摘要
+                improvement_suggestions if step == '结论' else '',  # 只在结论步骤保存改进建议
+                step_data.get('step_score', 0)  # 添加步骤评分
+            ))
+    return report_row, full_analysis_row, step_rows
+
+INSERT_REPORT_SQL = '''
+INSERT OR REPLACE INTO reports (
+    title, link, abstract, content_preview, full_content, 
+    industry, rating, org, date, analysis_method, 
+    completeness_score, created_at, updated_at
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+INSERT_FULL_ANALYSIS_SQL = '''
+INSERT OR REPLACE INTO report_full_analysis (
+    report_id, full_analysis_text, one_line_summary
+) VALUES (?, ?, ?)
+'''
+
+INSERT_STEP_SQL = '''
+INSERT OR REPLACE INTO analysis_results (
+    report_id, step_name, found, keywords, evidence, description,
+    framework_summary, improvement_suggestions, step_score
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def _remove_from_indexes(conn, report_id):
+    # INSERT OR REPLACE会删除同链接的旧记录并分配新ID，需要同步清理旧ID的索引和聚合
+    search_index.remove_report(conn, report_id)
+    report_stats.remove_report(conn, report_id)
+    prescorer.remove_report(conn, report_id)
+    near_duplicate.remove_report(conn, report_id)
+
 def save_report_to_db(report_data):
     """
     保存单条研报及其分析结果到数据库
@@ -30,109 +137,34 @@ def save_report_to_db(report_data):
     conn = get_db_connection()
     try:
         now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # 提取分析摘要
-        completeness_score = report_data.get('analysis', {}).get('summary', {}).get('completeness_score', 0)
+        report_row, full_analysis_row, step_rows = _report_rows(report_data, now)
         
         # 插入研报数据
         cursor = conn.cursor()
-        cursor.execute('''
-        INSERT OR REPLACE INTO reports (
-            title, link, abstract, content_preview, full_content, 
-            industry, rating, org, date, analysis_method, 
-            completeness_score, created_at, updated_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            report_data.get('title', 'N/A'),
-            report_data.get('link', 'N/A'),
-            report_data.get('abstract', ''),
-            report_data.get('content_preview', ''),
-            report_data.get('full_content', ''),
-            report_data.get('industry', '未知'),
-            report_data.get('rating', ''),
-            report_data.get('org', ''),
-            report_data.get('date', ''),
-            report_data.get('analysis_method', ''),
-            completeness_score,
-            now,
-            now
-        ))
+        
+        existing_row = cursor.execute(
+            'SELECT id FROM reports WHERE link = ?', (report_data.get('link', 'N/A'),)
+        ).fetchone()
+        
+        cursor.execute(INSERT_REPORT_SQL, report_row)
         
         # 获取插入的研报ID
         report_id = cursor.lastrowid
         
         # 保存完整分析文本和一句话总结
-        full_analysis = report_data.get('full_analysis', '')
-        one_line_summary = report_data.get('analysis', {}).get('summary', {}).get('one_line_summary', '')
-        
-        if full_analysis or one_line_summary:
-            cursor.execute('''
-            INSERT OR REPLACE INTO report_full_analysis (
-                report_id, full_analysis_text, one_line_summary
-            ) VALUES (?, ?, ?)
-            ''', (
-                report_id,
-                full_analysis,
-                one_line_summary
-            ))
+        if full_analysis_row:
+            cursor.execute(INSERT_FULL_ANALYSIS_SQL, (report_id, *full_analysis_row))
         
         # 插入分析结果
-        analysis = report_data.get('analysis', {})
-        
-        # 从Claude结果中提取五步框架梳理和可操作补强思路
-        framework_summaries = {}  # 用于存储各步骤的框架摘要
-        improvement_suggestions = ""  # 用于存储改进建议
-        
-        # 尝试从full_analysis中提取框架摘要
-        if full_analysis:
-            try:
-                # 提取框架梳理部分
-                framework_section_match = re.search(r'## 五步框架梳理(.*?)##', full_analysis, re.DOTALL)
-                if framework_section_match:
-                    framework_section = framework_section_match.group(1)
-                    steps_mapping = {
-                        'Information': '信息',
-                        'Logic': '逻辑',
-                        'Beyond-Consensus': '超预期',
-                        'Catalyst': '催化剂',
-                        'Conclusion': '结论'
-                    }
-                    
-                    for eng_name, cn_name in steps_mapping.items():
-                        pattern = r'\| ' + re.escape(eng_name) + r' \|(.*?)\|'
-                        match = re.search(pattern, framework_section, re.DOTALL)
-                        if match:
-                            framework_summaries[cn_name] = match.group(1).strip()
-                
-                # 提取可操作补强思路部分
-                suggestions_match = re.search(r'## 可操作补强思路(.*?)##', full_analysis, re.DOTALL)
-                if suggestions_match:
-                    improvement_suggestions = suggestions_match.group(1).strip()
-            except Exception as e:
-                print(f"从full_analysis提取框架摘要和改进建议时出错: {e}")
+        cursor.executemany(INSERT_STEP_SQL, [(report_id, *row) for row in step_rows])
         
-        for step in ['信息', '逻辑', '超预期', '催化剂', '结论']:
-            if step in analysis:
-                step_data = analysis[step]
-                keywords_json = json.dumps(step_data.get('keywords', []), ensure_ascii=False)
-                evidence_json = json.dumps(step_data.get('evidence', []), ensure_ascii=False)
-                
-                conn.execute('''
-                INSERT OR REPLACE INTO analysis_results (
-                    report_id, step_name, found, keywords, evidence, description,
-                    framework_summary, improvement_suggestions, step_score
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    report_id,
-                    step,
-                    1 if step_data.get('found', False) else 0,
-                    keywords_json,
-                    evidence_json,
-                    step_data.get('description', ''),
-                    framework_summaries.get(step, ''),  # 添加框架摘要
-                    improvement_suggestions if step == '结论' else '',  # 只在结论步骤保存改进建议
-                    step_data.get('step_score', 0)  # 添加步骤评分
-                ))
+        # 同步全文索引和统计聚合
+        if existing_row and existing_row['id'] != report_id:
+            _remove_from_indexes(conn, existing_row['id'])
+        search_index.index_report(conn, report_id)
+        report_stats.refresh_report(conn, report_id)
+        prescorer.prescore_report(conn, report_id, report_data.get('full_content', ''))
+        near_duplicate.index_report(conn, report_id, report_data.get('full_content', ''))
         
         conn.commit()
         print(f"成功保存研报到数据库: {report_data.get('title')}")
@@ -144,6 +176,112 @@ def save_report_to_db(report_data):
     finally:
         conn.close()
 
+def _chunks(reports, size):
+    chunk = []
+    for report in reports:
+        chunk.append(report)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _save_chunk(conn, chunk):
+    # 在调用方的事务中写入一批研报，返回与chunk顺序一致的研报ID
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    prepared = [_report_rows(report_data, now) for report_data in chunk]
+    links = list(dict.fromkeys(report_row[1] for report_row, _, _ in prepared))
+    placeholders = ','.join('?' * len(links))
+    existing = dict(conn.execute(f'SELECT link, id FROM reports WHERE link IN ({placeholders})', links).fetchall())
+    
+    conn.executemany(INSERT_REPORT_SQL, [report_row for report_row, _, _ in prepared])
+    # executemany不返回每行的ID，按链接查回；同一批中重复的链接以最后一条为准
+    ids = dict(conn.execute(f'SELECT link, id FROM reports WHERE link IN ({placeholders})', links).fetchall())
+    report_ids = [ids[report_row[1]] for report_row, _, _ in prepared]
+    
+    conn.executemany(INSERT_FULL_ANALYSIS_SQL, [
+        (report_id, *full_analysis_row)
+        for report_id, (_, full_analysis_row, _) in zip(report_ids, prepared) if full_analysis_row
+    ])
+    conn.executemany(INSERT_STEP_SQL, [
+        (report_id, *step_row)
+        for report_id, (_, _, step_rows) in zip(report_ids, prepared) for step_row in step_rows
+    ])
+    
+    # 同步全文索引、统计聚合、预评分和近似重复签名；研报按ID顺序处理，较早的研报作为原研报
+    for link, old_id in existing.items():
+        if old_id != ids[link]:
+            _remove_from_indexes(conn, old_id)
+    contents = {report_id: report_row[4] for report_id, (report_row, _, _) in zip(report_ids, prepared)}
+    search_index.index_reports(conn, sorted(contents))
+    report_stats.refresh_reports(conn, sorted(contents))
+    near_duplicate.index_reports(conn, list(contents.items()))
+    prescorer.save_prescores(conn, list(zip(contents, prescorer.score_reports(list(contents.values())))))
+    return report_ids
+
+def _save_one(conn, report_data):
+    # 整批写入失败后逐条重试，每条一个事务，返回研报ID，出错时返回-1
+    try:
+        report_id = _save_chunk(conn, [report_data])[0]
+        conn.commit()
+        return report_id
+    except Exception as e:
+        conn.rollback()
+        print(f"保存研报到数据库时出错: {report_data.get('title')}: {e}")
+        return -1
+
+def bulk_save_reports(reports, chunk_size=BULK_CHUNK_SIZE):
+    """
+    批量保存研报及其分析结果到数据库
+    
+    在同一个连接上按chunk_size条一个事务写入，各表用executemany批量插入；
+    某一批出错时回滚该批并逐条重新写入，只有出错的研报保存失败
+    
+    参数:
+    reports (iterable): 研报数据字典，结构与save_report_to_db的参数相同
+    chunk_size (int): 每个事务包含的研报数
+    
+    返回:
+    dict: report_ids（与输入顺序一致的研报ID，写入失败的为-1）、saved（成功保存的研报数）、
+          batches（每批的研报数、成功保存数、是否整批写入成功和耗时）和seconds（总耗时）
+    """
+    started = time.perf_counter()
+    report_ids = []
+    batches = []
+    conn = get_db_connection()
+    try:
+        search_index.ensure_search_index(conn)
+        report_stats.ensure_stats_tables(conn)
+        prescorer.ensure_prescore_table(conn)
+        near_duplicate.ensure_near_duplicate_tables(conn)
+        conn.commit()
+        
+        for chunk in _chunks(reports, chunk_size):
+            batch_started = time.perf_counter()
+            try:
+                chunk_ids = _save_chunk(conn, chunk)
+                conn.commit()
+                ok = True
+            except Exception as e:
+                conn.rollback()
+                print(f"批量保存第 {len(batches) + 1} 批研报时出错，改为逐条保存: {e}")
+                chunk_ids = [_save_one(conn, report_data) for report_data in chunk]
+                ok = False
+            report_ids.extend(chunk_ids)
+            saved = sum(1 for report_id in chunk_ids if report_id != -1)
+            seconds = time.perf_counter() - batch_started
+            batches.append({'reports': len(chunk), 'saved': saved, 'ok': ok, 'seconds': round(seconds, 3)})
+            print(f"第 {len(batches)} 批 {len(chunk)} 条研报已保存 {saved} 条，耗时 {seconds:.2f} 秒")
+    finally:
+        conn.close()
+    
+    return {
+        'report_ids': report_ids,
+        'saved': sum(batch['saved'] for batch in batches),
+        'batches': batches,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
 def save_reports_to_db(reports):
     """
     批量保存研报列表到数据库
@@ -154,11 +292,7 @@ def save_reports_to_db(reports):
     返回:
     int: 成功保存的研报数量
     """
-    success_count = 0
-    for report in reports:
-        if save_report_to_db(report) > 0:
-            success_count += 1
-    return success_count
+    return bulk_save_reports(reports)['saved']
 
 def get_reports_from_db(limit=100, offset=0):
     """
@@ -244,6 +378,138 @@ def get_reports_from_db(limit=100, offset=0):
     finally:
         conn.close()
 
+# 列表页允许下推到SQL的筛选字段，均有对应索引（idx_reports_industry/org/rating/date）
+REPORT_FILTER_COLUMNS = ('industry', 'org', 'rating', 'date')
+
+# 列表页分页大小
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def _build_report_filter(filters):
+    """
+    根据筛选条件构建WHERE子句
+
+    参数:
+    filters (dict): 字段名到取值的映射，只接受REPORT_FILTER_COLUMNS中的字段
+
+    返回:
+    tuple: (条件列表, 参数列表)
+    """
+    conditions = []
+    params = []
+    for column, value in (filters or {}).items():
+        if column not in REPORT_FILTER_COLUMNS:
+            raise ValueError(f"不支持的筛选字段: {column}")
+        conditions.append(f"{column} = ?")
+        params.append(value)
+    return conditions, params
+
+def get_reports_page(filters=None, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    按键集（游标）分页获取研报列表，筛选条件在SQL中完成
+
+    结果按id倒序排列，游标为上一页最后一条研报的id。
+    筛选字段上的单列索引隐含rowid，因此“WHERE 字段 = ? AND id < ? ORDER BY id DESC”
+    可以直接沿索引读取一页数据，耗时与表大小无关。
+
+    参数:
+    filters (dict): 筛选条件，如 {'industry': '医药'}
+    cursor (int): 上一页最后一条研报的id，为None时从最新研报开始
+    page_size (int): 每页数量，会被限制在1到MAX_PAGE_SIZE之间
+
+    返回:
+    tuple: (研报字典列表, 下一页游标)，没有下一页时游标为None
+    """
+    page_size = max(1, min(int(page_size or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    conditions, params = _build_report_filter(filters)
+
+    if cursor is not None:
+        conditions.append("id < ?")
+        params.append(cursor)
+
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    conn = get_db_connection()
+    try:
+        # 多取一条用于判断是否还有下一页
+        rows = conn.execute(f'''
+        SELECT * FROM reports
+        {where_clause}
+        ORDER BY id DESC
+        LIMIT ?
+        ''', params + [page_size + 1]).fetchall()
+
+        reports = [dict(row) for row in rows[:page_size]]
+        next_cursor = reports[-1]['id'] if len(rows) > page_size else None
+        return reports, next_cursor
+    except Exception as e:
+        print(f"分页获取研报列表时出错: {e}")
+        return [], None
+    finally:
+        conn.close()
+
+def _summary_version(conn):
+    """
+    读取可在常数时间内得到的数据版本：最大研报ID，以及report_stats中的研报总数和评分总和
+
+    新增或重新保存研报会改变最大ID，删除研报和写入分析结果会改变聚合行
+    """
+    report_stats.ensure_stats_tables(conn)
+    max_id = conn.execute('SELECT MAX(id) FROM reports').fetchone()[0]
+    overall = conn.execute(
+        'SELECT report_count, score_sum FROM report_stats WHERE dimension = ? AND bucket = ?',
+        (report_stats.DIMENSION_OVERALL, 'all')
+    ).fetchone()
+    return max_id, tuple(overall) if overall else None
+
+def get_reports_summary(filters=None, keyword=None):
+    """
+    在SQL中统计筛选结果的数量、平均分和评分分布
+
+    没有筛选条件和关键词时（首页）结果会缓存SUMMARY_CACHE_SECONDS秒，
+    期间数据版本（见_summary_version）不变则直接返回缓存，不再对reports表全表聚合。
+
+    参数:
+    filters (dict): 筛选条件，与get_reports_page相同
+    keyword (str): 搜索关键词，给定时只统计命中搜索条件的研报
+
+    返回:
+    dict: 包含total、avg_score、score_excellent、score_good、score_average、score_poor
+    """
+    conditions, params = _build_report_filter(filters)
+    if keyword:
+        search_condition, search_params = search_index.build_search_condition(keyword)
+        conditions.append(search_condition)
+        params.extend(search_params)
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    conn = get_db_connection()
+    try:
+        version = None
+        if not conditions:
+            version = _summary_version(conn)
+            cached = _summary_cache.get(DB_FILE)
+            if cached and cached[0] > time.monotonic() and cached[1] == version:
+                return dict(cached[2])
+
+        # 统计列与搜索页共用，保证两处的评分区间一致
+        columns = ', '.join(f'{expression} AS {name}' for name, expression in search_index.SUMMARY_COLUMNS)
+        row = conn.execute(f'''
+        SELECT {columns}
+        FROM reports r
+        {where_clause}
+        ''', params).fetchone()
+
+        summary = {key: (row[key] or 0) for key in row.keys()}
+        if version is not None:
+            _summary_cache[DB_FILE] = (time.monotonic() + SUMMARY_CACHE_SECONDS, version, summary)
+        return dict(summary)
+    except Exception as e:
+        print(f"统计研报列表时出错: {e}")
+        return {'total': 0, 'avg_score': 0, 'score_excellent': 0, 'score_good': 0, 'score_average': 0, 'score_poor': 0}
+    finally:
+        conn.close()
+
 def get_report_by_id(report_id):
     """
     通过ID从数据库获取单条研报
@@ -405,13 +671,14 @@ def get_reports_by_industry(industry, limit=100):
     finally:
         conn.close()
 
-def search_reports(keyword, limit=100):
+def search_reports(keyword, limit=100, offset=0):
     """
-    搜索研报
+    搜索研报，结果按全文索引的BM25相关度排序
     
     参数:
     keyword (str): 搜索关键词
     limit (int): 结果限制数量
+    offset (int): 跳过的结果数量，用于分页
     
     返回:
     list: 搜索结果列表
@@ -420,21 +687,22 @@ def search_reports(keyword, limit=100):
     try:
         cursor = conn.cursor()
         
-        # 构建搜索模式
-        search_pattern = f"%{keyword}%"
+        # 通过全文索引获取按相关度排序的研报ID
+        hits, _ = search_index.search_report_ids(conn, keyword, limit=limit, offset=offset)
+        ids = [report_id for report_id, _ in hits]
+        if not ids:
+            return []
         
-        # 搜索研报
-        rows = cursor.execute('''
-        SELECT * FROM reports
-        WHERE title LIKE ? OR abstract LIKE ? OR industry LIKE ? OR full_content LIKE ?
-        ORDER BY id DESC
-        LIMIT ?
-        ''', (search_pattern, search_pattern, search_pattern, search_pattern, limit)).fetchall()
+        rows_by_id = {row['id']: row for row in cursor.execute(
+            f"SELECT * FROM reports WHERE id IN ({','.join('?' for _ in ids)})", ids
+        ).fetchall()}
+        rows = [rows_by_id[report_id] for report_id in ids if report_id in rows_by_id]
         
         reports = []
         for row in rows:
             report = dict(row)
             report_id = row['id']
+            report['snippet'] = search_index.make_snippet(report, keyword)
             
             # 获取研报的分析结果
             analysis_rows = cursor.execute('''
@@ -556,7 +824,7 @@ def export_to_json(json_file='exported_reports.json'):
     """
     try:
         # 修改连接以使用标准字典
-        conn = sqlite3.connect(DB_FILE)
+        conn = db_pool.connect(DB_FILE)
         # 使用自定义的 row factory 函数，将 Row 对象转换为 dict
         conn.row_factory = lambda cursor, row: {col[0]: row[idx] for idx, col in enumerate(cursor.description)}
         
@@ -6,6 +6,7 @@
 """
 
 import sqlite3
+import db_pool
 import os
 import sys
 import logging
@@ -28,7 +29,7 @@ DB_FILE = 'research_reports.db'
 
 def get_db_connection():
     """获取数据库连接"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = db_pool.connect(DB_FILE)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -166,7 +167,6 @@ def optimize_database():
 def backup_database():
     """备份数据库"""
     try:
-        import shutil
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         backup_dir = 'database_backups'
         
@@ -175,7 +175,7 @@ def backup_database():
             os.makedirs(backup_dir)
         
         backup_file = os.path.join(backup_dir, f'research_reports_{timestamp}.db')
-        shutil.copy2(DB_FILE, backup_file)
+        db_pool.backup(DB_FILE, backup_file)
         
         # 清理旧备份，只保留最近5个
         backup_files = sorted([os.path.join(backup_dir, f) for f in os.listdir(backup_dir) 
@@ -6,11 +6,11 @@
 """
 
 import sqlite3
+import db_pool
 import logging
 import sys
 import os
 from datetime import datetime
-import shutil
 
 # 设置日志
 logging.basicConfig(
@@ -27,7 +27,7 @@ DB_FILE = 'research_reports.db'
 
 def get_db_connection():
     """获取数据库连接"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = db_pool.connect(DB_FILE)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -39,7 +39,7 @@ def create_backup():
             os.makedirs(backup_dir)
             
         backup_name = f"{backup_dir}/research_reports_before_migration_{datetime.now().strftime('%Y%m%d%H%M%S')}.db"
-        shutil.copy2(DB_FILE, backup_name)
+        db_pool.backup(DB_FILE, backup_name)
         logger.info(f"已创建数据库备份: {backup_name}")
         return True
     except Exception as e:
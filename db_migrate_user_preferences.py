@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import sqlite3
+import db_pool
 import json
 import os
 import sys
@@ -18,7 +19,7 @@ def migrate():
         print(f"错误：数据库文件 {db_path} 不存在")
         sys.exit(1)
         
-    conn = sqlite3.connect(db_path)
+    conn = db_pool.connect(db_path)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
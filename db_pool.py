@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite连接管理层
+所有模块通过connect()获取数据库连接，用法与sqlite3.connect相同；调用close()时连接回滚未提交的事务后
+归还给当前线程的空闲连接池，同一线程（Flask的请求线程、工作进程、爬虫流水线的各阶段线程）之后的调用直接复用，
+连同连接内已编译语句的缓存。嵌套使用时空闲池为空，另开一个连接，互不影响事务。
+新连接统一设置WAL日志（读取不再被爬虫的写入阻塞）、synchronous=NORMAL、页缓存、mmap和忙等待超时；
+同时按数据库统计连接的打开、复用、占用数和获取/持有耗时
+"""
+
+import os
+import time
+import atexit
+import sqlite3
+import threading
+import logging
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = 'research_reports.db'
+
+# 等待其他连接释放锁的最长秒数
+BUSY_TIMEOUT = float(os.environ.get('DB_BUSY_TIMEOUT', 30))
+
+# 每个连接的页缓存大小（KB）
+CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', 20000))
+
+# 内存映射读取的最大字节数，默认256MB
+MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024))
+
+# 每个线程为每个数据库保留的空闲连接数，超出的连接直接关闭
+MAX_IDLE_PER_THREAD = int(os.environ.get('DB_MAX_IDLE_PER_THREAD', 4))
+
+# 每个连接缓存的已编译语句数
+CACHED_STATEMENTS = 256
+
+# 不放入连接池的数据库：内存数据库每个连接各自独立
+_UNPOOLED_PATHS = frozenset(['', ':memory:'])
+
+# 按数据库统计的连接指标
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+class PooledConnection(sqlite3.Connection):
+    """close()时归还连接池的sqlite3连接，discard()才真正关闭"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool_key = None
+        self._acquired_at = None
+        self._busy_timeout = None
+
+    def close(self):
+        if self._pool_key is None:
+            super().close()
+        elif self._acquired_at is not None:
+            _release(self)
+
+    def discard(self):
+        """关闭连接，不再放回连接池"""
+        super().close()
+
+
+class _ThreadConnections:
+    """单个线程的空闲连接，线程结束时随线程局部数据一起释放并关闭"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.idle = {}
+
+    def close_all(self):
+        for key, connections in self.idle.items():
+            for conn in connections:
+                try:
+                    conn.discard()
+                except Exception:
+                    pass
+            _update(key, idle=-len(connections), closed=len(connections))
+        self.idle = {}
+
+    def __del__(self):
+        # 从父进程fork继承的连接不能在子进程中关闭；解释器退出时模块可能已部分卸载，忽略出错
+        try:
+            if self.pid == os.getpid():
+                self.close_all()
+        except Exception:
+            pass
+
+
+_local = threading.local()
+
+
+def _thread_connections():
+    connections = getattr(_local, 'connections', None)
+    if connections is None or connections.pid != os.getpid():
+        if connections is not None:
+            # fork出的子进程中丢弃父进程的连接，不关闭也不计入指标
+            connections.idle = {}
+        connections = _local.connections = _ThreadConnections()
+    return connections
+
+
+def _update(key, **deltas):
+    with _metrics_lock:
+        stats = _metrics.setdefault(key, {
+            'opened': 0, 'closed': 0, 'acquired': 0, 'reused': 0, 'released': 0,
+            'in_use': 0, 'peak_in_use': 0, 'idle': 0,
+            'acquire_seconds': 0.0, 'max_acquire_seconds': 0.0, 'held_seconds': 0.0, 'max_held_seconds': 0.0
+        })
+        for name, value in deltas.items():
+            if name.startswith('max_'):
+                stats[name] = max(stats[name], value)
+            else:
+                stats[name] += value
+        stats['peak_in_use'] = max(stats['peak_in_use'], stats['in_use'])
+
+
+def _configure(conn, db_path):
+    conn.execute(f'PRAGMA busy_timeout = {int(BUSY_TIMEOUT * 1000)}')
+    if db_path not in _UNPOOLED_PATHS:
+        # WAL模式保存在数据库文件中，只读文件系统等情况下设置失败时沿用原日志模式
+        try:
+            conn.execute('PRAGMA journal_mode = WAL')
+        except sqlite3.OperationalError as e:
+            logger.warning(f"数据库 {db_path} 无法切换到WAL模式: {str(e)}")
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+
+
+def _open(db_path):
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, factory=PooledConnection, check_same_thread=False,
+                           cached_statements=CACHED_STATEMENTS)
+    _configure(conn, db_path)
+    conn._busy_timeout = BUSY_TIMEOUT
+    return conn
+
+
+def connect(db_path=DEFAULT_DB_PATH, timeout=None, isolation_level=''):
+    """
+    获取数据库连接，优先复用当前线程的空闲连接
+
+    参数:
+    db_path (str): 数据库文件路径
+    timeout (float): 本次使用时的忙等待秒数，默认BUSY_TIMEOUT
+    isolation_level (str): 同sqlite3.connect，None表示由调用方显式控制事务
+
+    返回:
+    PooledConnection: 用法与sqlite3.Connection相同，用完调用close()归还
+    """
+    if db_path in _UNPOOLED_PATHS:
+        conn = _open(db_path)
+        conn.isolation_level = isolation_level
+        return conn
+
+    started = time.monotonic()
+    key = os.path.abspath(db_path)
+    idle = _thread_connections().idle.setdefault(key, [])
+    reused = bool(idle)
+    conn = idle.pop() if reused else _open(db_path)
+
+    timeout = BUSY_TIMEOUT if timeout is None else timeout
+    if conn._busy_timeout != timeout:
+        conn.execute(f'PRAGMA busy_timeout = {int(timeout * 1000)}')
+        conn._busy_timeout = timeout
+    conn.isolation_level = isolation_level
+    conn._pool_key = key
+    conn._acquired_at = time.monotonic()
+
+    elapsed = conn._acquired_at - started
+    _update(key, acquired=1, reused=int(reused), opened=int(not reused), in_use=1, idle=-int(reused),
+            acquire_seconds=elapsed, max_acquire_seconds=elapsed)
+    return conn
+
+
+def _release(conn):
+    key = conn._pool_key
+    held = time.monotonic() - conn._acquired_at
+    conn._acquired_at = None
+
+    idle = _thread_connections().idle.setdefault(key, [])
+    keep = len(idle) < MAX_IDLE_PER_THREAD
+    try:
+        # 与sqlite3关闭连接时一样丢弃未提交的修改
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = None
+        conn.isolation_level = ''
+    except sqlite3.Error as e:
+        logger.warning(f"归还数据库连接时出错，已关闭连接: {str(e)}")
+        keep = False
+
+    if keep:
+        idle.append(conn)
+    else:
+        conn.discard()
+    _update(key, in_use=-1, released=1, idle=int(keep), closed=int(not keep), held_seconds=held,
+            max_held_seconds=held)
+
+
+def close_idle():
+    """关闭当前线程的全部空闲连接"""
+    _thread_connections().close_all()
+
+
+atexit.register(close_idle)
+
+
+def backup(db_path, dest_path):
+    """
+    用SQLite在线备份接口复制数据库
+
+    WAL模式下最近提交的数据可能还在-wal文件中，直接复制数据库文件会丢失这部分数据
+    """
+    conn = connect(db_path)
+    try:
+        dest = sqlite3.connect(dest_path)
+        try:
+            conn.backup(dest)
+        finally:
+            dest.close()
+    finally:
+        conn.close()
+
+
+def get_metrics():
+    """
+    按数据库统计的连接指标
+
+    返回:
+    dict: 数据库路径到opened、closed、acquired、reused、reuse_rate、in_use、peak_in_use、idle、
+          avg_acquire_ms、max_acquire_ms、avg_held_ms、max_held_ms的映射
+    """
+    with _metrics_lock:
+        result = {}
+        for key, stats in _metrics.items():
+            acquired = stats['acquired']
+            released = stats['released']
+            result[key] = {
+                'opened': stats['opened'],
+                'closed': stats['closed'],
+                'acquired': acquired,
+                'reused': stats['reused'],
+                'reuse_rate': round(stats['reused'] / acquired, 3) if acquired else 0,
+                'in_use': stats['in_use'],
+                'peak_in_use': stats['peak_in_use'],
+                'idle': stats['idle'],
+                'avg_acquire_ms': round(stats['acquire_seconds'] * 1000 / acquired, 3) if acquired else 0,
+                'max_acquire_ms': round(stats['max_acquire_seconds'] * 1000, 3),
+                'avg_held_ms': round(stats['held_seconds'] * 1000 / released, 3) if released else 0,
+                'max_held_ms': round(stats['max_held_seconds'] * 1000, 3)
+            }
+        return result
+
+
+def reset_metrics():
+    """清空连接指标中的累计值，保留当前的占用数和空闲数"""
+    with _metrics_lock:
+        for stats in _metrics.values():
+            for name in stats:
+                if name not in ('in_use', 'idle'):
+                    stats[name] = 0
+            stats['peak_in_use'] = stats['in_use']
@@ -6,7 +6,10 @@
 """
 
 import sqlite3
+import db_pool
 import json
+import search_index
+import report_stats
 import logging
 import os
 import sys
@@ -27,7 +30,7 @@ DB_FILE = 'research_reports.db'
 
 def get_db_connection():
     """获取数据库连接"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = db_pool.connect(DB_FILE)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -49,6 +52,7 @@ def repair_analysis_data():
         # 2. 检查每个研报的分析数据是否完整
         fixed_count = 0
         created_placeholder = 0
+        repaired_ids = []
         
         for report_id in report_ids:
             # 检查新系统中是否有分析数据
@@ -67,6 +71,7 @@ def repair_analysis_data():
             if new_analysis and not old_analysis:
                 sync_new_to_old(conn, report_id)
                 fixed_count += 1
+                repaired_ids.append(report_id)
                 print(f"研报ID {report_id} 从新系统同步到旧系统")  # 直接打印到控制台
                 logger.info(f"研报ID {report_id} 从新系统同步到旧系统")
                 
@@ -74,6 +79,7 @@ def repair_analysis_data():
             elif old_analysis and not new_analysis:
                 sync_old_to_new(conn, report_id)
                 fixed_count += 1
+                repaired_ids.append(report_id)
                 print(f"研报ID {report_id} 从旧系统同步到新系统")  # 直接打印到控制台
                 logger.info(f"研报ID {report_id} 从旧系统同步到新系统")
                 
@@ -81,9 +87,14 @@ def repair_analysis_data():
             elif not new_analysis and not old_analysis:
                 create_placeholder_analysis(conn, report_id)
                 created_placeholder += 1
+                repaired_ids.append(report_id)
                 print(f"研报ID {report_id} 创建了占位分析记录")  # 直接打印到控制台
                 logger.info(f"研报ID {report_id} 创建了占位分析记录")
         
+        # 与AnalysisDatabase写入分析结果时一样，同步刷新全文索引和统计聚合
+        search_index.index_reports(conn, repaired_ids)
+        report_stats.refresh_reports(conn, repaired_ids)
+        
         conn.commit()
         print(f"成功修复 {fixed_count} 条研报的分析数据")  # 直接打印到控制台
         print(f"为 {created_placeholder} 条研报创建了占位分析记录")  # 直接打印到控制台
@@ -360,9 +371,8 @@ if __name__ == "__main__":
     
     # 创建备份
     try:
-        import shutil
         backup_name = f"research_reports_backup_{datetime.now().strftime('%Y%m%d%H%M%S')}.db"
-        shutil.copy2(DB_FILE, backup_name)
+        db_pool.backup(DB_FILE, backup_name)
         print(f"已创建数据库备份: {backup_name}")  # 直接打印到控制台
         logger.info(f"已创建数据库备份: {backup_name}")
     except Exception as e:
@@ -8,31 +8,168 @@ import json
 import re
 import tempfile
 import subprocess
+import asyncio
 import requests  # 使用requests库直接调用API
 from contextlib import contextmanager
 import time
 from datetime import datetime
+from llm_cache import get_default_cache, make_cache_key
+from deepseek_client import DeepSeekClient, get_http_session, backoff_delay, parse_retry_after, iter_stream_content
+from content_compactor import compact, DEFAULT_TOKEN_BUDGET
+from analysis_parser import AnalysisParser, parse_analysis, parse_analysis_json
+from analyzer_registry import ReportAnalyzer, default_provider, get_latency_histogram
 
-class DeepSeekAnalyzer:
-    """使用DeepSeek API进行研报五步法分析的分析器"""
+# 正文不超过此字符数的研报视为短研报，可以合并到一次批量请求中分析
+BATCH_MAX_CONTENT_CHARS = int(os.environ.get('ANALYSIS_BATCH_MAX_CHARS', 500))
+
+# 每次批量请求最多包含的研报数
+BATCH_SIZE = int(os.environ.get('ANALYSIS_BATCH_SIZE', 4))
+
+# 批量请求的输出token上限，按每篇研报2000个token计算，不超过此值
+BATCH_MAX_TOKENS = 8000
+
+# 批量请求和回复中每篇研报开头的分隔行
+BATCH_MARKER = "===== 研报 {} ====="
+_BATCH_MARKER_PATTERN = re.compile(r'^[ \t#*]*=+[ \t]*研报[ \t]*(\d+)[ \t]*=+[ \t*]*$', re.M)
+
+# 五步法分析结果的格式要求，单篇和批量分析的提示词共用
+ANALYSIS_FORMAT = """## 体检清单
+| 五步要素 | 是否覆盖 | 快评 |
+| ------- | ------- | ---- |
+| 信息 | [是/否] | [简要评价] |
+| 逻辑 | [是/否] | [简要评价] |
+| 超预期 | [是/否] | [简要评价] |
+| 催化剂 | [是/否] | [简要评价] |
+| 结论 | [是/否] | [简要评价] |
+
+## 五步框架梳理
+| 步骤 | 核心内容提炼 |
+| ---- | ------------ |
+| Information | [报告中的关键信息点] |
+| Logic | [报告的逻辑推理链] |
+| Beyond-Consensus | [超出市场预期的观点] |
+| Catalyst | [报告中提到的催化剂] |
+| Conclusion | [报告的主要结论] |
+
+## 可操作补强思路
+| 待完善点 | 建议 |
+| ------- | ---- |
+| [缺失点1] | [具体建议] |
+| [缺失点2] | [具体建议] |
+| [缺失点3] | [具体建议] |
+
+## 一句话总结
+[简明扼要的总体评价]
+
+## 五步法定量评分
+| 步骤 | 分数(0-100) | 评价 |
+| ---- | ----------- | ---- |
+| 信息 | [分数] | [简短评价] |
+| 逻辑 | [分数] | [简短评价] |
+| 超预期 | [分数] | [简短评价] |
+| 催化剂 | [分数] | [简短评价] |
+| 结论 | [分数] | [简短评价] |
+| 总分 | [加权平均分] | [总体评价] |
+"""
+
+
+# 分析结果格式：markdown为五个markdown表格（流式分析和批量分析固定使用），json为紧凑的JSON对象
+OUTPUT_MARKDOWN = 'markdown'
+OUTPUT_JSON = 'json'
+DEFAULT_OUTPUT_FORMAT = os.environ.get('ANALYSIS_OUTPUT_FORMAT', OUTPUT_MARKDOWN)
+
+# JSON格式分析结果的字段要求，省去表头、分隔行和各步骤评分的评价列
+ANALYSIS_JSON_FORMAT = """{"steps": {
+  "信息": {"found": true或false, "comment": "简要评价", "framework": "报告中的关键信息点", "score": 0-100的整数},
+  "逻辑": {"found": ..., "comment": "...", "framework": "报告的逻辑推理链", "score": ...},
+  "超预期": {"found": ..., "comment": "...", "framework": "超出市场预期的观点", "score": ...},
+  "催化剂": {"found": ..., "comment": "...", "framework": "报告中提到的催化剂", "score": ...},
+  "结论": {"found": ..., "comment": "...", "framework": "报告的主要结论", "score": ...}},
+ "suggestions": [{"point": "缺失点", "advice": "具体建议"}],
+ "summary": "简明扼要的一句话总结",
+ "total_score": 加权平均分,
+ "evaluation": "总体评价"}"""
+
+
+def split_batch_response(text, count):
+    """
+    按分隔行把批量分析的回复拆分为单篇研报的分析文本
+    
+    只返回通过校验的研报：序号在1~count之间且只出现一次，并且分析内容完整。
     
-    def __init__(self):
-        """初始化DeepSeek分析器"""
+    Parameters:
+    -----------
+    text : str
+        批量请求的回复文本
+    count : int
+        批量请求中的研报数
+        
+    Returns:
+    --------
+    dict
+        {序号: 分析文本}
+    """
+    parts = {}
+    duplicated = set()
+    markers = list(_BATCH_MARKER_PATTERN.finditer(text or ''))
+    for marker, following in zip(markers, markers[1:] + [None]):
+        position = int(marker.group(1))
+        if position in parts:
+            duplicated.add(position)
+        parts[position] = text[marker.end():following.start() if following else len(text)].strip()
+    
+    return {
+        position: part for position, part in parts.items()
+        if 1 <= position <= count and position not in duplicated and parse_analysis(part).complete
+    }
+
+
+class DeepSeekAnalyzer(ReportAnalyzer):
+    """使用DeepSeek API（或其他兼容chat completions接口的服务商）进行研报五步法分析的分析器"""
+    
+    def __init__(self, output_format=None, provider=None):
+        """
+        初始化DeepSeek分析器
+        
+        Parameters:
+        -----------
+        output_format : str, optional
+            analyze_with_five_steps请求的结果格式，'markdown'或'json'，默认取ANALYSIS_OUTPUT_FORMAT环境变量
+        provider : analyzer_registry.ProviderConfig, optional
+            服务商接口配置，默认由DEEPSEEK_*环境变量构成
+        """
         print("初始化DeepSeek五步法分析器")
         
+        provider = provider or default_provider()
+        # 分析结果按此类型保存到report_analysis
+        self.analyzer_type = provider.analyzer_type
+        
         # 初始化API密钥
-        self.api_key = os.environ.get("DEEPSEEK_API_KEY")
+        self.api_key = provider.api_key
         if not self.api_key:
             # 警告用户需要设置API密钥
-            print("警告: 未设置DEEPSEEK_API_KEY环境变量，请在.env文件中设置或直接导出环境变量")
+            print(f"警告: 未设置 {self.analyzer_type} 的API密钥，请在.env文件中设置或直接导出环境变量")
             self.api_key = "YOUR_DEEPSEEK_API_KEY"  # 使用占位符
         
-        self.base_url = os.environ.get("DEEPSEEK_API_URL", "https://api.deepseek.com/v1/chat/completions")
+        self.base_url = provider.api_url
+        self.model = provider.model
+        self.timeout = provider.timeout
+        
+        # 请求延迟直方图，对冲分析器据此决定何时向下一个服务商发出请求
+        self.latency = get_latency_histogram(self.analyzer_type)
         
         # 添加system_prompt属性
         self.system_prompt = "你是一个专业的投研助手，请使用黄燕铭五步分析法分析研报，并提供详细的分析结果。"
+        
+        # 相同请求直接复用缓存的API响应
+        self.cache = get_default_cache()
+        
+        # 研报正文在此token预算内压缩后发送
+        self.token_budget = DEFAULT_TOKEN_BUDGET
+        
+        self.output_format = output_format or DEFAULT_OUTPUT_FORMAT
     
-    def analyze_with_five_steps(self, report_title, report_content, industry=None):
+    def analyze_with_five_steps(self, report_title, report_content, industry=None, force_refresh=False):
         """
         使用DeepSeek对研报内容进行五步法分析
         
@@ -44,6 +181,8 @@ class DeepSeekAnalyzer:
             研报内容正文
         industry : str, optional
             行业分类，用于提供更具针对性的分析
+        force_refresh : bool, optional
+            为True时跳过缓存，强制重新调用API
             
         Returns:
         --------
@@ -51,8 +190,14 @@ class DeepSeekAnalyzer:
             包含五步法分析结果的字典，并包含完整的分析文本
         """
         try:
+            if self.output_format == OUTPUT_JSON:
+                structured_result = self._analyze_json(report_title, report_content, industry, force_refresh)
+                if structured_result is not None:
+                    return structured_result
+                print("JSON格式分析结果无效，改用markdown格式重新分析")
+            
             # 使用DeepSeek进行分析
-            analysis_text = self._ask_deepseek(report_title, report_content, industry)
+            analysis_text = self._ask_deepseek(report_title, report_content, industry, force_refresh=force_refresh)
             
             # 将文本分析结果转换为结构化数据
             structured_result = self._parse_analysis(analysis_text)
@@ -67,281 +212,476 @@ class DeepSeekAnalyzer:
             # 出错时返回简单的分析结果
             return self._generate_fallback_analysis()
     
-    def _ask_deepseek(self, report_title, report_content, industry=None):
+    def stream_five_steps(self, report_title, report_content, industry=None, force_refresh=False):
         """
-        向DeepSeek API发送请求并获取回复，添加重试机制
+        流式五步法分析，边接收模型输出边解析
+        
+        请求与analyze_with_five_steps相同（共用响应缓存），但使用流式响应，
+        每个表格行和小节一生成就产出对应事件，不必等待完整回复。
+        
+        Parameters:
+        -----------
+        report_title : str
+            研报标题
+        report_content : str
+            研报内容正文
+        industry : str, optional
+            行业分类
+        force_refresh : bool, optional
+            为True时跳过缓存，强制重新调用API
+            
+        Yields:
+        -------
+        dict
+            event字段为delta（增量文本）、row（表格行）、section（完整小节）、
+            done（result为与analyze_with_five_steps相同的结构化结果）或error（message为错误信息）
+        """
+        data = self._build_analysis_request(report_title, report_content, industry)
+        cache_key = self._analysis_cache_key(data)
+        
+        cached_text = None if force_refresh else self.cache.get(cache_key)
+        if cached_text:
+            print("命中DeepSeek响应缓存，跳过API调用。")
+            deltas = [cached_text]
+        else:
+            deltas = self._stream_deepseek(data)
+        
+        parser = AnalysisParser()
+        try:
+            for delta in deltas:
+                yield {'event': 'delta', 'text': delta}
+                yield from parser.feed(delta)
+            yield from parser.close()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"DeepSeek流式分析过程中出错: {str(e)}")
+            yield {'event': 'error', 'message': str(e)}
+            return
+        
+        analysis_text = parser.parsed.text
+        if not analysis_text.strip():
+            yield {'event': 'error', 'message': 'DeepSeek API返回了空的分析结果'}
+            return
+        
+        # 只缓存五个步骤和一句话总结齐全的回复，被截断或格式不对的回复下次重新请求
+        if not cached_text and parser.parsed.complete:
+            self.cache.set(cache_key, analysis_text, model=data["model"])
+        # 流式解析时已得到完整的解析结果，不再重新解析
+        yield {'event': 'done', 'result': parser.parsed.to_result(evaluate=self._get_evaluation_from_score)}
+    
+    def _analyze_json(self, report_title, report_content, industry=None, force_refresh=False, max_attempts=2):
+        """
+        以JSON格式请求五步法分析，校验字段后直接转换为结构化结果
+        
+        只有通过校验的回复才写入缓存；回复不合格时重新请求，
+        max_attempts次都不合格或请求失败时返回None，由调用方改用markdown格式分析。
         """
         if not self.api_key:
             raise ValueError("DeepSeek API密钥未设置")
         
-        url = "https://api.deepseek.com/v1/chat/completions"
-        
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
         
-        # 准备详细提示词
-        industry_context = f"该研报属于{industry}行业" if industry else ""
-        
-        detailed_prompt = f"""
-请使用黄燕铭五步分析法分析以下研报，并按照指定格式返回结果。
+        prompt = f"""
+请使用黄燕铭五步分析法分析以下研报，只返回一个JSON对象，不要输出JSON以外的任何内容。
 
-研报标题: {report_title}
-{industry_context}
+{self._report_block(report_title, report_content, industry)}
 
-研报内容:
-{report_content[:1000]}...
+JSON对象格式如下，steps必须包含全部五个步骤，found表示研报是否覆盖该步骤，suggestions给出2-3条:
+{ANALYSIS_JSON_FORMAT}"""
+        data = self._chat_request(prompt, max_tokens=2000)
+        data["response_format"] = {"type": "json_object"}
+        cache_key = self._analysis_cache_key(data)
+        
+        for attempt in range(max_attempts):
+            # 缓存中的回复写入前已校验过，只在第一次尝试时使用
+            cached_text = self.cache.get(cache_key) if attempt == 0 and not force_refresh else None
+            if cached_text:
+                print("命中DeepSeek响应缓存，跳过API调用。")
+                response_text = cached_text
+            else:
+                response_text = self._post_chat(data, headers)
+                if response_text is None:
+                    return None
+            
+            try:
+                parsed = parse_analysis_json(response_text)
+            except ValueError as e:
+                print(f"DeepSeek返回的JSON分析结果不合格 (尝试 {attempt+1}/{max_attempts}): {str(e)}")
+                continue
+            
+            if not cached_text:
+                self.cache.set(cache_key, response_text, model=data["model"])
+            # full_analysis为按markdown格式生成的分析文本，页面展示和保存时与markdown格式相同
+            return parsed.to_result(evaluate=self._get_evaluation_from_score)
+        
+        return None
+    
+    def _stream_deepseek(self, data):
+        """
+        以流式响应调用DeepSeek API，逐个产出增量文本
+        
+        只在收到第一段内容之前重试；之后出错直接抛出，避免调用方收到重复的文本。
+        """
+        if not self.api_key:
+            raise ValueError("DeepSeek API密钥未设置")
+        
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        payload = dict(data, stream=True)
+        
+        max_retries = 3
+        for attempt in range(max_retries):
+            received = False
+            try:
+                # 读超时按两段内容之间的间隔计算，而不是整个回复的耗时
+                with get_http_session().post(self.base_url, headers=headers, json=payload,
+                                             stream=True, timeout=(10, 60)) as response:
+                    response.raise_for_status()
+                    for delta in iter_stream_content(response.iter_lines()):
+                        received = True
+                        yield delta
+                return
+            except requests.exceptions.RequestException as e:
+                if received or attempt == max_retries - 1:
+                    raise
+                delay = backoff_delay(attempt, self._retry_after(e))
+                print(f"调用 DeepSeek 流式API时出错 (尝试 {attempt+1}/{max_retries}): {str(e)}，等待 {delay:.1f} 秒后重试...")
+                time.sleep(delay)
+    
+    def analyze_many(self, reports, max_concurrency=4, requests_per_second=1.0, force_refresh=False, on_result=None):
+        """
+        使用异步客户端并发分析多篇研报，共享一个连接池并统一限速
+        
+        Parameters:
+        -----------
+        reports : list
+            研报字典列表，每项包含title、content和可选的industry
+        max_concurrency : int, optional
+            同时进行的API请求数
+        requests_per_second : float, optional
+            初始请求速率，遇到429时自动下调
+        force_refresh : bool, optional
+            为True时跳过缓存
+        on_result : callable, optional
+            每完成一篇研报时以(序号, 分析结果)调用，可用于边分析边保存
+            
+        Returns:
+        --------
+        list
+            按完成顺序排列的(序号, 分析结果)列表，序号对应reports中的位置
+        """
+        return asyncio.run(self._analyze_many_async(
+            reports, max_concurrency, requests_per_second, force_refresh, on_result
+        ))
+    
+    async def _analyze_many_async(self, reports, max_concurrency, requests_per_second, force_refresh, on_result):
+        results = []
+        
+        def _emit(index, result):
+            results.append((index, result))
+            if on_result:
+                on_result(index, result)
+        
+        # 先处理缓存命中的研报，其余研报提交给异步客户端
+        pending = []
+        for index, report in enumerate(reports):
+            data = self._build_analysis_request(report.get('title', ''), report.get('content', ''), report.get('industry'))
+            cache_key = self._analysis_cache_key(data)
+            cached_text = None if force_refresh else self.cache.get(cache_key)
+            if cached_text:
+                _emit(index, self._build_structured_result(cached_text))
+            else:
+                pending.append((index, data, cache_key))
+        
+        if not pending:
+            return results
+        
+        async with DeepSeekClient(api_key=self.api_key, base_url=self.base_url,
+                                  max_concurrency=max_concurrency,
+                                  requests_per_second=requests_per_second) as client:
+            chat_requests = [
+                {"messages": data["messages"], "temperature": data["temperature"],
+                 "max_tokens": data["max_tokens"], "model": data["model"]}
+                for _, data, _ in pending
+            ]
+            async for position, response in client.analyze_many(chat_requests):
+                index, data, cache_key = pending[position]
+                if isinstance(response, Exception):
+                    print(f"DeepSeek批量分析第 {index+1} 篇研报时出错: {str(response)}")
+                    _emit(index, self._generate_fallback_analysis())
+                    continue
+                if parse_analysis(response).complete:
+                    self.cache.set(cache_key, response, model=data["model"])
+                _emit(index, self._build_structured_result(response))
+        
+        return results
+    
+    @staticmethod
+    def is_short_report(report_content):
+        """正文较短、可以合并到批量请求中分析的研报"""
+        return len((report_content or '').strip()) <= BATCH_MAX_CONTENT_CHARS
+    
+    def analyze_batch(self, reports, batch_size=BATCH_SIZE, force_refresh=False):
+        """
+        批量五步法分析，把多篇短研报合并到一次API请求中
+        
+        短研报每batch_size篇合并为一次请求，系统提示词和格式要求只发送一次，也只占用一次请求配额；
+        回复按分隔行拆分后逐篇校验，拆分或校验失败的研报与较长的研报一样逐篇调用analyze_with_five_steps。
+        拆分得到的分析文本按单篇请求的缓存键写入缓存，之后单独分析同一研报时直接命中。
+        
+        Parameters:
+        -----------
+        reports : list
+            研报字典列表，每项包含title、content和可选的industry
+        batch_size : int, optional
+            每次批量请求最多包含的研报数
+        force_refresh : bool, optional
+            为True时跳过缓存
+            
+        Returns:
+        --------
+        list
+            与reports顺序一致的分析结果列表
+        """
+        results = [None] * len(reports)
+        
+        # 先处理缓存命中的短研报，其余短研报等待合并请求
+        pending = []
+        for index, report in enumerate(reports):
+            if not self.is_short_report(report.get('content', '')):
+                continue
+            report_block = self._report_block(report.get('title', ''), report.get('content', ''), report.get('industry'))
+            data = self._build_analysis_request(None, None, report_block=report_block)
+            cache_key = self._analysis_cache_key(data)
+            cached_text = None if force_refresh else self.cache.get(cache_key)
+            if cached_text:
+                results[index] = self._build_structured_result(cached_text)
+            else:
+                pending.append((index, report_block, data, cache_key))
+        
+        batch_size = max(1, int(batch_size))
+        for start in range(0, len(pending), batch_size):
+            group = pending[start:start + batch_size]
+            # 只剩一篇时没有可以分摊的开销，直接逐篇分析
+            if len(group) < 2:
+                continue
+            texts = self._ask_deepseek_batch([report_block for _, report_block, _, _ in group])
+            print(f"批量分析 {len(group)} 篇短研报，{len(texts)} 篇通过校验")
+            for position, (index, _, data, cache_key) in enumerate(group, 1):
+                if position in texts:
+                    self.cache.set(cache_key, texts[position], model=data["model"])
+                    results[index] = self._build_structured_result(texts[position])
+        
+        # 较长的研报以及批量分析失败的研报逐篇分析
+        for index, report in enumerate(reports):
+            if results[index] is None:
+                results[index] = self.analyze_with_five_steps(
+                    report.get('title', ''), report.get('content', ''), report.get('industry'),
+                    force_refresh=force_refresh
+                )
+        return results
+    
+    def _ask_deepseek_batch(self, report_blocks):
+        """
+        在一次请求中分析多篇研报
+        
+        Returns:
+        --------
+        dict
+            {序号: 分析文本}，序号从1开始，只包含通过校验的研报；请求失败时为空
+        """
+        if not self.api_key:
+            return {}
+        
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        
+        reports_text = "\n\n".join(
+            f"{BATCH_MARKER.format(position)}\n{report_block}"
+            for position, report_block in enumerate(report_blocks, 1)
+        )
+        prompt = f"""
+请使用黄燕铭五步分析法分别分析以下{len(report_blocks)}篇研报，每篇研报的分析相互独立。
+按研报编号顺序输出，每篇研报的分析以单独一行"{BATCH_MARKER.format('编号')}"开头（编号与下方研报一致），
+随后给出该篇研报的完整分析。
 
-请严格按照以下格式提供分析:
+{reports_text}
 
-## 体检清单
-| 五步要素 | 是否覆盖 | 快评 |
-| ------- | ------- | ---- |
-| 信息 | [是/否] | [简要评价] |
-| 逻辑 | [是/否] | [简要评价] |
-| 超预期 | [是/否] | [简要评价] |
-| 催化剂 | [是/否] | [简要评价] |
-| 结论 | [是/否] | [简要评价] |
+每篇研报都请严格按照以下格式提供分析:
 
-## 五步框架梳理
-| 步骤 | 核心内容提炼 |
-| ---- | ------------ |
-| Information | [报告中的关键信息点] |
-| Logic | [报告的逻辑推理链] |
-| Beyond-Consensus | [超出市场预期的观点] |
-| Catalyst | [报告中提到的催化剂] |
-| Conclusion | [报告的主要结论] |
+{ANALYSIS_FORMAT}"""
+        data = self._chat_request(prompt, max_tokens=min(BATCH_MAX_TOKENS, 2000 * len(report_blocks)))
+        
+        print(f"正在批量调用 DeepSeek API 分析 {len(report_blocks)} 篇研报...")
+        response_text = self._post_chat(data, headers)
+        if response_text is None:
+            return {}
+        return split_batch_response(response_text, len(report_blocks))
+    
+    def _build_structured_result(self, analysis_text):
+        """将分析文本转换为结构化结果并附带原始文本"""
+        try:
+            structured_result = self._parse_analysis(analysis_text)
+            structured_result['full_analysis'] = analysis_text
+            return structured_result
+        except Exception as e:
+            print(f"解析DeepSeek分析结果时出错: {str(e)}")
+            return self._generate_fallback_analysis()
+    
+    @staticmethod
+    def _retry_after(error):
+        """从HTTP错误响应中读取Retry-After等待秒数"""
+        response = getattr(error, 'response', None)
+        if response is not None and response.status_code == 429:
+            return parse_retry_after(response.headers.get('Retry-After'))
+        return None
+    
+    def _build_analysis_request(self, report_title, report_content, industry=None, report_block=None):
+        """
+        构建五步法分析的API请求参数
+        
+        report_block为已生成的研报部分（见_report_block），提供时不再重新压缩正文
+        
+        Returns:
+        --------
+        dict
+            chat completions请求体
+        """
+        if report_block is None:
+            report_block = self._report_block(report_title, report_content, industry)
+        
+        detailed_prompt = f"""
+请使用黄燕铭五步分析法分析以下研报，并按照指定格式返回结果。
 
-## 可操作补强思路
-| 待完善点 | 建议 |
-| ------- | ---- |
-| [缺失点1] | [具体建议] |
-| [缺失点2] | [具体建议] |
-| [缺失点3] | [具体建议] |
+{report_block}
 
-## 一句话总结
-[简明扼要的总体评价]
+请严格按照以下格式提供分析:
 
-## 五步法定量评分
-| 步骤 | 分数(0-100) | 评价 |
-| ---- | ----------- | ---- |
-| 信息 | [分数] | [简短评价] |
-| 逻辑 | [分数] | [简短评价] |
-| 超预期 | [分数] | [简短评价] |
-| 催化剂 | [分数] | [简短评价] |
-| 结论 | [分数] | [简短评价] |
-| 总分 | [加权平均分] | [总体评价] |
-"""
+{ANALYSIS_FORMAT}"""
         
-        data = {
-            "model": "deepseek-chat",
+        return self._chat_request(detailed_prompt)
+    
+    def _chat_request(self, prompt, max_tokens=4000):
+        """使用分析器的系统提示词构建chat completions请求体"""
+        return {
+            "model": self.model,
             "messages": [
                 {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": detailed_prompt}
+                {"role": "user", "content": prompt}
             ],
             "temperature": 0.7,
-            "max_tokens": 4000
+            "max_tokens": max_tokens
+        }
+    
+    def _report_block(self, report_title, report_content, industry=None):
+        """提示词中的单篇研报部分：标题、行业和压缩后的正文"""
+        # 去除模板内容，按五步相关度选取段落，代替截取正文开头
+        compaction = compact(report_content, self.token_budget)
+        print(f"研报正文压缩: {compaction.tokens_before} -> {compaction.tokens_after} tokens，"
+              f"覆盖步骤: {'/'.join(compaction.covered_steps) or '无'}")
+        
+        industry_context = f"该研报属于{industry}行业" if industry else ""
+        return f"研报标题: {report_title}\n{industry_context}\n\n研报内容:\n{compaction.text}"
+    
+    def _analysis_cache_key(self, data):
+        """计算分析请求的缓存键"""
+        return make_cache_key(data["model"], data["messages"][0]["content"], data["messages"][1]["content"],
+                              data["temperature"], data["max_tokens"])
+    
+    def _ask_deepseek(self, report_title, report_content, industry=None, force_refresh=False):
+        """
+        向DeepSeek API发送请求并获取回复，添加重试机制和响应缓存
+        """
+        if not self.api_key:
+            raise ValueError("DeepSeek API密钥未设置")
+        
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
         }
         
+        data = self._build_analysis_request(report_title, report_content, industry)
+        
+        # 查询响应缓存
+        cache_key = self._analysis_cache_key(data)
+        if not force_refresh:
+            cached_text = self.cache.get(cache_key)
+            if cached_text:
+                print("命中DeepSeek响应缓存，跳过API调用。")
+                return cached_text
+        
         print("正在使用 requests 库调用 DeepSeek API...")
+        analysis_text = self._post_chat(data, headers)
+        if analysis_text is None:
+            print("达到最大重试次数，返回默认分析结果")
+            return self._generate_default_analysis()
         
-        max_retries = 3
-        retry_delay = 2
+        # 只缓存五个步骤和一句话总结齐全的回复
+        if parse_analysis(analysis_text).complete:
+            self.cache.set(cache_key, analysis_text, model=data["model"])
+        return analysis_text
+    
+    def _post_chat(self, data, headers, max_retries=3):
+        """
+        发送chat completions请求并返回回复文本，带重试机制
         
+        Returns:
+        --------
+        str or None
+            回复文本，重试次数用尽时返回None
+        """
         for attempt in range(max_retries):
             try:
-                response = requests.post(
-                    url,
+                started = time.time()
+                # 复用连接池中的keep-alive连接
+                response = get_http_session().post(
+                    self.base_url,
                     headers=headers,
                     json=data,
-                    timeout=60  # 增加超时时间
+                    timeout=self.timeout
                 )
                 
                 response.raise_for_status()  # 检查HTTP错误
                 result = response.json()
                 
                 if "choices" in result and len(result["choices"]) > 0:
+                    self.latency.record(time.time() - started)
                     print("成功从DeepSeek API获取分析结果。")
                     return result["choices"][0]["message"]["content"]
-                else:
-                    print(f"DeepSeek API返回了意外的响应格式: {result}")
-                    if attempt < max_retries - 1:
-                        print(f"尝试重试 ({attempt+1}/{max_retries})...")
-                        time.sleep(retry_delay)
-                        continue
-                    return "API返回了无效的响应格式。"
+                
+                print(f"DeepSeek API返回了意外的响应格式: {result}")
+                if attempt < max_retries - 1:
+                    print(f"尝试重试 ({attempt+1}/{max_retries})...")
+                    time.sleep(backoff_delay(attempt))
                 
             except requests.exceptions.ChunkedEncodingError as e:
                 print(f"连接中断错误 (尝试 {attempt+1}/{max_retries}): {str(e)}")
                 if attempt < max_retries - 1:
-                    print(f"等待 {retry_delay} 秒后重试...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # 指数退避
-                else:
-                    print("达到最大重试次数，返回默认分析结果")
-                    return self._generate_default_analysis()
+                    delay = backoff_delay(attempt)
+                    print(f"等待 {delay:.1f} 秒后重试...")
+                    time.sleep(delay)
             except requests.exceptions.RequestException as e:
                 print(f"调用 DeepSeek API 时出错 (尝试 {attempt+1}/{max_retries}): {str(e)}")
                 if attempt < max_retries - 1:
-                    print(f"等待 {retry_delay} 秒后重试...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # 指数退避
-                else:
-                    print("达到最大重试次数，返回默认分析结果")
-                    return self._generate_default_analysis()
+                    # 限流时优先按服务端的Retry-After等待，否则使用带抖动的指数退避
+                    delay = backoff_delay(attempt, self._retry_after(e))
+                    print(f"等待 {delay:.1f} 秒后重试...")
+                    time.sleep(delay)
         
-        return self._generate_default_analysis()
+        return None
     
     def _parse_analysis(self, analysis_text):
         """
         将DeepSeek生成的文本分析结果解析为结构化数据
         """
         try:
-            # 初始化结果结构
-            result = {
-                "analysis": {
-                    "信息": {"found": False, "keywords": [], "evidence": [], "description": "", "step_score": 0},
-                    "逻辑": {"found": False, "keywords": [], "evidence": [], "description": "", "step_score": 0},
-                    "超预期": {"found": False, "keywords": [], "evidence": [], "description": "", "step_score": 0},
-                    "催化剂": {"found": False, "keywords": [], "evidence": [], "description": "", "step_score": 0},
-                    "结论": {"found": False, "keywords": [], "evidence": [], "description": "", "step_score": 0},
-                    "summary": {"completeness_score": 0, "steps_found": 0, "evaluation": ""}
-                },
-                "full_analysis": analysis_text  # 保存完整的分析文本
-            }
-            
-            # 尝试解析体检清单部分
-            try:
-                checklist_section = analysis_text.split("## 体检清单")[1].split("##")[0]
-                steps = ["信息", "逻辑", "超预期", "催化剂", "结论"]
-                
-                for step in steps:
-                    for line in checklist_section.split("\n"):
-                        if step in line:
-                            # 检查是否包含"✅"标记
-                            if "✅" in line:
-                                result["analysis"][step]["found"] = True
-                                # 提取快评作为描述
-                                match = re.search(r'\|.*\|.*\|(.*)\|', line)
-                                if match:
-                                    result["analysis"][step]["description"] = match.group(1).strip()
-                            # 检查是否包含"⚠️"标记 (部分应用)
-                            elif "⚠️" in line:
-                                result["analysis"][step]["found"] = True
-                                match = re.search(r'\|.*\|.*\|(.*)\|', line)
-                                if match:
-                                    result["analysis"][step]["description"] = match.group(1).strip()
-            except Exception as e:
-                print(f"解析体检清单时出错: {e}")
-            
-            # 解析五步框架梳理部分
-            try:
-                framework_section_match = re.search(r'## 五步框架梳理(.*?)##', analysis_text, re.DOTALL)
-                if framework_section_match:
-                    framework_section = framework_section_match.group(1)
-                    steps_mapping = {
-                        'Information': '信息',
-                        'Logic': '逻辑',
-                        'Beyond-Consensus': '超预期',
-                        'Catalyst': '催化剂',
-                        'Conclusion': '结论'
-                    }
-                    
-                    for eng_name, cn_name in steps_mapping.items():
-                        pattern = r'\| ' + re.escape(eng_name) + r' \|(.*?)\|'
-                        match = re.search(pattern, framework_section, re.DOTALL)
-                        if match and cn_name in result["analysis"]:
-                            result["analysis"][cn_name]["framework_summary"] = match.group(1).strip()
-            except Exception as e:
-                print(f"解析五步框架梳理时出错: {e}")
-            
-            # 解析可操作补强思路部分
-            try:
-                suggestions_match = re.search(r'## 可操作补强思路(.*?)##', analysis_text, re.DOTALL)
-                if suggestions_match:
-                    improvement_suggestions = suggestions_match.group(1).strip()
-                    result["analysis"]["improvement_suggestions"] = improvement_suggestions
-            except Exception as e:
-                print(f"解析可操作补强思路时出错: {e}")
-            
-            # 解析五步法定量评分部分
-            try:
-                scores_section = analysis_text.split("## 五步法定量评分")[1]
-                steps = ["信息", "逻辑", "超预期", "催化剂", "结论"]
-                total_score = 0
-                steps_found = 0
-                
-                for step in steps:
-                    for line in scores_section.split("\n"):
-                        if line.strip().startswith(f"| {step}"):
-                            parts = line.split("|")
-                            if len(parts) >= 4:
-                                try:
-                                    score = int(parts[2].strip())
-                                    result["analysis"][step]["step_score"] = score
-                                    
-                                    # 如果分数大于等于60，认为是有效应用
-                                    if score >= 60:
-                                        steps_found += 1
-                                    
-                                    total_score += score
-                                    
-                                    # 提取评价
-                                    if len(parts) >= 5:
-                                        # 如果描述为空，使用评价作为描述
-                                        if not result["analysis"][step]["description"]:
-                                            result["analysis"][step]["description"] = parts[3].strip()
-                                except Exception as e:
-                                    print(f"解析步骤'{step}'评分时出错: {e}")
-                
-                # 提取总分
-                for line in scores_section.split("\n"):
-                    if "总分" in line:
-                        parts = line.split("|")
-                        if len(parts) >= 4:
-                            try:
-                                overall_score = int(parts[2].strip())
-                                result["analysis"]["summary"]["completeness_score"] = overall_score
-                                
-                                # 如果找到评价
-                                if len(parts) >= 5:
-                                    result["analysis"]["summary"]["evaluation"] = parts[3].strip()
-                            except:
-                                # 如果无法提取总分，使用平均分
-                                if len(steps) > 0:
-                                    avg_score = total_score // len(steps)
-                                    result["analysis"]["summary"]["completeness_score"] = avg_score
-                            break
-                
-                # 如果没有找到总分行
-                if result["analysis"]["summary"]["completeness_score"] == 0 and len(steps) > 0:
-                    avg_score = total_score // len(steps)
-                    result["analysis"]["summary"]["completeness_score"] = avg_score
-                
-                result["analysis"]["summary"]["steps_found"] = steps_found
-            except Exception as e:
-                print(f"解析五步法定量评分时出错: {e}")
-            
-            # 如果没有评价，根据分数生成评价
-            if not result["analysis"]["summary"]["evaluation"]:
-                score = result["analysis"]["summary"]["completeness_score"]
-                result["analysis"]["summary"]["evaluation"] = self._get_evaluation_from_score(score)
-            
-            # 尝试提取一句话总结
-            try:
-                summary_section_match = re.search(r'## 一句话总结(.*?)##', analysis_text, re.DOTALL)
-                if summary_section_match:
-                    one_line_summary = summary_section_match.group(1).strip()
-                    result["analysis"]["summary"]["one_line_summary"] = one_line_summary
-                else:
-                    result["analysis"]["summary"]["one_line_summary"] = "无法提取一句话总结"
-            except Exception as e:
-                print(f"提取一句话总结时出错: {e}")
-                result["analysis"]["summary"]["one_line_summary"] = "无法提取一句话总结"
-            
-            return result
-            
+            return parse_analysis(analysis_text).to_result(evaluate=self._get_evaluation_from_score)
         except Exception as e:
             print(f"解析DeepSeek分析结果时出错: {str(e)}")
             return self._generate_fallback_analysis()
@@ -484,7 +824,7 @@ class DeepSeekAnalyzer:
                 "evaluation": "解析分析结果时出错"
             } 
 
-    def generate_video_script(self, report_info, analysis_result):
+    def generate_video_script(self, report_info, analysis_result, force_refresh=False):
         """
         生成适合投资顾问口播或短视频的文案
         
@@ -494,6 +834,8 @@ class DeepSeekAnalyzer:
             研报基本信息，包含标题、日期、机构等
         analysis_result : dict
             五步法分析结果
+        force_refresh : bool, optional
+            为True时跳过缓存，强制重新生成
             
         Returns:
         --------
@@ -573,14 +915,14 @@ class DeepSeekAnalyzer:
 请确保五步法的每个维度都有充分展示，不要简化或省略任何关键信息。直接给出文案内容，不要添加任何额外的解释或标题。"""
 
             # 调用DeepSeek API生成文案
-            video_script = self._ask_deepseek_for_script(prompt)
+            video_script = self._ask_deepseek_for_script(prompt, force_refresh=force_refresh)
             return video_script
             
         except Exception as e:
             print(f"生成视频文案时出错: {str(e)}")
             return f"生成视频文案失败: {str(e)}"
     
-    def _ask_deepseek_for_script(self, prompt):
+    def _ask_deepseek_for_script(self, prompt, force_refresh=False):
         """
         调用DeepSeek API生成视频文案
         
@@ -588,6 +930,8 @@ class DeepSeekAnalyzer:
         -----------
         prompt : str
             生成视频文案的提示词
+        force_refresh : bool, optional
+            为True时跳过缓存，强制重新调用API
             
         Returns:
         --------
@@ -629,14 +973,22 @@ class DeepSeekAnalyzer:
             "Authorization": f"Bearer {api_key}"
         }
         
+        # 查询响应缓存，缓存的是API原始输出，命中后同样经过格式处理
+        cache_key = make_cache_key(data["model"], data["messages"][0]["content"], prompt,
+                                   data["temperature"], data["max_tokens"], top_p=data["top_p"])
+        if not force_refresh:
+            cached_text = self.cache.get(cache_key)
+            if cached_text:
+                print("命中DeepSeek响应缓存，跳过API调用。")
+                return self._process_generated_script(cached_text)
+        
         max_retries = 3
-        retry_delay = 2
         
         for attempt in range(max_retries):
             try:
                 print("正在调用DeepSeek API生成视频文案...")
-                response = requests.post(
-                    "https://api.deepseek.com/v1/chat/completions",
+                response = get_http_session().post(
+                    self.base_url,
                     headers=headers,
                     json=data,
                     timeout=45  # 增加超时时间以处理更长的响应
@@ -648,6 +1000,7 @@ class DeepSeekAnalyzer:
                 # 提取生成的文案
                 generated_text = result["choices"][0]["message"]["content"]
                 print(f"成功获取文案，长度: {len(generated_text)}字符")
+                self.cache.set(cache_key, generated_text, model=data["model"])
                 
                 # 处理生成的文案，确保格式符合要求
                 processed_text = self._process_generated_script(generated_text)
@@ -657,9 +1010,9 @@ class DeepSeekAnalyzer:
             except requests.exceptions.RequestException as e:
                 print(f"调用 DeepSeek API 生成视频文案时出错 (尝试 {attempt+1}/{max_retries}): {str(e)}")
                 if attempt < max_retries - 1:
-                    print(f"等待 {retry_delay} 秒后重试...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # 指数退避
+                    delay = backoff_delay(attempt, self._retry_after(e))
+                    print(f"等待 {delay:.1f} 秒后重试...")
+                    time.sleep(delay)
                 else:
                     print("达到最大重试次数，返回错误信息")
                     return "很抱歉，目前无法生成视频文案。请稍后再试或联系系统管理员。"
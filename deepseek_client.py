@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek API客户端
+提供进程内共享的HTTP连接池（同步调用）和基于aiohttp的异步客户端，
+异步客户端带有根据429/Retry-After自适应调整的令牌桶限速、带抖动的指数退避和批量分析接口
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import logging
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+    aiohttp_available = True
+except ImportError:
+    aiohttp_available = False
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = "https://api.deepseek.com/v1/chat/completions"
+DEFAULT_MODEL = "deepseek-chat"
+
+# 连接池大小
+POOL_SIZE = int(os.environ.get('DEEPSEEK_POOL_SIZE', 8))
+
+# 退避参数（秒）
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+# 需要重试的HTTP状态码
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+class DeepSeekAPIError(Exception):
+    """DeepSeek API返回不可重试的错误或重试次数用尽"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """
+    获取进程内共享的requests会话
+
+    同一主机的请求复用keep-alive连接，避免每次调用都重新进行TLS握手。
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def parse_retry_after(value):
+    """
+    解析Retry-After响应头
+
+    参数:
+    value (str): 秒数或HTTP日期
+
+    返回:
+    float: 需要等待的秒数，无法解析时返回None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """
+    计算第attempt次重试前的等待时间
+
+    服务端给出Retry-After时以其为准，否则使用全抖动指数退避，避免多个请求同时重试。
+
+    参数:
+    attempt (int): 已失败的次数，从0开始
+    retry_after (float): 服务端要求的等待秒数
+
+    返回:
+    float: 等待秒数
+    """
+    if retry_after is not None:
+        return min(cap, retry_after) + random.uniform(0, base / 2)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def iter_stream_content(lines):
+    """
+    解析chat completions流式响应（SSE），逐个产出增量文本
+
+    参数:
+    lines (iterable): 响应的各行，str或bytes，例如response.iter_lines()
+
+    返回:
+    generator: 逐个产出非空的增量文本，收到[DONE]时结束
+    """
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.startswith('data:'):
+            # 空行和keep-alive注释行
+            continue
+        payload = line[5:].strip()
+        if payload == '[DONE]':
+            return
+        try:
+            chunk = json.loads(payload)
+        except ValueError:
+            logger.warning(f"无法解析的流式响应行: {payload[:100]}")
+            continue
+        for choice in chunk.get('choices') or []:
+            content = (choice.get('delta') or {}).get('content')
+            if content:
+                yield content
+
+
+class AdaptiveTokenBucket:
+    """
+    自适应令牌桶
+
+    正常情况下按rate个/秒补充令牌；收到429时速率减半并暂停到Retry-After之后，
+    之后每次成功请求按加性增长逐步恢复到max_rate。
+    """
+
+    def __init__(self, rate, capacity=None, min_rate=0.05, max_rate=None, recovery_step=0.05):
+        self.rate = float(rate)
+        self.max_rate = float(max_rate or rate)
+        self.min_rate = min_rate
+        self.capacity = float(capacity or max(1.0, rate))
+        self.recovery_step = recovery_step
+        self.tokens = self.capacity
+        self.paused_until = 0.0
+        self.throttled = 0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """等待直到获得一个令牌"""
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def on_throttle(self, retry_after=None):
+        """收到429时降低速率并暂停发放令牌"""
+        self.throttled += 1
+        self.rate = max(self.min_rate, self.rate / 2)
+        now = time.monotonic()
+        pause = retry_after if retry_after is not None else 1.0 / self.rate
+        self.paused_until = max(self.paused_until, now + pause)
+        self.tokens = 0.0
+        self._updated = now
+        logger.warning(f"DeepSeek API限流，速率降为 {self.rate:.2f} 次/秒，暂停 {pause:.1f} 秒")
+
+    def on_success(self):
+        """请求成功后逐步恢复速率"""
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.recovery_step)
+
+
+class DeepSeekClient:
+    """
+    异步DeepSeek客户端
+
+    在async with块内复用同一个aiohttp会话和连接池：
+
+        async with DeepSeekClient(api_key) as client:
+            text = await client.chat(messages)
+            async for index, result in client.analyze_many(requests):
+                ...
+
+    Parameters:
+    -----------
+    api_key : str
+        API密钥，默认读取DEEPSEEK_API_KEY
+    base_url : str
+        接口地址，默认读取DEEPSEEK_API_URL
+    max_concurrency : int
+        同时进行的请求数上限，同时也是连接池大小
+    requests_per_second : float
+        初始请求速率
+    max_retries : int
+        可重试错误的最大重试次数
+    timeout : float
+        单次请求超时时间（秒）
+    """
+
+    def __init__(self, api_key=None, base_url=None, model=DEFAULT_MODEL, max_concurrency=4,
+                 requests_per_second=1.0, max_retries=4, timeout=120):
+        if not aiohttp_available:
+            raise ImportError("异步DeepSeek客户端需要aiohttp，请运行: python -m pip install aiohttp")
+        self.api_key = api_key or os.environ.get("DEEPSEEK_API_KEY")
+        self.base_url = base_url or os.environ.get("DEEPSEEK_API_URL", DEFAULT_API_URL)
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.requests_per_second = requests_per_second
+        self.limiter = None
+        self._session = None
+        self._semaphore = None
+
+        # 统计信息
+        self.request_count = 0
+        self.retry_count = 0
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.api_key}"
+            }
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.limiter = AdaptiveTokenBucket(self.requests_per_second)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def chat(self, messages, temperature=0.7, max_tokens=4000, **params):
+        """
+        调用chat completions接口
+
+        参数:
+        messages (list): 消息列表
+        temperature (float): 采样温度
+        max_tokens (int): 最大生成长度
+        params: 其他请求参数，如top_p
+
+        返回:
+        str: 模型回复内容
+        """
+        if self._session is None:
+            raise RuntimeError("DeepSeekClient需要在async with块内使用")
+
+        payload = {
+            "model": params.pop("model", self.model),
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        payload.update(params)
+
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.limiter.acquire()
+                self.request_count += 1
+                retry_after = None
+                try:
+                    async with self._session.post(self.base_url, json=payload) as response:
+                        if response.status == 200:
+                            result = await response.json(content_type=None)
+                            self.limiter.on_success()
+                            choices = result.get("choices") or []
+                            if not choices:
+                                raise DeepSeekAPIError(f"DeepSeek API返回了意外的响应格式: {result}", status=200)
+                            return choices[0]["message"]["content"]
+
+                        body = await response.text()
+                        if response.status not in RETRYABLE_STATUS:
+                            raise DeepSeekAPIError(f"DeepSeek API错误 {response.status}: {body[:200]}",
+                                                   status=response.status)
+
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        if response.status == 429:
+                            self.limiter.on_throttle(retry_after)
+                        error = DeepSeekAPIError(f"DeepSeek API错误 {response.status}", status=response.status)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = e
+
+                if attempt >= self.max_retries:
+                    raise DeepSeekAPIError(f"达到最大重试次数: {error}", status=getattr(error, "status", None))
+
+                self.retry_count += 1
+                delay = backoff_delay(attempt, retry_after)
+                logger.info(f"DeepSeek请求失败 ({error})，{delay:.1f} 秒后重试 ({attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+
+    async def analyze_many(self, chat_requests):
+        """
+        并发执行多个chat请求，按完成顺序返回结果
+
+        参数:
+        chat_requests (iterable): 每项为传给chat()的关键字参数字典
+
+        返回:
+        async generator: 逐个产出(序号, 回复内容或异常)
+        """
+        async def _run(index, kwargs):
+            try:
+                return index, await self.chat(**kwargs)
+            except Exception as e:
+                return index, e
+
+        tasks = [asyncio.ensure_future(_run(index, dict(kwargs))) for index, kwargs in enumerate(chat_requests)]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+研报详情页正文提取
+每种提取策略是一个预编译的CSS选择器及其正文处理方式，按注册顺序尝试；
+先在原始HTML中检查策略的特征字符串，不存在时直接跳过，不做树查找；
+按URL模板（如zw_industry.jshtml）记住上次成功的策略并优先尝试，同时统计各策略的命中率和耗时
+"""
+
+import time
+import importlib.util
+import threading
+import logging
+from urllib.parse import urlparse
+
+import soupsieve
+from bs4 import BeautifulSoup
+
+# 安装了lxml时使用更快的lxml解析器
+DEFAULT_TREE_BUILDER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 段落选择器
+_PARAGRAPHS = soupsieve.compile('p')
+
+# 正文中需要去除的元素
+_NOISE = soupsieve.compile('style, script')
+
+
+def _join_paragraphs(container):
+    paragraphs = _PARAGRAPHS.select(container)
+    if not paragraphs:
+        return ''
+    return '\n'.join(p.get_text(strip=True) for p in paragraphs)
+
+
+def _plain_text(container):
+    return container.get_text(strip=True)
+
+
+def _text_without_noise(container):
+    for element in _NOISE.select(container):
+        element.extract()
+    return container.get_text(strip=True)
+
+
+class ExtractionStrategy:
+    """
+    一种正文提取策略
+
+    Parameters:
+    -----------
+    name : str
+        策略名称
+    selector : str
+        正文容器的CSS选择器，创建时预编译
+    marker : str
+        原始HTML中必须出现的特征字符串，None表示总是尝试
+    handler : callable
+        从容器元素得到正文的函数
+    min_length : int
+        正文最短长度，短于此长度视为失败
+    fallback : bool
+        是否为兜底策略，只有调用方允许时才尝试
+    """
+
+    def __init__(self, name, selector, marker=None, handler=_plain_text, min_length=1, fallback=False):
+        self.name = name
+        self.selector = selector
+        self.compiled = soupsieve.compile(selector)
+        self.marker = marker
+        self.handler = handler
+        self.min_length = min_length
+        self.fallback = fallback
+
+    def extract(self, soup):
+        """返回正文，未找到时返回空字符串"""
+        for container in self.compiled.select(soup, limit=0 if self.min_length > 1 else 1):
+            content = self.handler(container)
+            if content and len(content) >= self.min_length:
+                return content
+        return ''
+
+
+class DetailExtractor:
+    """
+    详情页正文提取器
+
+    extract()依次尝试：该URL模板上次成功的策略，其余特征字符串出现在页面中的策略（按注册顺序）。
+    页面只在至少一个策略可能命中时才解析为文档树，且每个页面只解析一次。
+    """
+
+    def __init__(self, strategies=None, tree_builder=DEFAULT_TREE_BUILDER):
+        self.strategies = []
+        self.tree_builder = tree_builder
+        self._preferred = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+        for strategy in strategies or ():
+            self.register(strategy)
+
+    def register(self, strategy):
+        """注册提取策略，先注册的优先"""
+        self.strategies.append(strategy)
+        self._stats[strategy.name] = {'attempts': 0, 'hits': 0, 'skipped': 0, 'seconds': 0.0}
+
+    @staticmethod
+    def url_template(url):
+        """URL模板：路径的最后一段，例如zw_industry.jshtml"""
+        parsed = urlparse(url or '')
+        return parsed.path.rsplit('/', 1)[-1] or parsed.netloc
+
+    def _ordered(self, template, include_fallbacks):
+        preferred = self._preferred.get(template)
+        strategies = [s for s in self.strategies if include_fallbacks or not s.fallback]
+        if preferred:
+            strategies.sort(key=lambda s: s.name != preferred)
+        return strategies
+
+    def extract(self, url, page_source, include_fallbacks=False):
+        """
+        提取详情页正文
+
+        参数:
+        url (str): 详情页地址，用于确定URL模板
+        page_source (str): 页面HTML
+        include_fallbacks (bool): 是否尝试兜底策略
+
+        返回:
+        tuple: (正文, 命中的策略名称)，均未命中时返回('', None)
+        """
+        template = self.url_template(url)
+        soup = None
+        for strategy in self._ordered(template, include_fallbacks):
+            if strategy.marker and strategy.marker not in page_source:
+                with self._lock:
+                    self._stats[strategy.name]['skipped'] += 1
+                continue
+
+            started = time.perf_counter()
+            if soup is None:
+                soup = BeautifulSoup(page_source, self.tree_builder)
+            content = strategy.extract(soup)
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                stats = self._stats[strategy.name]
+                stats['attempts'] += 1
+                stats['seconds'] += elapsed
+                if content:
+                    stats['hits'] += 1
+                    # 兜底策略不作为该模板的首选
+                    if not strategy.fallback:
+                        self._preferred[template] = strategy.name
+            if content:
+                return content, strategy.name
+        return '', None
+
+    def stats(self):
+        """
+        各策略的统计信息
+
+        返回:
+        dict: 策略名称到attempts、hits、skipped、hit_rate和avg_ms的映射，以及各URL模板当前优先的策略
+        """
+        with self._lock:
+            result = {}
+            for name, stats in self._stats.items():
+                attempts = stats['attempts']
+                result[name] = {
+                    'attempts': attempts,
+                    'hits': stats['hits'],
+                    'skipped': stats['skipped'],
+                    'hit_rate': stats['hits'] / attempts if attempts else 0,
+                    'avg_ms': stats['seconds'] * 1000 / attempts if attempts else 0
+                }
+            return {'strategies': result, 'preferred': dict(self._preferred)}
+
+
+def default_strategies():
+    """东方财富研报详情页的提取策略，顺序与原先逐个查找的顺序一致"""
+    return [
+        # ctx-content是东方财富网研报内容的主要容器
+        ExtractionStrategy('ctx-content', 'div.ctx-content', marker='ctx-content', handler=_join_paragraphs),
+        ExtractionStrategy('report-content', 'div.report-content', marker='report-content', handler=_text_without_noise),
+        ExtractionStrategy('newsContent', 'div.newsContent', marker='newsContent'),
+        ExtractionStrategy('ContentBody', 'div#ContentBody', marker='ContentBody'),
+        ExtractionStrategy('zw-content/ctx-box', 'div.zw-content div.ctx-box', marker='ctx-box',
+                           handler=_join_paragraphs),
+        # 兜底：较长的content容器，仅用于浏览器渲染后的页面
+        ExtractionStrategy('content', 'div.content', min_length=500, fallback=True),
+    ]
+
+
+# 进程内共享的默认提取器
+_default_extractor = None
+_default_extractor_lock = threading.Lock()
+
+
+def get_default_extractor():
+    """获取进程内共享的默认提取器"""
+    global _default_extractor
+    with _default_extractor_lock:
+        if _default_extractor is None:
+            _default_extractor = DetailExtractor(default_strategies())
+        return _default_extractor
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+东方财富研报列表接口
+直接调用研报列表页背后的分页JSONP接口获取研报列表，不需要启动浏览器渲染页面，
+按日期范围、行业和研报类型翻页，产出与parse_reports_from_page相同字段的研报字典
+"""
+
+import os
+import re
+import json
+import time
+import datetime
+import threading
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+LIST_API_URL = "https://reportapi.eastmoney.com/report/list"
+
+# 研报类型：(接口qType参数, 详情页地址)
+REPORT_TYPES = {
+    'industry': ('1', "https://data.eastmoney.com/report/zw_industry.jshtml?infocode={info_code}"),
+    'stock': ('0', "https://data.eastmoney.com/report/zw_stock.jshtml?infocode={info_code}"),
+}
+
+# 每页条数，接口最多支持100
+DEFAULT_PAGE_SIZE = int(os.environ.get('EASTMONEY_PAGE_SIZE', 50))
+
+# 默认抓取最近多少天的研报
+DEFAULT_LIST_DAYS = int(os.environ.get('EASTMONEY_LIST_DAYS', 7))
+
+# 默认最多翻多少页，0表示翻到最后一页
+DEFAULT_MAX_PAGES = int(os.environ.get('EASTMONEY_MAX_PAGES', 1))
+
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36',
+    'Referer': 'https://data.eastmoney.com/report/',
+    'Accept': '*/*'
+}
+
+_JSONP_PATTERN = re.compile(r'^\s*[\w$.]+\s*\((.*)\)\s*;?\s*$', re.S)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """获取进程内共享的requests会话，翻页请求复用同一个keep-alive连接"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update(REQUEST_HEADERS)
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def parse_jsonp(text):
+    """
+    解析JSONP或JSON响应
+
+    参数:
+    text (str): 形如datatable123({...})的响应文本
+
+    返回:
+    dict: 解析后的数据
+    """
+    match = _JSONP_PATTERN.match(text)
+    return json.loads(match.group(1) if match else text)
+
+
+def normalize_report(item, report_type='industry'):
+    """
+    将接口返回的一条记录转换为研报字典
+
+    参数:
+    item (dict): 接口data数组中的一项
+    report_type (str): 'industry'或'stock'
+
+    返回:
+    dict: 包含title、link、abstract、industry、rating、org、date以及info_code的研报字典
+    """
+    _, link_template = REPORT_TYPES[report_type]
+    info_code = item.get('infoCode') or ''
+    industry = item.get('industryName') or '未知行业'
+    rating = item.get('emRatingName') or item.get('sRatingName') or ''
+    org = item.get('orgSName') or ''
+    # publishDate形如"2025-03-27 00:00:00.000"
+    date = (item.get('publishDate') or '')[:10]
+    return {
+        'title': (item.get('title') or '').strip(),
+        'link': link_template.format(info_code=info_code),
+        'abstract': f"行业: {industry}, 评级: {rating}, 机构: {org}, 日期: {date}",
+        'industry': industry,
+        'rating': rating,
+        'org': org,
+        'date': date,
+        'info_code': info_code,
+        'stock_name': item.get('stockName') or '',
+        'stock_code': item.get('stockCode') or '',
+        'researcher': item.get('researcher') or ''
+    }
+
+
+class EastmoneyReportAPI:
+    """
+    研报列表接口客户端
+
+    Parameters:
+    -----------
+    session : requests.Session, optional
+        HTTP会话，默认使用进程内共享会话；测试时可传入返回录制响应的对象
+    page_size : int
+        每页条数
+    timeout : float
+        单次请求超时时间（秒）
+    archive : callable, optional
+        归档原始响应的函数，以(url, 响应文本, 页面类型)调用，例如page_archive.archive_page
+    """
+
+    def __init__(self, session=None, page_size=DEFAULT_PAGE_SIZE, timeout=15, archive=None):
+        self.session = session or get_session()
+        self.page_size = page_size
+        self.timeout = timeout
+        self.archive = archive
+
+    def fetch_page(self, page_no, begin_date, end_date, industry_code='*', report_type='industry'):
+        """
+        获取一页研报
+
+        参数:
+        page_no (int): 页码，从1开始
+        begin_date (str): 开始日期，YYYY-MM-DD
+        end_date (str): 结束日期，YYYY-MM-DD
+        industry_code (str): 行业代码，'*'表示全部
+        report_type (str): 'industry'或'stock'
+
+        返回:
+        tuple: (原始记录列表, 总页数)
+        """
+        q_type, _ = REPORT_TYPES[report_type]
+        params = {
+            'cb': 'datatable',
+            'industryCode': industry_code,
+            'pageSize': str(self.page_size),
+            'industry': '*',
+            'rating': '*',
+            'ratingChange': '*',
+            'beginTime': begin_date,
+            'endTime': end_date,
+            'pageNo': str(page_no),
+            'fields': '',
+            'qType': q_type,
+            'orgCode': '',
+            'rcode': '',
+            '_': str(int(time.time() * 1000))
+        }
+        response = self.session.get(LIST_API_URL, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        if self.archive is not None:
+            self.archive(response.url, response.text, f'list_api:{report_type}')
+        data = parse_jsonp(response.text)
+        items = data.get('data') or []
+        total_pages = int(data.get('TotalPage') or 0)
+        return items, total_pages
+
+    def iter_reports(self, begin_date=None, end_date=None, industry_code='*', report_type='industry',
+                     max_pages=DEFAULT_MAX_PAGES):
+        """
+        按页产出研报字典，翻到最后一页或达到max_pages为止
+
+        翻页期间有新研报发布时，后续页可能出现重复记录，按info_code去重。
+
+        参数:
+        begin_date (str): 开始日期，默认为DEFAULT_LIST_DAYS天前
+        end_date (str): 结束日期，默认为今天
+        industry_code (str): 行业代码，'*'表示全部
+        report_type (str): 'industry'或'stock'
+        max_pages (int): 最多翻页数，0表示不限
+
+        返回:
+        generator: 逐条产出研报字典
+        """
+        today = datetime.date.today()
+        end_date = end_date or today.isoformat()
+        begin_date = begin_date or (today - datetime.timedelta(days=DEFAULT_LIST_DAYS)).isoformat()
+
+        seen = set()
+        page_no = 1
+        while True:
+            started = time.monotonic()
+            items, total_pages = self.fetch_page(page_no, begin_date, end_date, industry_code, report_type)
+            logger.info(f"研报列表第 {page_no}/{total_pages} 页: {len(items)} 条，"
+                        f"耗时 {(time.monotonic() - started) * 1000:.0f} 毫秒")
+
+            for item in items:
+                report = normalize_report(item, report_type)
+                if not report['info_code'] or not report['title'] or report['info_code'] in seen:
+                    continue
+                seen.add(report['info_code'])
+                yield report
+
+            if not items or page_no >= total_pages or (max_pages and page_no >= max_pages):
+                return
+            page_no += 1
+
+    def fetch_reports(self, **kwargs):
+        """获取研报列表，参数同iter_reports，出错时记录日志并返回已获取的部分"""
+        reports = []
+        try:
+            for report in self.iter_reports(**kwargs):
+                reports.append(report)
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"调用研报列表接口出错: {str(e)}")
+        return reports
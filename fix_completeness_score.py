@@ -5,12 +5,13 @@
 确保它们有有效的整数值，避免NoneType与int比较错误
 """
 
-import sqlite3
+import db_pool
 import json
+import report_stats
 
 def fix_completeness_scores():
     """修复所有研报的完整性评分"""
-    conn = sqlite3.connect('research_reports.db')
+    conn = db_pool.connect('research_reports.db')
     cursor = conn.cursor()
     
     try:
@@ -66,6 +67,8 @@ def fix_completeness_scores():
         analyses = cursor.fetchall()
         print(f"数据库中共有 {len(analyses)} 条分析记录")
         
+        # 分析记录的评分计入统计聚合，记录受影响的研报以便提交前刷新
+        rescored_ids = set()
         fixed_analysis_count = 0
         for analysis_id, report_id, score in analyses:
             # 检查分数是否为None或非整数
@@ -88,20 +91,26 @@ def fix_completeness_scores():
                 
                 print(f"已将分析记录ID {analysis_id} (报告ID: {report_id}) 的评分从 {score} 修复为 {new_score}")
                 fixed_analysis_count += 1
+                rescored_ids.add(report_id)
+        
+        # 与AnalysisDatabase写入分析结果时一样，同步刷新统计聚合
+        report_stats.refresh_reports(conn, sorted(rescored_ids))
         
         conn.commit()
         print(f"完成修复！共更新了 {fixed_analysis_count} 条分析记录的完整性评分")
         
         # 修复step_analysis表中的评分
         cursor.execute('''
-        SELECT id, analysis_id, step_name, step_score 
-        FROM step_analysis
+        SELECT sa.id, sa.analysis_id, sa.step_name, sa.step_score, ra.report_id
+        FROM step_analysis sa
+        LEFT JOIN report_analysis ra ON ra.id = sa.analysis_id
         ''')
         steps = cursor.fetchall()
         print(f"数据库中共有 {len(steps)} 条步骤分析记录")
         
+        rescored_ids = set()
         fixed_step_count = 0
-        for step_id, analysis_id, step_name, score in steps:
+        for step_id, analysis_id, step_name, score, report_id in steps:
             # 检查分数是否为None或非整数
             if score is None or not isinstance(score, int):
                 print(f"步骤分析ID {step_id} ({step_name}) 的评分为 {score}，需要修复")
@@ -116,6 +125,10 @@ def fix_completeness_scores():
                 
                 print(f"已将步骤分析ID {step_id} ({step_name}) 的评分从 {score} 修复为 {new_score}")
                 fixed_step_count += 1
+                if report_id is not None:
+                    rescored_ids.add(report_id)
+        
+        report_stats.refresh_reports(conn, sorted(rescored_ids))
         
         conn.commit()
         print(f"完成修复！共更新了 {fixed_step_count} 条步骤分析的评分")
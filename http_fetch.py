@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网页抓取公共层
+所有页面请求共用一个带连接池的keep-alive会话和统一的浏览器请求头；
+响应以流式读取并限制最大字节数，gzip/deflate由urllib3解码；
+字符集依次取自响应头、前几KB中的<meta charset>和按主机缓存的结果，不再对整个页面做字符集探测；
+同时按主机统计请求次数、耗时和字节数
+"""
+
+import os
+import re
+import time
+import threading
+import logging
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 连接池大小
+POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+
+# 响应体最大字节数，超过部分丢弃，默认5MB
+MAX_BODY_BYTES = int(os.environ.get('HTTP_MAX_BODY_BYTES', 5 * 1024 * 1024))
+
+# 查找<meta charset>时读取的字节数
+CHARSET_SNIFF_BYTES = 4096
+
+DEFAULT_TIMEOUT = 30
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate',
+    'Referer': 'https://data.eastmoney.com/'
+}
+
+_CONTENT_TYPE_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+
+# GB2312/GBK页面中常混有超出字符集的字符，统一按超集GB18030解码
+_ENCODING_ALIASES = {
+    'gb2312': 'gb18030',
+    'gbk': 'gb18030',
+    'x-gbk': 'gb18030',
+    'utf8': 'utf-8',
+}
+
+# 响应头中不可信的字符集声明
+_UNRELIABLE_ENCODINGS = frozenset(['iso-8859-1', 'latin-1', 'latin1'])
+
+_session = None
+_session_lock = threading.Lock()
+
+# 按主机缓存的字符集
+_host_encodings = {}
+
+# 按主机统计的请求指标
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def get_session():
+    """
+    获取进程内共享的requests会话
+
+    同一主机的请求复用keep-alive连接；连接错误和502/503/504对GET请求自动重试两次。
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update(DEFAULT_HEADERS)
+            retry = Retry(total=2, connect=2, read=0, backoff_factor=0.5,
+                          status_forcelist=(502, 503, 504), allowed_methods=frozenset(['GET', 'HEAD']),
+                          raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=POOL_SIZE, max_retries=retry)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def _normalize_encoding(name):
+    name = (name or '').strip().lower()
+    return _ENCODING_ALIASES.get(name, name) or None
+
+
+def _is_known_encoding(name):
+    try:
+        ''.encode(name)
+        return True
+    except (LookupError, TypeError):
+        return False
+
+
+def resolve_encoding(host, content_type, head):
+    """
+    确定响应正文的字符集
+
+    参数:
+    host (str): 主机名，用于读写字符集缓存
+    content_type (str): Content-Type响应头
+    head (bytes): 正文开头的若干字节
+
+    返回:
+    str: 字符集名称；响应头和页面都没有声明时返回该主机上次使用的字符集，没有记录时返回None
+    """
+    match = _CONTENT_TYPE_CHARSET.search(content_type or '')
+    if match:
+        encoding = _normalize_encoding(match.group(1))
+        # 不少服务器默认声明ISO-8859-1，以页面内的声明为准
+        if encoding not in _UNRELIABLE_ENCODINGS and _is_known_encoding(encoding):
+            _host_encodings[host] = encoding
+            return encoding
+
+    match = _META_CHARSET.search(head[:CHARSET_SNIFF_BYTES])
+    if match:
+        encoding = _normalize_encoding(match.group(1).decode('ascii', 'ignore'))
+        if _is_known_encoding(encoding):
+            _host_encodings[host] = encoding
+            return encoding
+
+    return _host_encodings.get(host)
+
+
+def decode_body(host, body, encoding):
+    """按字符集解码正文；未知字符集时先尝试UTF-8，失败再按GB18030解码，并缓存结果"""
+    if encoding:
+        return body.decode(encoding, errors='replace'), encoding
+    try:
+        text = body.decode('utf-8')
+        encoding = 'utf-8'
+    except UnicodeDecodeError:
+        text = body.decode('gb18030', errors='replace')
+        encoding = 'gb18030'
+    _host_encodings[host] = encoding
+    return text, encoding
+
+
+class FetchResult:
+    """一次页面请求的结果"""
+
+    def __init__(self, url, status_code, headers, content, encoding, elapsed, truncated):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+        self.elapsed = elapsed
+        self.truncated = truncated
+        self._text = None
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        if self._text is None:
+            host = urlparse(self.url).netloc
+            self._text, self.encoding = decode_body(host, self.content, self.encoding)
+        return self._text
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} 错误: {self.url}")
+
+
+def _record(host, elapsed, size, error=False, truncated=False):
+    with _metrics_lock:
+        stats = _metrics.setdefault(host, {
+            'requests': 0, 'errors': 0, 'bytes': 0, 'truncated': 0, 'seconds': 0.0, 'max_seconds': 0.0
+        })
+        stats['requests'] += 1
+        stats['bytes'] += size
+        stats['seconds'] += elapsed
+        stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+        if error:
+            stats['errors'] += 1
+        if truncated:
+            stats['truncated'] += 1
+
+
+def fetch(url, headers=None, params=None, timeout=DEFAULT_TIMEOUT, max_bytes=MAX_BODY_BYTES,
+          raise_for_status=True):
+    """
+    获取页面
+
+    参数:
+    url (str): 页面地址
+    headers (dict): 额外的请求头，覆盖默认请求头
+    params (dict): 查询参数
+    timeout (float): 超时时间（秒）
+    max_bytes (int): 最多读取的正文字节数（解压后），超过时截断
+    raise_for_status (bool): 状态码为4xx/5xx时是否抛出异常
+
+    返回:
+    FetchResult: 请求结果，text属性按需解码
+    """
+    host = urlparse(url).netloc
+    started = time.monotonic()
+    size = 0
+    try:
+        with get_session().get(url, headers=headers, params=params, timeout=timeout, stream=True) as response:
+            chunks = []
+            truncated = False
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    truncated = True
+                    break
+            content = b''.join(chunks)
+            if truncated:
+                content = content[:max_bytes]
+                logger.warning(f"响应超过 {max_bytes} 字节，已截断: {url}")
+            encoding = resolve_encoding(host, response.headers.get('Content-Type'), content)
+            result = FetchResult(response.url, response.status_code, response.headers, content,
+                                 encoding, time.monotonic() - started, truncated)
+    except requests.RequestException:
+        _record(host, time.monotonic() - started, size, error=True)
+        raise
+
+    _record(host, result.elapsed, len(result.content), error=not result.ok, truncated=result.truncated)
+    if raise_for_status:
+        result.raise_for_status()
+    return result
+
+
+def get_metrics():
+    """
+    按主机统计的请求指标
+
+    返回:
+    dict: 主机名到requests、errors、bytes、truncated、avg_ms、max_ms的映射
+    """
+    with _metrics_lock:
+        return {
+            host: {
+                'requests': stats['requests'],
+                'errors': stats['errors'],
+                'bytes': stats['bytes'],
+                'truncated': stats['truncated'],
+                'avg_ms': round(stats['seconds'] * 1000 / stats['requests'], 1) if stats['requests'] else 0,
+                'max_ms': round(stats['max_seconds'] * 1000, 1)
+            }
+            for host, stats in _metrics.items()
+        }
+
+
+def reset_metrics():
+    """清空请求指标"""
+    with _metrics_lock:
+        _metrics.clear()
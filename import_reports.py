@@ -10,6 +10,7 @@ import json
 import os
 import sys
 import sqlite3
+import db_pool
 from datetime import datetime
 import database as db  # 导入数据库模块
 from analysis_db import AnalysisDatabase  # 导入分析数据库模块
@@ -48,7 +49,7 @@ def main():
         analysis_db = AnalysisDatabase()
         
         # 获取数据库中的研报ID和链接映射
-        conn = sqlite3.connect('research_reports.db')
+        conn = db_pool.connect('research_reports.db')
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute("SELECT id, link FROM reports")
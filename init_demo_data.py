@@ -5,13 +5,15 @@
 直接添加一些基本的研报和分析结果到数据库中
 """
 
-import sqlite3
+import db_pool
 import json
 import datetime
+import search_index
+import report_stats
 
 def add_demo_report():
     """添加一条示例研报到数据库"""
-    conn = sqlite3.connect('research_reports.db')
+    conn = db_pool.connect('research_reports.db')
     cursor = conn.cursor()
     
     try:
@@ -140,6 +142,10 @@ def add_demo_report():
         else:
             print(f"示例研报已有新格式的分析结果，无需再次添加")
         
+        # 与AnalysisDatabase写入时一样，同步刷新全文索引和统计聚合
+        search_index.index_report(conn, report_id)
+        report_stats.refresh_report(conn, report_id)
+        
         conn.commit()
         print("演示数据初始化完成")
         
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite持久化任务队列
+HTTP请求只负责入队并返回任务ID，LLM分析、视频文案生成和爬取由独立的工作进程（analysis_worker.py）执行。
+任务按优先级领取，领取时加租约，工作进程崩溃后租约到期的任务会被其他进程重新领取；
+失败的任务按指数退避重试，相同的待执行任务只保留一条
+"""
+
+import json
+import time
+import random
+import sqlite3
+import db_pool
+import logging
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = 'research_reports.db'
+
+# 任务状态
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED)
+
+# 用户在页面上触发的任务优先于后台批量任务
+PRIORITY_INTERACTIVE = 100
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+
+# 重试退避：第n次失败后等待 RETRY_BASE_DELAY * 2^(n-1) 秒，加少量抖动，最多RETRY_MAX_DELAY秒
+RETRY_BASE_DELAY = 30.0
+RETRY_MAX_DELAY = 1800.0
+
+
+class PermanentJobError(Exception):
+    """重试也无法成功的错误（如研报不存在），任务直接标记为失败"""
+
+
+def ensure_job_tables(conn):
+    """创建任务表和索引（已存在时不做任何操作）"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_type TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        dedup_key TEXT NOT NULL,
+        priority INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL DEFAULT 3,
+        run_after REAL NOT NULL,
+        lease_owner TEXT,
+        lease_expires REAL,
+        result TEXT,
+        error TEXT,
+        progress TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        finished_at REAL
+    )
+    ''')
+    # 同一任务在等待或执行期间只能存在一条，完成后可以再次入队
+    conn.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_dedup
+    ON jobs(dedup_key) WHERE status IN ('pending', 'running')
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(status, priority DESC, run_after, id)')
+    # 早期创建的任务表没有执行进度字段
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(jobs)')]
+    if 'progress' not in columns:
+        conn.execute('ALTER TABLE jobs ADD COLUMN progress TEXT')
+
+
+def dedup_key(job_type, payload):
+    """任务类型和参数相同的任务视为同一任务"""
+    return f"{job_type}:{json.dumps(payload, sort_keys=True, ensure_ascii=False)}"
+
+
+def retry_delay(attempts):
+    """
+    计算第attempts次失败后重新执行前的等待秒数
+
+    参数:
+    attempts (int): 已执行的次数，从1开始
+
+    返回:
+    float: 等待秒数
+    """
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** max(0, attempts - 1)))
+    return delay + random.uniform(0, delay / 10)
+
+
+def _row_to_job(row):
+    if not row:
+        return None
+    job = dict(row)
+    job['payload'] = json.loads(job['payload'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    job['progress'] = json.loads(job['progress']) if job['progress'] else None
+    return job
+
+
+class JobQueue:
+    """
+    任务队列
+
+    Parameters:
+    -----------
+    db_path : str
+        数据库路径，任务表与reports表位于同一数据库，多个进程共享
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+
+        conn = self._connect()
+        try:
+            ensure_job_tables(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # isolation_level=None 由代码显式控制事务，领取任务时使用BEGIN IMMEDIATE避免多个进程领到同一任务
+        conn = db_pool.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, job_type, payload, priority=0, max_attempts=DEFAULT_MAX_ATTEMPTS, delay=0):
+        """
+        提交任务，已有相同的待执行或执行中的任务时不重复入队
+
+        参数:
+        job_type (str): 任务类型，对应工作进程中的处理函数
+        payload (dict): 任务参数，需可JSON序列化
+        priority (int): 优先级，数值大的先执行
+        max_attempts (int): 最多执行次数
+        delay (float): 延迟多少秒后才可执行
+
+        返回:
+        tuple: (任务ID, 是否新建)；已有相同任务时返回已有任务的ID，并把其优先级提高到priority
+        """
+        key = dedup_key(job_type, payload)
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.execute('''
+            INSERT OR IGNORE INTO jobs (job_type, payload, dedup_key, priority, max_attempts,
+                                        run_after, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (job_type, json.dumps(payload, ensure_ascii=False), key, priority, max_attempts,
+                  now + delay, now, now))
+            if cursor.rowcount:
+                job_id, created = cursor.lastrowid, True
+            else:
+                job_id = conn.execute(
+                    "SELECT id FROM jobs WHERE dedup_key = ? AND status IN ('pending', 'running')", (key,)
+                ).fetchone()[0]
+                created = False
+                conn.execute('UPDATE jobs SET priority = ?, updated_at = ? WHERE id = ? AND priority < ?',
+                             (priority, now, job_id, priority))
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        if created:
+            logger.info(f"任务 {job_id} 已入队: {key} (优先级 {priority})")
+        return job_id, created
+
+    def claim(self, worker_id, job_types=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        领取一个可执行的任务并加租约
+
+        可执行的任务包括到达run_after的等待任务，以及租约已过期（执行进程已退出）的执行中任务。
+
+        参数:
+        worker_id (str): 工作进程标识
+        job_types (list): 只领取这些类型的任务，None表示全部类型
+        lease_seconds (float): 租约时长，执行时间较长的任务需定期调用heartbeat续约
+
+        返回:
+        dict: 领取到的任务，没有可执行任务时返回None
+        """
+        now = time.time()
+        type_filter = ''
+        params = [now, now]
+        if job_types:
+            type_filter = f" AND job_type IN ({','.join('?' * len(job_types))})"
+            params.extend(job_types)
+
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            # 执行进程每次都中途退出的任务不再无限重领
+            conn.execute('''
+            UPDATE jobs SET status = 'failed', error = '执行进程退出，租约过期且已达最多执行次数',
+                            lease_expires = NULL, updated_at = ?, finished_at = ?
+            WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts
+            ''', (now, now, now))
+            row = conn.execute(f'''
+            SELECT id FROM jobs
+            WHERE ((status = 'pending' AND run_after <= ?) OR (status = 'running' AND lease_expires < ?)){type_filter}
+            ORDER BY priority DESC, id
+            LIMIT 1
+            ''', params).fetchone()
+            if not row:
+                conn.execute('COMMIT')
+                return None
+            conn.execute('''
+            UPDATE jobs
+            SET status = 'running', lease_owner = ?, lease_expires = ?, attempts = attempts + 1, progress = NULL,
+                updated_at = ?
+            WHERE id = ?
+            ''', (worker_id, now + lease_seconds, now, row['id']))
+            job = _row_to_job(conn.execute('SELECT * FROM jobs WHERE id = ?', (row['id'],)).fetchone())
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        return job
+
+    def _update_owned(self, sql, params, job_id, worker_id):
+        # 只有持有租约的进程可以更新任务，租约过期后被其他进程领走的任务不会被旧进程覆盖
+        conn = self._connect()
+        try:
+            cursor = conn.execute(f"{sql} WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                                  (*params, job_id, worker_id))
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """续约执行中的任务，返回False表示租约已丢失"""
+        now = time.time()
+        return self._update_owned('UPDATE jobs SET lease_expires = ?, updated_at = ?',
+                                  (now + lease_seconds, now), job_id, worker_id)
+
+    def report_progress(self, job_id, worker_id, progress):
+        """
+        记录执行中任务的进度，供状态接口和SSE推送转发给页面
+
+        参数:
+        job_id (int): 任务ID
+        worker_id (str): 工作进程标识
+        progress (dict): 进度信息，需可JSON序列化
+
+        返回:
+        bool: 是否更新成功，False表示租约已丢失
+        """
+        return self._update_owned('UPDATE jobs SET progress = ?, updated_at = ?',
+                                  (json.dumps(progress, ensure_ascii=False), time.time()), job_id, worker_id)
+
+    def complete(self, job_id, worker_id, result=None):
+        """
+        标记任务完成
+
+        参数:
+        job_id (int): 任务ID
+        worker_id (str): 工作进程标识
+        result (dict): 任务结果，需可JSON序列化
+
+        返回:
+        bool: 是否更新成功
+        """
+        now = time.time()
+        return self._update_owned('''
+        UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_expires = NULL,
+                        updated_at = ?, finished_at = ?
+        ''', (json.dumps(result, ensure_ascii=False), now, now), job_id, worker_id)
+
+    def fail(self, job_id, worker_id, error, retry=True):
+        """
+        记录任务失败，未超过最多执行次数时按退避时间重新排队
+
+        参数:
+        job_id (int): 任务ID
+        worker_id (str): 工作进程标识
+        error (str): 错误信息
+        retry (bool): 是否允许重试，PermanentJobError等不可恢复的错误传False
+
+        返回:
+        str: 任务的新状态，租约已丢失时返回None
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs "
+                               "WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                               (job_id, worker_id)).fetchone()
+            if not row:
+                conn.execute('COMMIT')
+                return None
+            if retry and row['attempts'] < row['max_attempts']:
+                status = STATUS_PENDING
+                conn.execute('''
+                UPDATE jobs SET status = 'pending', error = ?, run_after = ?, lease_owner = NULL,
+                                lease_expires = NULL, updated_at = ?
+                WHERE id = ?
+                ''', (error, now + retry_delay(row['attempts']), now, job_id))
+            else:
+                status = STATUS_FAILED
+                conn.execute('''
+                UPDATE jobs SET status = 'failed', error = ?, lease_expires = NULL, updated_at = ?, finished_at = ?
+                WHERE id = ?
+                ''', (error, now, now, job_id))
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        logger.warning(f"任务 {job_id} 执行失败（第 {row['attempts']} 次），状态: {status}，错误: {error}")
+        return status
+
+    def get(self, job_id):
+        """按ID获取任务，不存在时返回None"""
+        conn = self._connect()
+        try:
+            return _row_to_job(conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone())
+        finally:
+            conn.close()
+
+    def latest(self, job_type):
+        """获取某类型最近提交的任务，没有时返回None"""
+        conn = self._connect()
+        try:
+            return _row_to_job(conn.execute('SELECT * FROM jobs WHERE job_type = ? ORDER BY id DESC LIMIT 1',
+                                            (job_type,)).fetchone())
+        finally:
+            conn.close()
+
+    def stats(self):
+        """
+        按任务类型和状态统计任务数
+
+        返回:
+        dict: {job_type: {status: count}}
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT job_type, status, COUNT(*) FROM jobs GROUP BY job_type, status').fetchall()
+        finally:
+            conn.close()
+        stats = {}
+        for job_type, status, count in rows:
+            stats.setdefault(job_type, {})[status] = count
+        return stats
+
+    def purge_finished(self, older_than_days=7):
+        """删除完成或失败超过指定天数的任务，返回删除的条数"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                                  (time.time() - older_than_days * 86400,))
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+
+def job_status(job):
+    """
+    任务的对外状态，供轮询接口和SSE推送使用
+
+    参数:
+    job (dict): JobQueue.get返回的任务
+
+    返回:
+    dict: 不含租约等内部字段的状态信息
+    """
+    return {
+        "id": job['id'],
+        "type": job['job_type'],
+        "status": job['status'],
+        "attempts": job['attempts'],
+        "max_attempts": job['max_attempts'],
+        "result": job['result'],
+        "error": job['error'],
+        "progress": job['progress'],
+        "created_at": job['created_at'],
+        "finished_at": job['finished_at']
+    }
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+研报列表页解析
+一次遍历把页面中的表格抽取为(表头, 行, 单元格)结构，每个表格只解析一次表头得到列映射，
+再按列类型提取标题、行业、评级、机构和日期；树构建器可选lxml（C实现）或标准库html.parser
+"""
+
+import re
+import logging
+from collections import namedtuple
+from html.parser import HTMLParser
+
+try:
+    import lxml.html
+    lxml_available = True
+except ImportError:
+    lxml_available = False
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://data.eastmoney.com"
+
+# 研报详情页链接特征
+REPORT_LINK_PATTERN = re.compile(r'zw_(?:industry|stock)\.jshtml')
+
+# 广泛搜索时认为可能是研报的链接特征
+LOOSE_LINK_PATTERN = re.compile(r'report|research|pdf')
+
+DATE_PATTERN = re.compile(r'\d{4}[-/]\d{2}[-/]\d{2}')
+
+RATINGS = frozenset(["买入", "增持", "中性", "减持", "卖出", "强烈推荐", "推荐", "谨慎推荐", "持有", "回避"])
+
+ORG_PATTERN = re.compile(r'证券|研究|资本|投资')
+
+# 单元格中出现的常见行业名称
+COMMON_INDUSTRIES = ["食品饮料", "医药", "金融", "科技", "消费", "通信", "电子", "计算机", "汽车", "房地产", "能源", "化工"]
+COMMON_INDUSTRY_PATTERN = re.compile('|'.join(COMMON_INDUSTRIES))
+
+# 从标题推断行业时使用的关键词
+TITLE_INDUSTRY_KEYWORDS = ["医药", "科技", "金融", "消费", "房地产", "能源", "通信", "汽车", "食品", "电子", "互联网", "计算机", "传媒"]
+TITLE_INDUSTRY_PATTERN = re.compile('|'.join(TITLE_INDUSTRY_KEYWORDS))
+
+# 表头到字段的映射规则，按顺序匹配，每个字段只取第一个匹配的列
+COLUMN_RULES = (
+    ('title', re.compile(r'^(报告名称|研报标题|研报名称|标题)')),
+    ('industry', re.compile(r'^行业')),
+    ('rating', re.compile(r'^(东财评级|评级)(?!变动)')),
+    ('org', re.compile(r'^机构')),
+    ('date', re.compile(r'日期')),
+)
+
+Cell = namedtuple('Cell', 'text links hint')
+Table = namedtuple('Table', 'headers rows')
+Anchor = namedtuple('Anchor', 'href text in_table')
+
+
+class _TableExtractor(HTMLParser):
+    """基于标准库HTMLParser的流式表格抽取，不构建完整文档树"""
+
+    _SKIP_TAGS = frozenset(['script', 'style'])
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tables = []
+        self.anchors = []
+        # 嵌套表格栈，每项为[表头, 行列表, 当前行, 当前行是否全为th]
+        self._stack = []
+        self._cell = None
+        self._anchor = None
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP_TAGS:
+            self._skip += 1
+            return
+        if tag == 'table':
+            self._close_cell()
+            self._stack.append([[], [], None, True])
+        elif tag == 'tr' and self._stack:
+            self._close_row()
+            self._stack[-1][2] = []
+            self._stack[-1][3] = True
+        elif tag in ('td', 'th') and self._stack:
+            self._close_cell()
+            table = self._stack[-1]
+            if table[2] is None:
+                table[2] = []
+                table[3] = True
+            if tag == 'td':
+                table[3] = False
+            # [文本片段, 链接列表, 提示文本]
+            self._cell = [[], [], None]
+        elif tag == 'a':
+            self._anchor = [dict(attrs).get('href') or '', []]
+        elif self._cell is not None and self._cell[2] is None:
+            if tag == 'img':
+                self._cell[2] = dict(attrs).get('alt')
+            elif tag == 'i':
+                attrs = dict(attrs)
+                if 'icon' in (attrs.get('class') or '').lower():
+                    self._cell[2] = attrs.get('title')
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag == 'a' and self._anchor is not None:
+            href, parts = self._anchor
+            text = ''.join(parts)
+            self.anchors.append(Anchor(href, text, self._cell is not None))
+            if self._cell is not None:
+                self._cell[1].append((href, text))
+            self._anchor = None
+        elif tag in ('td', 'th'):
+            self._close_cell()
+        elif tag == 'tr':
+            self._close_row()
+        elif tag == 'table' and self._stack:
+            self._close_row()
+            headers, rows, _, _ = self._stack.pop()
+            self.tables.append(Table(headers, rows))
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        text = data.strip()
+        if not text:
+            return
+        if self._cell is not None:
+            self._cell[0].append(text)
+        if self._anchor is not None:
+            self._anchor[1].append(text)
+
+    def _close_cell(self):
+        if self._cell is None or not self._stack:
+            self._cell = None
+            return
+        parts, links, hint = self._cell
+        self._stack[-1][2].append(Cell(''.join(parts), links, hint))
+        self._cell = None
+
+    def _close_row(self):
+        self._close_cell()
+        table = self._stack[-1] if self._stack else None
+        if not table or table[2] is None:
+            return
+        cells, header_only = table[2], table[3]
+        if header_only and not table[0] and cells:
+            table[0] = [cell.text for cell in cells]
+        elif cells:
+            table[1].append(cells)
+        table[2] = None
+
+    def close(self):
+        super().close()
+        while self._stack:
+            self.handle_endtag('table')
+
+
+def _extract_with_html_parser(page_source):
+    parser = _TableExtractor()
+    parser.feed(page_source)
+    parser.close()
+    return parser.tables, parser.anchors
+
+
+def _text(element):
+    return ''.join(part.strip() for part in element.itertext())
+
+
+def _extract_with_lxml(page_source):
+    document = lxml.html.fromstring(page_source)
+    # lxml的itertext会包含脚本内容，先移除
+    for element in document.xpath('//script|//style'):
+        element.drop_tree()
+
+    tables = []
+    for table in document.iter('table'):
+        headers = []
+        rows = []
+        for row in table.iter('tr'):
+            # 只处理直接属于本表格的行，嵌套表格单独处理
+            if next(row.iterancestors('table'), None) is not table:
+                continue
+            cells = []
+            header_only = True
+            for cell in row:
+                if cell.tag not in ('td', 'th'):
+                    continue
+                if cell.tag == 'td':
+                    header_only = False
+                links = [(a.get('href') or '', _text(a)) for a in cell.iter('a')]
+                hint = None
+                for hint_element in cell.iter('i', 'img'):
+                    if hint_element.tag == 'img':
+                        hint = hint_element.get('alt')
+                    elif 'icon' in (hint_element.get('class') or '').lower():
+                        hint = hint_element.get('title')
+                    if hint is not None:
+                        break
+                cells.append(Cell(_text(cell), links, hint))
+            if header_only and not headers and cells:
+                headers = [cell.text for cell in cells]
+            elif cells:
+                rows.append(cells)
+        tables.append(Table(headers, rows))
+
+    anchors = [Anchor(a.get('href') or '', _text(a), next(a.iterancestors('td', 'th'), None) is not None)
+               for a in document.iter('a')]
+    return tables, anchors
+
+
+# 可用的树构建器
+BUILDERS = {'html.parser': _extract_with_html_parser}
+if lxml_available:
+    BUILDERS['lxml'] = _extract_with_lxml
+
+DEFAULT_BUILDER = 'lxml' if lxml_available else 'html.parser'
+
+
+def extract_tables(page_source, builder=None):
+    """
+    抽取页面中的所有表格和链接
+
+    参数:
+    page_source (str): 页面HTML
+    builder (str): 'lxml'或'html.parser'，默认优先使用lxml
+
+    返回:
+    tuple: (Table列表, Anchor列表)
+    """
+    name = builder or DEFAULT_BUILDER
+    if name not in BUILDERS:
+        raise ValueError(f"不支持的解析器: {name}，可用: {', '.join(BUILDERS)}")
+    return BUILDERS[name](page_source)
+
+
+def resolve_columns(headers):
+    """
+    根据表头计算字段到列序号的映射
+
+    参数:
+    headers (list): 表头文本
+
+    返回:
+    dict: 字段名到列序号，例如{'title': 4, 'industry': 1}
+    """
+    columns = {}
+    for index, header in enumerate(headers):
+        for field, pattern in COLUMN_RULES:
+            if field not in columns and pattern.search(header):
+                columns[field] = index
+                break
+    return columns
+
+
+def absolute_link(href):
+    """将相对链接转换为完整URL"""
+    if href.startswith('//'):
+        return f"https:{href}"
+    if href.startswith('/'):
+        return f"{BASE_URL}{href}"
+    return href
+
+
+def _industry_from_title(title, default="未知行业"):
+    match = TITLE_INDUSTRY_PATTERN.search(title) if title else None
+    return match.group(0) if match else default
+
+
+def _make_report(title, link, industry, rating, org, date):
+    return {
+        "title": title,
+        "link": link,
+        "abstract": f"行业: {industry}, 评级: {rating}, 机构: {org}, 日期: {date}",
+        "industry": industry,
+        "rating": rating,
+        "org": org,
+        "date": date
+    }
+
+
+def _find_report_link(cells):
+    for cell in cells:
+        for href, text in cell.links:
+            if REPORT_LINK_PATTERN.search(href):
+                return href, text
+    return None
+
+
+def _parse_row(cells, columns):
+    """按列映射提取一行研报，没有研报链接时返回None"""
+    found = None
+    title_index = columns.get('title')
+    if title_index is not None and title_index < len(cells):
+        found = _find_report_link([cells[title_index]])
+    if found is None:
+        found = _find_report_link(cells)
+    if found is None:
+        return None
+    href, title = found
+
+    def column_text(field):
+        index = columns.get(field)
+        return cells[index].text if index is not None and index < len(cells) else ''
+
+    industry = "未知行业"
+    index = columns.get('industry')
+    if index is not None and index < len(cells):
+        text = cells[index].text
+        if text and not text.isdigit():
+            industry = text
+        elif cells[index].hint:
+            # 行业列只显示数字时，行业名称在图标的title或图片的alt中
+            industry = cells[index].hint
+    if industry == "未知行业":
+        for cell in cells:
+            match = COMMON_INDUSTRY_PATTERN.search(cell.text)
+            if match:
+                industry = match.group(0)
+                break
+    if industry == "未知行业":
+        industry = _industry_from_title(title)
+
+    rating = column_text('rating')
+    if rating not in RATINGS:
+        rating = next((cell.text for cell in cells if cell.text in RATINGS), '')
+
+    org = column_text('org')
+    if not org:
+        org = next((cell.text for cell in reversed(cells) if ORG_PATTERN.search(cell.text)), '')
+
+    date = column_text('date')
+    if not DATE_PATTERN.match(date):
+        date = next((cell.text for cell in cells if DATE_PATTERN.match(cell.text)), '')
+
+    return _make_report(title, absolute_link(href), industry, rating, org, date)
+
+
+def parse_reports(page_source, builder=None):
+    """
+    从研报列表页解析研报
+
+    依次尝试：按表头列映射解析表格行；表格外的研报详情链接；包含report/research/pdf的链接。
+
+    参数:
+    page_source (str): 页面HTML
+    builder (str): 树构建器名称，默认优先使用lxml
+
+    返回:
+    list: 研报字典列表，字段与列表接口一致
+    """
+    tables, anchors = extract_tables(page_source, builder)
+
+    reports = []
+    for table in tables:
+        if not table.rows:
+            continue
+        columns = resolve_columns(table.headers)
+        for cells in table.rows:
+            report = _parse_row(cells, columns)
+            if report:
+                reports.append(report)
+    if reports:
+        return reports
+
+    # 研报链接不在表格中时，只能得到标题和链接
+    for anchor in anchors:
+        if anchor.text and REPORT_LINK_PATTERN.search(anchor.href):
+            reports.append(_make_report(anchor.text, absolute_link(anchor.href),
+                                        _industry_from_title(anchor.text), "", "", ""))
+    if reports:
+        return reports
+
+    # 广泛搜索可能的研报链接
+    for anchor in anchors:
+        if len(anchor.text) > 5 and LOOSE_LINK_PATTERN.search(anchor.href):
+            industry = _industry_from_title(anchor.text, "未能确定行业")
+            report = _make_report(anchor.text, absolute_link(anchor.href), industry, "", "", "")
+            report["abstract"] = f"行业: {industry}"
+            reports.append(report)
+    return reports
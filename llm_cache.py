@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM响应缓存
+以(模型, 系统提示词, 提示词, temperature, max_tokens)的哈希为键，将API响应保存在SQLite中，
+相同请求直接返回缓存结果，支持过期时间、条目数上限和命中统计
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import db_pool
+import hashlib
+import threading
+import logging
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 缓存数据库文件，与业务数据库分开，可随时删除
+DEFAULT_CACHE_PATH = os.environ.get('LLM_CACHE_PATH', os.path.join('data', 'llm_cache.db'))
+
+# 缓存有效期（秒），默认30天
+DEFAULT_TTL_SECONDS = int(os.environ.get('LLM_CACHE_TTL_SECONDS', 30 * 24 * 3600))
+
+# 缓存条目上限，超过后按最近访问时间淘汰
+DEFAULT_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 5000))
+
+# 设置LLM_CACHE_ENABLED=0可全局关闭缓存
+CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', '1') != '0'
+
+
+def make_cache_key(model, system_prompt, prompt, temperature, max_tokens, **extra_params):
+    """
+    根据请求参数计算缓存键
+
+    参数:
+    model (str): 模型名称
+    system_prompt (str): 系统提示词
+    prompt (str): 渲染后的用户提示词
+    temperature (float): 采样温度
+    max_tokens (int): 最大生成长度
+    extra_params: 其他影响输出的参数，如top_p
+
+    返回:
+    str: SHA-256十六进制摘要
+    """
+    payload = {
+        'model': model,
+        'system_prompt': system_prompt,
+        'prompt': prompt,
+        'temperature': temperature,
+        'max_tokens': max_tokens,
+    }
+    payload.update(extra_params)
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class LLMCache:
+    """基于SQLite的LLM响应缓存"""
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES, enabled=CACHE_ENABLED):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+
+        # 进程内命中统计
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # 缓存文件在第一次读写时才创建，导入或构造分析器不会在磁盘上留下文件
+        self._initialized = False
+
+    def _connect(self):
+        return db_pool.connect(self.db_path, timeout=10)
+
+    def _ready(self):
+        """首次使用时初始化缓存数据库，返回缓存是否可用"""
+        if self.enabled and not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self._init_db()
+                    self._initialized = True
+        return self.enabled
+
+    def _init_db(self):
+        """初始化缓存表结构"""
+        directory = os.path.dirname(self.db_path)
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = self._connect()
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"打开LLM缓存失败，缓存将被禁用: {str(e)}")
+            self.enabled = False
+            return
+        try:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0
+            )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_last_accessed ON llm_cache(last_accessed)')
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"初始化LLM缓存失败，缓存将被禁用: {str(e)}")
+            self.enabled = False
+        finally:
+            conn.close()
+
+    def get(self, cache_key):
+        """
+        读取缓存
+
+        参数:
+        cache_key (str): make_cache_key生成的缓存键
+
+        返回:
+        str: 缓存的响应文本，未命中或已过期时返回None
+        """
+        if not self._ready():
+            return None
+
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT response, created_at FROM llm_cache WHERE cache_key = ?', (cache_key,)
+            ).fetchone()
+
+            if row and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                conn.execute('DELETE FROM llm_cache WHERE cache_key = ?', (cache_key,))
+                conn.commit()
+                row = None
+
+            if row is None:
+                with self._lock:
+                    self.misses += 1
+                return None
+
+            conn.execute('''
+            UPDATE llm_cache SET last_accessed = ?, hit_count = hit_count + 1
+            WHERE cache_key = ?
+            ''', (now, cache_key))
+            conn.commit()
+            with self._lock:
+                self.hits += 1
+            return row[0]
+        except sqlite3.Error as e:
+            logger.error(f"读取LLM缓存出错: {str(e)}")
+            return None
+        finally:
+            conn.close()
+
+    def set(self, cache_key, response, model=None):
+        """
+        写入缓存，并按有效期和条目上限淘汰旧数据
+
+        参数:
+        cache_key (str): 缓存键
+        response (str): API响应文本
+        model (str): 模型名称，仅用于统计
+        """
+        if not response or not self._ready():
+            return
+
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('''
+            INSERT OR REPLACE INTO llm_cache (cache_key, model, response, created_at, last_accessed, hit_count)
+            VALUES (?, ?, ?, ?, ?, 0)
+            ''', (cache_key, model, response, now, now))
+            self._evict(conn, now)
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"写入LLM缓存出错: {str(e)}")
+        finally:
+            conn.close()
+
+    def _evict(self, conn, now):
+        """删除过期条目，并在超过上限时删除最久未访问的条目"""
+        if self.ttl_seconds:
+            conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (now - self.ttl_seconds,))
+        if self.max_entries:
+            conn.execute('''
+            DELETE FROM llm_cache WHERE cache_key IN (
+                SELECT cache_key FROM llm_cache
+                ORDER BY last_accessed DESC
+                LIMIT -1 OFFSET ?
+            )
+            ''', (self.max_entries,))
+
+    def invalidate(self, cache_key):
+        """删除指定缓存条目"""
+        if not self._ready():
+            return
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM llm_cache WHERE cache_key = ?', (cache_key,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def clear(self):
+        """清空缓存"""
+        if not self._ready():
+            return
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM llm_cache')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self):
+        """
+        获取缓存统计信息
+
+        返回:
+        dict: 包含本进程的hits、misses、hit_rate以及缓存中的entries和累计命中次数total_hits
+        """
+        enabled = self._ready()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        result = {
+            'enabled': enabled,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0,
+            'entries': 0,
+            'total_hits': 0
+        }
+        if enabled:
+            conn = self._connect()
+            try:
+                entries, total_hits = conn.execute(
+                    'SELECT COUNT(*), COALESCE(SUM(hit_count), 0) FROM llm_cache'
+                ).fetchone()
+                result['entries'] = entries
+                result['total_hits'] = total_hits
+            except sqlite3.Error as e:
+                logger.error(f"读取LLM缓存统计出错: {str(e)}")
+            finally:
+                conn.close()
+        return result
+
+
+# 进程内共享的默认缓存实例
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """获取进程内共享的默认缓存实例"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache()
+        return _default_cache
+
+
+if __name__ == '__main__':
+    # python llm_cache.py [stats|clear]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    cache = get_default_cache()
+    if command == 'clear':
+        cache.clear()
+        print("LLM缓存已清空")
+    else:
+        print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
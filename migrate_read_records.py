@@ -6,6 +6,7 @@
 """
 
 import sqlite3
+import db_pool
 import datetime
 
 def migrate_read_records():
@@ -13,7 +14,7 @@ def migrate_read_records():
     print("开始迁移旧版已读记录到新版阅读历史表...")
     
     # 连接数据库
-    conn = sqlite3.connect('research_reports.db')
+    conn = db_pool.connect('research_reports.db')
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
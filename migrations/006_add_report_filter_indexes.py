@@ -0,0 +1,43 @@
+import sqlite3
+import os
+
+# 列表页筛选字段对应的索引，与database.REPORT_FILTER_COLUMNS保持一致
+REPORT_FILTER_INDEXES = {
+    'idx_reports_industry': 'industry',
+    'idx_reports_org': 'org',
+    'idx_reports_rating': 'rating',
+    'idx_reports_date': 'date',
+}
+
+def migrate(db_path):
+    """
+    为研报列表的筛选字段创建索引，配合按id游标分页使用
+    """
+    print("执行迁移: 创建研报筛选索引...")
+    
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
+    try:
+        for index_name, column in REPORT_FILTER_INDEXES.items():
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON reports({column})")
+            print(f"- 确保索引 {index_name} 存在")
+        
+        # 更新统计信息，帮助查询优化器选择索引
+        cursor.execute("ANALYZE reports")
+        
+        conn.commit()
+        print("迁移完成: 研报筛选索引创建成功")
+    except sqlite3.Error as e:
+        print(f"数据库迁移失败: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    db_path = 'research_reports.db'
+    if os.path.exists(db_path):
+        migrate(db_path)
+    else:
+        print(f"错误: 数据库文件 {db_path} 不存在")
+        exit(1)
@@ -0,0 +1,44 @@
+import sqlite3
+import os
+import sys
+
+# 迁移脚本位于migrations目录，需要能导入项目根目录下的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_index
+
+def migrate(db_path):
+    """
+    创建研报全文检索索引（FTS5），并为已有研报建立索引
+    """
+    print("执行迁移: 创建研报全文检索索引...")
+    
+    conn = sqlite3.connect(db_path)
+    
+    try:
+        # 索引表可能已在保存研报时按需创建，只有所有研报都已建立索引时才跳过重建
+        search_index.ensure_search_index(conn)
+        cursor = conn.cursor()
+        report_count = cursor.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+        indexed = cursor.execute(f"SELECT COUNT(*) FROM {search_index.FTS_TABLE}").fetchone()[0]
+        if indexed == report_count:
+            print("- 全文索引已是最新，跳过")
+            return
+        
+        count = search_index.rebuild_search_index(conn)
+        conn.commit()
+        print(f"- 已为 {count} 篇研报建立全文索引")
+        print("迁移完成: 全文检索索引创建成功")
+    except sqlite3.Error as e:
+        print(f"数据库迁移失败: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    db_path = 'research_reports.db'
+    if os.path.exists(db_path):
+        migrate(db_path)
+    else:
+        print(f"错误: 数据库文件 {db_path} 不存在")
+        exit(1)
@@ -0,0 +1,44 @@
+import sqlite3
+import os
+import sys
+
+# 迁移脚本位于migrations目录，需要能导入项目根目录下的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import report_stats
+
+def migrate(db_path):
+    """
+    创建研报统计聚合表，并根据已有研报和分析结果计算初始数据
+    """
+    print("执行迁移: 创建研报统计聚合表...")
+    
+    conn = sqlite3.connect(db_path)
+    
+    try:
+        # 聚合表可能已在保存分析结果时按需创建，只有所有研报都已计入时才跳过重建
+        report_stats.ensure_stats_tables(conn)
+        cursor = conn.cursor()
+        report_count = cursor.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+        counted = cursor.execute("SELECT COUNT(*) FROM report_stats_contributions").fetchone()[0]
+        if counted == report_count:
+            print("- 统计聚合数据已是最新，跳过")
+            return
+        
+        count = report_stats.rebuild_report_stats(conn)
+        conn.commit()
+        print(f"- 已汇总 {count} 篇研报的统计数据")
+        print("迁移完成: 研报统计聚合表创建成功")
+    except sqlite3.Error as e:
+        print(f"数据库迁移失败: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    db_path = 'research_reports.db'
+    if os.path.exists(db_path):
+        migrate(db_path)
+    else:
+        print(f"错误: 数据库文件 {db_path} 不存在")
+        exit(1)
@@ -0,0 +1,34 @@
+import sqlite3
+import os
+import sys
+
+# 迁移脚本位于migrations目录，需要能导入项目根目录下的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crawl_state
+
+def migrate(db_path):
+    """
+    创建增量爬取状态表：数据源水位线和详情页校验信息
+    """
+    print("执行迁移: 创建增量爬取状态表...")
+    
+    conn = sqlite3.connect(db_path)
+    
+    try:
+        crawl_state.ensure_crawl_state_tables(conn)
+        conn.commit()
+        print("迁移完成: 增量爬取状态表创建成功")
+    except sqlite3.Error as e:
+        print(f"数据库迁移失败: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    db_path = 'research_reports.db'
+    if os.path.exists(db_path):
+        migrate(db_path)
+    else:
+        print(f"错误: 数据库文件 {db_path} 不存在")
+        exit(1)
@@ -0,0 +1,40 @@
+import sqlite3
+import os
+import sys
+
+# 迁移脚本位于migrations目录，需要能导入项目根目录下的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import near_duplicate
+
+def migrate(db_path):
+    """
+    创建近似重复研报的签名表和重复关系表，并为已有研报计算签名
+    """
+    print("执行迁移: 创建近似重复检测表...")
+    
+    conn = sqlite3.connect(db_path)
+    
+    try:
+        near_duplicate.ensure_near_duplicate_tables(conn)
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"数据库迁移失败: {e}")
+        conn.rollback()
+        return
+    finally:
+        conn.close()
+    
+    try:
+        result = near_duplicate.backfill(db_path)
+        print(f"迁移完成: 近似重复检测表创建成功，已为 {result['indexed']} 篇研报计算签名，识别出 {result['duplicates']} 篇重复研报")
+    except sqlite3.Error as e:
+        print(f"计算已有研报的签名失败: {e}")
+
+if __name__ == "__main__":
+    db_path = 'research_reports.db'
+    if os.path.exists(db_path):
+        migrate(db_path)
+    else:
+        print(f"错误: 数据库文件 {db_path} 不存在")
+        exit(1)
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近似重复研报检测
+东方财富常以不同infocode链接、略有改动的标题重复发布同一篇研报，按链接去重无法识别。
+研报入库时对正文的字符4-gram集合计算MinHash签名（一次置换MinHash，64个分箱），签名按每4个值一段分为16段，
+各段的哈希值存入分桶表并建索引（LSH）；查询时只取至少一段相同的研报作为候选，
+再用签名估计Jaccard相似度，不低于SIMILARITY_THRESHOLD的视为近似重复。
+识别出的重复研报记入report_duplicates表，指向最早入库的原研报，不再单独调用LLM分析，直接复用原研报的分析结果。
+分桶表只收录原研报，同一篇研报被大量重发时，查询的候选数不随重复研报的数量增长
+
+用法: python near_duplicate.py [backfill|stats] [--db 数据库]
+"""
+
+import os
+import re
+import json
+import sqlite3
+import db_pool
+import hashlib
+import argparse
+import datetime
+import logging
+from array import array
+
+try:
+    import numpy
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = 'research_reports.db'
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 4
+
+# 估计的Jaccard相似度不低于此值视为近似重复；
+# 16段×4行的分段下，相似度0.8的研报成为候选的概率约为99.98%，相似度0.3的约为12%
+SIMILARITY_THRESHOLD = float(os.environ.get('NEAR_DUP_THRESHOLD', 0.8))
+
+# 正文（去除空白和标点后）短于此长度时不计算签名，标题加摘要代替的正文容易误判
+MIN_CONTENT_CHARS = 200
+
+# 签名算法或参数变化时加1，backfill会重新计算旧版本的签名
+SIGNATURE_VERSION = 1
+
+# 只保留文字和数字，空白、标点和排版差异不影响签名
+_NOISE_PATTERN = re.compile(r'[\W_]+')
+
+# 一次置换MinHash：每个4-gram只计算一个64位哈希，低6位决定所在分箱，最高24位作为值，每个分箱取最小值，
+# 计算量与正文长度成正比，与分箱数无关。4-gram先按字符码点组合成多项式（模2^64），
+# 再经MurmurHash3的64位收尾混合打散
+_MASK64 = (1 << 64) - 1
+_BASE = 0x100000001b3
+_MIX1 = 0xff51afd7ed558ccd
+_MIX2 = 0xc4ceb9fe1a85ec53
+_BIN_MASK = NUM_PERM - 1
+_VALUE_SHIFT = 40
+_VALUE_RANGE = 1 << (64 - _VALUE_SHIFT)
+_EMPTY = 1 << 32
+# 滚动计算多项式时移出首字符用到的权重
+_LEAD_WEIGHT = pow(_BASE, SHINGLE_SIZE - 1, 1 << 64)
+
+
+def _normalize(text):
+    normalized = _NOISE_PATTERN.sub('', (text or '').lower())
+    return normalized if len(normalized) >= MIN_CONTENT_CHARS else None
+
+
+def _bins_numpy(normalized):
+    codes = numpy.frombuffer(normalized.encode('utf-32-le'), dtype=numpy.uint32).astype(numpy.uint64)
+    count = len(codes) - SHINGLE_SIZE + 1
+    keys = codes[:count].copy()
+    for offset in range(1, SHINGLE_SIZE):
+        keys = keys * numpy.uint64(_BASE) + codes[offset:offset + count]
+    keys ^= keys >> numpy.uint64(33)
+    keys *= numpy.uint64(_MIX1)
+    keys ^= keys >> numpy.uint64(33)
+    keys *= numpy.uint64(_MIX2)
+    keys ^= keys >> numpy.uint64(33)
+    bins = numpy.full(NUM_PERM, _EMPTY, dtype=numpy.uint64)
+    numpy.minimum.at(bins, (keys & numpy.uint64(_BIN_MASK)).astype(numpy.intp), keys >> numpy.uint64(_VALUE_SHIFT))
+    return bins.tolist()
+
+
+def _bins_python(normalized):
+    codes = [ord(char) for char in normalized]
+    bins = [_EMPTY] * NUM_PERM
+    key = 0
+    for code in codes[:SHINGLE_SIZE - 1]:
+        key = key * _BASE + code
+    for i in range(SHINGLE_SIZE - 1, len(codes)):
+        key = (key * _BASE + codes[i]) & _MASK64
+        k = key ^ (key >> 33)
+        k = (k * _MIX1) & _MASK64
+        k ^= k >> 33
+        k = (k * _MIX2) & _MASK64
+        k ^= k >> 33
+        index = k & _BIN_MASK
+        value = k >> _VALUE_SHIFT
+        if value < bins[index]:
+            bins[index] = value
+        # 移出本4-gram的首字符，为下一个4-gram做准备
+        key = (key - codes[i - SHINGLE_SIZE + 1] * _LEAD_WEIGHT) & _MASK64
+    return bins
+
+
+def minhash(text):
+    """
+    计算正文的MinHash签名
+
+    空分箱取右侧（循环）第一个非空分箱的值加上距离×_VALUE_RANGE，
+    两篇研报在同一位置的值相等的概率仍等于其4-gram集合的Jaccard相似度
+
+    参数:
+    text (str): 研报正文
+
+    返回:
+    tuple: NUM_PERM个分箱的最小值，正文过短时返回None
+    """
+    normalized = _normalize(text)
+    if normalized is None:
+        return None
+    bins = _bins_numpy(normalized) if numpy_available else _bins_python(normalized)
+
+    signature = []
+    for index in range(NUM_PERM):
+        for distance in range(NUM_PERM):
+            value = bins[(index + distance) % NUM_PERM]
+            if value != _EMPTY:
+                signature.append(int(value) + distance * _VALUE_RANGE)
+                break
+    return tuple(signature)
+
+
+def similarity(a, b):
+    """由两个签名估计Jaccard相似度"""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+def _buckets(signature):
+    # 每段的哈希值包含段号，不同段的桶不会相同；取有符号64位整数存入SQLite
+    buckets = []
+    for band in range(BANDS):
+        rows = array('I', signature[band * ROWS:(band + 1) * ROWS]).tobytes()
+        digest = hashlib.blake2b(bytes([band]) + rows, digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'big', signed=True))
+    return buckets
+
+
+def _pack(signature):
+    return array('I', signature).tobytes()
+
+
+def _unpack(blob):
+    return tuple(array('I', blob))
+
+
+def ensure_near_duplicate_tables(conn):
+    """创建签名表、LSH分桶表和重复关系表（已存在时不做任何操作）"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS report_minhashes (
+        report_id INTEGER PRIMARY KEY,
+        signature BLOB NOT NULL,
+        signature_version INTEGER NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS report_minhash_buckets (
+        bucket INTEGER NOT NULL,
+        report_id INTEGER NOT NULL,
+        PRIMARY KEY (bucket, report_id)
+    ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_report_minhash_buckets_report ON report_minhash_buckets(report_id)')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS report_duplicates (
+        report_id INTEGER PRIMARY KEY,
+        original_id INTEGER NOT NULL,
+        similarity REAL NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_report_duplicates_original ON report_duplicates(original_id)')
+
+
+def find_similar(conn, signature, exclude_id=None, threshold=None):
+    """
+    查找与签名近似的原研报（重复研报不在分桶表中）
+
+    参数:
+    conn (sqlite3.Connection): 数据库连接
+    signature (tuple): minhash返回的签名
+    exclude_id (int): 不包括的研报ID（通常是研报自身）
+    threshold (float): 最低相似度，默认SIMILARITY_THRESHOLD
+
+    返回:
+    list: (研报ID, 估计相似度)列表，按相似度降序、ID升序
+    """
+    ensure_near_duplicate_tables(conn)
+    return _find_similar(conn, signature, exclude_id, threshold)
+
+
+def _find_similar(conn, signature, exclude_id=None, threshold=None):
+    threshold = SIMILARITY_THRESHOLD if threshold is None else threshold
+    buckets = _buckets(signature)
+    rows = conn.execute(f'''
+    SELECT m.report_id, m.signature FROM report_minhashes m
+    WHERE m.signature_version = ? AND m.report_id IN (
+        SELECT report_id FROM report_minhash_buckets WHERE bucket IN ({','.join('?' * len(buckets))})
+    )
+    ''', (SIGNATURE_VERSION, *buckets)).fetchall()
+    similar = []
+    for report_id, blob in rows:
+        if report_id == exclude_id:
+            continue
+        score = similarity(signature, _unpack(blob))
+        if score >= threshold:
+            similar.append((report_id, score))
+    similar.sort(key=lambda item: (-item[1], item[0]))
+    return similar
+
+
+def _find_original(conn, signature, exclude_id=None):
+    # 候选都是原研报，所有重复研报都直接指向同一篇原研报
+    roots = dict(_find_similar(conn, signature, exclude_id))
+    if not roots:
+        return None
+    # 最早入库（ID最小）的研报作为原研报
+    root = min(roots)
+    return root, roots[root]
+
+
+def _save_signature(conn, report_id, signature, now):
+    conn.execute('DELETE FROM report_minhash_buckets WHERE report_id = ?', (report_id,))
+    if signature is None:
+        conn.execute('DELETE FROM report_minhashes WHERE report_id = ?', (report_id,))
+        return
+    conn.execute('''
+    INSERT OR REPLACE INTO report_minhashes (report_id, signature, signature_version, updated_at)
+    VALUES (?, ?, ?, ?)
+    ''', (report_id, _pack(signature), SIGNATURE_VERSION, now))
+
+
+def _save_buckets(conn, report_id, signature):
+    conn.executemany('INSERT OR IGNORE INTO report_minhash_buckets (bucket, report_id) VALUES (?, ?)',
+                     [(bucket, report_id) for bucket in _buckets(signature)])
+
+
+def index_report(conn, report_id, content):
+    """
+    研报入库时保存签名并记录重复关系，在调用方的事务中执行
+
+    只有ID更小的研报才会被当作原研报，原研报重新入库时不会反过来指向它的重复研报
+
+    返回:
+    int: 原研报ID，不是重复研报时返回None
+    """
+    ensure_near_duplicate_tables(conn)
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return _index_report(conn, report_id, minhash(content), now)
+
+
+def index_reports(conn, reports):
+    """
+    批量入库时按ID顺序为多篇研报保存签名并记录重复关系，在调用方的事务中执行
+
+    参数:
+    conn (sqlite3.Connection): 数据库连接
+    reports (list): (研报ID, 正文)列表
+
+    返回:
+    dict: 重复研报ID -> 原研报ID
+    """
+    ensure_near_duplicate_tables(conn)
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    originals = {}
+    # 同一批中较早的研报先写入签名，后面的重复研报才能找到它
+    for report_id, content in sorted(reports, key=lambda item: item[0]):
+        original_id = _index_report(conn, report_id, minhash(content), now)
+        if original_id is not None:
+            originals[report_id] = original_id
+    return originals
+
+
+def _index_report(conn, report_id, signature, now):
+    conn.execute('DELETE FROM report_duplicates WHERE report_id = ?', (report_id,))
+    _save_signature(conn, report_id, signature, now)
+    if signature is None:
+        return None
+
+    found = _find_original(conn, signature, exclude_id=report_id)
+    if not found or found[0] > report_id:
+        _save_buckets(conn, report_id, signature)
+        return None
+    original_id, score = found
+    conn.execute('INSERT INTO report_duplicates (report_id, original_id, similarity, created_at) VALUES (?, ?, ?, ?)',
+                 (report_id, original_id, score, now))
+    logger.info(f"研报 {report_id} 与研报 {original_id} 近似重复（相似度 {score:.2f}）")
+    return original_id
+
+
+def remove_report(conn, report_id):
+    """删除研报的签名和重复关系，指向它的重复研报一并解除并重新加入分桶表"""
+    ensure_near_duplicate_tables(conn)
+    conn.execute('DELETE FROM report_minhashes WHERE report_id = ?', (report_id,))
+    conn.execute('DELETE FROM report_minhash_buckets WHERE report_id = ?', (report_id,))
+    orphans = conn.execute('''
+    SELECT m.report_id, m.signature FROM report_duplicates d
+    JOIN report_minhashes m ON m.report_id = d.report_id
+    WHERE d.original_id = ?
+    ''', (report_id,)).fetchall()
+    conn.execute('DELETE FROM report_duplicates WHERE report_id = ? OR original_id = ?', (report_id, report_id))
+    for orphan_id, blob in orphans:
+        _save_buckets(conn, orphan_id, _unpack(blob))
+
+
+def original_of(conn, report_id):
+    """重复研报对应的原研报ID，不是重复研报（或尚未建表）时返回None"""
+    try:
+        row = conn.execute('SELECT original_id FROM report_duplicates WHERE report_id = ?', (report_id,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def originals_of(conn, report_ids):
+    """
+    批量查询重复研报对应的原研报
+
+    返回:
+    dict: 重复研报ID -> 原研报ID，不是重复研报的ID不出现在字典中
+    """
+    report_ids = list(report_ids)
+    originals = {}
+    try:
+        for start in range(0, len(report_ids), 500):
+            chunk = report_ids[start:start + 500]
+            rows = conn.execute(f'SELECT report_id, original_id FROM report_duplicates '
+                                f'WHERE report_id IN ({",".join("?" * len(chunk))})', chunk).fetchall()
+            originals.update(rows)
+    except sqlite3.OperationalError:
+        return {}
+    return originals
+
+
+def analyzed_original(conn, content, exclude_id=None):
+    """
+    分析前检查：正文与已有LLM分析结果的研报近似重复时返回该研报ID
+
+    参数:
+    conn (sqlite3.Connection): 数据库连接
+    content (str): 待分析的研报正文
+    exclude_id (int): 待分析研报自身的ID（已入库时）
+
+    返回:
+    int: 可复用分析结果的原研报ID，没有时返回None
+    """
+    signature = minhash(content)
+    if signature is None:
+        return None
+    try:
+        found = _find_original(conn, signature, exclude_id)
+    except sqlite3.OperationalError:
+        return None
+    if not found:
+        return None
+    # 只有预评分结果的研报没有可复用的分析
+    try:
+        row = conn.execute("SELECT 1 FROM report_analysis WHERE report_id = ? AND analyzer_type != 'prescore' LIMIT 1",
+                           (found[0],)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return found[0] if row else None
+
+
+def backfill(db_path=DEFAULT_DB_PATH, chunk_size=256):
+    """
+    按ID顺序为没有签名或签名版本较旧的研报计算签名并记录重复关系
+
+    返回:
+    dict: indexed（计算的研报数）、duplicates（识别出的重复研报数）和seconds（耗时）
+    """
+    started = datetime.datetime.now()
+    indexed = 0
+    duplicates = 0
+    conn = db_pool.connect(db_path)
+    try:
+        ensure_near_duplicate_tables(conn)
+        # 旧版本签名的分桶与新签名不可比较；研报已删除的旧签名也一并清理
+        with conn:
+            conn.execute('''
+            DELETE FROM report_minhash_buckets WHERE report_id IN (
+                SELECT report_id FROM report_minhashes WHERE signature_version != ?
+            )
+            ''', (SIGNATURE_VERSION,))
+            conn.execute('''
+            DELETE FROM report_minhashes
+            WHERE signature_version != ? AND report_id NOT IN (SELECT id FROM reports)
+            ''', (SIGNATURE_VERSION,))
+        last_id = 0
+        while True:
+            rows = conn.execute('''
+            SELECT r.id, r.full_content FROM reports r
+            LEFT JOIN report_minhashes s ON s.report_id = r.id
+            WHERE r.id > ? AND (s.report_id IS NULL OR s.signature_version != ?)
+            ORDER BY r.id LIMIT ?
+            ''', (last_id, SIGNATURE_VERSION, chunk_size)).fetchall()
+            if not rows:
+                break
+            with conn:
+                conn.executemany('DELETE FROM report_minhash_buckets WHERE report_id = ?',
+                                 [(report_id,) for report_id, _ in rows])
+                duplicates += len(index_reports(conn, rows))
+            indexed += len(rows)
+            last_id = rows[-1][0]
+    finally:
+        conn.close()
+    seconds = (datetime.datetime.now() - started).total_seconds()
+    logger.info(f"近似重复索引完成: {indexed} 篇研报，其中重复 {duplicates} 篇，耗时 {seconds:.2f} 秒")
+    return {'indexed': indexed, 'duplicates': duplicates, 'seconds': round(seconds, 3)}
+
+
+def stats(conn):
+    """签名数、重复研报数和重复最多的原研报"""
+    ensure_near_duplicate_tables(conn)
+    top = conn.execute('''
+    SELECT original_id, COUNT(*) AS copies FROM report_duplicates
+    GROUP BY original_id ORDER BY copies DESC, original_id LIMIT 10
+    ''').fetchall()
+    return {
+        'signatures': conn.execute('SELECT COUNT(*) FROM report_minhashes').fetchone()[0],
+        'duplicates': conn.execute('SELECT COUNT(*) FROM report_duplicates').fetchone()[0],
+        'top_originals': [{'report_id': report_id, 'copies': copies} for report_id, copies in top]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="近似重复研报检测")
+    parser.add_argument('command', nargs='?', default='backfill', choices=['backfill', 'stats'],
+                        help='backfill: 为数据库中的研报计算签名并识别重复; stats: 查看重复统计')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='数据库文件路径')
+    args = parser.parse_args()
+
+    if args.command == 'stats':
+        conn = db_pool.connect(args.db)
+        try:
+            result = stats(conn)
+        finally:
+            conn.close()
+    else:
+        result = backfill(args.db)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
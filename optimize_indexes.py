@@ -6,6 +6,7 @@
 """
 
 import sqlite3
+import db_pool
 import logging
 import sys
 import time
@@ -22,7 +23,7 @@ DB_FILE = 'research_reports.db'
 
 def get_db_connection():
     """获取数据库连接"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = db_pool.connect(DB_FILE)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+原始页面归档
+抓取到的列表页、列表接口响应和详情页按内容哈希去重后压缩追加到段文件中（安装zstandard时用zstd，否则用zlib），
+SQLite索引记录每次抓取的URL、类型、时间和哈希；
+reparse命令只读取归档重新解析并写回reports表，不访问网络，用于解析器修复后离线重建数据
+
+用法: python page_archive.py [stats|reparse] [--archive 目录] [--db 数据库] [--dry-run]
+"""
+
+import os
+import json
+import zlib
+import time
+import db_pool
+import hashlib
+import datetime
+import argparse
+import threading
+import logging
+
+try:
+    import zstandard
+    zstd_available = True
+except ImportError:
+    zstd_available = False
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.environ.get('PAGE_ARCHIVE_DIR', os.path.join('data', 'page_archive'))
+
+# 设置为0时不归档
+ARCHIVE_ENABLED = os.environ.get('PAGE_ARCHIVE_ENABLED', '1') != '0'
+
+# 单个段文件的大小上限，超过后写入新段
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+DEFAULT_DB_PATH = 'research_reports.db'
+
+# 页面类型
+KIND_LIST = 'list'
+KIND_LIST_API = 'list_api'
+KIND_DETAIL = 'detail'
+
+CODEC = 'zstd' if zstd_available else 'zlib'
+
+
+def _compress(data, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 6)
+
+
+def _decompress(data, codec):
+    if codec == 'zstd':
+        if not zstd_available:
+            raise RuntimeError("归档中包含zstd压缩的页面，需要安装zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class PageArchive:
+    """
+    只追加的页面归档
+
+    Parameters:
+    -----------
+    root : str
+        归档目录，包含index.sqlite和segments/下的段文件
+    codec : str
+        新写入页面的压缩方式，'zstd'或'zlib'；读取时按每个页面记录的方式解压
+    """
+
+    def __init__(self, root=ARCHIVE_DIR, codec=CODEC):
+        self.root = root
+        self.codec = codec
+        self.index_path = os.path.join(root, 'index.sqlite')
+        self.segment_dir = os.path.join(root, 'segments')
+        self._lock = threading.Lock()
+        os.makedirs(self.segment_dir, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                segment INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                codec TEXT NOT NULL
+            )
+            ''')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                fetched_at TEXT NOT NULL,
+                hash TEXT NOT NULL
+            )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_pages_url ON pages (url, fetched_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_pages_kind ON pages (kind, fetched_at)')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return db_pool.connect(self.index_path, timeout=30)
+
+    def _segment_path(self, segment):
+        return os.path.join(self.segment_dir, f'{segment:06d}.seg')
+
+    def _current_segment(self, conn):
+        row = conn.execute('SELECT MAX(segment) FROM blobs').fetchone()
+        segment = row[0] or 1
+        path = self._segment_path(segment)
+        if os.path.exists(path) and os.path.getsize(path) >= SEGMENT_MAX_BYTES:
+            segment += 1
+        return segment
+
+    def put(self, url, body, kind, fetched_at=None):
+        """
+        归档一次抓取
+
+        参数:
+        url (str): 页面地址
+        body (str|bytes): 页面内容，字符串按UTF-8保存
+        kind (str): 页面类型，例如'list'、'list_api:industry'、'detail'
+        fetched_at (str): 抓取时间，默认为当前时间
+
+        返回:
+        str: 内容哈希；内容与已归档的页面相同时只追加索引记录
+        """
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        digest = hashlib.sha256(data).hexdigest()
+        fetched_at = fetched_at or datetime.datetime.now().isoformat(timespec='seconds')
+
+        with self._lock:
+            conn = self._connect()
+            try:
+                if conn.execute('SELECT 1 FROM blobs WHERE hash = ?', (digest,)).fetchone() is None:
+                    compressed = _compress(data, self.codec)
+                    segment = self._current_segment(conn)
+                    with open(self._segment_path(segment), 'ab') as f:
+                        offset = f.tell()
+                        f.write(compressed)
+                    conn.execute(
+                        'INSERT INTO blobs (hash, segment, offset, length, size, codec) VALUES (?, ?, ?, ?, ?, ?)',
+                        (digest, segment, offset, len(compressed), len(data), self.codec)
+                    )
+                conn.execute('INSERT INTO pages (url, kind, fetched_at, hash) VALUES (?, ?, ?, ?)',
+                             (url, kind, fetched_at, digest))
+                conn.commit()
+            finally:
+                conn.close()
+        return digest
+
+    def read(self, digest):
+        """按哈希读取页面内容（字符串），不存在时返回None"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT segment, offset, length, codec FROM blobs WHERE hash = ?',
+                               (digest,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        segment, offset, length, codec = row
+        with open(self._segment_path(segment), 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+        return _decompress(data, codec).decode('utf-8', errors='replace')
+
+    def latest(self, url):
+        """读取某个地址最近一次归档的内容，没有记录时返回None"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT hash FROM pages WHERE url = ? ORDER BY fetched_at DESC, id DESC LIMIT 1',
+                               (url,)).fetchone()
+        finally:
+            conn.close()
+        return self.read(row[0]) if row else None
+
+    def iter_pages(self, kind_prefix, latest_only=False):
+        """
+        按抓取时间从旧到新产出归档页面
+
+        参数:
+        kind_prefix (str): 页面类型前缀，例如'list_api'匹配'list_api:industry'和'list_api:stock'
+        latest_only (bool): 每个地址只产出最近一次抓取
+
+        返回:
+        generator: 逐个产出(url, kind, fetched_at, 内容)
+        """
+        conn = self._connect()
+        try:
+            condition = '(kind = ? OR kind LIKE ?)'
+            params = (kind_prefix, f'{kind_prefix}:%')
+            if latest_only:
+                rows = conn.execute(f'''
+                SELECT url, kind, fetched_at, hash FROM pages
+                WHERE id IN (SELECT MAX(id) FROM pages WHERE {condition} GROUP BY url)
+                ORDER BY fetched_at, id
+                ''', params).fetchall()
+            else:
+                rows = conn.execute(f'SELECT url, kind, fetched_at, hash FROM pages WHERE {condition} '
+                                    f'ORDER BY fetched_at, id', params).fetchall()
+        finally:
+            conn.close()
+
+        for url, kind, fetched_at, digest in rows:
+            body = self.read(digest)
+            if body is not None:
+                yield url, kind, fetched_at, body
+
+    def stats(self):
+        """
+        归档统计
+
+        返回:
+        dict: pages（抓取次数）、blobs（去重后的页面数）、raw_bytes、stored_bytes、segments和各类型的抓取次数
+        """
+        conn = self._connect()
+        try:
+            pages = conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+            blobs, raw_bytes, stored_bytes, segments = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length), 0), COUNT(DISTINCT segment) FROM blobs'
+            ).fetchone()
+            kinds = dict(conn.execute('SELECT kind, COUNT(*) FROM pages GROUP BY kind').fetchall())
+        finally:
+            conn.close()
+        return {
+            'pages': pages,
+            'blobs': blobs,
+            'raw_bytes': raw_bytes,
+            'stored_bytes': stored_bytes,
+            'segments': segments,
+            'kinds': kinds
+        }
+
+
+# 进程内共享的默认归档
+_default_archive = None
+_default_archive_lock = threading.Lock()
+
+
+def get_default_archive():
+    """获取进程内共享的默认归档"""
+    global _default_archive
+    with _default_archive_lock:
+        if _default_archive is None:
+            _default_archive = PageArchive()
+        return _default_archive
+
+
+def archive_page(url, body, kind):
+    """
+    归档抓取到的页面，归档失败只记录日志，不影响爬取
+
+    返回:
+    str: 内容哈希，未启用归档或归档失败时返回None
+    """
+    if not ARCHIVE_ENABLED or not body:
+        return None
+    try:
+        return get_default_archive().put(url, body, kind)
+    except Exception as e:
+        logger.error(f"归档页面出错 {url}: {str(e)}")
+        return None
+
+
+def _reports_from_list_pages(archive):
+    """从归档的列表页和列表接口响应解析研报元数据，同一链接以最近一次抓取为准"""
+    import list_parser
+    from eastmoney_api import parse_jsonp, normalize_report
+
+    reports = {}
+    for _, _, _, body in archive.iter_pages(KIND_LIST, latest_only=True):
+        for report in list_parser.parse_reports(body):
+            reports[report['link']] = report
+
+    for _, kind, _, body in archive.iter_pages(KIND_LIST_API):
+        report_type = kind.split(':', 1)[1] if ':' in kind else 'industry'
+        try:
+            items = parse_jsonp(body).get('data') or []
+        except ValueError as e:
+            logger.warning(f"跳过无法解析的列表接口响应: {str(e)}")
+            continue
+        for item in items:
+            report = normalize_report(item, report_type)
+            if report['info_code'] and report['title']:
+                reports[report['link']] = report
+    return reports
+
+
+def reparse(archive, db_path=DEFAULT_DB_PATH, dry_run=False):
+    """
+    从归档离线重建reports表
+
+    列表页提供标题、行业、评级、机构和日期，详情页提供正文；只有两者都已归档的研报才会写回。
+    写入方式与AnalysisDatabase.insert_report相同：按链接更新已有研报并保留其ID和分析结果，
+    同时刷新全文索引和统计聚合，全部在一个事务中完成。
+
+    参数:
+    archive (PageArchive): 页面归档
+    db_path (str): 数据库文件路径
+    dry_run (bool): 只解析不写库
+
+    返回:
+    dict: listed（列表中的研报数）、parsed（提取到正文的研报数）、missing_detail、empty_content、written和seconds
+    """
+    from detail_extractors import DetailExtractor, default_strategies
+    import search_index
+    import report_stats
+    import prescorer
+    import near_duplicate
+
+    started = time.perf_counter()
+    reports = _reports_from_list_pages(archive)
+    # 使用独立的提取器，不影响在线爬取时记住的首选策略
+    extractor = DetailExtractor(default_strategies())
+
+    details = {url: body for url, _, _, body in archive.iter_pages(KIND_DETAIL, latest_only=True)}
+
+    rows = []
+    missing_detail = 0
+    empty_content = 0
+    for link, report in reports.items():
+        body = details.get(link)
+        if body is None:
+            missing_detail += 1
+            continue
+        content, _ = extractor.extract(link, body, include_fallbacks=True)
+        if not content:
+            empty_content += 1
+            continue
+        rows.append((report['title'], link, report['industry'], report['rating'],
+                     report['org'], report['date'], content))
+
+    written = 0
+    if rows and not dry_run:
+        conn = db_pool.connect(db_path)
+        try:
+            search_index.ensure_search_index(conn)
+            report_stats.ensure_stats_tables(conn)
+            report_ids = []
+            for row in rows:
+                conn.execute('''
+                INSERT INTO reports (title, link, industry, rating, org, date, full_content, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
+                ON CONFLICT(link) DO UPDATE SET
+                    title = excluded.title,
+                    industry = excluded.industry,
+                    rating = excluded.rating,
+                    org = excluded.org,
+                    date = excluded.date,
+                    full_content = excluded.full_content,
+                    updated_at = datetime('now')
+                ''', row)
+                report_id = conn.execute('SELECT id FROM reports WHERE link = ?', (row[1],)).fetchone()[0]
+                search_index.index_report(conn, report_id)
+                report_stats.refresh_report(conn, report_id)
+                near_duplicate.index_report(conn, report_id, row[6])
+                report_ids.append(report_id)
+                written += 1
+            # 重建的研报整批计算预评分
+            prescores = prescorer.score_reports([row[6] for row in rows])
+            prescorer.save_prescores(conn, list(zip(report_ids, prescores)))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    return {
+        'listed': len(reports),
+        'parsed': len(rows),
+        'missing_detail': missing_detail,
+        'empty_content': empty_content,
+        'written': written,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="原始页面归档")
+    parser.add_argument('command', nargs='?', default='stats', choices=['stats', 'reparse'],
+                        help='stats: 查看归档统计; reparse: 从归档离线重建研报数据')
+    parser.add_argument('--archive', default=ARCHIVE_DIR, help='归档目录')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='数据库文件路径')
+    parser.add_argument('--dry-run', action='store_true', help='只解析，不写入数据库')
+    args = parser.parse_args()
+
+    archive = PageArchive(args.archive)
+    if args.command == 'reparse':
+        result = reparse(archive, args.db, dry_run=args.dry_run)
+    else:
+        result = archive.stats()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import sqlite3
+import db_pool
 import json
 import os
 from datetime import datetime
@@ -15,7 +16,7 @@ class PreferenceManager:
         
     def get_db_connection(self):
         """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
+        conn = db_pool.connect(self.db_path)
         conn.row_factory = sqlite3.Row
         return conn
     
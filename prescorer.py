@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+研报五步法规则预评分
+用各步骤词表和结构特征（数字、百分比、目标价、日期、评级表述）在本地为研报打出临时分数，
+研报入库时即可得到预评分，不需要等待LLM分析；流水线可按预评分排序待分析研报，
+或跳过低于阈值（PRESCORE_THRESHOLD）的研报。
+所有词表合并为一个预编译的正则，一次扫描统计全部步骤的命中次数；
+一批研报的特征组成矩阵后统一计算分数，安装numpy时使用矩阵运算，否则逐篇计算
+
+用法: python prescorer.py [backfill|rank] [--db 数据库] [--threshold 分数] [--limit 条数]
+"""
+
+import os
+import re
+import json
+import math
+import db_pool
+import argparse
+import datetime
+import logging
+from collections import Counter, namedtuple
+
+try:
+    import numpy
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = 'research_reports.db'
+
+# 预评分低于此值的研报不调用LLM分析，0表示全部分析
+PRESCORE_THRESHOLD = int(os.environ.get('PRESCORE_THRESHOLD', 0))
+
+# 跳过LLM分析的研报以此分析器类型保存预评分结果
+ANALYZER_TYPE = 'prescore'
+
+# 词表或权重变化时加1，backfill会重新计算旧版本的预评分
+LEXICON_VERSION = 1
+
+STEPS = ('信息', '逻辑', '超预期', '催化剂', '结论')
+
+# 各步骤词表
+LEXICON = {
+    '信息': ('同比', '环比', '营收', '营业收入', '收入', '净利润', '归母净利润', '毛利率', '净利率', '销量', '产量',
+           '产能', '市场份额', '份额', '价格', '均价', '出货量', '订单', '亿元', '万元', '增速', '占比', '渗透率',
+           '数据显示'),
+    '逻辑': ('因为', '由于', '因此', '所以', '驱动', '带动', '导致', '受益于', '受益', '主要原因', '一方面',
+           '另一方面', '从而', '随着', '意味着', '传导', '核心在于'),
+    '超预期': ('超预期', '预期差', '一致预期', '市场认为', '市场担心', '市场忽视', '好于预期', '优于预期', '高于预期',
+            '低于预期', '不及预期', '低估', '被忽视', '分歧', '我们认为', '与市场不同'),
+    '催化剂': ('催化剂', '催化', '政策', '落地', '投产', '发布会', '发布', '有望', '将于', '即将', '会议', '招标',
+            '审批', '获批', '新品', '上市', '大促', '补贴', '并购'),
+    '结论': ('投资建议', '维持', '首次覆盖', '给予', '评级', '买入', '增持', '推荐', '目标价', '盈利预测', 'EPS', 'PE',
+           '估值', '建议关注', '风险提示'),
+}
+
+# 结构特征：数字、百分比、日期（含季度和半年）、目标价和评级表述
+STRUCTURE_FEATURES = ('numbers', 'percents', 'dates', 'target_price', 'ratings')
+
+# 数字连同紧跟的单位一次匹配，由单位区分百分比和日期，避免每种特征各扫描一遍全文
+_NUMBER_PATTERN = re.compile(r'[0-9][0-9.]* ?(%|pct|个?百分点|年|月|日|Q[1-4])?')
+_PERCENT_UNITS = frozenset(['%', 'pct', '百分点', '个百分点'])
+_DATE_UNITS = frozenset(['年', '月', '日', 'Q1', 'Q2', 'Q3', 'Q4'])
+_DATE_WORDS = ('季度', '半年')
+_TARGET_PRICE_PATTERN = re.compile(r'目标价(?:格|位)?[^0-9。\n]{0,8}[0-9]')
+_RATING_PATTERN = re.compile(r'(?:给予|维持|首次覆盖|上调至|下调至)[^。\n]{0,6}'
+                             r'(?:买入|增持|强烈推荐|推荐|中性|持有|减持|卖出|跑赢行业|优于大市)')
+
+FEATURES = tuple(f'lexicon_{step}' for step in STEPS) + STRUCTURE_FEATURES
+
+# 特征（行）对各步骤（列）的权重，特征值先取log(1+次数)
+WEIGHTS = (
+    (1.0, 0.0, 0.0, 0.0, 0.0),
+    (0.0, 1.0, 0.0, 0.0, 0.0),
+    (0.0, 0.0, 1.0, 0.0, 0.0),
+    (0.0, 0.0, 0.0, 1.0, 0.0),
+    (0.0, 0.0, 0.0, 0.0, 1.0),
+    (0.4, 0.0, 0.0, 0.0, 0.0),  # numbers
+    (0.5, 0.0, 0.0, 0.0, 0.0),  # percents
+    (0.0, 0.0, 0.0, 0.6, 0.0),  # dates
+    (0.0, 0.0, 0.0, 0.0, 1.0),  # target_price
+    (0.0, 0.0, 0.0, 0.0, 1.0),  # ratings
+)
+
+# 步骤分数 = 100 * (1 - exp(-加权特征 / SATURATION))，命中越多越接近100
+SATURATION = 1.5
+
+# 步骤分数不低于此值时视为覆盖该步骤
+FOUND_SCORE = 40
+
+# 每个步骤保留的关键词数和证据片段数，证据片段为关键词前后各EVIDENCE_CHARS个字符
+MAX_KEYWORDS = 5
+MAX_EVIDENCE = 2
+EVIDENCE_CHARS = 30
+
+# 所有词表合并为一个正则，较长的词优先，避免"受益于"被拆成"受益"
+_TERM_STEP = {term: index for index, step in enumerate(STEPS) for term in LEXICON[step]}
+_LEXICON_PATTERN = re.compile('|'.join(re.escape(term) for term in sorted(_TERM_STEP, key=len, reverse=True)))
+_WHITESPACE = re.compile(r'\s+')
+
+
+class PreScore(namedtuple('PreScore', 'score step_scores keywords evidence')):
+    """
+    一篇研报的预评分
+
+    score为五个步骤分数的平均值，step_scores、keywords和evidence为按步骤名索引的字典
+    """
+    __slots__ = ()
+
+    def to_result(self):
+        """转换为与分析器相同结构的分析结果，用于跳过LLM分析的研报"""
+        analysis = {}
+        for step in STEPS:
+            found = self.step_scores[step] >= FOUND_SCORE
+            analysis[step] = {
+                "found": found,
+                "keywords": list(self.keywords[step]),
+                "evidence": list(self.evidence[step]),
+                "description": f"规则预评分命中: {'、'.join(self.keywords[step])}" if found else f"未找到明显{step}相关内容",
+                "step_score": self.step_scores[step],
+                "framework_summary": ""
+            }
+        analysis["summary"] = {
+            "completeness_score": self.score,
+            "steps_found": sum(1 for step in STEPS if analysis[step]["found"]),
+            "evaluation": "规则预评分，尚未经过模型分析",
+            "one_line_summary": "规则预评分结果，尚未经过模型分析"
+        }
+        return {"analysis": analysis, "full_analysis": "", "analyzer_type": ANALYZER_TYPE}
+
+
+def extract_features(text):
+    """
+    提取一篇研报的特征
+
+    返回:
+    tuple: (特征值列表（顺序同FEATURES）, 各步骤命中的词及次数)
+    """
+    text = text or ''
+    term_counts = Counter(_LEXICON_PATTERN.findall(text))
+    features = [0] * len(FEATURES)
+    step_terms = [[] for _ in STEPS]
+    for term, count in term_counts.items():
+        index = _TERM_STEP[term]
+        features[index] += count
+        step_terms[index].append((term, count))
+
+    units = Counter(_NUMBER_PATTERN.findall(text))
+    features[len(STEPS):] = [
+        sum(units.values()),
+        sum(count for unit, count in units.items() if unit in _PERCENT_UNITS),
+        sum(count for unit, count in units.items() if unit in _DATE_UNITS) + sum(map(text.count, _DATE_WORDS)),
+        len(_TARGET_PRICE_PATTERN.findall(text)),
+        len(_RATING_PATTERN.findall(text)),
+    ]
+    return features, step_terms
+
+
+def _score_matrix(rows):
+    """按权重计算各研报的步骤分数，返回每篇研报的分数列表"""
+    if numpy_available:
+        weighted = numpy.log1p(numpy.asarray(rows, dtype=float)) @ numpy.asarray(WEIGHTS)
+        return numpy.rint(100 * (1 - numpy.exp(-weighted / SATURATION))).astype(int).tolist()
+
+    scores = []
+    for row in rows:
+        logs = [math.log1p(value) for value in row]
+        scores.append([
+            int(round(100 * (1 - math.exp(-sum(logs[i] * WEIGHTS[i][j] for i in range(len(FEATURES))) / SATURATION))))
+            for j in range(len(STEPS))
+        ])
+    return scores
+
+
+def _evidence(text, terms):
+    """关键词首次出现位置前后的原文片段"""
+    snippets = []
+    for term in terms[:MAX_EVIDENCE]:
+        position = text.find(term)
+        start = max(0, position - EVIDENCE_CHARS)
+        snippets.append(_WHITESPACE.sub(' ', text[start:position + len(term) + EVIDENCE_CHARS]).strip())
+    return snippets
+
+
+def score_reports(texts):
+    """
+    批量计算研报预评分
+
+    参数:
+    texts (list): 研报正文列表
+
+    返回:
+    list: 与texts顺序一致的PreScore列表
+    """
+    texts = [text or '' for text in texts]
+    if not texts:
+        return []
+    extracted = [extract_features(text) for text in texts]
+    step_scores = _score_matrix([features for features, _ in extracted])
+
+    results = []
+    for text, (_, step_terms), scores in zip(texts, extracted, step_scores):
+        keywords, evidence = {}, {}
+        for step, terms in zip(STEPS, step_terms):
+            terms = [term for term, _ in sorted(terms, key=lambda item: (-item[1], -len(item[0])))]
+            keywords[step] = terms[:MAX_KEYWORDS]
+            evidence[step] = _evidence(text, terms)
+        results.append(PreScore(int(round(sum(scores) / len(STEPS))), dict(zip(STEPS, scores)), keywords, evidence))
+    return results
+
+
+def prescore(text):
+    """计算单篇研报的预评分"""
+    return score_reports([text])[0]
+
+
+def should_analyze(score, threshold=None):
+    """预评分是否达到调用LLM分析的阈值"""
+    threshold = PRESCORE_THRESHOLD if threshold is None else threshold
+    return score >= threshold
+
+
+def ensure_prescore_table(conn):
+    """创建预评分表（已存在时不做任何操作）"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS report_prescores (
+        report_id INTEGER PRIMARY KEY,
+        score INTEGER NOT NULL,
+        step_scores TEXT,
+        keywords TEXT,
+        evidence TEXT,
+        lexicon_version INTEGER NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_report_prescores_score ON report_prescores(score)')
+
+
+def save_prescores(conn, items):
+    """
+    保存预评分，在调用方的事务中执行
+
+    参数:
+    conn (sqlite3.Connection): 数据库连接
+    items (list): (研报ID, PreScore)列表
+    """
+    ensure_prescore_table(conn)
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    conn.executemany('''
+    INSERT OR REPLACE INTO report_prescores
+    (report_id, score, step_scores, keywords, evidence, lexicon_version, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (report_id, result.score, json.dumps(result.step_scores, ensure_ascii=False),
+         json.dumps(result.keywords, ensure_ascii=False), json.dumps(result.evidence, ensure_ascii=False),
+         LEXICON_VERSION, now)
+        for report_id, result in items
+    ])
+
+
+def prescore_report(conn, report_id, content):
+    """研报入库时计算并保存预评分，返回PreScore"""
+    result = prescore(content)
+    save_prescores(conn, [(report_id, result)])
+    return result
+
+
+def remove_report(conn, report_id):
+    """删除研报的预评分"""
+    ensure_prescore_table(conn)
+    conn.execute('DELETE FROM report_prescores WHERE report_id = ?', (report_id,))
+
+
+def get_prescore(conn, report_id):
+    """读取研报的预评分，没有时返回None"""
+    ensure_prescore_table(conn)
+    row = conn.execute('SELECT score, step_scores, keywords, evidence FROM report_prescores WHERE report_id = ?',
+                       (report_id,)).fetchone()
+    if not row:
+        return None
+    return PreScore(row[0], json.loads(row[1]), json.loads(row[2]), json.loads(row[3]))
+
+
+def backfill(db_path=DEFAULT_DB_PATH, chunk_size=256):
+    """
+    为没有预评分或词表版本较旧的研报计算预评分
+
+    每次读取chunk_size篇研报批量计算并在一个事务中写入
+
+    返回:
+    dict: scored（计算的研报数）和seconds（耗时）
+    """
+    started = datetime.datetime.now()
+    scored = 0
+    conn = db_pool.connect(db_path)
+    try:
+        ensure_prescore_table(conn)
+        last_id = 0
+        while True:
+            rows = conn.execute('''
+            SELECT r.id, r.full_content FROM reports r
+            LEFT JOIN report_prescores p ON p.report_id = r.id
+            WHERE r.id > ? AND (p.report_id IS NULL OR p.lexicon_version != ?)
+            ORDER BY r.id LIMIT ?
+            ''', (last_id, LEXICON_VERSION, chunk_size)).fetchall()
+            if not rows:
+                break
+            results = score_reports([content for _, content in rows])
+            with conn:
+                save_prescores(conn, [(report_id, result) for (report_id, _), result in zip(rows, results)])
+            scored += len(rows)
+            last_id = rows[-1][0]
+    finally:
+        conn.close()
+    seconds = (datetime.datetime.now() - started).total_seconds()
+    logger.info(f"预评分完成: {scored} 篇研报，耗时 {seconds:.2f} 秒")
+    return {'scored': scored, 'seconds': round(seconds, 3)}
+
+
+def rank_unanalyzed(conn, threshold=None, limit=None):
+    """
+    按预评分从高到低返回尚未经过LLM分析的研报（只有预评分结果的研报也包括在内）
+
+    参数:
+    conn (sqlite3.Connection): 数据库连接
+    threshold (int): 最低预评分，默认PRESCORE_THRESHOLD
+    limit (int): 最多返回的条数
+
+    返回:
+    list: (研报ID, 预评分)列表
+    """
+    ensure_prescore_table(conn)
+    threshold = PRESCORE_THRESHOLD if threshold is None else threshold
+    sql = '''
+    SELECT p.report_id, p.score FROM report_prescores p
+    WHERE p.score >= ? AND NOT EXISTS (
+        SELECT 1 FROM report_analysis a WHERE a.report_id = p.report_id AND a.analyzer_type != ?
+    )
+    ORDER BY p.score DESC, p.report_id
+    '''
+    params = [threshold, ANALYZER_TYPE]
+    if limit:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    return [tuple(row) for row in conn.execute(sql, params).fetchall()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="研报五步法规则预评分")
+    parser.add_argument('command', nargs='?', default='backfill', choices=['backfill', 'rank'],
+                        help='backfill: 为数据库中的研报计算预评分; rank: 按预评分列出待分析研报')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='数据库文件路径')
+    parser.add_argument('--threshold', type=int, default=None, help='最低预评分')
+    parser.add_argument('--limit', type=int, default=20, help='rank列出的条数')
+    args = parser.parse_args()
+
+    if args.command == 'rank':
+        conn = db_pool.connect(args.db)
+        try:
+            result = [{'report_id': report_id, 'score': score}
+                      for report_id, score in rank_unanalyzed(conn, args.threshold, args.limit)]
+        finally:
+            conn.close()
+    else:
+        result = backfill(args.db)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import sqlite3
+import db_pool
 from datetime import datetime, timedelta
 import json
 import math
@@ -88,7 +89,7 @@ class RecommendationEngine:
 
     def get_recommendations(self, user_id=1, limit=5):
         """获取推荐研报列表，考虑用户偏好和阅读历史"""
-        conn = sqlite3.connect(self.db_path)
+        conn = db_pool.connect(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -155,7 +156,7 @@ class RecommendationEngine:
     
     def mark_as_read(self, report_id, user_id=1, status='read'):
         """标记研报为已读，同时更新阅读历史"""
-        conn = sqlite3.connect(self.db_path)
+        conn = db_pool.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
@@ -255,7 +256,7 @@ class RecommendationEngine:
     
     def update_user_preferences(self, user_id=1, **preferences):
         """更新用户偏好设置"""
-        conn = sqlite3.connect(self.db_path)
+        conn = db_pool.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
@@ -332,7 +333,7 @@ class RecommendationEngine:
     
     def check_is_read(self, report_id, user_id=1):
         """检查研报是否已读，同时检查新旧两个表"""
-        conn = sqlite3.connect(self.db_path)
+        conn = db_pool.connect(self.db_path)
         cursor = conn.cursor()
         
         is_read = False
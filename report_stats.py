@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+研报统计聚合
+按行业、机构、评级、分析步骤和评分区间维护研报数量与评分总和，
+在分析结果写入或删除时增量更新，统计页面只需读取少量聚合行
+"""
+
+import sqlite3
+import db_pool
+import json
+import logging
+import prescorer
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 分析步骤
+STEP_NAMES = ("信息", "逻辑", "超预期", "催化剂", "结论")
+
+# 评级归类，顺序即统计图中的显示顺序
+RATING_BUCKETS = ("买入/强烈推荐", "增持/推荐", "中性/持有", "减持/卖出", "其他")
+
+# 评分区间：(名称, 下限)，按下限从高到低排列
+SCORE_BANDS = (("excellent", 80), ("good", 60), ("average", 40), ("poor", None))
+
+# 统计维度
+DIMENSION_OVERALL = 'overall'
+DIMENSION_INDUSTRY = 'industry'
+DIMENSION_ORG = 'org'
+DIMENSION_RATING = 'rating'
+DIMENSION_STEP = 'step'
+DIMENSION_SCORE_BAND = 'score_band'
+
+
+def normalize_rating(rating):
+    """将研报评级归入RATING_BUCKETS中的一类"""
+    if rating in ["买入", "强烈推荐"]:
+        return "买入/强烈推荐"
+    elif rating in ["增持", "推荐"]:
+        return "增持/推荐"
+    elif rating in ["中性", "持有"]:
+        return "中性/持有"
+    elif rating in ["减持", "卖出"]:
+        return "减持/卖出"
+    return "其他"
+
+
+def score_band(score):
+    """返回完整性评分所在的区间名称"""
+    for name, lower in SCORE_BANDS:
+        if lower is None or score >= lower:
+            return name
+    return SCORE_BANDS[-1][0]
+
+
+def ensure_stats_tables(conn):
+    """创建统计聚合表和单篇研报贡献表（已存在时不做任何操作）"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS report_stats (
+        dimension TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        report_count INTEGER NOT NULL DEFAULT 0,
+        score_sum REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (dimension, bucket)
+    )
+    ''')
+    # 记录每篇研报当前计入聚合表的值，更新时先减去旧值再加上新值
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS report_stats_contributions (
+        report_id INTEGER PRIMARY KEY,
+        industry TEXT,
+        org TEXT,
+        rating_bucket TEXT,
+        completeness_score REAL,
+        step_scores TEXT
+    )
+    ''')
+
+
+def _compute_contribution(conn, report_id):
+    """
+    根据研报及其最新分析结果计算该研报对各统计维度的贡献
+
+    未分析的研报按0分计入，与列表页的默认分析结构保持一致；规则预评分结果不计入。
+
+    返回:
+    dict: 贡献值，研报不存在时返回None
+    """
+    report = conn.execute(
+        'SELECT industry, org, rating FROM reports WHERE id = ?', (report_id,)
+    ).fetchone()
+    if report is None:
+        return None
+
+    analysis = conn.execute('''
+    SELECT id, completeness_score FROM report_analysis
+    WHERE report_id = ? AND analyzer_type != ?
+    ORDER BY created_at DESC, id DESC
+    LIMIT 1
+    ''', (report_id, prescorer.ANALYZER_TYPE)).fetchone()
+
+    step_scores = {step: 0 for step in STEP_NAMES}
+    completeness_score = 0
+    if analysis:
+        completeness_score = analysis[1] or 0
+        for step_name, step_score in conn.execute(
+            'SELECT step_name, step_score FROM step_analysis WHERE analysis_id = ? ORDER BY id',
+            (analysis[0],)
+        ):
+            if step_name in step_scores:
+                step_scores[step_name] = float(step_score or 0)
+
+    return {
+        'industry': report[0] or "未知行业",
+        'org': report[1] or "未知机构",
+        'rating_bucket': normalize_rating(report[2]),
+        'completeness_score': completeness_score,
+        'step_scores': step_scores
+    }
+
+
+def _contribution_rows(contribution):
+    """将贡献值展开为(维度, 分类, 评分)列表"""
+    score = contribution['completeness_score']
+    rows = [
+        (DIMENSION_OVERALL, 'all', score),
+        (DIMENSION_INDUSTRY, contribution['industry'], score),
+        (DIMENSION_ORG, contribution['org'], score),
+        (DIMENSION_RATING, contribution['rating_bucket'], score),
+        (DIMENSION_SCORE_BAND, score_band(score), score),
+    ]
+    for step, step_score in contribution['step_scores'].items():
+        rows.append((DIMENSION_STEP, step, step_score))
+    return rows
+
+
+def _apply(conn, contribution, sign):
+    """将一篇研报的贡献加到（sign=1）或减出（sign=-1）聚合表"""
+    conn.executemany('''
+    INSERT INTO report_stats (dimension, bucket, report_count, score_sum)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(dimension, bucket) DO UPDATE SET
+        report_count = report_count + excluded.report_count,
+        score_sum = score_sum + excluded.score_sum
+    ''', [(dimension, bucket, sign, sign * score) for dimension, bucket, score in _contribution_rows(contribution)])
+
+
+def _load_contribution(conn, report_id):
+    """读取研报当前计入聚合表的贡献值"""
+    row = conn.execute('''
+    SELECT industry, org, rating_bucket, completeness_score, step_scores
+    FROM report_stats_contributions WHERE report_id = ?
+    ''', (report_id,)).fetchone()
+    if row is None:
+        return None
+    return {
+        'industry': row[0],
+        'org': row[1],
+        'rating_bucket': row[2],
+        'completeness_score': row[3],
+        'step_scores': json.loads(row[4])
+    }
+
+
+def refresh_report(conn, report_id):
+    """
+    重新计算一篇研报的贡献并增量更新聚合表
+
+    在调用方的事务中执行，由调用方负责提交。研报已被删除时会移除其贡献。
+
+    参数:
+    conn (sqlite3.Connection): 数据库连接
+    report_id (int): 研报ID
+    """
+    ensure_stats_tables(conn)
+    if _refresh_report(conn, report_id):
+        conn.execute('DELETE FROM report_stats WHERE report_count <= 0')
+
+
+def refresh_reports(conn, report_ids):
+    """批量入库时更新多篇研报的贡献，在调用方的事务中执行"""
+    ensure_stats_tables(conn)
+    changed = [_refresh_report(conn, report_id) for report_id in report_ids]
+    if any(changed):
+        conn.execute('DELETE FROM report_stats WHERE report_count <= 0')
+
+
+def _refresh_report(conn, report_id):
+    # 返回贡献是否有变化
+    old = _load_contribution(conn, report_id)
+    new = _compute_contribution(conn, report_id)
+    if old == new:
+        return False
+
+    if old:
+        _apply(conn, old, -1)
+    if new:
+        _apply(conn, new, 1)
+        conn.execute('''
+        INSERT OR REPLACE INTO report_stats_contributions
+        (report_id, industry, org, rating_bucket, completeness_score, step_scores)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', (report_id, new['industry'], new['org'], new['rating_bucket'],
+              new['completeness_score'], json.dumps(new['step_scores'], ensure_ascii=False)))
+    else:
+        conn.execute('DELETE FROM report_stats_contributions WHERE report_id = ?', (report_id,))
+    return True
+
+
+def remove_report(conn, report_id):
+    """从聚合表中移除一篇研报的贡献"""
+    ensure_stats_tables(conn)
+    old = _load_contribution(conn, report_id)
+    if old:
+        _apply(conn, old, -1)
+        conn.execute('DELETE FROM report_stats_contributions WHERE report_id = ?', (report_id,))
+        conn.execute('DELETE FROM report_stats WHERE report_count <= 0')
+
+
+def rebuild_report_stats(conn):
+    """
+    清空并根据现有数据重建聚合表
+
+    参数:
+    conn (sqlite3.Connection): 数据库连接
+
+    返回:
+    int: 计入统计的研报数量
+    """
+    ensure_stats_tables(conn)
+    conn.execute('DELETE FROM report_stats')
+    conn.execute('DELETE FROM report_stats_contributions')
+    report_ids = [row[0] for row in conn.execute('SELECT id FROM reports ORDER BY id')]
+    refresh_reports(conn, report_ids)
+    return len(report_ids)
+
+
+def get_stats(db_path):
+    """
+    读取统计页面所需的全部聚合数据
+
+    参数:
+    db_path (str): 数据库路径
+
+    返回:
+    dict: 包含总数、平均分、行业/机构数量与平均分、评级分布、各步骤平均分和评分区间分布
+    """
+    conn = db_pool.connect(db_path)
+    try:
+        ensure_stats_tables(conn)
+        rows = conn.execute(
+            'SELECT dimension, bucket, report_count, score_sum FROM report_stats'
+        ).fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"读取统计聚合数据出错: {str(e)}")
+        rows = []
+    finally:
+        conn.close()
+
+    aggregates = {}
+    for dimension, bucket, count, score_sum in rows:
+        aggregates.setdefault(dimension, {})[bucket] = (count, score_sum)
+
+    def _counts(dimension):
+        # 按研报数量降序排列
+        items = sorted(aggregates.get(dimension, {}).items(), key=lambda item: item[1][0], reverse=True)
+        return {bucket: count for bucket, (count, _) in items}
+
+    def _averages(dimension):
+        return {bucket: (score_sum / count if count else 0)
+                for bucket, (count, score_sum) in aggregates.get(dimension, {}).items()}
+
+    total, total_score = aggregates.get(DIMENSION_OVERALL, {}).get('all', (0, 0))
+    ratings = aggregates.get(DIMENSION_RATING, {})
+    step_averages = _averages(DIMENSION_STEP)
+    bands = aggregates.get(DIMENSION_SCORE_BAND, {})
+
+    return {
+        'total': total,
+        'avg_score': total_score / total if total else 0,
+        'industry_counts': _counts(DIMENSION_INDUSTRY),
+        'industry_avg_scores': _averages(DIMENSION_INDUSTRY),
+        'org_counts': _counts(DIMENSION_ORG),
+        'org_avg_scores': _averages(DIMENSION_ORG),
+        'rating_labels': [bucket for bucket in RATING_BUCKETS if bucket in ratings],
+        'rating_counts': [ratings[bucket][0] for bucket in RATING_BUCKETS if bucket in ratings],
+        'step_avg_scores': [step_averages.get(step, 0) for step in STEP_NAMES],
+        'score_bands': [bands.get(name, (0, 0))[0] for name, _ in SCORE_BANDS]
+    }
+
+
+if __name__ == '__main__':
+    # 直接运行此脚本可重建统计聚合表
+    conn = db_pool.connect('research_reports.db')
+    try:
+        count = rebuild_report_stats(conn)
+        conn.commit()
+        print(f"已重建 {count} 篇研报的统计聚合数据")
+    finally:
+        conn.close()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+研报全文检索索引
+基于SQLite FTS5，对标题、摘要、行业、机构、正文和一句话总结建立倒排索引，
+按BM25排序返回结果并生成高亮片段
+"""
+
+import sqlite3
+import db_pool
+import re
+import html
+import logging
+import prescorer
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 全文索引表名
+FTS_TABLE = 'reports_fts'
+
+# 索引列，顺序与BM25权重一一对应
+FTS_COLUMNS = ('title', 'abstract', 'industry', 'org', 'full_content', 'one_line_summary')
+
+# BM25列权重：标题命中远比正文命中重要
+COLUMN_WEIGHTS = (10.0, 5.0, 3.0, 3.0, 1.0, 4.0)
+
+# 生成高亮片段时优先使用的原文字段
+SNIPPET_FIELDS = ('abstract', 'full_content', 'one_line_summary', 'title')
+
+# 高亮片段长度（字符）
+SNIPPET_LENGTH = 120
+
+# 命中结果的数量、平均分和评分分布，结构与database.get_reports_summary的返回值相同
+SUMMARY_COLUMNS = (
+    ('total', 'COUNT(*)'),
+    ('avg_score', 'AVG(COALESCE(r.completeness_score, 0))'),
+    ('score_excellent', 'SUM(CASE WHEN r.completeness_score >= 80 THEN 1 ELSE 0 END)'),
+    ('score_good', 'SUM(CASE WHEN r.completeness_score >= 60 AND r.completeness_score < 80 THEN 1 ELSE 0 END)'),
+    ('score_average', 'SUM(CASE WHEN r.completeness_score >= 40 AND r.completeness_score < 60 THEN 1 ELSE 0 END)'),
+    ('score_poor', 'SUM(CASE WHEN COALESCE(r.completeness_score, 0) < 40 THEN 1 ELSE 0 END)'),
+)
+
+# 中日韩统一表意文字
+CJK_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+
+
+def segment_text(text):
+    """
+    将文本切分为适合unicode61分词器的形式
+
+    unicode61不会切分连续的汉字，这里把每段连续汉字展开为重叠的二元组（单个汉字保持原样），
+    其余字符原样保留，由unicode61按空白和标点切分。
+
+    参数:
+    text (str): 原始文本
+
+    返回:
+    str: 以空格分隔二元组后的文本
+    """
+    if not text:
+        return ''
+
+    def _expand(match):
+        run = match.group(0)
+        if len(run) == 1:
+            return f' {run} '
+        return ' ' + ' '.join(run[i:i + 2] for i in range(len(run) - 1)) + ' '
+
+    return CJK_PATTERN.sub(_expand, str(text))
+
+
+def build_match_query(keyword):
+    """
+    将用户输入转换为FTS5 MATCH表达式
+
+    每个空白分隔的词被转换为一个短语查询，多个词之间为AND关系。
+    含有单个孤立汉字的词无法用二元组索引精确匹配，此时返回None，由调用方回退到LIKE查询。
+
+    参数:
+    keyword (str): 用户输入的搜索词
+
+    返回:
+    str: MATCH表达式，无法使用全文索引时返回None
+    """
+    phrases = []
+    for term in (keyword or '').split():
+        if any(len(run) == 1 for run in CJK_PATTERN.findall(term)):
+            return None
+        tokens = segment_text(term).split()
+        if tokens:
+            phrase = ' '.join(tokens).replace('"', '""')
+            phrases.append(f'"{phrase}"')
+    return ' '.join(phrases) if phrases else None
+
+
+def ensure_search_index(conn):
+    """创建全文索引表（已存在时不做任何操作）"""
+    conn.execute(f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {', '.join(FTS_COLUMNS)},
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    ''')
+
+
+def index_report(conn, report_id):
+    """
+    根据reports表和最新的分析结果刷新一篇研报的索引
+
+    在调用方的事务中执行，由调用方负责提交。
+
+    参数:
+    conn (sqlite3.Connection): 数据库连接
+    report_id (int): 研报ID
+    """
+    ensure_search_index(conn)
+    _index_report(conn, report_id)
+
+
+def index_reports(conn, report_ids):
+    """批量入库时刷新多篇研报的索引，在调用方的事务中执行"""
+    ensure_search_index(conn)
+    for report_id in report_ids:
+        _index_report(conn, report_id)
+
+
+def _index_report(conn, report_id):
+    row = conn.execute('''
+    SELECT r.title, r.abstract, r.industry, r.org, r.full_content,
+        COALESCE(
+            (SELECT ra.one_line_summary FROM report_analysis ra
+             WHERE ra.report_id = r.id AND ra.analyzer_type != ?
+             ORDER BY ra.created_at DESC, ra.id DESC LIMIT 1),
+            ''
+        ) AS one_line_summary
+    FROM reports r
+    WHERE r.id = ?
+    ''', (prescorer.ANALYZER_TYPE, report_id)).fetchone()
+
+    conn.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = ?', (report_id,))
+    if row is None:
+        return
+
+    conn.execute(f'''
+    INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)})
+    VALUES (?, {', '.join('?' for _ in FTS_COLUMNS)})
+    ''', (report_id, *[segment_text(value) for value in row]))
+
+
+def remove_report(conn, report_id):
+    """从全文索引中删除一篇研报"""
+    ensure_search_index(conn)
+    conn.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = ?', (report_id,))
+
+
+def rebuild_search_index(conn):
+    """
+    清空并重建全文索引
+
+    参数:
+    conn (sqlite3.Connection): 数据库连接
+
+    返回:
+    int: 索引的研报数量
+    """
+    ensure_search_index(conn)
+    conn.execute(f'DELETE FROM {FTS_TABLE}')
+    report_ids = [row[0] for row in conn.execute('SELECT id FROM reports ORDER BY id')]
+    for report_id in report_ids:
+        index_report(conn, report_id)
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return len(report_ids)
+
+
+def build_search_condition(keyword):
+    """
+    构建可用于reports表的搜索条件
+
+    参数:
+    keyword (str): 搜索关键词
+
+    返回:
+    tuple: (SQL条件, 参数列表)，条件中以id引用reports表
+    """
+    match_query = build_match_query(keyword)
+    if match_query:
+        return f'id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?)', [match_query]
+
+    # 单字查询无法使用二元组索引，回退到LIKE
+    pattern = f'%{keyword}%'
+    condition = '(title LIKE ? OR abstract LIKE ? OR industry LIKE ? OR org LIKE ? OR full_content LIKE ?)'
+    return condition, [pattern] * 5
+
+
+def search_report_ids(conn, keyword, limit=20, offset=0):
+    """
+    搜索研报，返回按相关度排序的研报ID
+
+    参数:
+    conn (sqlite3.Connection): 数据库连接
+    keyword (str): 搜索关键词
+    limit (int): 返回数量
+    offset (int): 跳过的数量
+
+    返回:
+    tuple: ([(研报ID, 相关度得分)], 命中总数)
+    """
+    hits, summary = _search(conn, keyword, limit, offset)
+    return hits, summary['total']
+
+
+def _search(conn, keyword, limit, offset):
+    """
+    搜索一页研报，命中统计以窗口函数在同一条查询中算出，MATCH只执行一次
+
+    返回:
+    tuple: ([(研报ID, 相关度得分)], 命中统计)，命中统计的键见SUMMARY_COLUMNS
+    """
+    summary_columns = ', '.join(f'{expression} OVER () AS {name}' for name, expression in SUMMARY_COLUMNS)
+    match_query = build_match_query(keyword)
+    if match_query:
+        ensure_search_index(conn)
+        weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+        # bm25()不能与窗口函数出现在同一层查询中，先在子查询中算出得分；bm25()越小越相关，取反后作为得分
+        source = f'''(
+            SELECT r.id, r.completeness_score, -bm25({FTS_TABLE}, {weights}) AS score
+            FROM {FTS_TABLE} JOIN reports r ON r.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH ?
+        ) r'''
+        params = [match_query]
+        order = 'r.score DESC'
+    else:
+        condition, params = build_search_condition(keyword)
+        source = f'(SELECT id, completeness_score, 0.0 AS score FROM reports WHERE {condition}) r'
+        order = 'r.id DESC'
+
+    rows = conn.execute(f'''
+    SELECT r.id, r.score, {summary_columns}
+    FROM {source}
+    ORDER BY {order}
+    LIMIT ? OFFSET ?
+    ''', params + [limit, offset]).fetchall()
+    if rows:
+        summary = dict(zip((name for name, _ in SUMMARY_COLUMNS), rows[0][2:]))
+    else:
+        # 页码超出命中范围时单独统计
+        row = conn.execute(f'''
+        SELECT {', '.join(expression for _, expression in SUMMARY_COLUMNS)}
+        FROM {source}
+        ''', params).fetchone()
+        summary = dict(zip((name for name, _ in SUMMARY_COLUMNS), row))
+    return [(row[0], row[1]) for row in rows], {name: value or 0 for name, value in summary.items()}
+
+
+def make_snippet(report, keyword, length=SNIPPET_LENGTH):
+    """
+    从研报原文中截取包含关键词的片段，并用<mark>高亮关键词
+
+    参数:
+    report (dict): 研报字典
+    keyword (str): 搜索关键词
+    length (int): 片段长度
+
+    返回:
+    str: 已转义的HTML片段
+    """
+    terms = [term for term in (keyword or '').split() if term]
+    if not terms:
+        return ''
+    term_pattern = re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+
+    # 优先使用摘要等描述性字段，找不到命中时退回字段开头
+    text, match = '', None
+    for field in SNIPPET_FIELDS:
+        value = report.get(field) or ''
+        match = term_pattern.search(value)
+        if match:
+            text = value
+            break
+    if not match:
+        text = next((report.get(field) for field in SNIPPET_FIELDS if report.get(field)), '')
+        return html.escape(' '.join(text[:length].split()))
+
+    start = max(0, match.start() - length // 3)
+    end = min(len(text), start + length)
+    window = ' '.join(text[start:end].split())
+
+    parts = []
+    last = 0
+    for hit in term_pattern.finditer(window):
+        parts.append(html.escape(window[last:hit.start()]))
+        parts.append(f'<mark>{html.escape(hit.group(0))}</mark>')
+        last = hit.end()
+    parts.append(html.escape(window[last:]))
+
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if end < len(text) else ''
+    return prefix + ''.join(parts) + suffix
+
+
+def search(db_path, keyword, page=1, page_size=20):
+    """
+    按相关度分页搜索研报
+
+    参数:
+    db_path (str): 数据库路径
+    keyword (str): 搜索关键词
+    page (int): 页码，从1开始
+    page_size (int): 每页数量
+
+    返回:
+    tuple: (研报字典列表, 命中统计)，研报字典附带snippet和search_score字段，
+           命中统计包含total、avg_score和各评分区间的研报数量，结构与database.get_reports_summary相同
+    """
+    conn = db_pool.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        offset = (max(1, page) - 1) * page_size
+        hits, summary = _search(conn, keyword, page_size, offset)
+        if not hits:
+            return [], summary
+
+        ids = [report_id for report_id, _ in hits]
+        # 一并取出最新的一句话总结，用于生成片段
+        rows = conn.execute(f'''
+        SELECT r.*,
+            (SELECT ra.one_line_summary FROM report_analysis ra
+             WHERE ra.report_id = r.id AND ra.analyzer_type != ?
+             ORDER BY ra.created_at DESC, ra.id DESC LIMIT 1) AS one_line_summary
+        FROM reports r
+        WHERE r.id IN ({','.join('?' for _ in ids)})
+        ''', [prescorer.ANALYZER_TYPE] + ids).fetchall()
+        reports_by_id = {row['id']: dict(row) for row in rows}
+
+        reports = []
+        for report_id, score in hits:
+            report = reports_by_id.get(report_id)
+            if report is None:
+                continue
+            report['search_score'] = score
+            report['snippet'] = make_snippet(report, keyword)
+            reports.append(report)
+        return reports, summary
+    except sqlite3.Error as e:
+        logger.error(f"全文检索出错: {str(e)}")
+        return [], {name: 0 for name, _ in SUMMARY_COLUMNS}
+    finally:
+        conn.close()
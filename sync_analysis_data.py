@@ -6,12 +6,14 @@
 确保评分和分析结果一致
 """
 
-import sqlite3
+import db_pool
 import json
+import search_index
+import report_stats
 
 def sync_analysis_data():
     """同步分析数据"""
-    conn = sqlite3.connect('research_reports.db')
+    conn = db_pool.connect('research_reports.db')
     cursor = conn.cursor()
     
     try:
@@ -50,6 +52,7 @@ def sync_analysis_data():
         
         # 4. 更新reports表中的completeness_score
         updated_reports = 0
+        synced_ids = []
         for analysis_id, report_id, analyzer_type, completeness_score, evaluation, one_line_summary, full_analysis in analyses:
             # 更新reports表中的评分
             cursor.execute('''
@@ -103,8 +106,13 @@ def sync_analysis_data():
                     ''', (report_id, full_analysis, one_line_summary))
                 
                 updated_reports += 1
+                synced_ids.append(report_id)
                 print(f"已同步研报ID {report_id} 的分析数据")
         
+        # 与AnalysisDatabase写入分析结果时一样，同步刷新全文索引和统计聚合
+        search_index.index_reports(conn, synced_ids)
+        report_stats.refresh_reports(conn, synced_ids)
+        
         conn.commit()
         print(f"成功同步了 {updated_reports} 条研报的分析数据")
         
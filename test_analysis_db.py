@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分析结果批量查询测试
+在临时目录中执行全部迁移，比较批量查询与逐条查询get_analysis_by_report_id的结果
+"""
+
+import sqlite3
+
+import pytest
+
+from analysis_db import AnalysisDatabase
+
+STEPS = ("信息", "逻辑", "超预期", "催化剂", "结论")
+
+
+def _analysis(score):
+    analysis = {step: {"found": score >= 60, "description": f"{step}分析", "step_score": score,
+                       "framework_summary": f"{step}要点"} for step in STEPS}
+    analysis["summary"] = {"completeness_score": score, "evaluation": "较完整", "one_line_summary": f"分数为{score}的点评"}
+    analysis["improvement_suggestions"] = "- 估值：补充可比公司估值\n- 催化剂：给出政策落地时间"
+    return {"analysis": analysis, "full_analysis": f"## 一句话总结\n分数为{score}的点评"}
+
+
+@pytest.fixture
+def db(analysis_db_path, monkeypatch):
+    # 每批只查2个id，少量研报即可覆盖多个批次
+    chunked = AnalysisDatabase._chunked
+    monkeypatch.setattr(AnalysisDatabase, "_chunked", staticmethod(lambda ids, size=2: chunked(ids, size)))
+    return AnalysisDatabase(analysis_db_path)
+
+
+def test_batch_lookup_matches_single_lookups(db, analysis_db_path):
+    ids = [db.insert_report(f"研报{n}", f"https://example.com/{n}", "银行", "买入", "机构", "2025-06-16", f"第{n}篇正文")
+           for n in range(7)]
+    analyzed = ids[::2]
+    for n, report_id in enumerate(analyzed):
+        db.save_analysis_result(report_id, _analysis(50 + n * 10))
+    # 第一篇另有一条较新的其他类型分析
+    db.save_analysis_result(ids[0], _analysis(90), analyzer_type="claude")
+    conn = sqlite3.connect(analysis_db_path)
+    try:
+        # 同一秒内写入的分析按写入顺序区分先后
+        conn.execute("UPDATE report_analysis SET created_at = datetime('2025-06-16', '+' || id || ' minutes')")
+        conn.commit()
+    finally:
+        conn.close()
+
+    # 包括没有分析结果的研报和不存在的研报ID
+    lookup = ids + [max(ids) + 100]
+    batch = db.get_analyses_by_report_ids(lookup)
+    assert sorted(batch) == sorted(analyzed)
+    for report_id in lookup:
+        assert batch.get(report_id) == db.get_analysis_by_report_id(report_id)
+    assert batch[ids[0]]["analyzer_type"] == "claude"
+    assert len(batch[ids[2]]["steps"]) == len(STEPS)
+    assert len(batch[ids[2]]["improvement_suggestions"]) == 2
+
+    # 指定优先的分析器类型
+    preferred = db.get_analyses_by_report_ids(lookup, analyzer_type="deepseek")
+    assert preferred[ids[0]]["analyzer_type"] == "deepseek"
+    for report_id in lookup:
+        assert preferred.get(report_id) == db.get_analysis_by_report_id(report_id, "deepseek")
+
+    assert db.get_analyses_by_report_ids([]) == {}
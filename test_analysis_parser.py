@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+五步法分析文本解析测试
+使用fixtures/analysis下DeepSeek和Claude两种风格的分析文本，以及JSON格式的分析结果
+"""
+
+import os
+import json
+
+import pytest
+
+from analysis_parser import (AnalysisParser, parse_analysis, parse_analysis_json, extract_suggestions,
+                             NO_SUMMARY, STEPS)
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "analysis")
+
+
+def _fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_deepseek_style_analysis():
+    parsed = parse_analysis(_fixture("deepseek_consumer.md"))
+
+    # 提示词要求"是否覆盖"列填写是/否
+    assert all(step.found for step in parsed.steps.values())
+    assert {name: step.score for name, step in parsed.steps.items()} == {
+        "信息": 90, "逻辑": 85, "超预期": 88, "催化剂": 80, "结论": 85
+    }
+    assert parsed.total_score == 86
+    assert parsed.steps_found == 5
+    assert parsed.steps["信息"].framework_summary.startswith("2025年5月社")
+    assert parsed.suggestions[0] == ("行业竞争格局分析", "建议补充商业百货行业内主要企业的市场份额和竞争态势")
+
+
+def test_claude_style_analysis():
+    parsed = parse_analysis(_fixture("claude_semiconductor.md"))
+
+    assert [name for name, step in parsed.steps.items() if not step.found] == ["催化剂"]
+    assert parsed.total_score == 65
+    assert parsed.steps_found == 3
+    # 列表格式的补强思路
+    assert parsed.suggestions[:2] == [("催化剂时间表", "补充晶圆厂招标和新品验证的时间节点"),
+                                      ("敏感性分析", "给出订单增速变化对盈利预测的影响")]
+
+    result = parsed.to_result(xhtml_breaks=True)
+    assert "<br />" in result["analysis"]["逻辑"]["description"]
+    assert result["analysis"]["summary"]["one_line_summary"] != NO_SUMMARY
+    assert result["full_analysis"] == parsed.text
+
+
+@pytest.mark.parametrize("name", ["deepseek_consumer.md", "claude_semiconductor.md"])
+@pytest.mark.parametrize("chunk", [1, 7, 64])
+def test_streaming_matches_single_parse(name, chunk):
+    text = _fixture(name)
+    parser = AnalysisParser()
+    events = []
+    for start in range(0, len(text), chunk):
+        events.extend(parser.feed(text[start:start + chunk]))
+    events.extend(parser.close())
+
+    assert parser.parsed == parse_analysis(text)
+    assert [event["section"] for event in events if event["event"] == "section"] == list(parser.parsed.sections)
+
+
+def test_extract_suggestions_from_section_text():
+    text = "| 待完善点 | 建议 |\n| ------- | ---- |\n| 估值 | 补充可比公司估值 |"
+    assert extract_suggestions(text) == [("估值", "补充可比公司估值")]
+    assert extract_suggestions("- 估值：补充可比公司估值") == [("估值", "补充可比公司估值")]
+    assert extract_suggestions("") == []
+
+
+def _analysis_json(**overrides):
+    data = {
+        "steps": {step: {"found": step != "超预期", "comment": "有涉及", "framework": f"{step}|要点\n第二行",
+                         "score": 70 + index} for index, step in enumerate(STEPS)},
+        "suggestions": [{"point": "估值", "advice": "补充可比公司估值"}],
+        "summary": "数据扎实的月度点评。",
+        "total_score": 72,
+        "evaluation": "良好"
+    }
+    data.update(overrides)
+    return json.dumps(data, ensure_ascii=False)
+
+
+def test_json_analysis_matches_markdown_rendering():
+    parsed = parse_analysis_json(_analysis_json())
+
+    assert [name for name, step in parsed.steps.items() if not step.found] == ["超预期"]
+    assert parsed.steps["结论"].score == 74
+    assert parsed.steps["信息"].framework_summary == "信息｜要点<br>第二行"
+    assert parsed.suggestions == [("估值", "补充可比公司估值")]
+    assert parsed.complete
+    # 生成的markdown文本按原有方式解析得到相同结果
+    assert parse_analysis(parsed.text) == parsed
+
+
+@pytest.mark.parametrize("overrides", [
+    {"steps": {}},
+    {"total_score": "七十"},
+    {"summary": ""},
+    {"suggestions": "估值"},
+])
+def test_json_analysis_rejects_invalid_schema(overrides):
+    with pytest.raises(ValueError):
+        parse_analysis_json(_analysis_json(**overrides))
+    with pytest.raises(ValueError):
+        parse_analysis_json("## 体检清单")
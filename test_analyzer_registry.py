@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分析器注册表和对冲请求测试
+每个服务商对应一个本地桩服务器，按server.delay延迟后返回server.script中的回复，不访问真实API
+"""
+
+import json
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+import analyzer_registry
+import deepseek_analyzer
+from analyzer_registry import LatencyHistogram, HedgedAnalyzer
+from llm_cache import LLMCache
+
+
+@pytest.fixture
+def providers(tmp_path, monkeypatch, chat_server, analysis_text):
+    """两个服务商：primary和backup，各自一个桩服务器"""
+    servers = {name: chat_server([analysis_text(score)]) for name, score in (("primary", 70), ("backup", 80))}
+
+    monkeypatch.setattr(deepseek_analyzer, "get_default_cache", lambda: LLMCache(str(tmp_path / "cache.db")))
+    monkeypatch.setattr(analyzer_registry, "_histograms", {})
+    monkeypatch.setenv("BACKUP_API_KEY", "backup-key")
+    monkeypatch.setenv("ANALYZER_PROVIDERS", json.dumps([
+        {"analyzer_type": name, "api_url": server.url, "api_key_env": "BACKUP_API_KEY", "model": f"{name}-model"}
+        for name, server in servers.items()
+    ]))
+    return servers
+
+
+def _hedged(*names):
+    configs = analyzer_registry.load_providers()
+    return HedgedAnalyzer([deepseek_analyzer.DeepSeekAnalyzer(provider=configs[name]) for name in names])
+
+
+def _warm_up(analyzer_type, seconds, samples=analyzer_registry.HEDGE_MIN_SAMPLES):
+    histogram = analyzer_registry.get_latency_histogram(analyzer_type)
+    for _ in range(samples):
+        histogram.record(seconds)
+
+
+def test_histogram_quantiles_and_hedge_delay():
+    histogram = LatencyHistogram()
+    assert histogram.quantile(0.9) is None
+    assert histogram.hedge_delay(default=7) == 7
+
+    for seconds in [1.0] * 90 + [30.0] * 10:
+        histogram.record(seconds)
+    assert 1.0 <= histogram.quantile(0.5) < 1.25
+    assert 1.0 <= histogram.hedge_delay() < 1.25
+    assert 30.0 <= histogram.quantile(0.99) < 37.5
+
+    # 样本数超过上限后计数减半，仍保留分布
+    small = LatencyHistogram(decay_samples=10)
+    for _ in range(11):
+        small.record(2.0)
+    assert small.total == 5 and 2.0 <= small.quantile(0.9) < 2.5
+
+
+def test_slow_primary_is_hedged_after_p90(providers):
+    providers["primary"].delay = 1.5
+    _warm_up("primary", 0.1)
+
+    started = time.time()
+    result = _hedged("primary", "backup").analyze_with_five_steps("社零点评", "5月社零同比增长6.4%。")
+    elapsed = time.time() - started
+
+    assert result["analyzer_type"] == "backup"
+    assert result["analysis"]["summary"]["completeness_score"] == 80
+    assert elapsed < 1.0
+    assert len(providers["primary"].requests) == 1 and len(providers["backup"].requests) == 1
+    assert analyzer_registry.get_latency_histogram("backup").total == 1
+
+
+def test_fast_primary_does_not_fire_hedge(providers):
+    _warm_up("primary", 1.0)
+    result = _hedged("primary", "backup").analyze_with_five_steps("社零点评", "5月社零同比增长6.4%。")
+
+    assert result["analyzer_type"] == "primary"
+    assert len(providers["backup"].requests) == 0
+    # 延迟按服务商分别统计
+    assert analyzer_registry.get_latency_histogram("primary").total == analyzer_registry.HEDGE_MIN_SAMPLES + 1
+
+
+def test_invalid_primary_answer_hedges_immediately(providers):
+    providers["primary"].script = ["## 一句话总结\n内容不完整"]
+    result = _hedged("primary", "backup").analyze_with_five_steps("社零点评", "5月社零同比增长6.4%。")
+
+    # 未积累样本时默认等待HEDGE_DEFAULT_DELAY，无效回复不必等待
+    assert result["analyzer_type"] == "backup"
+    assert len(providers["backup"].requests) == 1
+
+
+def test_registry_resolves_configured_and_builtin_types(providers):
+    assert analyzer_registry.analyzer_types()[:3] == ["deepseek", "primary", "backup"]
+    assert {"hedged", "legacy"} <= set(analyzer_registry.analyzer_types())
+
+    backup = analyzer_registry.get_analyzer("backup")
+    assert backup.analyzer_type == "backup" and backup.model == "backup-model"
+    assert backup._chat_request("提示词")["model"] == "backup-model"
+
+    from claude_analyzer import DeepSeekAnalyzer as LegacyAlias, LegacyDeepSeekAnalyzer
+    assert LegacyAlias is LegacyDeepSeekAnalyzer
+    assert isinstance(analyzer_registry.get_analyzer("legacy"), LegacyDeepSeekAnalyzer)
+
+    with pytest.raises(KeyError):
+        analyzer_registry.get_analyzer("unknown")
+
+
+def test_incomplete_analyzer_fails_at_construction():
+    class Incomplete(analyzer_registry.ReportAnalyzer):
+        analyzer_type = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+浏览器池测试
+使用假的driver_factory，不启动Chrome
+"""
+
+import pytest
+
+import browser_pool
+
+
+class FakeDriver:
+    def __init__(self):
+        self.pages = []
+        self.alive = True
+        self.quit_called = False
+
+    def get(self, url):
+        if not self.alive:
+            raise browser_pool.WebDriverException("会话已失效")
+        self.pages.append(url)
+
+    def execute_script(self, script):
+        if not self.alive:
+            raise browser_pool.WebDriverException("会话已失效")
+        return 1
+
+    def quit(self):
+        self.quit_called = True
+
+
+def _pool(**kwargs):
+    drivers = []
+
+    def factory():
+        drivers.append(FakeDriver())
+        return drivers[-1]
+
+    return browser_pool.BrowserPool(driver_factory=factory, **kwargs), drivers
+
+
+def test_drivers_are_reused_across_leases():
+    pool, drivers = _pool(size=2, max_pages=10)
+    for n in range(3):
+        with pool.lease() as driver:
+            pool.load(driver, f"https://example.com/{n}")
+
+    assert len(drivers) == 1 and drivers[0].pages == [f"https://example.com/{n}" for n in range(3)]
+    assert pool.stats()["created"] == 1 and pool.stats()["leases"] == 3 and pool.stats()["idle"] == 1
+
+
+def test_drivers_are_recycled_after_max_pages_loaded():
+    pool, drivers = _pool(size=1, max_pages=3)
+    # 只租用不打开页面不计数
+    for _ in range(5):
+        with pool.lease():
+            pass
+    assert len(drivers) == 1
+
+    # 一次租用中打开多个页面按页面计数
+    with pool.lease() as driver:
+        pool.load(driver, "https://example.com/1")
+        pool.load(driver, "https://example.com/2")
+    with pool.lease() as driver:
+        pool.load(driver, "https://example.com/3")
+    assert drivers[0].quit_called and pool.stats()["recycled"] == 1
+
+    with pool.lease() as driver:
+        assert driver is drivers[1]
+
+
+def test_broken_drivers_are_replaced():
+    pool, drivers = _pool(size=1, max_pages=10)
+
+    # 块内抛出WebDriverException时直接关闭浏览器
+    with pytest.raises(browser_pool.WebDriverException):
+        with pool.lease() as driver:
+            driver.alive = False
+            pool.load(driver, "https://example.com/1")
+    assert drivers[0].quit_called
+
+    # 空闲期间失效的浏览器在下次租用时被健康检查发现并替换
+    with pool.lease() as driver:
+        assert driver is drivers[1]
+    drivers[1].alive = False
+    with pool.lease() as driver:
+        assert driver is drivers[2]
+    assert drivers[1].quit_called and pool.stats()["created"] == 3 and pool.stats()["recycled"] == 0
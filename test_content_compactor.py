@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+研报正文压缩测试
+使用仓库中保存的研报single_report.json，并在末尾追加重复段落和免责声明
+"""
+
+import os
+import json
+
+import content_compactor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DISCLAIMER = "免责声明\n本报告仅供本公司客户使用。分析师执业证书编号：S1234567890。\n未经本公司书面许可，不得转载。"
+
+
+def _report_content():
+    with open(os.path.join(BASE_DIR, "single_report.json"), encoding="utf-8") as f:
+        return json.load(f)["full_content"]
+
+
+def test_budget_is_respected_and_conclusion_kept():
+    content = _report_content()
+    result = content_compactor.compact(content, token_budget=300)
+
+    assert result.tokens_after <= 300
+    assert result.covered_steps == list(content_compactor.STEPS)
+    # 截取开头会丢掉位于正文后部的投资建议和风险提示
+    assert "投资建议" not in content[:1000]
+    assert "建议关注" in result.text
+    assert "风险提示" in result.text
+
+
+def test_boilerplate_and_duplicates_are_removed():
+    content = _report_content()
+    conclusion = content.splitlines()[-1]
+    result = content_compactor.compact(f"{content}\n{conclusion}\n{DISCLAIMER}", token_budget=10000)
+
+    assert result.text.count(conclusion) == 1
+    assert "免责声明" not in result.text
+    assert "执业证书" not in result.text
+
+
+def test_short_content_is_kept_whole():
+    content = "投资建议：维持增持评级，目标价20元。"
+    assert content_compactor.compact(content).text == content
+    # 预算内的短正文同样去掉免责声明
+    assert content_compactor.compact(f"{content}\n{DISCLAIMER}").text == content
+    # 过滤后不剩内容时退回原文
+    assert content_compactor.compact("维持买入。").text == "维持买入。"
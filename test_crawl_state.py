@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+增量爬取状态测试
+在临时目录中执行全部迁移，列表接口和详情页响应均为桩对象，不访问网络
+"""
+
+import sqlite3
+
+import pytest
+
+from crawl_state import CrawlState
+from analysis_db import AnalysisDatabase
+
+
+def _listed(n, date):
+    return {"title": f"社零点评{n}", "link": f"https://example.com/{n}", "industry": "商贸零售",
+            "rating": "增持", "org": "机构", "date": date, "info_code": f"AP{n:04d}"}
+
+
+def _store(db, report):
+    return db.insert_report(report["title"], report["link"], report["industry"], report["rating"],
+                            report["org"], report["date"], f"{report['title']}正文")
+
+
+@pytest.fixture
+def db_path(migrated_db):
+    return migrated_db
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    pytest.importorskip("selenium")
+    pytest.importorskip("dotenv")
+    # main在导入时创建DeepSeek分析器及其响应缓存，放到临时目录中
+    monkeypatch.chdir(tmp_path)
+    import main
+    monkeypatch.setattr(main, "archive_page", lambda *args, **kwargs: None)
+    return main
+
+
+def test_watermark_advances_only_past_contiguously_stored_reports(db_path):
+    db = AnalysisDatabase(db_path)
+    state = CrawlState(db_path)
+    # 列表按发布时间倒序
+    listed = [_listed(4, "2025-06-04"), _listed(3, "2025-06-03"), _listed(2, "2025-06-02"), _listed(1, "2025-06-01")]
+
+    candidates = state.select_reports(iter(listed))
+    assert [report["info_code"] for report in candidates] == ["AP0001", "AP0002", "AP0003", "AP0004"]
+    # 第3篇写入失败，水位线只能推进到第2篇
+    for report in (candidates[0], candidates[1], candidates[3]):
+        _store(db, report)
+    assert state.advance_watermark(candidates) == {"last_date": "2025-06-02", "last_info_code": "AP0002"}
+
+    # 下次从水位线开始，第3篇仍被列出
+    candidates = state.select_reports(iter(listed))
+    assert [(report["info_code"], report["known"]) for report in candidates] == [
+        ("AP0003", False), ("AP0004", True)
+    ]
+
+
+def test_interrupted_listing_does_not_advance_watermark(db_path):
+    db = AnalysisDatabase(db_path)
+    state = CrawlState(db_path)
+
+    def pages():
+        yield _listed(2, "2025-06-02")
+        raise ConnectionError("列表接口超时")
+
+    candidates = state.select_reports(pages())
+    _store(db, candidates[0])
+    assert not state.listing_complete
+    assert state.advance_watermark(candidates) is None
+    assert state.get_watermark() is None
+
+
+def test_upsert_keeps_report_id_and_analysis(db_path):
+    db = AnalysisDatabase(db_path)
+    report = _listed(1, "2025-06-01")
+    report_id = _store(db, report)
+    conn = sqlite3.connect(db_path)
+    try:
+        # 迁移和AnalysisDatabase都不创建统计聚合读取的步骤表
+        conn.execute("CREATE TABLE IF NOT EXISTS step_analysis (id INTEGER PRIMARY KEY, analysis_id INTEGER, step_name TEXT, "
+                     "found INTEGER, description TEXT, step_score INTEGER, framework_summary TEXT)")
+        conn.execute("INSERT INTO report_analysis (report_id, analyzer_type, completeness_score, evaluation, created_at) "
+                     "VALUES (?, 'deepseek', 80, '较完整', datetime('now'))", (report_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+    report["title"] = "社零点评1（更新）"
+    assert _store(db, report) == report_id
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("SELECT title FROM reports WHERE id = ?", (report_id,)).fetchone()[0] == "社零点评1（更新）"
+        assert conn.execute("SELECT COUNT(*) FROM report_analysis WHERE report_id = ?", (report_id,)).fetchone()[0] == 1
+    finally:
+        conn.close()
+
+
+class _Response:
+    def __init__(self, status_code, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+
+def test_not_modified_detail_is_skipped(main, db_path, monkeypatch):
+    state = CrawlState(db_path)
+    url = "https://example.com/1"
+    page = "<html><body><div class='ctx-content'><p>5月社零同比增长6.4%，餐饮收入增速回升。</p></div></body></html>"
+    requests = []
+
+    def fetch(request_url, headers=None):
+        requests.append(headers)
+        if headers and headers.get("If-None-Match") == '"v1"':
+            return _Response(304)
+        return _Response(200, page, {"ETag": '"v1"'})
+
+    monkeypatch.setattr(main.http_fetch, "fetch", fetch)
+    monkeypatch.setattr(main, "chrome_driver_available", False)
+
+    assert "5月社零同比增长6.4%" in main.get_report_detail(url, state)
+    assert main.get_report_detail(url, state) is None
+    assert requests == [{}, {"If-None-Match": '"v1"'}]
+
+
+def test_list_reports_incrementally_starts_from_the_watermark(main, db_path, monkeypatch):
+    db = AnalysisDatabase(db_path)
+    state = CrawlState(db_path)
+    listed = [_listed(3, "2025-06-03"), _listed(2, "2025-06-02"), _listed(1, "2025-06-01")]
+    calls = []
+
+    class FakeAPI:
+        def __init__(self, archive=None):
+            pass
+
+        def iter_reports(self, begin_date=None, max_pages=None):
+            calls.append(begin_date)
+            yield from listed
+
+    monkeypatch.setattr(main, "LIST_MODE", "api")
+    monkeypatch.setattr(main, "EastmoneyReportAPI", FakeAPI)
+
+    candidates = main.list_reports_incrementally("https://example.com/list", state)
+    assert [report["info_code"] for report in candidates] == ["AP0001", "AP0002", "AP0003"]
+    for report in candidates[:2]:
+        _store(db, report)
+    state.advance_watermark(candidates)
+
+    candidates = main.list_reports_incrementally("https://example.com/list", state)
+    assert calls == [None, "2025-06-02"]
+    assert [report["info_code"] for report in candidates] == ["AP0003"]
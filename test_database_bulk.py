@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+研报批量写入测试
+在临时目录中执行全部迁移后写入生成的研报
+"""
+
+import sqlite3
+
+import pytest
+
+import database
+
+
+def _report(n, title=None):
+    return {
+        "title": title or f"研报{n}",
+        "link": f"https://example.com/{n}",
+        "industry": "商贸零售",
+        "full_content": f"第{n}篇研报正文。",
+        "analysis": {
+            "信息": {"found": True, "keywords": ["社零"], "evidence": ["5月社零同比增长6.4%"], "step_score": 70},
+            "结论": {"found": True, "keywords": ["增持"], "evidence": [], "step_score": 60},
+            "summary": {"completeness_score": 65, "one_line_summary": f"第{n}篇总结"}
+        },
+        "full_analysis": f"## 一句话总结\n第{n}篇总结"
+    }
+
+
+@pytest.fixture
+def db_path(migrated_db, monkeypatch):
+    monkeypatch.setattr(database, "DB_FILE", migrated_db)
+    return migrated_db
+
+
+def _count(db_path, sql):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_bulk_save_returns_ids_in_input_order(db_path):
+    result = database.bulk_save_reports((_report(n) for n in range(1200)), chunk_size=500)
+
+    assert result["saved"] == 1200
+    assert [batch["reports"] for batch in result["batches"]] == [500, 500, 200]
+    conn = sqlite3.connect(db_path)
+    try:
+        ids = dict(conn.execute("SELECT link, id FROM reports").fetchall())
+    finally:
+        conn.close()
+    assert result["report_ids"] == [ids[f"https://example.com/{n}"] for n in range(1200)]
+    assert _count(db_path, "SELECT COUNT(*) FROM analysis_results") == 2400
+    assert _count(db_path, "SELECT COUNT(*) FROM report_full_analysis") == 1200
+    assert _count(db_path, "SELECT COUNT(*) FROM report_prescores") == 1200
+
+
+def test_resaved_links_replace_old_rows_and_indexes(db_path):
+    first = database.bulk_save_reports([_report(n) for n in range(3)])["report_ids"]
+    # 单条保存和批量保存写入同一组表，可以混用
+    single_id = database.save_report_to_db(_report(3))
+    second = database.bulk_save_reports([_report(1, "研报1修订版"), _report(3), _report(1, "研报1再修订")])
+
+    assert second["report_ids"][0] == second["report_ids"][2] != first[1]
+    assert second["report_ids"][1] != single_id
+    assert _count(db_path, "SELECT COUNT(*) FROM reports") == 4
+    assert _count(db_path, "SELECT title FROM reports WHERE link = 'https://example.com/1'") == "研报1再修订"
+    # 全文索引和预评分只保留当前的研报ID
+    assert _count(db_path, "SELECT COUNT(*) FROM reports_fts") == 4
+    assert _count(db_path, "SELECT COUNT(*) FROM report_prescores WHERE report_id NOT IN (SELECT id FROM reports)") == 0
+
+
+def test_bad_report_fails_alone_inside_a_good_chunk(db_path):
+    reports = [_report(n) for n in range(5)]
+    reports[2]["title"] = None
+    result = database.bulk_save_reports(reports, chunk_size=2)
+
+    # 出错的批次回滚后逐条重试，只有出错的研报保存失败
+    assert result["saved"] == 4
+    assert result["report_ids"][2] == -1 and -1 not in result["report_ids"][:2] + result["report_ids"][3:]
+    assert [(batch["ok"], batch["saved"]) for batch in result["batches"]] == [(True, 2), (False, 1), (True, 1)]
+    assert _count(db_path, "SELECT COUNT(*) FROM reports") == 4
+    assert _count(db_path, "SELECT COUNT(*) FROM reports_fts") == 4
+    assert database.save_reports_to_db([_report(9)]) == 1
+
+
+def test_unfiltered_summary_is_cached_until_reports_change(db_path):
+    database.bulk_save_reports([_report(n) for n in range(3)])
+    summary = database.get_reports_summary()
+    assert summary["total"] == 3 and summary["score_good"] == 3 and summary["avg_score"] == 65
+
+    # 直接改写评分不改变数据版本，缓存期内首页仍返回缓存结果，筛选结果实时统计
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("UPDATE reports SET completeness_score = 90")
+        conn.commit()
+    finally:
+        conn.close()
+    assert database.get_reports_summary()["score_good"] == 3
+    assert database.get_reports_summary({"industry": "商贸零售"})["score_excellent"] == 3
+
+    # 新增研报后重新统计
+    database.save_report_to_db(_report(3))
+    summary = database.get_reports_summary()
+    assert summary["total"] == 4 and summary["score_excellent"] == 3 and summary["score_good"] == 1
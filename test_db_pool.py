@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SQLite连接管理层测试
+使用临时数据库
+"""
+
+import os
+import gc
+import sqlite3
+import threading
+
+import pytest
+
+import db_pool
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "pool.db")
+    conn = db_pool.connect(path)
+    conn.execute("CREATE TABLE reports (id INTEGER PRIMARY KEY, title TEXT)")
+    conn.execute("INSERT INTO reports (title) VALUES ('社零点评')")
+    conn.commit()
+    conn.close()
+    db_pool.reset_metrics()
+    yield path
+    db_pool.close_idle()
+
+
+def test_connections_are_reused_and_reset_on_close(db_path):
+    conn = db_pool.connect(db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    conn.row_factory = sqlite3.Row
+    conn.execute("INSERT INTO reports (title) VALUES ('未提交')")
+    conn.close()
+    conn.close()
+
+    # 归还时回滚未提交的修改并恢复默认的row_factory
+    again = db_pool.connect(db_path)
+    assert again is conn
+    assert again.row_factory is None
+    assert again.execute("SELECT COUNT(*) FROM reports").fetchone()[0] == 1
+
+    # 嵌套使用时另开连接，互不影响事务
+    nested = db_pool.connect(db_path)
+    assert nested is not again
+    nested.close()
+    again.close()
+
+    metrics = db_pool.get_metrics()[os.path.abspath(db_path)]
+    assert metrics["acquired"] == 3 and metrics["reused"] == 2 and metrics["opened"] == 1
+    assert metrics["in_use"] == 0 and metrics["peak_in_use"] == 2 and metrics["idle"] == 2
+
+
+def test_threads_get_their_own_connections(db_path):
+    main_conn = db_pool.connect(db_path)
+    main_conn.close()
+    seen = []
+
+    def read():
+        conn = db_pool.connect(db_path)
+        seen.append(conn)
+        conn.execute("SELECT COUNT(*) FROM reports").fetchone()
+        conn.close()
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    thread.join()
+    gc.collect()
+
+    assert seen[0] is not main_conn
+    # 线程结束后其空闲连接随之关闭
+    metrics = db_pool.get_metrics()[os.path.abspath(db_path)]
+    assert metrics["closed"] == 1 and metrics["idle"] == 1
+
+
+def test_readers_are_not_blocked_by_an_open_write(db_path):
+    writer = db_pool.connect(db_path)
+    writer.execute("BEGIN IMMEDIATE")
+    writer.execute("UPDATE reports SET title = '改写中'")
+
+    reader = db_pool.connect(db_path, timeout=0)
+    assert reader.execute("SELECT title FROM reports").fetchone()[0] == "社零点评"
+    reader.close()
+    writer.commit()
+    writer.close()
+
+
+def test_backup_includes_data_still_in_the_wal(db_path, tmp_path):
+    conn = db_pool.connect(db_path)
+    conn.execute("INSERT INTO reports (title) VALUES ('新研报')")
+    conn.commit()
+    conn.close()
+
+    dest = str(tmp_path / "backup.db")
+    db_pool.backup(db_path, dest)
+    copy = sqlite3.connect(dest)
+    try:
+        assert copy.execute("SELECT COUNT(*) FROM reports").fetchone()[0] == 2
+    finally:
+        copy.close()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+短研报批量分析测试
+使用本地桩服务器按请求中的研报分隔行返回分析文本，不访问真实API
+"""
+
+import re
+
+import pytest
+
+pytest.importorskip("requests")
+
+import deepseek_analyzer
+from deepseek_analyzer import BATCH_MARKER, split_batch_response
+from llm_cache import LLMCache
+
+
+def _prompts(server):
+    return [body["messages"][1]["content"] for body in server.requests]
+
+
+@pytest.fixture
+def analyzer(tmp_path, monkeypatch, chat_server, analysis_text):
+    def reply(body):
+        """批量请求按研报编号返回各篇分析（跳过server.drop中的编号），单篇请求返回一篇分析"""
+        prompt = body["messages"][1]["content"]
+        positions = [int(n) for n in re.findall(r"^===== 研报 (\d+) =====$", prompt, re.M)]
+        if not positions:
+            return analysis_text(60)
+        return "\n".join(f"{BATCH_MARKER.format(n)}\n{analysis_text(70 + n)}"
+                         for n in positions if n not in server.drop)
+
+    server = chat_server(reply)
+    server.drop = set()
+    monkeypatch.setattr(deepseek_analyzer, "get_default_cache", lambda: LLMCache(str(tmp_path / "cache.db")))
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    monkeypatch.setenv("DEEPSEEK_API_URL", server.url)
+    instance = deepseek_analyzer.DeepSeekAnalyzer()
+    instance.server = server
+    return instance
+
+
+REPORTS = [
+    {"title": "短评一", "content": "5月销量同比增长12%，维持增持评级。", "industry": "汽车"},
+    {"title": "长篇深度", "content": "由于需求回暖，行业订单同比增长。" * 80, "industry": "机械"},
+    {"title": "短评二", "content": "新品发布有望带动收入增长，首次覆盖给予买入评级。", "industry": "电子"},
+    {"title": "短评三", "content": "政策落地，建议关注龙头。", "industry": "医药"},
+]
+
+
+def test_short_reports_share_one_request(analyzer):
+    results = analyzer.analyze_batch(REPORTS)
+
+    batch_prompts = [prompt for prompt in _prompts(analyzer.server) if BATCH_MARKER.format(1) in prompt]
+    assert len(analyzer.server.requests) == 2
+    assert len(batch_prompts) == 1
+    assert "长篇深度" not in batch_prompts[0] and "短评三" in batch_prompts[0]
+    # 批量请求中的格式要求只出现一次
+    assert batch_prompts[0].count("## 体检清单") == 1
+
+    scores = [result["analysis"]["summary"]["completeness_score"] for result in results]
+    assert scores == [71, 60, 72, 73]
+
+    # 拆分结果按单篇请求写入缓存
+    cached = analyzer.analyze_with_five_steps(REPORTS[2]["title"], REPORTS[2]["content"], REPORTS[2]["industry"])
+    assert cached["analysis"]["summary"]["completeness_score"] == 72
+    assert len(analyzer.server.requests) == 2
+
+
+def test_invalid_batch_entries_fall_back_to_single_requests(analyzer):
+    analyzer.server.drop = {2}
+    short_reports = [REPORTS[0], REPORTS[2], REPORTS[3]]
+    results = analyzer.analyze_batch(short_reports)
+
+    assert len(analyzer.server.requests) == 2
+    assert _prompts(analyzer.server)[1].count("研报标题: 短评二") == 1
+    assert [result["analysis"]["summary"]["completeness_score"] for result in results] == [71, 60, 73]
+
+
+def test_split_batch_response_rejects_duplicates_and_unknown_positions(analysis_text):
+    text = "\n".join([BATCH_MARKER.format(1), analysis_text(80), BATCH_MARKER.format(1), analysis_text(81),
+                      BATCH_MARKER.format(2), "## 一句话总结\n不完整", BATCH_MARKER.format(3), analysis_text(82),
+                      BATCH_MARKER.format(9), analysis_text(83)])
+    assert list(split_batch_response(text, 3)) == [3]
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+异步DeepSeek客户端测试
+使用本地桩服务器模拟chat completions接口，不访问真实API
+"""
+
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from deepseek_client import DeepSeekClient, AdaptiveTokenBucket, backoff_delay, parse_retry_after
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """模拟DeepSeek接口：前throttle_count次请求返回429，之后回显用户消息"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.request_count += 1
+            server.client_ports.add(self.client_address[1])
+            throttle = server.request_count <= server.throttle_count
+
+        if throttle:
+            self._send(429, {"error": "rate limited"}, {"Retry-After": "0.2"})
+            return
+
+        time.sleep(server.delay)
+        content = body["messages"][-1]["content"]
+        self._send(200, {"choices": [{"message": {"role": "assistant", "content": f"echo:{content}"}}]})
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.client_ports = set()
+    server.throttle_count = 0
+    server.delay = 0.05
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _messages(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_chat_returns_content(stub_server):
+    async def run():
+        async with DeepSeekClient(api_key="test", base_url=stub_server.url, requests_per_second=100) as client:
+            return await client.chat(_messages("你好"))
+
+    assert asyncio.run(run()) == "echo:你好"
+
+
+def test_retries_after_429_and_slows_down(stub_server):
+    stub_server.throttle_count = 2
+
+    async def run():
+        async with DeepSeekClient(api_key="test", base_url=stub_server.url, requests_per_second=10) as client:
+            text = await client.chat(_messages("retry"))
+            return text, client.retry_count, client.limiter
+
+    started = time.monotonic()
+    text, retries, limiter = asyncio.run(run())
+    assert text == "echo:retry"
+    assert retries == 2
+    assert limiter.throttled == 2
+    assert limiter.rate < 10
+    # 两次Retry-After各0.2秒
+    assert time.monotonic() - started >= 0.4
+
+
+def test_analyze_many_yields_all_results_over_pooled_connections(stub_server):
+    async def run():
+        results = []
+        async with DeepSeekClient(api_key="test", base_url=stub_server.url,
+                                  max_concurrency=3, requests_per_second=100) as client:
+            requests = [{"messages": _messages(str(i))} for i in range(12)]
+            async for index, result in client.analyze_many(requests):
+                results.append((index, result))
+        return results
+
+    results = asyncio.run(run())
+    assert sorted(index for index, _ in results) == list(range(12))
+    assert all(result == f"echo:{index}" for index, result in results)
+    # keep-alive：12个请求最多使用max_concurrency个连接
+    assert len(stub_server.client_ports) <= 3
+
+
+def test_analyze_many_reports_errors_per_item(stub_server):
+    async def run():
+        async with DeepSeekClient(api_key="test", base_url=stub_server.url,
+                                  max_retries=0, requests_per_second=100) as client:
+            return [item async for item in client.analyze_many([{"messages": _messages("x")}])]
+
+    stub_server.throttle_count = 1
+    [(index, result)] = asyncio.run(run())
+    assert index == 0
+    assert isinstance(result, Exception)
+
+
+def test_token_bucket_limits_rate():
+    async def run():
+        bucket = AdaptiveTokenBucket(rate=20, capacity=1)
+        started = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # 首个令牌立即可用，其余5个按每秒20个补充
+    assert asyncio.run(run()) >= 0.2
+
+
+def test_backoff_helpers():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("not a date") is None
+    assert 2.0 <= backoff_delay(0, retry_after=2.0) <= 2.5
+    assert all(0 <= backoff_delay(attempt) <= 30 for attempt in range(10))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+JSON格式五步法分析测试
+本地桩服务器依次返回server.script中的回复，不访问真实API
+"""
+
+import json
+
+import pytest
+
+pytest.importorskip("requests")
+
+import deepseek_analyzer
+from llm_cache import LLMCache
+
+STEPS = ("信息", "逻辑", "超预期", "催化剂", "结论")
+
+VALID_JSON = json.dumps({
+    "steps": {step: {"found": True, "comment": "有涉及", "framework": "要点", "score": 80} for step in STEPS},
+    "suggestions": [{"point": "估值", "advice": "补充可比公司估值"}],
+    "summary": "结论明确的点评。",
+    "total_score": 81,
+    "evaluation": "良好"
+}, ensure_ascii=False)
+
+MARKDOWN = ("## 一句话总结\n改用markdown格式的分析。\n\n## 五步法定量评分\n| 步骤 | 分数(0-100) | 评价 |\n"
+            "| ---- | ----------- | ---- |\n| 总分 | 55 | 一般 |\n")
+
+
+@pytest.fixture
+def analyzer(tmp_path, monkeypatch, chat_server):
+    server = chat_server([MARKDOWN])
+    monkeypatch.setattr(deepseek_analyzer, "get_default_cache", lambda: LLMCache(str(tmp_path / "cache.db")))
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    monkeypatch.setenv("DEEPSEEK_API_URL", server.url)
+    instance = deepseek_analyzer.DeepSeekAnalyzer(output_format=deepseek_analyzer.OUTPUT_JSON)
+    instance.server = server
+    return instance
+
+
+def test_json_reply_maps_to_structured_result(analyzer):
+    analyzer.server.script = ["{\"steps\": {}}", VALID_JSON]
+    result = analyzer.analyze_with_five_steps("社零点评", "5月社零同比增长6.4%。")
+
+    requests_sent = analyzer.server.requests
+    assert len(requests_sent) == 2
+    assert requests_sent[0]["response_format"] == {"type": "json_object"}
+    assert result["analysis"]["summary"]["completeness_score"] == 81
+    assert result["analysis"]["信息"]["found"] is True
+    assert result["full_analysis"].startswith("## 体检清单")
+
+    # 只缓存通过校验的回复
+    assert analyzer.analyze_with_five_steps("社零点评", "5月社零同比增长6.4%。") == result
+    assert len(analyzer.server.requests) == 2
+
+
+def test_invalid_json_falls_back_to_markdown(analyzer):
+    analyzer.server.script = ["不是JSON", "{}", MARKDOWN]
+    result = analyzer.analyze_with_five_steps("社零点评", "5月社零同比增长6.4%。")
+
+    assert len(analyzer.server.requests) == 3
+    assert "response_format" not in analyzer.server.requests[2]
+    assert result["analysis"]["summary"]["completeness_score"] == 55
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+流式五步法分析测试
+使用本地桩服务器按SSE格式逐行返回分析文本，不访问真实API
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+
+import deepseek_analyzer
+from deepseek_client import iter_stream_content
+from llm_cache import LLMCache
+
+ANALYSIS_TEXT = """## 体检清单
+| 五步要素 | 是否覆盖 | 快评 |
+| ------- | ------- | ---- |
+| 信息 | ✅ | 数据详实 |
+| 逻辑 | ✅ | 推理清晰 |
+| 超预期 | ⚠️ | 略有提及 |
+| 催化剂 | ✅ | 政策明确 |
+| 结论 | ✅ | 建议明确 |
+
+## 五步框架梳理
+| 步骤 | 核心内容提炼 |
+| ---- | ------------ |
+| Information | 5月社零同比增长6.4% |
+| Conclusion | 关注高端酒和区域龙头 |
+
+## 一句话总结
+数据扎实、结论清晰的月度点评。
+
+## 五步法定量评分
+| 步骤 | 分数(0-100) | 评价 |
+| ---- | ----------- | ---- |
+| 信息 | 85 | 良好 |
+| 逻辑 | 80 | 良好 |
+| 超预期 | 60 | 一般 |
+| 催化剂 | 75 | 良好 |
+| 结论 | 82 | 良好 |
+| 总分 | 78 | 良好 |
+"""
+
+
+@pytest.fixture
+def analyzer(tmp_path, monkeypatch, chat_server):
+    server = chat_server([ANALYSIS_TEXT])
+    monkeypatch.setattr(deepseek_analyzer, "get_default_cache", lambda: LLMCache(str(tmp_path / "cache.db")))
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    monkeypatch.setenv("DEEPSEEK_API_URL", server.url)
+    instance = deepseek_analyzer.DeepSeekAnalyzer()
+    instance.server = server
+    return instance
+
+
+def test_iter_stream_content_skips_comments_and_stops_at_done():
+    lines = [b": ping", b"", 'data: {"choices": [{"delta": {"content": "五步"}}]}',
+             'data: {"choices": [{"delta": {}}]}', "data: [DONE]", 'data: {"choices": [{"delta": {"content": "x"}}]}']
+    assert list(iter_stream_content(lines)) == ["五步"]
+
+
+def test_stream_emits_rows_before_done_and_matches_blocking_parse(analyzer):
+    events = list(analyzer.stream_five_steps("社零点评", "5月社零同比增长6.4%。", "商贸零售"))
+    names = [event["event"] for event in events]
+
+    assert analyzer.server.requests[0]["stream"] is True
+    # 第一行表格在回复结束之前就已产出
+    first_row = names.index("row")
+    assert first_row < names.index("section") < names.index("done")
+    assert events[first_row] == {"event": "row", "section": "体检清单", "step": "信息",
+                                 "covered": "✅", "comment": "数据详实"}
+
+    scores = {event["step"]: event["score"] for event in events
+              if event["event"] == "row" and event["section"] == "五步法定量评分"}
+    assert scores == {"信息": 85, "逻辑": 80, "超预期": 60, "催化剂": 75, "结论": 82, "总分": 78}
+    assert [event["section"] for event in events if event["event"] == "section"] == [
+        "体检清单", "五步框架梳理", "一句话总结", "五步法定量评分"
+    ]
+
+    result = events[-1]["result"]
+    assert result == analyzer._build_structured_result(ANALYSIS_TEXT)
+    assert result["analysis"]["summary"]["completeness_score"] == 78
+
+
+def test_stream_replays_cached_response(analyzer):
+    # 构造分析器不创建缓存文件，第一次读写时才创建
+    assert not os.path.exists(analyzer.cache.db_path)
+    list(analyzer.stream_five_steps("社零点评", "5月社零同比增长6.4%。"))
+    events = list(analyzer.stream_five_steps("社零点评", "5月社零同比增长6.4%。"))
+
+    assert len(analyzer.server.requests) == 1
+    assert events[-1]["event"] == "done"
+    assert events[-1]["result"]["full_analysis"] == ANALYSIS_TEXT
+
+
+def test_stream_does_not_cache_incomplete_response(analyzer):
+    # 回复在评分表之前中断，解析结果不完整
+    analyzer.server.script = [ANALYSIS_TEXT.split("## 五步法定量评分")[0]]
+    list(analyzer.stream_five_steps("社零点评", "5月社零同比增长6.4%。"))
+    events = list(analyzer.stream_five_steps("社零点评", "5月社零同比增长6.4%。"))
+
+    assert len(analyzer.server.requests) == 2
+    assert events[-1]["event"] == "done"
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+详情页正文提取策略测试
+"""
+
+import pytest
+
+pytest.importorskip("bs4")
+
+from detail_extractors import DetailExtractor, default_strategies
+
+INDUSTRY_URL = "https://data.eastmoney.com/report/zw_industry.jshtml?infocode=AP1"
+STOCK_URL = "https://data.eastmoney.com/report/zw_stock.jshtml?infocode=AP2"
+
+
+def test_strategies_keep_original_order():
+    extractor = DetailExtractor(default_strategies())
+    html = '<div class="ctx-content"><p>甲</p><p> 乙 </p></div><div class="newsContent">新闻</div>'
+    assert extractor.extract(INDUSTRY_URL, html) == ("甲\n乙", "ctx-content")
+
+
+def test_report_content_drops_scripts_and_styles():
+    extractor = DetailExtractor(default_strategies())
+    html = '<div class="report-content"><script>var a = 1;</script>正文<style>.x{}</style>内容</div>'
+    assert extractor.extract(INDUSTRY_URL, html) == ("正文内容", "report-content")
+
+
+def test_markers_skip_absent_strategies_and_remember_winner():
+    extractor = DetailExtractor(default_strategies())
+    html = '<div class="zw-content"><div class="ctx-box"><p>正文</p></div></div>'
+    assert extractor.extract(STOCK_URL, html) == ("正文", "zw-content/ctx-box")
+
+    stats = extractor.stats()
+    # 页面中没有特征字符串的策略不解析、不计入尝试次数
+    assert stats["strategies"]["ctx-content"]["attempts"] == 0
+    assert stats["strategies"]["ctx-content"]["skipped"] == 1
+    assert stats["strategies"]["zw-content/ctx-box"]["hit_rate"] == 1.0
+    assert stats["preferred"] == {"zw_stock.jshtml": "zw-content/ctx-box"}
+
+    # 同一模板下次优先尝试上次成功的策略
+    html = '<div class="ctx-content"><p>甲</p></div><div class="zw-content"><div class="ctx-box"><p>乙</p></div></div>'
+    assert extractor.extract(STOCK_URL, html) == ("乙", "zw-content/ctx-box")
+    assert extractor.extract(INDUSTRY_URL, html) == ("甲", "ctx-content")
+
+
+def test_fallback_strategy_only_when_requested():
+    extractor = DetailExtractor(default_strategies())
+    html = '<div class="content">' + "字" * 600 + '</div>'
+    assert extractor.extract(INDUSTRY_URL, html) == ("", None)
+    content, strategy = extractor.extract(INDUSTRY_URL, html, include_fallbacks=True)
+    assert strategy == "content" and len(content) == 600
+    assert extractor.stats()["preferred"] == {}
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+研报列表接口测试
+使用fixtures/eastmoney下录制的接口响应，不访问网络
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+
+from eastmoney_api import EastmoneyReportAPI, parse_jsonp, normalize_report
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "eastmoney")
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+
+class FixtureSession:
+    """按pageNo返回录制的响应，并记录请求参数"""
+
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append(params)
+        path = os.path.join(FIXTURE_DIR, f"report_list_page{params['pageNo']}.jsonp")
+        with open(path, encoding="utf-8") as f:
+            return FakeResponse(f.read())
+
+
+def test_parse_jsonp_accepts_callback_and_plain_json():
+    assert parse_jsonp('datatable123({"a": 1});') == {"a": 1}
+    assert parse_jsonp('{"a": 1}') == {"a": 1}
+
+
+def test_iter_reports_pages_and_deduplicates():
+    session = FixtureSession()
+    api = EastmoneyReportAPI(session=session, page_size=3)
+    reports = list(api.iter_reports(begin_date="2025-03-20", end_date="2025-03-27",
+                                    industry_code="1039", max_pages=0))
+
+    assert [call["pageNo"] for call in session.calls] == ["1", "2"]
+    assert session.calls[0]["beginTime"] == "2025-03-20"
+    assert session.calls[0]["industryCode"] == "1039"
+    assert session.calls[0]["qType"] == "1"
+    # 第2页重复出现的研报只保留一次
+    assert [report["info_code"] for report in reports] == [
+        "AP202503271234567890", "AP202503271234567891", "AP202503261234567892", "AP202503251234567893"
+    ]
+
+
+def test_iter_reports_respects_max_pages():
+    session = FixtureSession()
+    reports = EastmoneyReportAPI(session=session).fetch_reports(begin_date="2025-03-20", max_pages=1)
+    assert len(session.calls) == 1
+    assert len(reports) == 3
+
+
+def test_normalize_report_matches_page_parser_fields():
+    report = normalize_report({
+        "title": " 半导体行业周报 ",
+        "infoCode": "AP1",
+        "industryName": "半导体",
+        "emRatingName": "增持",
+        "orgSName": "中信证券",
+        "publishDate": "2025-03-27 00:00:00.000"
+    })
+    assert report["title"] == "半导体行业周报"
+    assert report["link"] == "https://data.eastmoney.com/report/zw_industry.jshtml?infocode=AP1"
+    assert report["date"] == "2025-03-27"
+    assert report["abstract"] == "行业: 半导体, 评级: 增持, 机构: 中信证券, 日期: 2025-03-27"
+
+    stock = normalize_report({"infoCode": "AP2"}, report_type="stock")
+    assert stock["link"].startswith("https://data.eastmoney.com/report/zw_stock.jshtml")
+    assert stock["industry"] == "未知行业"
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+网页抓取公共层测试
+使用本地HTTP服务返回gzip压缩、GBK编码和超长的页面
+"""
+
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+import http_fetch
+
+GBK_PAGE = '<html><head><meta charset="gb2312"></head><body>行业研报</body></html>'.encode("gbk")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/gzip":
+            body = gzip.compress("<html><body>压缩页面</body></html>".encode("utf-8"))
+            self._send(body, "text/html; charset=utf-8", {"Content-Encoding": "gzip"})
+        elif self.path == "/gbk":
+            # 响应头没有声明字符集，需要从<meta charset>中识别
+            self._send(GBK_PAGE, "text/html")
+        elif self.path == "/large":
+            self._send(b"a" * 200000, "text/html; charset=utf-8")
+        else:
+            self._send(b"not found", "text/plain", status=404)
+
+    def _send(self, body, content_type, extra_headers=None, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = HTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_gzip_body_is_decoded(server):
+    result = http_fetch.fetch(f"{server}/gzip")
+    assert result.text == "<html><body>压缩页面</body></html>"
+    assert result.encoding == "utf-8"
+
+
+def test_meta_charset_is_used_and_cached(server):
+    result = http_fetch.fetch(f"{server}/gbk")
+    assert result.encoding == "gb18030"
+    assert "行业研报" in result.text
+
+    host = server.split("//", 1)[1]
+    assert http_fetch.resolve_encoding(host, "text/html", b"<html></html>") == "gb18030"
+
+
+def test_body_cap_truncates(server):
+    result = http_fetch.fetch(f"{server}/large", max_bytes=100000)
+    assert result.truncated
+    assert len(result.content) == 100000
+
+
+def test_error_status_and_metrics(server):
+    http_fetch.reset_metrics()
+    with pytest.raises(http_fetch.requests.HTTPError):
+        http_fetch.fetch(f"{server}/missing")
+    result = http_fetch.fetch(f"{server}/missing", raise_for_status=False)
+    assert result.status_code == 404
+
+    [stats] = http_fetch.get_metrics().values()
+    assert stats["requests"] == 2
+    assert stats["errors"] == 2
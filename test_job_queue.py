@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SQLite任务队列测试
+使用临时数据库和测试用处理函数，不调用LLM和爬虫
+"""
+
+import time
+import sqlite3
+import multiprocessing
+
+import analysis_worker
+from job_queue import JobQueue, PermanentJobError
+
+
+def test_identical_pending_jobs_are_deduplicated(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    first, created = queue.enqueue("analyze", {"report_id": 1, "force_refresh": False}, priority=10)
+    again, created_again = queue.enqueue("analyze", {"force_refresh": False, "report_id": 1}, priority=50)
+    other, _ = queue.enqueue("analyze", {"report_id": 2, "force_refresh": False})
+
+    assert created and not created_again
+    assert again == first != other
+    # 重复提交时提高已有任务的优先级
+    assert queue.get(first)["priority"] == 50
+
+    job = queue.claim("w1")
+    assert job["id"] == first
+    queue.complete(first, "w1", {"ok": True})
+    # 完成后可以再次入队
+    assert queue.enqueue("analyze", {"report_id": 1, "force_refresh": False}) == (other + 1, True)
+
+
+def test_claim_order_and_expired_lease(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    low, _ = queue.enqueue("analyze", {"report_id": 1}, priority=1)
+    high, _ = queue.enqueue("analyze", {"report_id": 2}, priority=100)
+    later, _ = queue.enqueue("analyze", {"report_id": 3}, priority=200, delay=60)
+    video, _ = queue.enqueue("video_script", {"report_id": 4}, priority=300)
+
+    assert queue.claim("w1", ["analyze"], lease_seconds=0.01)["id"] == high
+    assert queue.claim("w2", ["analyze"])["id"] == low
+    time.sleep(0.05)
+
+    # w1的租约已过期，任务被w2重新领取，w1不能再完成该任务
+    reclaimed = queue.claim("w2", ["analyze"])
+    assert reclaimed["id"] == high and reclaimed["attempts"] == 2
+    assert queue.complete(high, "w1", {}) is False
+    assert queue.complete(high, "w2", {"score": 80}) is True
+    assert queue.get(high)["result"] == {"score": 80}
+
+    assert queue.claim("w3", ["analyze"]) is None
+    assert queue.claim("w3")["id"] == video
+    assert later not in (low, high)
+
+
+def test_failed_jobs_retry_with_backoff_until_max_attempts(tmp_path, monkeypatch):
+    monkeypatch.setattr("job_queue.RETRY_BASE_DELAY", 0)
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    calls = []
+
+    def flaky(payload, db_path):
+        calls.append(payload)
+        raise RuntimeError("接口超时")
+
+    def missing(payload, db_path):
+        raise PermanentJobError("未找到研报")
+
+    handlers = {"flaky": flaky, "missing": missing}
+    job_id, _ = queue.enqueue("flaky", {"n": 1}, max_attempts=2)
+    assert analysis_worker.process_next(queue, "w1", handlers=handlers)["status"] == "pending"
+    job = analysis_worker.process_next(queue, "w1", handlers=handlers)
+    assert job["id"] == job_id and job["status"] == "failed" and job["error"] == "接口超时"
+    assert len(calls) == 2
+
+    missing_id, _ = queue.enqueue("missing", {})
+    job = analysis_worker.process_next(queue, "w1", handlers=handlers)
+    assert job["id"] == missing_id and job["status"] == "failed" and job["attempts"] == 1
+    assert queue.stats() == {"flaky": {"failed": 1}, "missing": {"failed": 1}}
+
+
+class _StreamingAnalyzer:
+    output_format = "markdown"
+
+    def __init__(self, seen):
+        self.seen = seen
+
+    def stream_five_steps(self, title, content, industry=None, force_refresh=False):
+        yield {"event": "delta", "text": "## 体检清单\n"}
+        yield {"event": "row", "section": "体检清单", "step": "信息", "covered": "是"}
+        # 工作进程在生成过程中写入进度，页面通过任务状态读取
+        self.seen.append(self.queue.get(self.job_id)["progress"])
+        yield {"event": "done", "result": {"analysis": {"summary": {"completeness_score": 70}}}}
+
+
+def test_streamed_analysis_progress_is_relayed_through_the_job(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    seen = []
+    analyzer = _StreamingAnalyzer(seen)
+    analyzer.queue = queue
+    report = {"title": "社零点评", "full_content": "正文", "industry": "商贸零售"}
+
+    def analyze(payload, db_path):
+        return analysis_worker._stream_analysis(analyzer, report, False)
+
+    analyzer.job_id, _ = queue.enqueue("analyze", {"report_id": 1})
+    job = analysis_worker.process_next(queue, "w1", handlers={"analyze": analyze})
+
+    assert seen == [{"text": "## 体检清单\n", "rows": [{"section": "体检清单", "step": "信息", "covered": "是"}],
+                     "sections": []}]
+    assert job["status"] == "done" and job["progress"]["rows"] == seen[0]["rows"]
+    # 不在工作进程中执行时上报进度不做任何操作
+    analysis_worker.report_progress({"text": "忽略"})
+    assert queue.get(analyzer.job_id)["progress"] == job["progress"]
+
+
+def test_retry_delay_grows_exponentially(monkeypatch):
+    import job_queue
+    monkeypatch.setattr(job_queue.random, "uniform", lambda a, b: 0)
+    assert [job_queue.retry_delay(n) for n in (1, 2, 3)] == [30, 60, 120]
+    assert job_queue.retry_delay(20) == job_queue.RETRY_MAX_DELAY
+
+
+def _claim_all(db_path, worker_id, results):
+    queue = JobQueue(db_path)
+    while True:
+        job = queue.claim(worker_id)
+        if not job:
+            return
+        queue.complete(job["id"], worker_id, {"worker": worker_id})
+        results.put(job["id"])
+
+
+def test_worker_processes_never_claim_the_same_job(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    queue = JobQueue(db_path)
+    job_ids = [queue.enqueue("analyze", {"report_id": n})[0] for n in range(40)]
+
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_claim_all, args=(db_path, f"w{n}", results)) for n in range(3)]
+    for process in processes:
+        process.start()
+    claimed = [results.get(timeout=30) for _ in job_ids]
+    for process in processes:
+        process.join(timeout=30)
+
+    assert sorted(claimed) == job_ids
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'done' AND attempts = 1").fetchone()[0] == 40
+    finally:
+        conn.close()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+研报列表页解析测试
+使用仓库中保存的行业研报页面快照
+"""
+
+import os
+
+import pytest
+
+import list_parser
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _read(name):
+    with open(os.path.join(BASE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("builder", sorted(list_parser.BUILDERS))
+def test_parse_industry_page(builder):
+    reports = list_parser.parse_reports(_read("page_source_backup_industry.jshtml"), builder=builder)
+
+    assert len(reports) == 50
+    first = reports[0]
+    assert first["title"] == "非银行金融行业周报：券商回购释放信心，行业估值仍处低位"
+    assert first["link"] == "https://data.eastmoney.com/report/zw_industry.jshtml?infocode=AP202506101688401971"
+    assert first["industry"] == "证券"
+    assert first["rating"] == "增持"
+    assert first["org"] == "山西证券"
+    assert first["date"] == "2025-06-10"
+    assert all(report["link"].startswith("https://data.eastmoney.com/report/zw_") for report in reports)
+
+
+def test_builders_agree():
+    page_source = _read("page_source_backup_industry.jshtml")
+    results = [list_parser.parse_reports(page_source, builder=builder) for builder in list_parser.BUILDERS]
+    assert all(result == results[0] for result in results)
+
+
+def test_page_without_report_links():
+    assert list_parser.parse_reports(_read("page_output.html")) == []
+
+
+def test_resolve_columns_once_per_header():
+    headers = ["序号", "行业名称", "涨跌幅", "相关", "报告名称", "东财评级", "评级变动", "机构名称", "近一月行业研报数", "日期"]
+    assert list_parser.resolve_columns(headers) == {
+        "industry": 1, "title": 4, "rating": 5, "org": 7, "date": 9
+    }
+
+
+def test_row_without_header_falls_back_to_cell_types():
+    html = """
+    <table><tr>
+      <td><a href="/report/zw_stock.jshtml?infocode=AP1">医药公司点评</a></td>
+      <td>买入</td><td>某某证券</td><td>2025-01-02</td>
+    </tr></table>
+    """
+    [report] = list_parser.parse_reports(html)
+    assert report["link"] == "https://data.eastmoney.com/report/zw_stock.jshtml?infocode=AP1"
+    assert (report["industry"], report["rating"], report["org"], report["date"]) == ("医药", "买入", "某某证券", "2025-01-02")
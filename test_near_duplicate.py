@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+近似重复研报检测测试
+使用仓库中保存的研报single_report.json，数据库测试在临时目录中执行全部迁移，不调用LLM
+"""
+
+import os
+import json
+import sqlite3
+
+import near_duplicate
+import analysis_worker
+from analysis_db import AnalysisDatabase
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _report_content():
+    with open(os.path.join(BASE_DIR, "single_report.json"), encoding="utf-8") as f:
+        return json.load(f)["full_content"]
+
+
+def _reposted(content):
+    # 重发时常见的改动：标点、空白和末尾的免责声明
+    return content.replace("。", "；", 5).replace("\n", " ") + "\n免责声明：本报告仅供参考。"
+
+
+def _insert(db, n, content):
+    return db.insert_report(f"社零点评{n}", f"https://example.com/{n}", "商贸零售", "增持", "机构", "2025-06-16",
+                            content)
+
+
+def test_signature_separates_reposts_from_different_reports(monkeypatch):
+    content = _report_content()
+    signature = near_duplicate.minhash(content)
+
+    assert near_duplicate.similarity(signature, near_duplicate.minhash(_reposted(content))) >= near_duplicate.SIMILARITY_THRESHOLD
+    assert near_duplicate.similarity(signature, near_duplicate.minhash(content[:len(content) // 2])) < 0.6
+    # 过短的正文不计算签名
+    assert near_duplicate.minhash("本周行业动态汇总，详见附件。") is None
+
+    if near_duplicate.numpy_available:
+        monkeypatch.setattr(near_duplicate, "numpy_available", False)
+        assert near_duplicate.minhash(content) == signature
+
+
+def test_ingest_links_reposts_to_the_earliest_report(migrated_db):
+    db_path = migrated_db
+    db = AnalysisDatabase(db_path)
+    content = _report_content()
+
+    original_id = _insert(db, 1, content)
+    copy_id = _insert(db, 2, _reposted(content))
+    other_id = _insert(db, 3, content[:len(content) // 2])
+    # 原研报重新入库不会反过来指向它的重复研报
+    assert _insert(db, 1, content) == original_id
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert near_duplicate.originals_of(conn, [original_id, copy_id, other_id]) == {copy_id: original_id}
+        assert near_duplicate.stats(conn)["top_originals"] == [{"report_id": original_id, "copies": 1}]
+        # 原研报只有预评分结果，没有可复用的分析
+        assert near_duplicate.analyzed_original(conn, _reposted(content)) is None
+        # 删除原研报后，它的重复研报重新加入分桶表，成为新的原研报
+        near_duplicate.remove_report(conn, original_id)
+        assert near_duplicate.find_similar(conn, near_duplicate.minhash(content))[0][0] == copy_id
+    finally:
+        conn.close()
+
+
+def test_duplicates_reuse_the_original_analysis_without_llm(migrated_db, monkeypatch):
+    db_path = migrated_db
+    db = AnalysisDatabase(db_path)
+    content = _report_content()
+    original_id = _insert(db, 1, content)
+    copy_id = _insert(db, 2, _reposted(content))
+    conn = sqlite3.connect(db_path)
+    try:
+        # 迁移和AnalysisDatabase都不创建读取分析结果时用到的步骤表和建议表
+        conn.execute("CREATE TABLE IF NOT EXISTS step_analysis (analysis_id INTEGER, step_name TEXT, found INTEGER, "
+                     "description TEXT, step_score INTEGER, framework_summary TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS improvement_suggestions (id INTEGER PRIMARY KEY, analysis_id INTEGER, "
+                     "point TEXT, suggestion TEXT)")
+        conn.execute("INSERT INTO report_analysis (report_id, analyzer_type, completeness_score, evaluation, created_at) "
+                     "VALUES (?, 'deepseek', 85, '较完整', datetime('now'))", (original_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+    analysis = db.get_analysis_by_report_id(copy_id)
+    assert analysis["duplicate_of"] == original_id and analysis["completeness_score"] == 85
+    assert "duplicate_of" not in db.get_analysis_by_report_id(original_id)
+    batch = db.get_analyses_by_report_ids([original_id, copy_id])
+    assert batch[copy_id]["duplicate_of"] == original_id and batch[copy_id]["id"] == batch[original_id]["id"]
+
+    def no_llm(analyzer_type=None):
+        raise AssertionError("近似重复的研报不应调用分析器")
+
+    monkeypatch.setattr("analyzer_registry.get_analyzer", no_llm)
+    result = analysis_worker.handle_analyze({"report_id": copy_id, "force_refresh": False}, db_path)
+    assert result == {"report_id": copy_id, "duplicate_of": original_id}
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("DELETE FROM report_analysis WHERE report_id = ?", (original_id,))
+        conn.commit()
+    finally:
+        conn.close()
+    # 重复研报不进入分析队列，只有原研报入队
+    assert analysis_worker.enqueue_backlog(db_path, threshold=0)["enqueued"] == 1
+
+
+def test_backfill_drops_buckets_of_stale_signatures(migrated_db):
+    db_path = migrated_db
+    db = AnalysisDatabase(db_path)
+    report_id = _insert(db, 1, _report_content())
+    conn = sqlite3.connect(db_path)
+    try:
+        # 模拟旧版本算法留下的签名和分桶，其中研报999已被删除
+        conn.execute("UPDATE report_minhashes SET signature_version = 0")
+        conn.execute("INSERT INTO report_minhash_buckets (bucket, report_id) VALUES (12345, ?)", (report_id,))
+        conn.execute("INSERT INTO report_minhashes (report_id, signature, signature_version, updated_at) "
+                     "VALUES (999, x'00', 0, '2025-06-16 00:00:00')")
+        conn.execute("INSERT INTO report_minhash_buckets (bucket, report_id) VALUES (678, 999)")
+        conn.commit()
+    finally:
+        conn.close()
+
+    assert near_duplicate.backfill(db_path)["indexed"] == 1
+    conn = sqlite3.connect(db_path)
+    try:
+        buckets = conn.execute("SELECT bucket, report_id FROM report_minhash_buckets").fetchall()
+        assert len(buckets) == near_duplicate.BANDS and {row[1] for row in buckets} == {report_id}
+        assert (12345, report_id) not in buckets
+        assert conn.execute("SELECT COUNT(*) FROM report_minhashes WHERE report_id = 999").fetchone()[0] == 0
+    finally:
+        conn.close()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+原始页面归档测试
+使用录制的列表接口响应和构造的详情页，在临时目录中归档并离线重建研报
+"""
+
+import os
+import sqlite3
+
+import pytest
+
+import page_archive
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DETAIL_URL = "https://data.eastmoney.com/report/zw_industry.jshtml?infocode=AP202503271234567890"
+DETAIL_PAGE = '<html><body><div class="ctx-content"><p>国产替代加速。</p><p>维持增持评级。</p></div></body></html>'
+
+
+def test_identical_bodies_are_stored_once(tmp_path):
+    archive = page_archive.PageArchive(str(tmp_path), codec="zlib")
+    first = archive.put("https://example.com/a", "同一页面", "list")
+    second = archive.put("https://example.com/b", "同一页面", "list")
+    archive.put("https://example.com/a", "更新后的页面", "list")
+
+    assert first == second
+    stats = archive.stats()
+    assert (stats["pages"], stats["blobs"]) == (3, 2)
+    assert archive.read(first) == "同一页面"
+    assert archive.latest("https://example.com/a") == "更新后的页面"
+    assert [url for url, _, _, _ in archive.iter_pages("list", latest_only=True)] == [
+        "https://example.com/b", "https://example.com/a"
+    ]
+
+
+def test_reparse_rebuilds_reports_offline(tmp_path, migrated_db):
+    pytest.importorskip("bs4")
+    with open(os.path.join(BASE_DIR, "fixtures", "eastmoney", "report_list_page1.jsonp"), encoding="utf-8") as f:
+        list_response = f.read()
+
+    archive = page_archive.PageArchive(str(tmp_path / "archive"))
+    archive.put("https://reportapi.eastmoney.com/report/list?pageNo=1", list_response, "list_api:industry")
+    archive.put(DETAIL_URL, DETAIL_PAGE, "detail")
+
+    db_path = migrated_db
+
+    result = page_archive.reparse(archive, db_path)
+    assert result["written"] == 1
+    assert result["missing_detail"] == result["listed"] - 1
+
+    conn = sqlite3.connect(db_path)
+    try:
+        title, industry, content = conn.execute(
+            "SELECT title, industry, full_content FROM reports WHERE link = ?", (DETAIL_URL,)
+        ).fetchone()
+    finally:
+        conn.close()
+    assert title == "半导体行业周报：国产替代加速"
+    assert industry == "半导体"
+    assert content == "国产替代加速。\n维持增持评级。"
+
+    # 重复执行时按链接更新，不产生重复研报
+    page_archive.reparse(archive, db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0] == 1
+    finally:
+        conn.close()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+研报规则预评分测试
+使用仓库中保存的研报single_report.json，数据库测试在临时目录中执行全部迁移
+"""
+
+import os
+import json
+import sqlite3
+
+import pytest
+
+import prescorer
+from analysis_db import AnalysisDatabase
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+THIN_CONTENT = "本周行业动态汇总，详见附件。"
+
+
+def _report_content():
+    with open(os.path.join(BASE_DIR, "single_report.json"), encoding="utf-8") as f:
+        return json.load(f)["full_content"]
+
+
+def test_structured_report_scores_above_thin_content():
+    full, thin = prescorer.score_reports([_report_content(), THIN_CONTENT])
+
+    assert full.score > 60 > thin.score
+    assert all(full.step_scores[step] >= prescorer.FOUND_SCORE for step in prescorer.STEPS)
+    assert "投资建议" in full.keywords["结论"]
+    assert any("投资建议" in snippet for snippet in full.evidence["结论"])
+
+    result = thin.to_result()
+    assert result["analyzer_type"] == prescorer.ANALYZER_TYPE
+    assert result["analysis"]["summary"]["completeness_score"] == thin.score
+
+
+def test_longer_terms_win_and_structure_features_are_counted():
+    features, step_terms = prescorer.extract_features("受益于政策落地，给予买入评级，目标价25元，2025年一季度收入同比+12%。")
+    counts = dict(zip(prescorer.FEATURES, features))
+
+    assert ("受益于", 1) in step_terms[prescorer.STEPS.index("逻辑")]
+    assert counts["target_price"] == 1
+    assert counts["ratings"] == 1
+    assert counts["percents"] == 1
+    assert counts["dates"] == 2
+
+
+def test_numpy_and_python_paths_agree(monkeypatch):
+    pytest.importorskip("numpy")
+    texts = [_report_content(), THIN_CONTENT, ""]
+    vectorized = prescorer.score_reports(texts)
+    monkeypatch.setattr(prescorer, "numpy_available", False)
+    assert prescorer.score_reports(texts) == vectorized
+
+
+def test_ingest_stores_prescore_and_ranks_unanalyzed(migrated_db):
+    db_path = migrated_db
+    db = AnalysisDatabase(db_path)
+    full_id = db.insert_report("社零点评", "https://example.com/a", "商贸零售", "增持", "机构", "2025-06-16",
+                               _report_content())
+    thin_id = db.insert_report("周报", "https://example.com/b", "商贸零售", "", "机构", "2025-06-16", THIN_CONTENT)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert prescorer.get_prescore(conn, full_id).score == prescorer.prescore(_report_content()).score
+        assert [report_id for report_id, _ in prescorer.rank_unanalyzed(conn, threshold=0)] == [full_id, thin_id]
+        assert [report_id for report_id, _ in prescorer.rank_unanalyzed(conn, threshold=60)] == [full_id]
+    finally:
+        conn.close()
+
+    # 只有预评分结果的研报仍然待分析，经过LLM分析后不再列出
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executemany("INSERT INTO report_analysis (report_id, analyzer_type, created_at) VALUES (?, ?, datetime('now'))",
+                         [(thin_id, prescorer.ANALYZER_TYPE), (full_id, "deepseek")])
+        assert [report_id for report_id, _ in prescorer.rank_unanalyzed(conn, threshold=0)] == [thin_id]
+    finally:
+        conn.close()
+
+    # 预评分结果不作为研报的分析结果返回
+    assert db.get_analysis_by_report_id(thin_id) is None
+    assert thin_id not in db.get_analyses_by_report_ids([thin_id, full_id])
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+统计聚合增量维护测试
+在临时目录中执行全部迁移，每次写入后比较增量结果与全量重建结果
+"""
+
+import sqlite3
+
+import pytest
+
+import database
+import report_stats
+from analysis_db import AnalysisDatabase
+
+
+def _analysis(score, step_score):
+    analysis = {step: {"found": True, "description": f"{step}分析", "step_score": step_score, "framework_summary": ""}
+                for step in report_stats.STEP_NAMES}
+    analysis["summary"] = {"completeness_score": score, "evaluation": "较完整", "one_line_summary": "数据扎实的点评"}
+    return {"analysis": analysis, "full_analysis": "## 一句话总结\n数据扎实的点评"}
+
+
+def _snapshot(conn):
+    return (
+        sorted(conn.execute("SELECT dimension, bucket, report_count, score_sum FROM report_stats").fetchall()),
+        sorted(conn.execute("SELECT * FROM report_stats_contributions").fetchall()),
+    )
+
+
+def _assert_matches_rebuild(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        incremental = _snapshot(conn)
+        report_stats.rebuild_report_stats(conn)
+        assert _snapshot(conn) == incremental
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+@pytest.fixture
+def db_path(analysis_db_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_FILE", analysis_db_path)
+    return analysis_db_path
+
+
+def test_incremental_aggregates_match_full_rebuild(db_path):
+    db = AnalysisDatabase(db_path)
+    ids = [db.insert_report(f"研报{n}", f"https://example.com/{n}", industry, rating, "机构", "2025-06-16", "正文")
+           for n, (industry, rating) in enumerate([("商贸零售", "增持"), ("银行", "买入"), ("银行", "中性")])]
+    _assert_matches_rebuild(db_path)
+
+    # 写入、更新分析结果
+    analysis_id = db.save_analysis_result(ids[0], _analysis(85, 80))
+    db.save_analysis_result(ids[1], _analysis(45, 40))
+    _assert_matches_rebuild(db_path)
+    db.save_analysis_result(ids[1], _analysis(62, 70))
+    _assert_matches_rebuild(db_path)
+
+    # 按链接重新入库，行业和评级变化
+    assert db.insert_report("研报0", "https://example.com/0", "食品饮料", "推荐", "机构", "2025-06-16", "正文") == ids[0]
+    _assert_matches_rebuild(db_path)
+
+    # 旧版保存接口以新ID替换研报，旧ID的贡献被移除
+    assert database.save_report_to_db({"title": "研报2", "link": "https://example.com/2", "industry": "银行",
+                                       "rating": "减持", "full_content": "正文",
+                                       "analysis": {"summary": {"completeness_score": 30}}}) != ids[2]
+    _assert_matches_rebuild(db_path)
+
+    # 删除分析结果和研报
+    db.delete_analysis(analysis_id)
+    _assert_matches_rebuild(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("DELETE FROM reports WHERE id = ?", (ids[1],))
+        report_stats.remove_report(conn, ids[1])
+        conn.commit()
+        assert conn.execute("SELECT report_count FROM report_stats WHERE dimension = 'overall'").fetchone()[0] == 2
+    finally:
+        conn.close()
+    _assert_matches_rebuild(db_path)
+
+
+def test_migration_rebuilds_only_when_reports_are_missing(db_path, load_migration):
+    db = AnalysisDatabase(db_path)
+    for n in range(3):
+        report_id = db.insert_report(f"研报{n}", f"https://example.com/{n}", "银行", "买入", "机构", "2025-06-16", "正文")
+    db.save_analysis_result(report_id, _analysis(70, 65))
+    migration = load_migration("008_create_report_stats.py")
+
+    conn = sqlite3.connect(db_path)
+    try:
+        expected = _snapshot(conn)
+        # 模拟启用统计聚合之前直接写入、没有计入聚合表的研报
+        conn.execute("DELETE FROM report_stats_contributions WHERE report_id = ?", (report_id,))
+        conn.execute("UPDATE report_stats SET report_count = report_count - 1")
+        conn.commit()
+    finally:
+        conn.close()
+
+    migration.migrate(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        assert _snapshot(conn) == expected
+    finally:
+        conn.close()